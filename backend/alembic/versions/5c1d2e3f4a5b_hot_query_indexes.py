@@ -0,0 +1,85 @@
+"""hot_query_indexes
+
+Composite indexes for the lookups on the webhook path and the tenant
+dashboard / report / list queries. On PostgreSQL they are built with
+CREATE INDEX CONCURRENTLY (outside the migration transaction) so live
+tables are not locked while they build.
+
+facebook_accounts.page_id is not indexed here: its UNIQUE constraint
+already creates one.
+
+Downgrade drops the indexes only; the leads columns added on upgrade (when
+missing) stay, since there is no record of whether this revision or
+init_db created them.
+
+Revision ID: 5c1d2e3f4a5b
+Revises: 1a2b3c4d5e6f
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import app.models
+
+# revision identifiers, used by Alembic.
+revision: str = '5c1d2e3f4a5b'
+down_revision: Union[str, None] = '1a2b3c4d5e6f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (index name, table, columns)
+INDEXES = [
+    ('ix_conversations_tenant_contact_channel', 'conversations', ['tenant_id', 'contact_id', 'channel']),
+    ('ix_conversations_tenant_created_at', 'conversations', ['tenant_id', 'created_at']),
+    ('ix_conversations_tenant_last_message_at', 'conversations', ['tenant_id', 'last_message_at']),
+    ('ix_messages_conversation_created_at', 'messages', ['conversation_id', 'created_at']),
+    ('ix_leads_tenant_phone', 'leads', ['tenant_id', 'phone']),
+    ('ix_instagram_accounts_instagram_user_id', 'instagram_accounts', ['instagram_user_id']),
+    ('ix_conversation_analyses_sales_outcome', 'conversation_analyses', ['sales_outcome']),
+    ('ix_daily_reports_tenant_report_date', 'daily_reports', ['tenant_id', 'report_date']),
+]
+
+LEAD_COLUMNS = [
+    ('name', sa.String(length=255)),
+    ('phone', sa.String(length=100)),
+    ('source', sa.String(length=100)),
+]
+
+
+def _is_postgres() -> bool:
+    return op.get_bind().dialect.name == 'postgresql'
+
+
+def _existing_columns(table: str) -> set:
+    return {column['name'] for column in sa.inspect(op.get_bind()).get_columns(table)}
+
+
+def upgrade() -> None:
+    # init_db may already have added these on databases not managed by Alembic
+    existing = _existing_columns('leads')
+    for name, type_ in LEAD_COLUMNS:
+        if name not in existing:
+            op.add_column('leads', sa.Column(name, type_, nullable=True))
+
+    if _is_postgres():
+        with op.get_context().autocommit_block():
+            for name, table, columns in INDEXES:
+                op.create_index(name, table, columns, postgresql_concurrently=True, if_not_exists=True)
+    else:
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, if_not_exists=True)
+
+
+def downgrade() -> None:
+    if _is_postgres():
+        with op.get_context().autocommit_block():
+            for name, table, _ in reversed(INDEXES):
+                op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
+    else:
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, if_exists=True)
+
+    # leads.name/phone/source are left in place: init_db may have created them
+    # before this revision ran, and the Lead model reads them either way
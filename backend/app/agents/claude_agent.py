@@ -6,7 +6,9 @@ Handles text, image descriptions, and voice transcripts.
 Returns structured responses with reply text and metadata.
 """
 
+import asyncio
 import json
+import time
 import structlog
 from typing import Optional
 from dataclasses import dataclass, field
@@ -89,9 +91,57 @@ After your natural reply, add a JSON block on a new line with this exact format:
 class ClaudeAgent:
     """AI Sales Agent powered by Claude claude-sonnet-4-5."""
 
+    # Unclaimed speculative retrievals are dropped after this long
+    PREFETCH_TTL_SEC = 60.0
+
     def __init__(self):
         """Initialize the agent. Routing is now handled by the LLM Router."""
-        pass
+        # (tenant_id, contact_id) -> (query, task, started_at)
+        self._prefetches: dict[tuple[str, str], tuple[str, asyncio.Task, float]] = {}
+
+    # ─── Speculative knowledge retrieval ──────────────────────────────
+
+    def prefetch_knowledge(self, tenant_id: str, contact_id: str, query: str) -> Optional[asyncio.Task]:
+        """
+        Start RAG retrieval for a just-received text message, so the embedding
+        and vector search overlap lead upsert, notifications and the automation
+        check. generate_response() picks the result up for the same message.
+        """
+        if not query or not query.strip():
+            return None
+
+        now = time.monotonic()
+        for key in [k for k, (_, _, started) in self._prefetches.items() if now - started > self.PREFETCH_TTL_SEC]:
+            self._prefetches.pop(key)[1].cancel()
+
+        self.discard_prefetch(tenant_id, contact_id)
+        task = asyncio.create_task(self._get_knowledge_context(tenant_id, query))
+        self._prefetches[(str(tenant_id), str(contact_id))] = (query, task, now)
+        return task
+
+    def discard_prefetch(self, tenant_id: str, contact_id: str, task: Optional[asyncio.Task] = None) -> None:
+        """
+        Cancel a speculative retrieval, e.g. when an automation handled the
+        message. With `task`, only that retrieval is dropped, so a handler
+        cleaning up after itself never cancels a newer message's prefetch.
+        """
+        key = (str(tenant_id), str(contact_id))
+        entry = self._prefetches.get(key)
+        if entry and (task is None or entry[1] is task):
+            self._prefetches.pop(key)
+            entry[1].cancel()
+        if task is not None:
+            task.cancel()
+
+    def _take_prefetch(self, tenant_id: str, contact_id: str, query: str) -> Optional[asyncio.Task]:
+        entry = self._prefetches.pop((str(tenant_id), str(contact_id)), None)
+        if not entry:
+            return None
+        prefetched_query, task, _ = entry
+        if prefetched_query != query or task.cancelled():
+            task.cancel()
+            return None
+        return task
 
     async def generate_response(
         self,
@@ -106,6 +156,7 @@ class ClaudeAgent:
         """
         Generate an AI response to a user message.
         """
+        prefetched = self._take_prefetch(tenant_id, contact_id, user_message) if message_type == "text" else None
         try:
             # 0. Fetch Tenant AI settings
             db_persona = ""
@@ -124,11 +175,10 @@ class ClaudeAgent:
             # Combine DB persona with channel-specific persona
             final_persona = f"{db_persona}\n\n{custom_persona}".strip()
 
-            # 1. Retrieve conversation context from Redis
-            context_messages = await memory.get_context(tenant_id, contact_id)
+            # 1-2. Retrieve conversation context and the human handoff flag (one Redis read)
+            context_messages, handoff_active = await memory.get_state(tenant_id, contact_id)
 
-            # 2. Check if human handoff is active
-            if await memory.is_human_handoff(tenant_id, contact_id):
+            if handoff_active:
                 logger.info("human_handoff_active", tenant=tenant_id, contact=contact_id)
                 return AgentResponse(
                     reply_text="",
@@ -136,8 +186,12 @@ class ClaudeAgent:
                     metadata={"reason": "Human operator is handling this conversation"},
                 )
 
-            # 3. Search knowledge base via RAG
-            knowledge_context = await self._get_knowledge_context(tenant_id, user_message)
+            # 3. Search knowledge base via RAG (reuse the retrieval started at ingress)
+            if prefetched:
+                logger.debug("rag_prefetch_used", tenant=tenant_id, ready=prefetched.done())
+                knowledge_context = await prefetched
+            else:
+                knowledge_context = await self._get_knowledge_context(tenant_id, user_message)
 
             # 4. Build system prompt
             system_prompt = SYSTEM_PROMPT_TEMPLATE.format(
@@ -161,7 +215,8 @@ class ClaudeAgent:
             router_result = await router_generate(
                 message=current_user_msg if isinstance(current_user_msg, str) else str(current_user_msg),
                 conversation_history=full_history,
-                mode="chat"
+                mode="chat",
+                tenant_id=tenant_id,
             )
 
             raw_reply = router_result["response"]
@@ -170,8 +225,10 @@ class ClaudeAgent:
             agent_response = self._parse_response(raw_reply)
 
             # 8. Store messages in Redis context
-            await memory.add_message(tenant_id, contact_id, "user", user_message, message_type)
-            await memory.add_message(tenant_id, contact_id, "assistant", agent_response.reply_text, "text")
+            await memory.add_messages(tenant_id, contact_id, [
+                {"role": "user", "content": user_message, "type": message_type},
+                {"role": "assistant", "content": agent_response.reply_text, "type": "text"},
+            ])
 
             # 9. Handle human handoff flag (Intelligence: proactive escalation)
             handoff_triggered = False
@@ -236,7 +293,10 @@ class ClaudeAgent:
                         session_id=str(contact_id),
                         prompt_snapshot=system_prompt[:500] + "...", # Snapshot for audit
                         completion=agent_response.reply_text,
-                        token_usage=router_result.get("usage", {}).get("total_tokens", 0)
+                        token_usage=router_result.get("tokens_used", 0),
+                        user_message=user_message if message_type == "text" else None,
+                        complexity=router_result.get("complexity"),
+                        intent=agent_response.intent,
                     )
                     db.add(ai_log)
                     await db.commit()
@@ -267,6 +327,10 @@ class ClaudeAgent:
                 reply_text="Sorry, give me a moment — I'll get right back to you! 😊",
                 metadata={"error": str(e)},
             )
+        finally:
+            # Handoff and error paths return before awaiting the retrieval
+            if prefetched and not prefetched.done():
+                prefetched.cancel()
 
     def _build_message_history(
         self,
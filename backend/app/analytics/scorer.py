@@ -93,11 +93,14 @@ class ConversationScorer:
             # Call Claude for analysis
             prompt = SCORING_PROMPT.format(conversation=conversation_text)
 
-            response = await self.client.messages.create(
-                model=settings.claude_model,
-                max_tokens=1024,
-                messages=[{"role": "user", "content": prompt}],
-            )
+            # Scoring is background analysis: lowest scheduler priority
+            from app.services.llm_scheduler import llm_scheduler
+            async with llm_scheduler.slot(tenant_id, "analysis"):
+                response = await self.client.messages.create(
+                    model=settings.claude_model,
+                    max_tokens=1024,
+                    messages=[{"role": "user", "content": prompt}],
+                )
 
             raw_text = response.content[0].text
             analysis = self._parse_analysis(raw_text)
@@ -13,9 +13,9 @@ from sqlalchemy import select, and_, desc
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.database import get_db
-from app.models import KnowledgeDocument, Tenant
+from app.models import KnowledgeDocument, KnowledgeIngestionJob, Tenant
 from app.api.routes.auth import get_current_tenant
-from app.knowledge.uploader import ingest_document
+from app.knowledge.ingestion_jobs import JobConflictError, ingestion_jobs
 
 logger = structlog.get_logger(__name__)
 router = APIRouter(prefix="/api/knowledge-base", tags=["Knowledge Base"])
@@ -50,13 +50,63 @@ async def list_documents(
     }
 
 
-@router.post("/upload")
+async def _active_job_exists(db: AsyncSession, document_id) -> bool:
+    result = await db.execute(
+        select(KnowledgeIngestionJob.id).where(
+            KnowledgeIngestionJob.document_id == document_id,
+            KnowledgeIngestionJob.status.in_(("queued", "running")),
+        ).limit(1)
+    )
+    return result.scalar_one_or_none() is not None
+
+
+async def _get_or_create_document(
+    db: AsyncSession, tenant_id, filename: str, file_type: str, file_size: int
+) -> KnowledgeDocument:
+    """
+    Re-uploading a file with the same name (or re-scraping a URL) updates that
+    document in place; ingestion then only re-embeds the chunks that changed.
+    """
+    result = await db.execute(
+        select(KnowledgeDocument)
+        .where(and_(KnowledgeDocument.tenant_id == tenant_id, KnowledgeDocument.filename == filename))
+        .order_by(desc(KnowledgeDocument.created_at))
+        .limit(1)
+    )
+    doc = result.scalar_one_or_none()
+    # Fast path; the unique index on active jobs settles concurrent submissions
+    if doc and await _active_job_exists(db, doc.id):
+        raise HTTPException(status_code=409, detail="This document is already being processed")
+
+    if doc:
+        doc.file_type = file_type
+        doc.file_size = file_size
+        doc.status = "processing"
+    else:
+        doc = KnowledgeDocument(
+            tenant_id=tenant_id,
+            filename=filename,
+            file_type=file_type,
+            file_size=file_size,
+            status="processing",
+        )
+        db.add(doc)
+    # Committed before queueing: the job registers chunks against this row from its own session
+    await db.commit()
+    return doc
+
+
+@router.post("/upload", status_code=202)
 async def upload_document(
     current_tenant: Tenant = Depends(get_current_tenant),
     file: UploadFile = File(...),
     db: AsyncSession = Depends(get_db),
 ):
-    """Upload a document to the knowledge base."""
+    """
+    Upload a document to the knowledge base.
+    Ingestion runs as a background job; progress is streamed over the
+    notifications SSE channel and available at /jobs/{job_id}.
+    """
     allowed_types = {"pdf", "docx", "doc", "txt", "md", "csv", "json"}
     ext = file.filename.rsplit(".", 1)[-1].lower() if "." in file.filename else ""
 
@@ -71,86 +121,63 @@ async def upload_document(
     if len(file_data) > 10 * 1024 * 1024:  # 10MB limit
         raise HTTPException(status_code=400, detail="File too large. Maximum size: 10MB")
 
-    # Create DB record
-    doc = KnowledgeDocument(
-        tenant_id=current_tenant.id,
-        filename=file.filename,
-        file_type=ext,
-        file_size=len(file_data),
-        status="processing",
-    )
-    db.add(doc)
-    await db.flush()
+    doc = await _get_or_create_document(db, current_tenant.id, file.filename, ext, len(file_data))
     doc_id = str(doc.id)
 
     try:
-        # Ingest into Pinecone
-        result = await ingest_document(
-            tenant_id=str(current_tenant.id),
-            file_data=file_data,
-            filename=file.filename,
-            document_id=doc_id,
-        )
+        job_id = await ingestion_jobs.submit_upload(str(current_tenant.id), doc_id, file.filename, file_data)
+    except JobConflictError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    logger.info("document_upload_queued", tenant=str(current_tenant.id), filename=file.filename, job_id=job_id)
 
-        doc.chunk_count = result["chunk_count"]
-        doc.status = "completed"
-        await db.flush()
-
-        logger.info("document_uploaded", tenant=str(current_tenant.id), filename=file.filename, chunks=result["chunk_count"])
+    return {
+        "id": doc_id,
+        "job_id": job_id,
+        "filename": file.filename,
+        "status": "queued",
+    }
 
-        return {
-            "id": doc_id,
-            "filename": file.filename,
-            "chunk_count": result["chunk_count"],
-            "status": "completed",
-        }
 
-    except Exception as e:
-        doc.status = "failed"
-        await db.flush()
-        logger.error("document_upload_error", error=str(e), filename=file.filename)
-        raise HTTPException(status_code=500, detail=f"Failed to process document: {str(e)}")
-@router.post("/scrape")
+@router.post("/scrape", status_code=202)
 async def scrape_website(
     url: str = Query(...),
+    crawl: bool = Query(False, description="Follow the sitemap and same-domain links instead of one page"),
     current_tenant: Tenant = Depends(get_current_tenant),
     db: AsyncSession = Depends(get_db),
 ):
-    """Scrape a website and ingest its content into the knowledge base."""
-    from app.knowledge.scraper import scraper
-    
+    """Scrape a website (or crawl the whole site) into the knowledge base (background job)."""
     # Simple URL validation
     if not url.startswith(("http://", "https://")):
         raise HTTPException(status_code=400, detail="Invalid URL. Must start with http or https")
 
-    # Log the action in DB
-    doc = KnowledgeDocument(
-        tenant_id=current_tenant.id,
-        filename=f"Scraped: {url}",
-        file_type="web",
-        file_size=0,
-        status="processing",
-    )
-    db.add(doc)
-    await db.flush()
-    
+    filename = f"Crawled: {url}" if crawl else f"Scraped: {url}"
+    doc = await _get_or_create_document(db, current_tenant.id, filename, "web", 0)
+    doc_id = str(doc.id)
+
     try:
-        result = await scraper.scrape_and_ingest(str(current_tenant.id), url)
-        
-        if result["status"] == "success":
-            doc.status = "completed"
-            doc.chunk_count = result["chunks"]
-            await db.commit()
-            return result
-        else:
-            doc.status = "failed"
-            await db.commit()
-            raise HTTPException(status_code=500, detail=result["message"])
-            
-    except Exception as e:
-        doc.status = "failed"
-        await db.commit()
-        raise HTTPException(status_code=500, detail=str(e))
+        job_id = await ingestion_jobs.submit_scrape(str(current_tenant.id), doc_id, url, crawl=crawl)
+    except JobConflictError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    logger.info("web_scrape_queued", tenant=str(current_tenant.id), url=url, job_id=job_id, crawl=crawl)
+
+    return {"id": doc_id, "job_id": job_id, "url": url, "crawl": crawl, "status": "queued"}
+
+
+@router.get("/jobs")
+async def list_ingestion_jobs(
+    limit: int = Query(20, ge=1, le=100),
+    current_tenant: Tenant = Depends(get_current_tenant),
+):
+    """Recent ingestion jobs with stage and progress counters."""
+    return {"jobs": await ingestion_jobs.list_jobs(str(current_tenant.id), limit=limit)}
+
+
+@router.get("/jobs/{job_id}")
+async def get_ingestion_job(job_id: UUID, current_tenant: Tenant = Depends(get_current_tenant)):
+    job = await ingestion_jobs.get(str(current_tenant.id), str(job_id))
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
 
 
 # ─── Manual Knowledge ──────────────────────────────────────────────
@@ -199,9 +226,8 @@ async def delete_manual_knowledge(item_id: UUID, current_tenant: Tenant = Depend
     if doc:
         # Delete from Pinecone
         try:
-            from app.knowledge.rag import get_pinecone_index
-            index = get_pinecone_index()
-            index.delete(ids=[f"manual_{item_id}"], namespace=str(current_tenant.id))
+            from app.knowledge.rag import delete_vectors
+            await delete_vectors(str(current_tenant.id), [f"manual_{item_id}"])
         except Exception as e:
             logger.warning("pinecone_delete_failed", error=str(e))
             
@@ -209,6 +235,32 @@ async def delete_manual_knowledge(item_id: UUID, current_tenant: Tenant = Depend
         await db.commit()
     return {"status": "deleted"}
 
+@router.post("/manual/import")
+async def import_manual_knowledge(
+    file: UploadFile = File(...),
+    kind: str = Query("manual", pattern="^(manual|objection)$"),
+    current_tenant: Tenant = Depends(get_current_tenant),
+):
+    """
+    Bulk-import Q&A pairs (columns: question, answer[, media_url]) or
+    objections (columns: objection, rebuttal) from a CSV or XLSX file.
+    Invalid rows are reported by row number and skipped.
+    """
+    from app.knowledge.bulk_import import ImportFormatError, import_manual_knowledge as run_import
+
+    file.file.seek(0, 2)
+    size = file.file.tell()
+    file.file.seek(0)
+    if size > 20 * 1024 * 1024:  # 20MB limit
+        raise HTTPException(status_code=400, detail="File too large. Maximum size: 20MB")
+
+    try:
+        summary = await run_import(str(current_tenant.id), file.file, file.filename or "", kind)
+    except ImportFormatError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return {"status": "completed" if not summary["failed"] else "completed_with_errors", **summary}
+
 # ─── Objection Handling Management ──────────────────────────────────
 
 class ObjectionCreate(BaseModel):
@@ -290,12 +342,15 @@ async def delete_document(
 
     # Remove vectors from Pinecone
     try:
-        from app.knowledge.rag import get_pinecone_index
-        index = get_pinecone_index()
-        # Delete vectors by ID prefix
-        vector_ids = [f"{document_id}_{i}" for i in range(doc.chunk_count)]
-        if vector_ids:
-            index.delete(ids=vector_ids, namespace=str(current_tenant.id))
+        from app.knowledge.rag import delete_vectors
+        from app.knowledge.lexical_index import lexical_index
+        # Registered chunk vectors; positional IDs for documents indexed before the registry
+        registered = await lexical_index.document_chunks(str(current_tenant.id), str(document_id))
+        vector_ids = list(registered.values()) or [f"{document_id}_{i}" for i in range(doc.chunk_count or 0)]
+        await delete_vectors(str(current_tenant.id), vector_ids)
+        if doc.file_type == "web":
+            from app.knowledge.crawler import forget_crawl_state
+            await forget_crawl_state(str(current_tenant.id), str(document_id))
     except Exception as e:
         logger.warning("vector_delete_warning", error=str(e), document_id=str(document_id))
 
@@ -8,11 +8,13 @@ import httpx
 from app.database import get_db
 from app.models import Lead
 from app.channels.telegram import active_bots
+from app.memory.persister import stores_own_messages
 
 logger = structlog.get_logger(__name__)
 router = APIRouter(prefix="/api/webhooks/telegram", tags=["Webhooks"])
 
 @router.post("/bot/{tenant_id}")
+@stores_own_messages
 async def telegram_bot_webhook(
     tenant_id: UUID,
     request: Request, 
@@ -41,96 +43,103 @@ async def telegram_bot_webhook(
 
         logger.info("telegram_bot_message_received", tenant=tenant_id_str, chat_id=chat_id, text=text)
 
-        # 1. Identify or Create Lead & Conversation
-        from app.services.message_storage import storage
-        convo_id = await storage.get_or_create_conversation(
-            tenant_id=tenant_id_str,
-            channel="telegram",
-            contact_id=str(chat_id),
-            contact_name=contact_name
-        )
+        # 0. Speculative RAG retrieval, overlapping the DB/CRM/automation work below
+        from app.agents.claude_agent import agent
+        prefetch = agent.prefetch_knowledge(tenant_id_str, str(chat_id), text)
+        try:
+            # 1. Identify or Create Lead & Conversation
+            from app.services.message_storage import storage
+            convo_id = await storage.get_or_create_conversation(
+                tenant_id=tenant_id_str,
+                channel="telegram",
+                contact_id=str(chat_id),
+                contact_name=contact_name
+            )
         
-        # Store incoming message
-        await storage.store_message(convo_id, "user", text)
+            # Store incoming message
+            await storage.store_message(convo_id, "user", text)
 
-        lead_result = await db.execute(
-            select(Lead).where(Lead.tenant_id == tenant_id, Lead.phone == str(chat_id))
-        )
-        lead = lead_result.scalar_one_or_none()
-        
-        if not lead:
-            lead = Lead(
-                tenant_id=tenant_id,
-                name=contact_name,
-                phone=str(chat_id),
-                source="telegram_bot",
-                status="new"
+            lead_result = await db.execute(
+                select(Lead).where(Lead.tenant_id == tenant_id, Lead.phone == str(chat_id))
             )
-            db.add(lead)
-            await db.commit()
-            await db.refresh(lead)
-
-            # --- amoCRM SYNC ---
-            try:
-                from app.crm.amocrm import get_crm_client
-                crm = await get_crm_client(tenant_id_str, db)
-                if crm:
-                    await crm.auto_create_lead_if_new(
-                        phone=str(chat_id),
-                        name=contact_name,
-                        channel="Telegram", # Ensure 'channel' keyword is used
-                        first_message=text
-                    )
-            except Exception as e:
-                logger.error("amocrm_sync_failed", error=str(e))
-
-        # 2. Setup Reply Function 
-        # (needs the bot token cached in memory)
-        async def _auto_reply(reply_text: str):
-            bot_data = active_bots.get(tenant_id_str)
-            if not bot_data:
-                logger.error("telegram_bot_token_not_in_memory", tenant=tenant_id_str)
-                return
-
-            token = bot_data["access_token"]
-            url = f"https://api.telegram.org/bot{token}/sendMessage"
-            
-            async with httpx.AsyncClient() as client:
-                res = await client.post(url, json={
-                    "chat_id": chat_id,
-                    "text": reply_text
-                })
-                if res.status_code == 200:
-                    # Store outgoing message
-                    await storage.store_message(convo_id, "assistant", reply_text)
-                else:
-                    logger.error("telegram_bot_send_failed", response=res.text)
-
-        # 3. Process with Automation Flow (which routes to AI Agent if needed)
-        from app.services.automation_engine import process_automation_flow
+            lead = lead_result.scalar_one_or_none()
         
-        handled = await process_automation_flow(
-            tenant_id=tenant_id_str,
-            message_text=text,
-            platform="telegram",
-            user_id=str(chat_id),
-            send_message_func=_auto_reply
-        )
+            if not lead:
+                lead = Lead(
+                    tenant_id=tenant_id,
+                    name=contact_name,
+                    phone=str(chat_id),
+                    source="telegram_bot",
+                    status="new"
+                )
+                db.add(lead)
+                await db.commit()
+                await db.refresh(lead)
+
+                # --- amoCRM SYNC ---
+                try:
+                    from app.crm.amocrm import get_crm_client
+                    crm = await get_crm_client(tenant_id_str, db)
+                    if crm:
+                        await crm.auto_create_lead_if_new(
+                            phone=str(chat_id),
+                            name=contact_name,
+                            channel="Telegram", # Ensure 'channel' keyword is used
+                            first_message=text
+                        )
+                except Exception as e:
+                    logger.error("amocrm_sync_failed", error=str(e))
+
+            # 2. Setup Reply Function 
+            # (needs the bot token cached in memory)
+            async def _auto_reply(reply_text: str):
+                bot_data = active_bots.get(tenant_id_str)
+                if not bot_data:
+                    logger.error("telegram_bot_token_not_in_memory", tenant=tenant_id_str)
+                    return
+
+                token = bot_data["access_token"]
+                url = f"https://api.telegram.org/bot{token}/sendMessage"
+            
+                async with httpx.AsyncClient() as client:
+                    res = await client.post(url, json={
+                        "chat_id": chat_id,
+                        "text": reply_text
+                    })
+                    if res.status_code == 200:
+                        # Store outgoing message
+                        await storage.store_message(convo_id, "assistant", reply_text)
+                    else:
+                        logger.error("telegram_bot_send_failed", response=res.text)
+
+            # 3. Process with Automation Flow (which routes to AI Agent if needed)
+            from app.services.automation_engine import process_automation_flow
         
-        # 4. Fallback to Claude Agent directly if automation didn't handle it
-        if not handled:
-            from app.agents.claude_agent import agent
-            response = await agent.generate_response(
-                tenant_id=tenant_id_str, 
-                contact_id=str(chat_id),
-                user_message=text, 
-                message_type="text",
-                business_name="Business", # Will be pulled from DB inside agent
+            handled = await process_automation_flow(
+                tenant_id=tenant_id_str,
+                message_text=text,
+                platform="telegram",
+                user_id=str(chat_id),
+                send_message_func=_auto_reply
             )
-            if response.reply_text and not response.human_handoff:
-                await _auto_reply(response.reply_text)
+        
+            # 4. Fallback to Claude Agent directly if automation didn't handle it
+            if not handled:
+                response = await agent.generate_response(
+                    tenant_id=tenant_id_str, 
+                    contact_id=str(chat_id),
+                    user_message=text, 
+                    message_type="text",
+                    business_name="Business", # Will be pulled from DB inside agent
+                )
+                if response.reply_text and not response.human_handoff:
+                    await _auto_reply(response.reply_text)
 
-        return {"status": "ok"}
+            return {"status": "ok"}
+        finally:
+            # Automation replies, handoffs and errors never take the prefetch
+            if prefetch:
+                agent.discard_prefetch(tenant_id_str, str(chat_id), prefetch)
         
     except Exception as e:
         logger.error("telegram_bot_webhook_error", error=str(e), tenant=tenant_id_str)
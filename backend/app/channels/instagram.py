@@ -16,6 +16,7 @@ from app.config import settings
 from app.agents.claude_agent import agent
 from app.agents.vision import vision
 from app.memory.context import memory
+from app.memory.persister import stores_own_messages
 
 logger = structlog.get_logger(__name__)
 
@@ -203,6 +204,7 @@ async def _process_messaging_event(event: dict) -> None:
         )
 
 
+@stores_own_messages
 async def _handle_text_message(
     tenant_id: str,
     sender_id: str,
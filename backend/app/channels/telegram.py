@@ -300,6 +300,26 @@ async def process_telegram_message(
         media_type=str(message.media) if message.media else "text",
     )
 
+    # 0. Start knowledge retrieval now; it runs while we upsert the lead,
+    # notify and check automations. Any path that doesn't hand it to the
+    # agent (automation reply, non-text, errors) drops it in the finally below.
+    prefetch = agent.prefetch_knowledge(tenant_id, contact_id, message.text) if message.text else None
+    try:
+        await _route_telegram_message(tenant_id, business_name, client, message, contact_id, contact_name)
+    finally:
+        if prefetch:
+            agent.discard_prefetch(tenant_id, contact_id, prefetch)
+
+
+async def _route_telegram_message(
+    tenant_id: str,
+    business_name: str,
+    client: Client,
+    message: Message,
+    contact_id: str,
+    contact_name: str,
+) -> None:
+    """Upsert the lead, notify, then hand the message to automations or a media handler."""
     # 1. Identify or Create Lead
     from app.database import async_session_factory
     from sqlalchemy import select
@@ -499,8 +519,9 @@ async def _handle_document(
             file_data = f.read()
 
     try:
-        from app.knowledge.uploader import extract_text
-        text = extract_text(file_data, filename)
+        from app.knowledge.uploader import extract_text_async
+        # Only the first 3000 chars are used, so stop extracting once we have them
+        text = await extract_text_async(file_data, filename, max_chars=3000)
         if len(text) > 3000:
             text = text[:3000] + "\n\n[Document truncated for processing...]"
     except ValueError:
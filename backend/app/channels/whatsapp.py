@@ -8,6 +8,7 @@ import structlog
 from fastapi import APIRouter, Request, HTTPException, Query
 from app.config import settings
 from app.agents.claude_agent import agent
+from app.memory.persister import stores_own_messages
 
 logger = structlog.get_logger(__name__)
 router = APIRouter(prefix="/api/webhooks/whatsapp", tags=["WhatsApp"])
@@ -43,6 +44,7 @@ async def receive_whatsapp(request: Request):
                 
     return {"status": "ok"}
 
+@stores_own_messages
 async def _handle_whatsapp_message(tenant_id: str, sender_id: str, text: str):
     from app.services.automation_engine import process_automation_flow
     from app.services.message_storage import storage
@@ -31,9 +31,37 @@ class Settings(BaseSettings):
     # --- Database ---
     database_url: str = ""
     database_echo: bool = False
+    db_pool_size: int = 10  # API / webhook pool
+    db_max_overflow: int = 10
+    db_pool_timeout_sec: float = 10.0  # wait for a free connection before failing
+    db_pool_recycle_sec: int = 1800  # replace connections older than this
+    db_background_pool_size: int = 5  # persister, ingestion jobs, reconciliation, campaigns
+    db_background_max_overflow: int = 5
+    db_pgbouncer: bool = False  # PgBouncer in transaction mode: no asyncpg prepared-statement cache
+    db_statement_cache_size: int = 100  # asyncpg prepared statements per connection (ignored with db_pgbouncer)
+    db_slow_checkout_ms: float = 100.0  # log checkouts that waited longer
 
     # --- Redis ---
     redis_url: str = "redis://localhost:6379/0"
+    redis_cluster: bool = False  # redis_url points at a Redis Cluster node
+    redis_max_connections: int = 50  # per client (standalone)
+    redis_pool_timeout_sec: float = 1.0  # wait for a free connection past the cap before erroring
+    redis_socket_timeout_sec: float = 5.0
+    redis_connect_timeout_sec: float = 2.0
+    redis_health_check_interval_sec: int = 30
+
+    # --- Conversation Memory ---
+    memory_codec: str = "orjson"  # 'orjson' | 'msgpack' (needs msgpack installed)
+    memory_context_ttl_sec: int = 7 * 24 * 3600
+    memory_local_max_keys: int = 10000  # contacts + flags kept by the no-Redis fallback
+    memory_l1_enabled: bool = True  # per-process cache of hot contexts (Redis mode)
+    memory_l1_max_contacts: int = 2000
+    memory_l1_ttl_sec: float = 30.0  # upper bound on staleness if an invalidation is lost
+    memory_persist_enabled: bool = True  # write-behind copy of memory into the messages table
+    memory_persist_batch_size: int = 200
+    memory_persist_interval_sec: float = 1.0
+    memory_persist_max_buffer: int = 20000  # oldest messages dropped beyond this while the DB is down
+    memory_legacy_key_fallback: bool = True  # migrate pre-hash-tag keys (background sweep, then off everywhere)
 
     # --- Claude API ---
     anthropic_api_key: str = ""
@@ -44,6 +72,78 @@ class Settings(BaseSettings):
     whisper_model: str = "whisper-1"
     embedding_model: str = "text-embedding-3-small"
 
+    # --- Embedding Cache (content-addressed: L1 process LRU + Redis) ---
+    embedding_cache_enabled: bool = True
+    embedding_cache_local_size: int = 4096
+    embedding_cache_ttl_sec: int = 30 * 24 * 3600
+    embedding_batch_size: int = 256  # inputs per embeddings request
+    embedding_batch_concurrency: int = 4  # batches in flight per ingestion
+
+    # --- Vector Store ---
+    vector_store_backend: str = "pinecone"  # 'pinecone' | 'local' (self-hosted, on-disk)
+    local_vector_store_dir: str = "./data/vectors"
+    local_vector_quantize: bool = False  # int8 rows (4x smaller) instead of float32
+    local_vector_hnsw_threshold: int = 20000  # live vectors before switching to the graph index
+    local_vector_hnsw_m: int = 16
+    local_vector_hnsw_ef: int = 64
+    vector_store_threads: int = 8  # thread pool for the sync Pinecone client
+    vector_upsert_concurrency: int = 4  # parallel upsert batches per call
+
+    # --- Document Extraction (process pool for PDF/DOCX parsing) ---
+    extraction_workers: int = 2
+    extraction_job_timeout_sec: float = 30.0  # per batch of pages, from when a worker starts it
+    extraction_memory_limit_mb: int = 1024  # address-space cap per worker
+    extraction_pages_per_job: int = 8
+    extraction_max_tasks_per_child: int = 50  # recycle workers to release leaked memory
+
+    # --- Chunking (token-sized, sentence-aligned) ---
+    chunk_max_tokens: int = 256
+    chunk_overlap_tokens: int = 48
+
+    # --- Knowledge Ingestion Jobs (background upload/scrape processing) ---
+    knowledge_jobs_per_tenant: int = 2  # concurrent jobs per tenant, across all processes
+    knowledge_jobs_max_concurrent: int = 8  # concurrent jobs per process
+    knowledge_job_claim_retry_sec: float = 2.0  # wait before retrying a job whose tenant is at its cap
+    knowledge_job_staging_dir: str = "./data/ingestion"  # must be shared storage when several nodes run jobs
+    knowledge_job_stale_sec: int = 300  # a running job silent this long is resumed elsewhere
+    knowledge_job_progress_interval_sec: float = 0.5
+
+    # --- Bulk Q&A / Objection Import ---
+    kb_import_batch_size: int = 500  # rows per insert / embed / upsert round
+    kb_import_max_rows: int = 20000
+
+    # --- Knowledge Vector Reconciliation (registry vs. vector namespace) ---
+    kb_reconcile_batch_size: int = 500  # vector ids checked / deleted per batch
+    kb_reconcile_grace_sec: int = 3600  # registry rows younger than this may still be upserting
+    kb_reconcile_hour: int = 4  # daily, in daily_report_timezone
+
+    # --- Site Crawler ---
+    crawl_max_pages: int = 200
+    crawl_max_depth: int = 3
+    crawl_concurrency: int = 8  # concurrent fetches per crawl
+    crawl_per_host_concurrency: int = 2
+    crawl_host_delay_sec: float = 0.5  # min spacing between requests to one host (robots crawl-delay wins if larger)
+    crawl_batch_pages: int = 10  # pages per embed/upsert batch
+    crawl_timeout_sec: float = 20.0
+
+    # --- Hybrid Retrieval (BM25 + vectors, reciprocal rank fusion) ---
+    hybrid_search_enabled: bool = True
+    hybrid_rrf_k: int = 60
+    hybrid_candidates: int = 20  # candidates taken from each ranking before fusion
+    hybrid_lexical_min_coverage: float = 0.6  # share of query words a BM25-only hit must contain
+
+    # --- Retrieval Reranking (over-fetch, rescore, MMR, prompt budget) ---
+    rerank_enabled: bool = True
+    rerank_overfetch: int = 4  # candidates fetched = top_k × this
+    rerank_lexical_weight: float = 0.3
+    rerank_recency_weight: float = 0.05
+    rerank_recency_half_life_days: float = 90.0
+    rerank_manual_boost: float = 0.1  # manual Q&A / objection entries
+    rerank_mmr_lambda: float = 0.7  # 1.0 = pure relevance, lower = more diversity
+    rerank_min_relative_score: float = 0.5  # drop chunks scoring below this share of the best
+    rag_context_token_budget: int = 1200
+    lexical_index_max_tenants: int = 500  # tenant indexes kept in memory per process
+
     # --- Alternative LLM Providers (optional) ---
     # Choose provider for text/embeddings: 'openai'|'openrouter'|'huggingface'|'groq'|'google'
     llm_provider: str = "openai"
@@ -53,6 +153,29 @@ class Settings(BaseSettings):
     google_api_key: str = ""
     orbit_api_key: str = ""
 
+    # --- LLM Routing Classifier (optional) ---
+    # Path to a model trained with `python -m app.services.complexity_classifier train`
+    routing_classifier_path: str = ""
+    routing_classifier_min_confidence: float = 0.55
+
+    # --- LLM Concurrency (AIMD per provider) ---
+    llm_aimd_enabled: bool = True
+    llm_aimd_initial_limit: int = 8
+    llm_aimd_min_limit: int = 1
+    llm_aimd_max_limit: int = 64
+    llm_aimd_provider_max: dict[str, int] = {}  # e.g. {"groq": 30}
+    llm_aimd_decrease_factor: float = 0.5
+    llm_aimd_latency_tolerance: float = 2.0  # recent/baseline latency ratio that counts as congestion
+    llm_queue_timeout_sec: float = 10.0  # max wait for a slot before falling back
+
+    # --- LLM Fair Scheduler (per-tenant queues, priority classes) ---
+    llm_scheduler_enabled: bool = True
+    llm_scheduler_max_concurrency: int = 48  # concurrent router calls per process
+    llm_tenant_default_share: float = 0.5  # max fraction of slots one tenant may hold
+    llm_tenant_shares: dict[str, float] = {}  # tenant_id -> share override
+    llm_tenant_weights: dict[str, float] = {}  # tenant_id -> fair-queue weight (default 1.0)
+    llm_scheduler_timeouts: dict[str, float] = {"interactive": 30.0, "automation": 120.0, "analysis": 600.0}
+    llm_scheduler_metrics_interval_sec: float = 5.0
 
     # --- Pinecone ---
     pinecone_api_key: str = ""
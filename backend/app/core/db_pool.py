@@ -0,0 +1,95 @@
+"""
+InstaTG Agent — Database Connection Pool
+
+Queue pool that measures checkout latency: the time a caller waits between
+asking for a connection and getting one (queueing behind other checkouts,
+opening an overflow connection, the pre-ping). Rising checkout latency is
+the first sign of pool exhaustion, well before `pool_timeout` errors.
+"""
+
+import time
+from collections import deque
+
+import structlog
+from sqlalchemy import exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from app.config import settings
+
+logger = structlog.get_logger(__name__)
+
+
+class CheckoutMetrics:
+    """Recent checkout latencies and timeout counts for one pool."""
+
+    def __init__(self, window: int = 1000):
+        self._samples: deque[float] = deque(maxlen=window)
+        self._max_ms = 0.0
+        self.checkouts = 0
+        self.slow = 0
+        self.timeouts = 0
+
+    def record(self, wait_ms: float) -> None:
+        self._samples.append(wait_ms)
+        self._max_ms = max(self._max_ms, wait_ms)
+        self.checkouts += 1
+
+    def stats(self) -> dict:
+        result = {"checkouts": self.checkouts, "slow": self.slow, "timeouts": self.timeouts}
+        if not self._samples:
+            return result
+        ordered = sorted(self._samples)
+
+        def pct(p: float) -> float:
+            return round(ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))], 2)
+
+        return {
+            **result,
+            "mean_ms": round(sum(ordered) / len(ordered), 2),
+            "p50_ms": pct(50),
+            "p99_ms": pct(99),
+            "max_ms": round(self._max_ms, 2),
+        }
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """AsyncAdaptedQueuePool that records checkout latency in `metrics`."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics = CheckoutMetrics()
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            self.metrics.timeouts += 1
+            logger.error("db_pool_checkout_timeout", pool=self._name(), **self.status_dict())
+            raise
+        wait_ms = (time.perf_counter() - started) * 1000
+        self.metrics.record(wait_ms)
+        if wait_ms >= settings.db_slow_checkout_ms:
+            self.metrics.slow += 1
+            logger.warning("db_pool_slow_checkout", pool=self._name(), wait_ms=round(wait_ms, 1), **self.status_dict())
+        return connection
+
+    def recreate(self):
+        # engine.dispose() swaps in a fresh pool; keep the history
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
+
+    def _name(self) -> str:
+        return getattr(self, "logging_name", None) or "default"
+
+    def status_dict(self) -> dict:
+        return {
+            "size": self.size(),
+            "checked_out": self.checkedout(),
+            "overflow": max(0, self.overflow()),
+            "idle": self.checkedin(),
+        }
+
+    def stats(self) -> dict:
+        return {**self.status_dict(), "max_overflow": self._max_overflow, **self.metrics.stats()}
@@ -0,0 +1,74 @@
+"""
+InstaTG Agent — Event Loop Lag Monitor
+
+Measures how late the event loop wakes a periodic timer. Any blocking call
+(sync SDK, CPU-heavy parsing) on the loop shows up here as lag, since it
+delays every other tenant's webhooks by the same amount.
+"""
+
+import asyncio
+import time
+from collections import deque
+from typing import Optional
+
+import structlog
+
+logger = structlog.get_logger(__name__)
+
+
+class LoopLagMonitor:
+    """Samples event-loop scheduling lag and keeps recent percentiles."""
+
+    def __init__(self, interval: float = 0.1, window: int = 600, warn_threshold_ms: float = 100.0):
+        self.interval = interval
+        self.warn_threshold_ms = warn_threshold_ms
+        self._samples: deque[float] = deque(maxlen=window)
+        self._max_ms = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def reset(self) -> None:
+        self._samples.clear()
+        self._max_ms = 0.0
+
+    async def _run(self) -> None:
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            lag_ms = max(0.0, (time.perf_counter() - start - self.interval) * 1000)
+            self._samples.append(lag_ms)
+            self._max_ms = max(self._max_ms, lag_ms)
+            if lag_ms >= self.warn_threshold_ms:
+                logger.warning("event_loop_lag", lag_ms=round(lag_ms, 1))
+
+    def stats(self) -> dict:
+        if not self._samples:
+            return {"samples": 0}
+        ordered = sorted(self._samples)
+
+        def pct(p: float) -> float:
+            return round(ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))], 2)
+
+        return {
+            "samples": len(ordered),
+            "mean_ms": round(sum(ordered) / len(ordered), 2),
+            "p50_ms": pct(50),
+            "p99_ms": pct(99),
+            "max_ms": round(self._max_ms, 2),
+        }
+
+
+# Singleton instance
+loop_monitor = LoopLagMonitor()
@@ -0,0 +1,150 @@
+"""
+InstaTG Agent — Redis Client Factory
+
+One place that builds Redis clients for conversation memory, the
+embedding cache, the LLM rate limiters and queues, so pool size, timeouts
+and standalone-vs-cluster mode are configured once.
+
+- Standalone: a connection pool capped at `redis_max_connections`. Past
+  the cap a command waits up to `redis_pool_timeout_sec` for a connection
+  to be released instead of failing: callers treat a Redis error as an
+  outage (conversation memory falls back to the process-local store), so
+  a burst must not look like one. redis-py's BlockingConnectionPool is
+  not used: in 5.0 a failed connect inside it re-enters the lock it holds
+  and stalls for the whole timeout, so an outage would slow every request.
+- Cluster (`redis_cluster=true`): a RedisCluster client. Its pools cannot
+  wait for a free connection, so they keep redis-py's (unbounded) default.
+  Keys that a script or transaction touches together must share a hash tag
+  (see `hash_tag`) so they land in one slot.
+
+Clients are process singletons per response mode (str / bytes) and are
+closed together by `close_redis()`.
+"""
+
+import asyncio
+from typing import Optional
+
+import redis.asyncio as aioredis
+import structlog
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+from app.config import settings
+
+logger = structlog.get_logger(__name__)
+
+_clients: dict[bool, object] = {}
+
+
+def hash_tag(*parts) -> str:
+    """Cluster hash tag: keys containing the same `{...}` section share a slot."""
+    return "{" + ":".join(str(part) for part in parts) + "}"
+
+
+def is_cluster(client) -> bool:
+    from redis.asyncio.cluster import RedisCluster
+    return isinstance(client, RedisCluster)
+
+
+class WaitingConnectionPool(aioredis.ConnectionPool):
+    """Capped pool where a caller past the cap waits for a released connection."""
+
+    def __init__(self, *args, timeout: float = 1.0, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.timeout = timeout
+        self._released = asyncio.Condition()
+        self.waits = 0
+        self.wait_timeouts = 0
+
+    def _has_capacity(self) -> bool:
+        return bool(self._available_connections) or len(self._in_use_connections) < self.max_connections
+
+    async def get_connection(self, command_name, *keys, **options):
+        if not self._has_capacity():
+            self.waits += 1
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + self.timeout
+            # Re-checked right before taking a connection: another waiter may have been faster
+            while not self._has_capacity():
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    self.wait_timeouts += 1
+                    raise RedisConnectionError("No connection available.")
+                async with self._released:
+                    try:
+                        await asyncio.wait_for(self._released.wait(), remaining)
+                    except asyncio.TimeoutError:
+                        pass
+        return await super().get_connection(command_name, *keys, **options)
+
+    async def release(self, connection) -> None:
+        await super().release(connection)
+        async with self._released:
+            self._released.notify()
+
+
+def _connection_kwargs() -> dict:
+    return {
+        "socket_timeout": settings.redis_socket_timeout_sec,
+        "socket_connect_timeout": settings.redis_connect_timeout_sec,
+        "health_check_interval": settings.redis_health_check_interval_sec,
+        "socket_keepalive": True,
+    }
+
+
+def create_redis(decode_responses: bool = True, url: Optional[str] = None):
+    """A new client with the configured pool and timeouts (caller closes it)."""
+    url = url or settings.redis_url
+    if settings.redis_cluster:
+        from redis.asyncio.cluster import RedisCluster
+        return RedisCluster.from_url(url, decode_responses=decode_responses, **_connection_kwargs())
+    pool = WaitingConnectionPool.from_url(
+        url,
+        decode_responses=decode_responses,
+        max_connections=settings.redis_max_connections,
+        timeout=settings.redis_pool_timeout_sec,
+        **_connection_kwargs(),
+    )
+    return aioredis.Redis(connection_pool=pool)
+
+
+def get_redis(binary: bool = False):
+    """Shared client: str responses by default, bytes with binary=True."""
+    client = _clients.get(binary)
+    if client is None:
+        client = _clients[binary] = create_redis(decode_responses=not binary)
+    return client
+
+
+def create_pubsub_client(url: Optional[str] = None):
+    """
+    Client for SUBSCRIBE. The async cluster client has no pub/sub; PUBLISH
+    is broadcast to every node, so one node's connection sees all messages.
+    """
+    return aioredis.from_url(url or settings.redis_url, decode_responses=True, **_connection_kwargs())
+
+
+async def close_redis() -> None:
+    for binary, client in list(_clients.items()):
+        try:
+            await client.close()
+        except Exception as e:
+            logger.warning("redis_close_failed", binary=binary, error=str(e))
+    _clients.clear()
+
+
+def pool_stats() -> dict:
+    """Connections in use / idle per shared client (standalone mode)."""
+    stats = {}
+    for binary, client in _clients.items():
+        pool = getattr(client, "connection_pool", None)
+        if pool is None:
+            stats["bytes" if binary else "str"] = {"cluster": True}
+            continue
+        stats["bytes" if binary else "str"] = {
+            "in_use": len(getattr(pool, "_in_use_connections", ())),
+            "idle": len(getattr(pool, "_available_connections", ())),
+            "max": pool.max_connections,
+            "waits": getattr(pool, "waits", 0),
+            "wait_timeouts": getattr(pool, "wait_timeouts", 0),
+        }
+    return stats
@@ -1,23 +1,72 @@
 """
 InstaTG Agent — Database Engine & Session
 
-Async SQLAlchemy engine and session factory for PostgreSQL on Railway.
+Async SQLAlchemy engines and session factories for PostgreSQL on Railway.
+
+Two pools share the database so background work cannot starve replies:
+- `engine` / `AsyncSessionLocal`: API requests and webhook handlers
+  (`db_pool_size` + `db_max_overflow` connections)
+- `background_engine` / `BackgroundSessionLocal`: the memory persister,
+  knowledge ingestion jobs, vector reconciliation, campaigns and classifier
+  training (`db_background_pool_size` + `db_background_max_overflow`)
+
+With `db_pgbouncer=true` (PgBouncer in transaction mode) asyncpg's
+prepared-statement caches are disabled and every statement gets a unique
+name, since consecutive transactions may run on different server
+connections. Both pools record checkout latency (see `pool_stats()`).
 """
 
 import os
+import uuid
 
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import declarative_base
 
 from app.config import settings
+from app.core.db_pool import TimedQueuePool
 
 DATABASE_URL = settings.database_url
 
+
+def _prepared_statement_name() -> str:
+    return f"__asyncpg_{uuid.uuid4()}__"
+
+
+def _engine_options(name: str, pool_size: int, max_overflow: int) -> dict:
+    url = make_url(DATABASE_URL)
+    options = {"echo": False, "future": True, "pool_pre_ping": True}
+    if url.get_backend_name() == "sqlite":
+        return options  # local/test databases keep SQLAlchemy's default pool
+
+    options.update(
+        poolclass=TimedQueuePool,
+        pool_logging_name=name,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=settings.db_pool_timeout_sec,
+        pool_recycle=settings.db_pool_recycle_sec,
+    )
+    if url.get_driver_name() == "asyncpg":
+        if settings.db_pgbouncer:
+            options["connect_args"] = {
+                "statement_cache_size": 0,
+                "prepared_statement_cache_size": 0,
+                "prepared_statement_name_func": _prepared_statement_name,
+            }
+        else:
+            options["connect_args"] = {"prepared_statement_cache_size": settings.db_statement_cache_size}
+    return options
+
+
 engine = create_async_engine(
     DATABASE_URL,
-    echo=False,
-    future=True,
-    pool_pre_ping=True,
+    **_engine_options("api", settings.db_pool_size, settings.db_max_overflow),
+)
+
+background_engine = create_async_engine(
+    DATABASE_URL,
+    **_engine_options("background", settings.db_background_pool_size, settings.db_background_max_overflow),
 )
 
 AsyncSessionLocal = async_sessionmaker(
@@ -26,9 +75,18 @@ AsyncSessionLocal = async_sessionmaker(
     expire_on_commit=False,
 )
 
+BackgroundSessionLocal = async_sessionmaker(
+    background_engine,
+    class_=AsyncSession,
+    expire_on_commit=False,
+)
+
 # Backwards-compatible alias used in existing imports.
 async_session_factory = AsyncSessionLocal
 
+# Sessions for background workers (separate pool from API requests).
+background_session_factory = BackgroundSessionLocal
+
 Base = declarative_base()
 
 
@@ -112,6 +170,21 @@ async def init_db() -> None:
 
             # campaigns
             ("campaigns", "connected", "INTEGER DEFAULT 0"),
+
+            # ai_logs (routing classifier training signal)
+            ("ai_logs", "user_message", "TEXT"),
+            ("ai_logs", "complexity", "VARCHAR(20)"),
+            ("ai_logs", "intent", "VARCHAR(50)"),
+
+            # knowledge_base_chunks (lexical index source, diff re-indexing)
+            ("knowledge_base_chunks", "source", "VARCHAR(500)"),
+            ("knowledge_base_chunks", "chunk_index", "INTEGER DEFAULT 0"),
+            ("knowledge_base_chunks", "content_hash", "VARCHAR(64)"),
+
+            # leads (channel contact lookups; indexed by migration 5c1d2e3f4a5b)
+            ("leads", "name", "VARCHAR(255)"),
+            ("leads", "phone", "VARCHAR(100)"),
+            ("leads", "source", "VARCHAR(100)"),
         ]
 
         # SQLite does not support ALTER COLUMN well, so we skip the phone_number DROP NOT NULL for SQLite
@@ -124,7 +197,26 @@ async def init_db() -> None:
         for table, col, type_def in migrations:
             await add_column_if_missing(table, col, type_def)
 
+        # create_all does not add indexes to tables that already exist
+        try:
+            await conn.execute(text(
+                "CREATE UNIQUE INDEX IF NOT EXISTS uq_knowledge_ingestion_jobs_active_document "
+                "ON knowledge_ingestion_jobs (document_id) WHERE status IN ('queued', 'running')"
+            ))
+        except Exception as e:
+            print(f"Migration error for uq_knowledge_ingestion_jobs_active_document: {e}")
+
 
 async def close_db() -> None:
-    """Dispose engine on shutdown."""
+    """Dispose engines on shutdown."""
     await engine.dispose()
+    await background_engine.dispose()
+
+
+def pool_stats() -> dict:
+    """Connections and checkout latency per pool."""
+    stats = {}
+    for name, eng in (("api", engine), ("background", background_engine)):
+        pool = eng.pool
+        stats[name] = pool.stats() if isinstance(pool, TimedQueuePool) else {"pool": type(pool).__name__}
+    return stats
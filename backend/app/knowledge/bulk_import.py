@@ -0,0 +1,235 @@
+"""
+InstaTG Agent — Bulk Q&A / Objection Import
+
+Loads manual Q&A pairs or sales objections from a CSV or XLSX spreadsheet.
+
+Rows are streamed (csv module / openpyxl read-only mode) in batches; each
+batch is bulk-inserted into `manual_knowledges`, embedded with one batched
+call and upserted in parallel vector batches. Bad rows (missing fields,
+oversized text) are reported with their spreadsheet row number, rows
+repeated in the file or already in the tenant's knowledge are skipped, and
+a batch that fails to insert or to index is rolled back and its rows
+reported — none of these abort the rest of the import. Files longer
+than kb_import_max_rows are imported up to the limit and flagged
+'truncated'.
+"""
+
+import asyncio
+import codecs
+import csv
+import uuid
+from itertools import islice
+from typing import BinaryIO, Iterator, Optional
+
+import structlog
+from sqlalchemy import delete, insert, select
+
+from app.config import settings
+
+logger = structlog.get_logger(__name__)
+
+# Header aliases (lowercased) -> field, per import kind (English / Uzbek / Russian)
+COLUMNS = {
+    "manual": {
+        "question": {"question", "q", "savol", "вопрос"},
+        "answer": {"answer", "a", "javob", "ответ"},
+        "media_url": {"media_url", "media", "image", "rasm", "медиа"},
+    },
+    "objection": {
+        "question": {"objection", "term", "e'tiroz", "возражение"},
+        "answer": {"rebuttal", "response", "handling", "javob", "ответ"},
+    },
+}
+SOURCES = {"manual": "Training Hub (Manual Entry)", "objection": "Sales Objection Plate"}
+MAX_FIELD_CHARS = 4000
+MAX_ERRORS_REPORTED = 200
+
+
+class ImportFormatError(ValueError):
+    """The file can't be read as a spreadsheet of the expected shape."""
+
+
+def _header_map(header: list, kind: str) -> dict[str, int]:
+    names = [str(h or "").strip().lower() for h in header]
+    mapping = {}
+    for field, aliases in COLUMNS[kind].items():
+        for position, name in enumerate(names):
+            if name in aliases:
+                mapping[field] = position
+                break
+    missing = {"question", "answer"} - set(mapping)
+    if missing:
+        raise ImportFormatError(f"Missing column(s): {', '.join(sorted(missing))}")
+    return mapping
+
+
+def _csv_rows(stream: BinaryIO) -> Iterator[list]:
+    sample = stream.read(4096)
+    stream.seek(0)
+    encoding = "utf-8-sig"
+    try:
+        sample.decode("utf-8")
+    except UnicodeDecodeError as e:
+        # A multi-byte character cut at the sample boundary is still UTF-8
+        if e.start < len(sample) - 3:
+            encoding = "cp1251"
+    text = codecs.getreader(encoding)(stream, errors="replace")
+    first = sample.decode(encoding, errors="replace")
+    try:
+        dialect = csv.Sniffer().sniff(first.split("\n", 1)[0], delimiters=",;\t")
+    except csv.Error:
+        dialect = csv.excel
+    yield from csv.reader(text, dialect)
+
+
+def _xlsx_rows(stream: BinaryIO) -> Iterator[list]:
+    from openpyxl import load_workbook
+
+    try:
+        workbook = load_workbook(stream, read_only=True, data_only=True)
+    except Exception as e:
+        raise ImportFormatError(f"Not a valid XLSX file: {e}")
+    try:
+        for row in workbook.worksheets[0].iter_rows(values_only=True):
+            yield list(row)
+    finally:
+        workbook.close()
+
+
+def iter_records(stream: BinaryIO, filename: str, kind: str) -> Iterator[tuple[int, Optional[dict], Optional[str]]]:
+    """Yield (row number, record or None, error or None) for each data row."""
+    ext = filename.lower().rsplit(".", 1)[-1] if "." in filename else ""
+    if ext == "csv":
+        rows = _csv_rows(stream)
+    elif ext in ("xlsx", "xlsm"):
+        rows = _xlsx_rows(stream)
+    else:
+        raise ImportFormatError(f"Unsupported file type: .{ext}. Allowed: csv, xlsx")
+
+    header = next(rows, None)
+    if header is None:
+        raise ImportFormatError("File is empty")
+    mapping = _header_map(header, kind)
+
+    for number, row in enumerate(rows, start=2):
+        values = {field: row[pos] if pos < len(row) else None for field, pos in mapping.items()}
+        values = {field: str(v).strip() if v is not None else "" for field, v in values.items()}
+        if not any(values.values()):
+            continue  # blank line
+        if not values["question"] or not values["answer"]:
+            yield number, None, "question and answer are required"
+        elif len(values["question"]) > MAX_FIELD_CHARS or len(values["answer"]) > MAX_FIELD_CHARS:
+            yield number, None, f"text longer than {MAX_FIELD_CHARS} characters"
+        else:
+            yield number, values, None
+
+
+def _pair_key(row: dict) -> tuple[str, str]:
+    return row["question"].strip().lower(), row["answer"].strip().lower()
+
+
+async def _existing_pairs(tenant_uuid: uuid.UUID) -> set[tuple[str, str]]:
+    """(question, answer) keys of the tenant's active manual knowledge, as stored."""
+    from app.database import async_session_factory
+    from app.models import ManualKnowledge
+
+    async with async_session_factory() as db:
+        result = await db.execute(
+            select(ManualKnowledge.question, ManualKnowledge.answer).where(
+                ManualKnowledge.tenant_id == tenant_uuid, ManualKnowledge.is_active == True
+            )
+        )
+        return {_pair_key({"question": q or "", "answer": a or ""}) for q, a in result.all()}
+
+
+def _entry(kind: str, record: dict) -> tuple[dict, str]:
+    """ManualKnowledge column values and the indexed text, as the single-entry routes build them."""
+    if kind == "objection":
+        row = {"question": f"OBJECTION:{record['question']}", "answer": record["answer"], "media_url": None}
+        text = f"OBJECTION: {record['question']}\nHANDLING: {record['answer']}"
+    else:
+        row = {"question": record["question"], "answer": record["answer"], "media_url": record.get("media_url") or None}
+        text = f"Q: {record['question']}\nA: {record['answer']}"
+    return row, text
+
+
+async def import_manual_knowledge(tenant_id: str, stream: BinaryIO, filename: str, kind: str = "manual") -> dict:
+    """
+    Import a spreadsheet of Q&A pairs (kind='manual') or objections
+    (kind='objection'). Returns counts and per-row errors.
+    """
+    from app.database import async_session_factory
+    from app.models import ManualKnowledge
+    from app.knowledge.uploader import ingest_manual_entries
+
+    tenant_uuid = uuid.UUID(str(tenant_id))
+    records = iter_records(stream, filename, kind)
+    batch_size = settings.kb_import_batch_size
+    summary = {"imported": 0, "failed": 0, "skipped": 0, "truncated": False, "errors": []}
+    # Re-importing the same sheet must not duplicate entries (or their vectors)
+    seen = await _existing_pairs(tenant_uuid)
+
+    def report(number: int, error: str) -> None:
+        summary["failed"] += 1
+        if len(summary["errors"]) < MAX_ERRORS_REPORTED:
+            summary["errors"].append({"row": number, "error": error})
+
+    rows_read = 0
+    while not summary["truncated"]:
+        # Parsing (openpyxl / csv) is blocking; pull each batch off the event loop
+        chunk = await asyncio.to_thread(lambda: list(islice(records, batch_size)))
+        if not chunk:
+            break
+        if rows_read + len(chunk) > settings.kb_import_max_rows:
+            chunk = chunk[:settings.kb_import_max_rows - rows_read]
+            summary["truncated"] = True
+        rows_read += len(chunk)
+
+        batch: list[tuple[int, dict, str]] = []
+        for number, record, error in chunk:
+            if error:
+                report(number, error)
+                continue
+            row, text = _entry(kind, record)
+            key = _pair_key(row)
+            if key in seen:
+                summary["skipped"] += 1
+                continue
+            seen.add(key)
+            batch.append((number, {"id": uuid.uuid4(), "tenant_id": tenant_uuid, "is_active": True, **row}, text))
+        if not batch:
+            continue
+
+        ids = [row["id"] for _, row, _ in batch]
+        try:
+            async with async_session_factory() as db:
+                await db.execute(insert(ManualKnowledge), [row for _, row, _ in batch])
+                await db.commit()
+        except Exception as e:
+            logger.warning("manual_knowledge_import_batch_failed", tenant=str(tenant_id), error=str(e))
+            for number, _, _ in batch:
+                report(number, f"saving failed: {e}")
+            continue
+        try:
+            await ingest_manual_entries(
+                str(tenant_id),
+                [{"id": str(row["id"]), "text": text, "source": SOURCES[kind]} for _, row, text in batch],
+            )
+        except Exception as e:
+            async with async_session_factory() as db:
+                await db.execute(delete(ManualKnowledge).where(ManualKnowledge.id.in_(ids)))
+                await db.commit()
+            for number, _, _ in batch:
+                report(number, f"indexing failed: {e}")
+            continue
+        summary["imported"] += len(batch)
+
+    logger.info(
+        "manual_knowledge_imported",
+        tenant=str(tenant_id),
+        kind=kind,
+        imported=summary["imported"],
+        failed=summary["failed"],
+        skipped=summary["skipped"],
+    )
+    return summary
@@ -0,0 +1,178 @@
+"""
+InstaTG Agent — Streaming Text Chunker
+
+Splits document text into embedding chunks by sentence and paragraph,
+sized in tokens rather than characters so every chunk costs roughly the
+same to embed and fills the same share of a prompt.
+
+- Segmentation handles Latin (English, Uzbek) and Cyrillic (Russian,
+  Uzbek) sentence starts; line breaks and blank lines are boundaries too,
+  so price lists and FAQs keep one item per line.
+- Chunks close at a paragraph break once they are reasonably full, or
+  when the next sentence would overflow the target; a tail of whole
+  sentences is carried over as overlap.
+- Everything is a generator: chunks are yielded as soon as they are
+  complete, so extraction, chunking and embedding can run as a pipeline
+  and a large document never exists as a chunk list in memory.
+
+Token counts come from tiktoken (cl100k_base, the embedding model's
+encoding) when it is installed, otherwise from a per-script character estimate.
+"""
+
+import math
+import re
+from typing import Iterable, Iterator, Union
+
+from app.config import settings
+
+try:
+    import tiktoken
+    has_tiktoken = True
+except ImportError:
+    tiktoken = None
+    has_tiktoken = False
+
+# Boundary kinds recorded after each sentence; they decide the join separator
+SENTENCE, LINE, PARAGRAPH = 0, 1, 2
+_SEPARATORS = {SENTENCE: " ", LINE: "\n", PARAGRAPH: "\n\n"}
+
+# Sentence end (group 1) followed by a capitalised / numeric start, or a line break
+_BOUNDARY_RE = re.compile(
+    r"([.!?…]+[\"'»”)\]]*)[ \t]+(?=[\"'«“(\[]?[A-ZА-ЯЁЎҚҒҲ0-9])"
+    r"|\n(?:[ \t]*\n)*"
+)
+
+_encoding = None
+
+
+def count_tokens(text: str) -> int:
+    global _encoding
+    if has_tiktoken:
+        if _encoding is None:
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        return len(_encoding.encode(text, disallowed_special=()))
+    # ~4 chars per token for ASCII, ~2.5 for Cyrillic (2 bytes each in UTF-8)
+    non_ascii = len(text.encode("utf-8")) - len(text)
+    return max(1, math.ceil((len(text) - non_ascii) / 4 + non_ascii / 2.5))
+
+
+def iter_sentences(text: str) -> Iterator[tuple[str, int]]:
+    """Yield (sentence, boundary kind after it)."""
+    start = 0
+    for match in _BOUNDARY_RE.finditer(text):
+        if match.group(1):
+            end, kind = match.end(1), SENTENCE
+        else:
+            end, kind = match.start(), PARAGRAPH if match.group().count("\n") > 1 else LINE
+        sentence = text[start:end].strip()
+        if sentence:
+            yield sentence, kind
+        start = match.end()
+    tail = text[start:].strip()
+    if tail:
+        yield tail, PARAGRAPH
+
+
+def _split_long(sentence: str, tokens: int, max_tokens: int) -> Iterator[str]:
+    """Word windows of at most max_tokens for a single sentence longer than that."""
+    window: list[str] = []
+    total = 0
+    for word in sentence.split():
+        n = count_tokens(" " + word)  # with its separator, so the window sum is an upper bound
+        if n > max_tokens:
+            # No spaces to split on (base64, URLs, glued PDF text): slice by characters
+            if window:
+                yield " ".join(window)
+                window, total = [], 0
+            yield from _slice_word(word, n, max_tokens)
+            continue
+        if window and total + n > max_tokens:
+            yield " ".join(window)
+            window, total = [], 0
+        window.append(word)
+        total += n
+    if window:
+        yield " ".join(window)
+
+
+def _slice_word(word: str, tokens: int, max_tokens: int) -> Iterator[str]:
+    size = max(1, len(word) * max_tokens // tokens)
+    start = 0
+    while start < len(word):
+        piece = word[start:start + size]
+        while len(piece) > 1 and count_tokens(piece) > max_tokens:
+            piece = piece[:len(piece) * 3 // 4]
+        yield piece
+        start += len(piece)
+
+
+def _join(window: list[tuple[str, int, int]]) -> str:
+    parts = []
+    for i, (sentence, _, kind) in enumerate(window):
+        parts.append(sentence)
+        if i < len(window) - 1:
+            parts.append(_SEPARATORS[kind])
+    return "".join(parts)
+
+
+def _overlap_tail(window: list[tuple[str, int, int]], overlap_tokens: int) -> list[tuple[str, int, int]]:
+    tail, total = [], 0
+    for item in reversed(window):
+        if total + item[1] > overlap_tokens:
+            break
+        tail.append(item)
+        total += item[1]
+    tail.reverse()
+    return tail
+
+
+def iter_chunks(
+    source: Union[str, Iterable[str]],
+    max_tokens: int = None,
+    overlap_tokens: int = None,
+) -> Iterator[str]:
+    """
+    Yield chunks of at most ~max_tokens from a text or an iterable of texts
+    (e.g. PDF pages as they are extracted; each text ends a paragraph).
+    """
+    max_tokens = max_tokens or settings.chunk_max_tokens
+    overlap_tokens = settings.chunk_overlap_tokens if overlap_tokens is None else overlap_tokens
+    flush_at_paragraph = int(max_tokens * 0.75)
+    texts = [source] if isinstance(source, str) else source
+
+    window: list[tuple[str, int, int]] = []  # (sentence, tokens, boundary after)
+    tokens = 0
+    fresh = 0  # sentences added since the last flush (excludes overlap)
+
+    for text in texts:
+        for sentence, kind in iter_sentences(text):
+            n = count_tokens(sentence)
+
+            if n > max_tokens:
+                if fresh:
+                    yield _join(window)
+                yield from _split_long(sentence, n, max_tokens)
+                window, tokens, fresh = [], 0, 0
+                continue
+
+            if tokens + n > max_tokens:
+                if fresh:
+                    yield _join(window)
+                    window = _overlap_tail(window, overlap_tokens)
+                    tokens = sum(item[1] for item in window)
+                if not fresh or tokens + n > max_tokens:
+                    window, tokens = [], 0
+                fresh = 0
+
+            window.append((sentence, n, kind))
+            tokens += n
+            fresh += 1
+
+            if kind == PARAGRAPH and tokens >= flush_at_paragraph:
+                yield _join(window)
+                window = _overlap_tail(window, overlap_tokens)
+                tokens = sum(item[1] for item in window)
+                fresh = 0
+
+    if fresh:
+        yield _join(window)
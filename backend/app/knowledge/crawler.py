@@ -0,0 +1,405 @@
+"""
+InstaTG Agent — Site Crawler
+
+Crawl mode for knowledge scraping: indexes a whole site instead of one URL.
+
+- Discovery: robots.txt sitemaps (or /sitemap.xml) plus same-domain links,
+  up to a page and depth budget; robots.txt rules and crawl-delay are honoured.
+- Politeness: bounded total concurrency, a per-host connection cap and a
+  minimum delay between requests to the same host.
+- Re-crawls send conditional GETs (ETag / Last-Modified) and skip pages whose
+  extracted text hash is unchanged; identical pages under several URLs are
+  indexed once.
+- Pages stream through a bounded queue into batched ingestion (one embed /
+  upsert round per batch), each page diffed under its own vector-id prefix.
+"""
+
+import asyncio
+import hashlib
+import json
+import re
+import time
+from contextlib import asynccontextmanager
+from typing import Optional
+from urllib.parse import urljoin, urldefrag, urlparse
+from urllib.robotparser import RobotFileParser
+
+import httpx
+import structlog
+from bs4 import BeautifulSoup
+
+from app.config import settings
+
+logger = structlog.get_logger(__name__)
+
+USER_AGENT = "InstaTGBot/1.0 (+knowledge-base crawler)"
+STATE_KEY = "kb:crawl:{tenant_id}:{document_id}"
+_SKIP_EXTENSIONS = re.compile(
+    r"\.(?:jpe?g|png|gif|webp|svg|ico|css|js|pdf|zip|rar|gz|mp4|mp3|avi|mov|docx?|xlsx?|pptx?|woff2?|ttf)$",
+    re.IGNORECASE,
+)
+_LOC_RE = re.compile(r"<loc>\s*(.*?)\s*</loc>", re.IGNORECASE | re.DOTALL)
+_IDLE = object()
+
+# Validators per crawled URL when Redis is unavailable (single-process dev)
+_local_state: dict[str, dict[str, dict]] = {}
+
+
+def html_to_text(html: str, base_url: str) -> tuple[str, list[str]]:
+    """Visible text (scripts, styles, nav and footer removed) and absolute outgoing links."""
+    soup = BeautifulSoup(html, "html.parser")
+    links = [urljoin(base_url, a["href"]) for a in soup.find_all("a", href=True)]
+
+    for element in soup(["script", "style", "nav", "footer", "noscript"]):
+        element.decompose()
+
+    text_content = soup.get_text(separator="\n")
+    lines = (line.strip() for line in text_content.splitlines())
+    phrases = (phrase.strip() for line in lines for phrase in line.split("  "))
+    return "\n".join(phrase for phrase in phrases if phrase), links
+
+
+def page_key(url: str) -> str:
+    return hashlib.sha1(url.encode("utf-8")).hexdigest()[:12]
+
+
+def _host(url: str) -> str:
+    host = urlparse(url).netloc.lower()
+    return host[4:] if host.startswith("www.") else host
+
+
+class _HostThrottle:
+    """Per-host connection cap plus minimum spacing between request starts."""
+
+    def __init__(self, per_host: int, delay: float):
+        self.per_host = per_host
+        self.delay = delay
+        self._slots: dict[str, asyncio.Semaphore] = {}
+        self._locks: dict[str, asyncio.Lock] = {}
+        self._next_at: dict[str, float] = {}
+
+    @asynccontextmanager
+    async def slot(self, host: str):
+        semaphore = self._slots.setdefault(host, asyncio.Semaphore(self.per_host))
+        async with semaphore:
+            async with self._locks.setdefault(host, asyncio.Lock()):
+                wait = self._next_at.get(host, 0.0) - time.monotonic()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                self._next_at[host] = time.monotonic() + self.delay
+            yield
+
+
+class _CrawlState:
+    """Validators, content hash and links of previously crawled pages."""
+
+    def __init__(self, tenant_id: str, document_id: str):
+        self.key = STATE_KEY.format(tenant_id=tenant_id, document_id=document_id)
+
+    async def load(self) -> dict[str, dict]:
+        from app.memory.context import memory
+        if memory._use_redis:
+            try:
+                raw = await memory.redis.hgetall(self.key)
+                return {url: json.loads(value) for url, value in raw.items()}
+            except Exception as e:
+                logger.warning("crawl_state_load_failed", error=str(e))
+                return {}
+        return dict(_local_state.get(self.key, {}))
+
+    async def save(self, entries: dict[str, Optional[dict]]) -> None:
+        """Set (dict) or forget (None) page entries."""
+        from app.memory.context import memory
+        if memory._use_redis:
+            try:
+                async with memory.redis.pipeline(transaction=False) as pipe:
+                    for url, entry in entries.items():
+                        if entry is None:
+                            pipe.hdel(self.key, url)
+                        else:
+                            pipe.hset(self.key, url, json.dumps(entry))
+                    await pipe.execute()
+            except Exception as e:
+                logger.warning("crawl_state_save_failed", error=str(e))
+            return
+        local = _local_state.setdefault(self.key, {})
+        for url, entry in entries.items():
+            if entry is None:
+                local.pop(url, None)
+            else:
+                local[url] = entry
+
+
+async def forget_crawl_state(tenant_id: str, document_id: str) -> None:
+    """Drop stored validators so the next crawl of this document refetches everything."""
+    from app.memory.context import memory
+    key = STATE_KEY.format(tenant_id=tenant_id, document_id=document_id)
+    _local_state.pop(key, None)
+    if memory._use_redis:
+        try:
+            await memory.redis.delete(key)
+        except Exception as e:
+            logger.warning("crawl_state_delete_failed", error=str(e))
+
+
+class SiteCrawler:
+    """Crawls one site into one knowledge document."""
+
+    def __init__(
+        self,
+        tenant_id: str,
+        start_url: str,
+        document_id: str,
+        max_pages: int = 200,
+        max_depth: int = 3,
+        concurrency: int = 8,
+        per_host_concurrency: int = 2,
+        host_delay: float = 0.5,
+        batch_pages: int = 10,
+        progress=None,
+    ):
+        self.tenant_id = str(tenant_id)
+        self.start_url = urldefrag(start_url)[0]
+        self.document_id = str(document_id)
+        self.host = _host(self.start_url)
+        self.max_pages = max_pages
+        self.max_depth = max_depth
+        self.concurrency = concurrency
+        self.batch_pages = batch_pages
+        self.progress = progress
+        self._throttle = _HostThrottle(per_host_concurrency, host_delay)
+        self._state = _CrawlState(self.tenant_id, self.document_id)
+        self._known: dict[str, dict] = {}
+        self._seen: set[str] = set()
+        # Hashes of pages confirmed live in this run (fetched or 304). Hashes from the previous
+        # crawl are not trusted: that page may have moved or been removed since.
+        self._content_hashes: set[str] = set()
+        self._frontier: asyncio.Queue = asyncio.Queue()
+        self._pages: asyncio.Queue = asyncio.Queue(maxsize=batch_pages * 2)
+        self._robots: Optional[RobotFileParser] = None
+        self._client: Optional[httpx.AsyncClient] = None
+        self.stats = {
+            "pages_fetched": 0,
+            "pages_unchanged": 0,
+            "pages_duplicate": 0,
+            "pages_ingested": 0,
+            "pages_removed": 0,
+            "pages_failed": 0,
+            "chunks_embedded": 0,
+        }
+
+    # ── Discovery ──
+
+    def _enqueue(self, url: str, depth: int) -> None:
+        url = urldefrag(url)[0]
+        parsed = urlparse(url)
+        if parsed.scheme not in ("http", "https") or _host(url) != self.host:
+            return
+        if _SKIP_EXTENSIONS.search(parsed.path) or url in self._seen or len(self._seen) >= self.max_pages:
+            return
+        if self._robots and not self._robots.can_fetch(USER_AGENT, url):
+            return
+        self._seen.add(url)
+        self._frontier.put_nowait((url, depth))
+
+    async def _load_robots(self) -> list[str]:
+        """Parse robots.txt; returns the sitemaps it lists."""
+        robots_url = urljoin(self.start_url, "/robots.txt")
+        try:
+            response = await self._client.get(robots_url)
+        except httpx.HTTPError:
+            return []
+        if response.status_code != 200:
+            return []
+        parser = RobotFileParser(robots_url)
+        parser.parse(response.text.splitlines())
+        self._robots = parser
+        crawl_delay = parser.crawl_delay(USER_AGENT)
+        if crawl_delay:
+            self._throttle.delay = max(self._throttle.delay, float(crawl_delay))
+        return list(parser.site_maps() or [])
+
+    async def _discover_sitemap(self, sitemaps: list[str]) -> list[str]:
+        pending = list(sitemaps) or [urljoin(self.start_url, "/sitemap.xml")]
+        urls: list[str] = []
+        fetched = 0
+        while pending and fetched < 10 and len(urls) < self.max_pages:
+            sitemap_url = pending.pop(0)
+            fetched += 1
+            try:
+                async with self._throttle.slot(_host(sitemap_url)):
+                    response = await self._client.get(sitemap_url)
+            except httpx.HTTPError:
+                continue
+            if response.status_code != 200:
+                continue
+            locs = _LOC_RE.findall(response.text)
+            if "<sitemapindex" in response.text:
+                pending.extend(locs)
+            else:
+                urls.extend(locs)
+        return urls
+
+    # ── Fetching ──
+
+    async def _worker(self) -> None:
+        while True:
+            # httpx can swallow a cancellation that lands mid-request; honour it here
+            if asyncio.current_task().cancelling():
+                raise asyncio.CancelledError
+            url, depth = await self._frontier.get()
+            try:
+                await self._fetch(url, depth)
+            except Exception as e:
+                self.stats["pages_failed"] += 1
+                logger.warning("crawl_page_failed", url=url, error=str(e))
+            finally:
+                self._frontier.task_done()
+
+    async def _fetch(self, url: str, depth: int) -> None:
+        known = self._known.get(url) or {}
+        headers = {}
+        if known.get("etag"):
+            headers["If-None-Match"] = known["etag"]
+        if known.get("last_modified"):
+            headers["If-Modified-Since"] = known["last_modified"]
+
+        async with self._throttle.slot(_host(url)):
+            response = await self._client.get(url, headers=headers)
+        self.stats["pages_fetched"] += 1
+
+        if response.status_code == 304:
+            self.stats["pages_unchanged"] += 1
+            if known.get("hash"):
+                self._content_hashes.add(known["hash"])
+            self._follow(known.get("links", []), depth)
+            await self._report()
+            return
+        if response.status_code in (404, 410):
+            if known:
+                await self._remove_page(url)
+            return
+        response.raise_for_status()
+        if "html" not in response.headers.get("content-type", "html"):
+            return
+
+        text, links = html_to_text(response.text, str(response.url))
+        links = sorted({urldefrag(link)[0] for link in links if _host(link) == self.host})
+        self._follow(links, depth)
+
+        entry = {
+            "etag": response.headers.get("etag"),
+            "last_modified": response.headers.get("last-modified"),
+            "hash": hashlib.sha256(text.encode("utf-8")).hexdigest(),
+            "links": links[:500],
+        }
+        if known.get("hash") == entry["hash"]:
+            # Server ignored the validators but the content is the same
+            self.stats["pages_unchanged"] += 1
+            self._content_hashes.add(entry["hash"])
+            await self._state.save({url: entry})
+            return
+        if entry["hash"] in self._content_hashes:
+            self.stats["pages_duplicate"] += 1
+            if known:
+                # Indexed before with other text; that text is gone, the new text is indexed elsewhere
+                await self._remove_page(url)
+            return
+        self._content_hashes.add(entry["hash"])
+        if not text.strip():
+            return
+        await self._pages.put({
+            "url": url,
+            "entry": entry,
+            "page": {"text": text, "source": url, "prefix": f"{self.document_id}_{page_key(url)}"},
+        })
+
+    def _follow(self, links: list[str], depth: int) -> None:
+        if depth < self.max_depth:
+            for link in links:
+                self._enqueue(link, depth + 1)
+
+    async def _remove_page(self, url: str) -> None:
+        from app.knowledge.lexical_index import lexical_index
+        from app.knowledge.rag import delete_vectors
+
+        registered = await lexical_index.document_chunks(self.tenant_id, f"{self.document_id}_{page_key(url)}")
+        if registered:
+            await delete_vectors(self.tenant_id, list(registered.values()))
+        await self._state.save({url: None})
+        self.stats["pages_removed"] += 1
+
+    # ── Ingestion ──
+
+    async def _ingest_loop(self) -> None:
+        """Flush a batch when full, when fetching goes idle, or at the end (None)."""
+        batch: list[dict] = []
+        finished = False
+        while not finished:
+            try:
+                item = await asyncio.wait_for(self._pages.get(), timeout=1.0)
+            except asyncio.TimeoutError:
+                item = _IDLE
+            if item is None:
+                finished = True
+            elif item is not _IDLE:
+                batch.append(item)
+            if batch and (item is None or item is _IDLE or len(batch) >= self.batch_pages):
+                await self._flush(batch)
+                batch = []
+
+    async def _flush(self, batch: list[dict]) -> None:
+        from app.knowledge.uploader import ingest_pages
+
+        result = await ingest_pages(self.tenant_id, [item["page"] for item in batch], document_id=self.document_id)
+        # Validators are only stored once the page is indexed, so a failed batch is retried next crawl
+        await self._state.save({item["url"]: item["entry"] for item in batch})
+        self.stats["pages_ingested"] += len(batch)
+        self.stats["chunks_embedded"] += result["chunks_embedded"]
+        await self._report()
+
+    async def _report(self) -> None:
+        if self.progress:
+            await self.progress("crawling", dict(self.stats))
+
+    # ── Entry point ──
+
+    async def run(self) -> dict:
+        self._known = await self._state.load()
+        async with httpx.AsyncClient(
+            timeout=settings.crawl_timeout_sec,
+            follow_redirects=True,
+            headers={"User-Agent": USER_AGENT},
+            limits=httpx.Limits(max_connections=self.concurrency),
+        ) as client:
+            self._client = client
+            sitemaps = await self._load_robots()
+            self._enqueue(self.start_url, 0)
+            for url in await self._discover_sitemap(sitemaps):
+                self._enqueue(url, 1)
+
+            ingester = asyncio.create_task(self._ingest_loop())
+            workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+            waiters: list[asyncio.Task] = []
+            try:
+                # Fetching stops early if ingestion fails
+                waiters.append(asyncio.create_task(self._frontier.join()))
+                done, _ = await asyncio.wait([waiters[-1], ingester], return_when=asyncio.FIRST_COMPLETED)
+                if ingester in done:
+                    ingester.result()
+                # The queue may be full; if the ingester dies meanwhile nothing will drain it
+                waiters.append(asyncio.create_task(self._pages.put(None)))
+                await asyncio.wait([waiters[-1], ingester], return_when=asyncio.FIRST_COMPLETED)
+                await ingester
+                # Pages no longer linked anywhere; only trusted when the crawl was neither
+                # truncated nor missing links behind a failed fetch
+                if len(self._seen) < self.max_pages and not self.stats["pages_failed"]:
+                    for url in set(self._known) - self._seen:
+                        await self._remove_page(url)
+            finally:
+                for task in (*workers, *waiters, ingester):
+                    task.cancel()
+                await asyncio.gather(*workers, *waiters, ingester, return_exceptions=True)
+
+        logger.info("crawl_completed", tenant=self.tenant_id, url=self.start_url, **self.stats)
+        return dict(self.stats)
@@ -0,0 +1,43 @@
+"""
+InstaTG Agent — Document Extraction Worker
+
+Functions executed inside the extraction process pool (extraction_pool.py).
+Kept free of app imports so spawned workers start fast and never touch
+settings, database engines or Redis clients.
+"""
+
+import io
+
+
+def init_worker(memory_limit_mb: int) -> None:
+    """Cap the worker's address space so a hostile PDF can't take the host down."""
+    if memory_limit_mb <= 0:
+        return
+    try:
+        import resource
+        limit = memory_limit_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    except (ImportError, ValueError, OSError):
+        # Not supported on this platform; the per-job timeout still applies
+        pass
+
+
+def pdf_page_count(path: str) -> int:
+    import PyPDF2
+    return len(PyPDF2.PdfReader(path).pages)
+
+
+def pdf_pages(path: str, start: int, stop: int) -> list[str]:
+    """Text of pages [start, stop); empty string for pages without a text layer."""
+    import PyPDF2
+    reader = PyPDF2.PdfReader(path)
+    texts = []
+    for page in reader.pages[start:stop]:
+        texts.append(page.extract_text() or "")
+    return texts
+
+
+def docx_text(data: bytes) -> str:
+    import docx
+    doc = docx.Document(io.BytesIO(data))
+    return "\n\n".join(p.text for p in doc.paragraphs if p.text.strip())
@@ -0,0 +1,152 @@
+"""
+InstaTG Agent — Document Extraction Pool
+
+PyPDF2 and python-docx are pure-Python and CPU-bound; run on the event loop
+a large PDF stalls every tenant's webhooks for seconds. Extraction runs in a
+managed process pool instead:
+
+- each job has a timeout, measured from when a worker picks it up; a stuck
+  worker is killed and the pool is rebuilt
+- workers run under an address-space limit and are recycled periodically
+- PDF pages are extracted in parallel batches and streamed back in
+  document order as soon as the next batch is ready
+"""
+
+import asyncio
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import AsyncIterator, Optional
+
+import structlog
+
+from app.config import settings
+from app.knowledge import extract_worker
+
+logger = structlog.get_logger(__name__)
+
+
+class ExtractionTimeout(ValueError):
+    """A document took longer than the per-job limit to extract."""
+
+
+class ExtractionPool:
+    """Process pool for CPU-bound document parsing."""
+
+    def __init__(
+        self,
+        max_workers: int = 2,
+        job_timeout: float = 30.0,
+        memory_limit_mb: int = 1024,
+        pages_per_job: int = 8,
+        max_tasks_per_child: int = 50,
+    ):
+        self.max_workers = max_workers
+        self.job_timeout = job_timeout
+        self.memory_limit_mb = memory_limit_mb
+        self.pages_per_job = pages_per_job
+        self.max_tasks_per_child = max_tasks_per_child
+        self._executor: Optional[ProcessPoolExecutor] = None
+        # One job per worker at a time, so the timeout never counts queueing
+        self._slots: Optional[asyncio.Semaphore] = None
+        self.metrics = {"jobs": 0, "timeouts": 0, "crashes": 0, "restarts": 0}
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                # Never fork a process that holds an event loop, DB pool and Redis sockets
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=extract_worker.init_worker,
+                initargs=(self.memory_limit_mb,),
+                max_tasks_per_child=self.max_tasks_per_child,
+            )
+        return self._executor
+
+    def _restart(self, executor: ProcessPoolExecutor, reason: str) -> None:
+        if self._executor is not executor:
+            return  # another job already replaced it
+        self._executor = None
+        self.metrics["restarts"] += 1
+        for process in list((executor._processes or {}).values()):
+            process.kill()
+        executor.shutdown(wait=False, cancel_futures=True)
+        logger.warning("extraction_pool_restarted", reason=reason)
+
+    async def run(self, fn, *args, _retry: bool = True):
+        """Run fn(*args) in a worker with the per-job timeout."""
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_workers)
+        async with self._slots:
+            executor = self._get_executor()
+            self.metrics["jobs"] += 1
+            try:
+                return await asyncio.wait_for(
+                    asyncio.get_running_loop().run_in_executor(executor, fn, *args),
+                    timeout=self.job_timeout,
+                )
+            except asyncio.TimeoutError:
+                self.metrics["timeouts"] += 1
+                self._restart(executor, reason="timeout")
+                raise ExtractionTimeout(f"Document extraction timed out after {self.job_timeout:.0f}s")
+            except BrokenProcessPool:
+                if self._executor is not executor and _retry:
+                    # Killed because of someone else's job; not this document's fault
+                    retry = True
+                else:
+                    self.metrics["crashes"] += 1
+                    self._restart(executor, reason="worker_crashed")
+                    retry = False
+            except MemoryError:
+                raise ValueError("Document is too large to extract")
+        if retry:
+            return await self.run(fn, *args, _retry=False)
+        raise ValueError("Document extraction failed: file is too large or malformed")
+
+    async def pdf_pages(self, file_data: bytes) -> AsyncIterator[str]:
+        """Yield page texts in order; later page batches are extracted meanwhile."""
+        fd, path = tempfile.mkstemp(suffix=".pdf")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(file_data)
+            page_count = await self.run(extract_worker.pdf_page_count, path)
+            tasks = [
+                asyncio.create_task(
+                    self.run(extract_worker.pdf_pages, path, start, min(start + self.pages_per_job, page_count))
+                )
+                for start in range(0, page_count, self.pages_per_job)
+            ]
+            try:
+                for task in tasks:
+                    for text in await task:
+                        yield text
+            finally:
+                # Consumer stopped early or a batch failed: drop the rest
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+        finally:
+            os.unlink(path)
+
+    async def docx_text(self, file_data: bytes) -> str:
+        return await self.run(extract_worker.docx_text, file_data)
+
+    async def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> dict:
+        return {**self.metrics, "workers": self.max_workers, "running": self._executor is not None}
+
+
+# Singleton instance
+extraction_pool = ExtractionPool(
+    max_workers=settings.extraction_workers,
+    job_timeout=settings.extraction_job_timeout_sec,
+    memory_limit_mb=settings.extraction_memory_limit_mb,
+    pages_per_job=settings.extraction_pages_per_job,
+    max_tasks_per_child=settings.extraction_max_tasks_per_child,
+)
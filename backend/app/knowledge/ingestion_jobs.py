@@ -0,0 +1,428 @@
+"""
+InstaTG Agent — Knowledge Ingestion Jobs
+
+Uploads and scrapes are queued as background jobs instead of holding the
+HTTP request open for the whole extract → chunk → embed → upsert pipeline.
+
+- Jobs are rows in `knowledge_ingestion_jobs`; uploaded bytes and extracted
+  text are staged on disk, so a job interrupted by a restart resumes after
+  extraction (embeddings of chunks done before the crash come from the
+  embedding cache). A stale job can be picked up by any API process, so with
+  more than one node KNOWLEDGE_JOB_STAGING_DIR must be storage they all mount
+  (a shared volume); on node-local disk only the node that staged an upload
+  can finish it.
+- Progress (pages parsed, chunks embedded, vectors upserted) is pushed to
+  the tenant's notifications SSE stream as `ingestion_progress` events.
+- Concurrent jobs are capped per tenant across all processes (a job is only
+  claimed while the tenant has fewer running rows than the cap) and per
+  process.
+
+Jobs run on the API process's event loop: extraction already happens in the
+extraction process pool, and Celery's prefork workers cannot host one.
+"""
+
+import asyncio
+import os
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+import structlog
+from sqlalchemy import and_, desc, func, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import aliased
+
+from app.config import settings
+
+logger = structlog.get_logger(__name__)
+
+ACTIVE_STATUSES = ("queued", "running")
+
+
+class JobConflictError(RuntimeError):
+    """The document already has a queued or running ingestion job."""
+
+
+class IngestionJobManager:
+    """Queues, runs and resumes knowledge ingestion jobs."""
+
+    def __init__(self, per_tenant: int = 2, max_concurrent: int = 8, staging_dir: str = "./data/ingestion"):
+        self.per_tenant = per_tenant
+        self.max_concurrent = max_concurrent
+        self.staging_dir = staging_dir
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._tasks: dict[str, asyncio.Task] = {}
+
+    # ── Staging ──
+
+    def _staged_path(self, job_id: str, suffix: str) -> str:
+        return os.path.join(self.staging_dir, f"{job_id}.{suffix}")
+
+    async def _write_staged(self, job_id: str, suffix: str, data: bytes) -> None:
+        def write():
+            os.makedirs(self.staging_dir, exist_ok=True)
+            tmp = self._staged_path(job_id, suffix) + ".tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, self._staged_path(job_id, suffix))
+        await asyncio.to_thread(write)
+
+    async def _read_staged(self, job_id: str, suffix: str) -> Optional[bytes]:
+        path = self._staged_path(job_id, suffix)
+
+        def read():
+            with open(path, "rb") as f:
+                return f.read()
+        try:
+            return await asyncio.to_thread(read)
+        except FileNotFoundError:
+            return None
+
+    def _drop_staged(self, job_id: str) -> None:
+        for suffix in ("upload", "txt"):
+            try:
+                os.unlink(self._staged_path(job_id, suffix))
+            except FileNotFoundError:
+                pass
+
+    # ── Submission ──
+
+    async def submit_upload(self, tenant_id: str, document_id: str, filename: str, file_data: bytes) -> str:
+        job_id = str(uuid.uuid4())
+        await self._write_staged(job_id, "upload", file_data)
+        try:
+            await self._create(job_id, tenant_id, document_id, "upload", filename)
+        except JobConflictError:
+            self._drop_staged(job_id)
+            raise
+        self._schedule(job_id)
+        return job_id
+
+    async def submit_scrape(self, tenant_id: str, document_id: str, url: str, crawl: bool = False) -> str:
+        job_id = str(uuid.uuid4())
+        await self._create(job_id, tenant_id, document_id, "crawl" if crawl else "scrape", url)
+        self._schedule(job_id)
+        return job_id
+
+    async def _create(self, job_id: str, tenant_id: str, document_id: str, kind: str, source: str) -> None:
+        """Insert the job row; JobConflictError if the document already has an active job."""
+        from app.database import background_session_factory
+        from app.models import KnowledgeIngestionJob
+
+        async with background_session_factory() as db:
+            db.add(KnowledgeIngestionJob(
+                id=uuid.UUID(job_id),
+                tenant_id=uuid.UUID(str(tenant_id)),
+                document_id=uuid.UUID(str(document_id)),
+                kind=kind,
+                source=source,
+                status="queued",
+                stage="queued",
+                progress={},
+            ))
+            try:
+                await db.commit()
+            except IntegrityError as e:
+                # uq_knowledge_ingestion_jobs_active_document
+                raise JobConflictError("This document is already being processed") from e
+        logger.info("ingestion_job_queued", job_id=job_id, tenant=str(tenant_id), kind=kind)
+
+    def _schedule(self, job_id: str) -> None:
+        if job_id in self._tasks:
+            return
+        task = asyncio.create_task(self._run(job_id))
+        self._tasks[job_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job_id, None))
+
+    async def resume_pending(self) -> int:
+        """Re-schedule queued jobs and jobs whose runner went silent (process restart)."""
+        from app.database import background_session_factory
+        from app.models import KnowledgeIngestionJob
+
+        stale_before = datetime.now(timezone.utc) - timedelta(seconds=settings.knowledge_job_stale_sec)
+        async with background_session_factory() as db:
+            result = await db.execute(
+                select(KnowledgeIngestionJob.id).where(
+                    or_(
+                        KnowledgeIngestionJob.status == "queued",
+                        and_(KnowledgeIngestionJob.status == "running", KnowledgeIngestionJob.updated_at < stale_before),
+                    )
+                ).order_by(KnowledgeIngestionJob.created_at)
+            )
+            job_ids = [str(job_id) for job_id in result.scalars().all()]
+        for job_id in job_ids:
+            self._schedule(job_id)
+        if job_ids:
+            logger.info("ingestion_jobs_resumed", count=len(job_ids))
+        return len(job_ids)
+
+    # ── Execution ──
+
+    async def _claim(self, job_id: str, tenant_id: str) -> Optional[bool]:
+        """
+        Mark the job running unless another process already owns it (False)
+        or the tenant already has `per_tenant` live running jobs (None: retry later).
+        """
+        from app.database import background_session_factory
+        from app.models import KnowledgeIngestionJob, Tenant
+
+        tenant_uuid = uuid.UUID(tenant_id)
+        stale_before = datetime.now(timezone.utc) - timedelta(seconds=settings.knowledge_job_stale_sec)
+        running = aliased(KnowledgeIngestionJob)
+        live_running = (
+            select(func.count())
+            .select_from(running)
+            .where(running.tenant_id == tenant_uuid, running.status == "running", running.updated_at >= stale_before)
+            .scalar_subquery()
+        )
+        async with background_session_factory() as db:
+            # Serialize claims for one tenant (PostgreSQL row lock) so two
+            # processes cannot both see a free slot and overshoot the cap
+            await db.execute(select(Tenant.id).where(Tenant.id == tenant_uuid).with_for_update())
+            result = await db.execute(
+                update(KnowledgeIngestionJob)
+                .where(
+                    KnowledgeIngestionJob.id == uuid.UUID(job_id),
+                    or_(
+                        KnowledgeIngestionJob.status == "queued",
+                        and_(KnowledgeIngestionJob.status == "running", KnowledgeIngestionJob.updated_at < stale_before),
+                    ),
+                    live_running < self.per_tenant,
+                )
+                .values(status="running", updated_at=datetime.now(timezone.utc))
+                .execution_options(synchronize_session=False)
+            )
+            if result.rowcount == 1:
+                await db.commit()
+                return True
+            job = await db.get(KnowledgeIngestionJob, uuid.UUID(job_id))
+            claimable = job is not None and (
+                job.status == "queued"
+                or (job.status == "running" and _as_utc(job.updated_at) < stale_before)
+            )
+            await db.commit()
+            return None if claimable else False
+
+    async def _save(self, job_id: str, **values) -> None:
+        from app.database import background_session_factory
+        from app.models import KnowledgeIngestionJob
+
+        async with background_session_factory() as db:
+            await db.execute(
+                update(KnowledgeIngestionJob)
+                .where(KnowledgeIngestionJob.id == uuid.UUID(job_id))
+                .values(updated_at=datetime.now(timezone.utc), **values)
+            )
+            await db.commit()
+
+    async def _run(self, job_id: str) -> None:
+        from app.database import background_session_factory
+        from app.models import KnowledgeIngestionJob
+
+        async with background_session_factory() as db:
+            job = await db.get(KnowledgeIngestionJob, uuid.UUID(job_id))
+        if job is None or job.status not in ACTIVE_STATUSES:
+            return
+        tenant_id, document_id = str(job.tenant_id), str(job.document_id)
+
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_concurrent)
+        while True:
+            async with self._slots:
+                claimed = await self._claim(job_id, tenant_id)
+                if claimed:
+                    reporter = _ProgressReporter(self, job_id, tenant_id, dict(job.progress or {}))
+                    try:
+                        result = await self._execute(job, reporter)
+                    except asyncio.CancelledError:
+                        # Shutting down: hand the job back so the next start resumes it
+                        await self._save(job_id, status="queued")
+                        raise
+                    except Exception as e:
+                        logger.error("ingestion_job_failed", job_id=job_id, tenant=tenant_id, error=str(e))
+                        await self._save(job_id, status="failed", error=str(e)[:2000])
+                        await self._set_document(document_id, status="failed")
+                        await reporter.finish("failed", error=str(e))
+                        self._drop_staged(job_id)
+                        return
+                    break
+            if claimed is False:
+                return
+            # The tenant is at its cap (possibly on other processes): retry
+            # without holding one of this process's slots
+            await asyncio.sleep(settings.knowledge_job_claim_retry_sec)
+
+        await self._save(job_id, status="completed", stage="done", progress=reporter.progress)
+        await self._set_document(document_id, status="completed", chunk_count=result["chunk_count"])
+        await reporter.finish("completed", chunk_count=result["chunk_count"])
+        self._drop_staged(job_id)
+
+        from app.api.routes.notifications import create_and_dispatch_notification
+        await create_and_dispatch_notification(
+            tenant_id=tenant_id,
+            title="Knowledge base updated",
+            message=f"{job.source}: {result['chunk_count']} chunks indexed",
+            type="success",
+        )
+
+    async def _execute(self, job, reporter: "_ProgressReporter") -> dict:
+        from app.database import background_session_factory
+        from app.models import KnowledgeDocument
+        from app.knowledge.uploader import extract_text_async, ingest_text
+
+        job_id, tenant_id, document_id = str(job.id), str(job.tenant_id), str(job.document_id)
+        async with background_session_factory() as db:
+            doc = await db.get(KnowledgeDocument, job.document_id)
+        if doc is None:
+            raise ValueError("Document was deleted before ingestion finished")
+        # Chunk count of the version being replaced (used for pre-registry vectors)
+        legacy_chunk_count = doc.chunk_count or 0
+
+        if job.kind == "scrape":
+            from app.knowledge.scraper import scraper
+            result = await scraper.scrape_and_ingest(tenant_id, job.source, document_id=document_id, progress=reporter)
+            if result["status"] != "success":
+                raise ValueError(result.get("message", "Scrape failed"))
+            return {"chunk_count": result["chunks"]}
+
+        if job.kind == "crawl":
+            from app.knowledge.scraper import scraper
+            result = await scraper.crawl_and_ingest(tenant_id, job.source, document_id, progress=reporter)
+            if result["status"] != "success":
+                raise ValueError(result.get("message", "Crawl failed"))
+            return {"chunk_count": result["chunks"], "pages_ingested": result["pages_ingested"]}
+
+        # Stage 1: extraction (skipped when resuming with text already staged)
+        staged_text = await self._read_staged(job_id, "txt")
+        if staged_text is not None:
+            text = staged_text.decode("utf-8")
+        else:
+            file_data = await self._read_staged(job_id, "upload")
+            if file_data is None:
+                raise ValueError("Uploaded file is no longer available; please upload it again")
+            await reporter("extracting", {"pages_parsed": 0})
+
+            async def on_page(pages: int) -> None:
+                await reporter("extracting", {"pages_parsed": pages})
+
+            text = await extract_text_async(file_data, job.source, on_page=on_page)
+            await self._write_staged(job_id, "txt", text.encode("utf-8"))
+
+        # Stages 2-4: chunk → embed → upsert
+        return await ingest_text(
+            tenant_id,
+            text,
+            job.source,
+            document_id=document_id,
+            legacy_chunk_count=legacy_chunk_count,
+            progress=reporter,
+        )
+
+    async def _set_document(self, document_id: str, **values) -> None:
+        from app.database import background_session_factory
+        from app.models import KnowledgeDocument
+
+        async with background_session_factory() as db:
+            await db.execute(
+                update(KnowledgeDocument).where(KnowledgeDocument.id == uuid.UUID(document_id)).values(**values)
+            )
+            await db.commit()
+
+    # ── Queries ──
+
+    async def get(self, tenant_id: str, job_id: str) -> Optional[dict]:
+        from app.database import background_session_factory
+        from app.models import KnowledgeIngestionJob
+
+        async with background_session_factory() as db:
+            job = await db.get(KnowledgeIngestionJob, uuid.UUID(str(job_id)))
+        if job is None or str(job.tenant_id) != str(tenant_id):
+            return None
+        return _job_to_dict(job)
+
+    async def list_jobs(self, tenant_id: str, limit: int = 20) -> list[dict]:
+        from app.database import background_session_factory
+        from app.models import KnowledgeIngestionJob
+
+        async with background_session_factory() as db:
+            result = await db.execute(
+                select(KnowledgeIngestionJob)
+                .where(KnowledgeIngestionJob.tenant_id == uuid.UUID(str(tenant_id)))
+                .order_by(desc(KnowledgeIngestionJob.created_at))
+                .limit(limit)
+            )
+            return [_job_to_dict(job) for job in result.scalars().all()]
+
+    async def close(self) -> None:
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+class _ProgressReporter:
+    """Progress callback for uploader.ingest_text: persists and streams stage counters."""
+
+    def __init__(self, manager: IngestionJobManager, job_id: str, tenant_id: str, progress: dict):
+        self.manager = manager
+        self.job_id = job_id
+        self.tenant_id = tenant_id
+        self.progress = progress
+        self.stage = None
+        self._last_sent = 0.0
+
+    async def __call__(self, stage: str, counters: dict) -> None:
+        self.progress.update(counters)
+        now = time.monotonic()
+        if stage == self.stage and now - self._last_sent < settings.knowledge_job_progress_interval_sec:
+            return
+        self.stage = stage
+        self._last_sent = now
+        await self.manager._save(self.job_id, stage=stage, progress=dict(self.progress))
+        await self._send(status="running")
+
+    async def finish(self, status: str, **extra) -> None:
+        self.stage = "done" if status == "completed" else self.stage
+        await self._send(status=status, **extra)
+
+    async def _send(self, status: str, **extra) -> None:
+        from app.api.routes.notifications import notify_tenant
+        await notify_tenant(self.tenant_id, {
+            "event_type": "ingestion_progress",
+            "job_id": self.job_id,
+            "status": status,
+            "stage": self.stage,
+            "progress": dict(self.progress),
+            **extra,
+        })
+
+
+def _as_utc(value: Optional[datetime]) -> datetime:
+    # SQLite hands back naive datetimes for timezone-aware columns
+    if value is None:
+        return datetime.min.replace(tzinfo=timezone.utc)
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+def _job_to_dict(job) -> dict:
+    return {
+        "id": str(job.id),
+        "document_id": str(job.document_id) if job.document_id else None,
+        "kind": job.kind,
+        "source": job.source,
+        "status": job.status,
+        "stage": job.stage,
+        "progress": job.progress or {},
+        "error": job.error,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "updated_at": job.updated_at.isoformat() if job.updated_at else None,
+    }
+
+
+# Singleton instance
+ingestion_jobs = IngestionJobManager(
+    per_tenant=settings.knowledge_jobs_per_tenant,
+    max_concurrent=settings.knowledge_jobs_max_concurrent,
+    staging_dir=settings.knowledge_job_staging_dir,
+)
@@ -0,0 +1,365 @@
+"""
+InstaTG Agent — Lexical (BM25) Knowledge Index
+
+Per-tenant in-memory inverted index over the same chunks that are embedded
+into the vector store. Embedding search is weak on exact tokens — SKUs,
+model numbers, prices — so rag_search queries this index in parallel and
+fuses both rankings (reciprocal rank fusion, see rag.py).
+
+Chunk text is persisted in `knowledge_base_chunks`; each process loads a
+tenant's index lazily from there and applies uploads/deletes incrementally.
+A per-tenant version counter in Redis tells other processes (API replicas,
+Celery workers) when their copy is stale.
+"""
+
+import asyncio
+import heapq
+import math
+import re
+import time
+import uuid
+from collections import Counter, OrderedDict, defaultdict
+from typing import Optional
+
+import structlog
+from sqlalchemy import delete, insert, select
+
+from app.config import settings
+
+logger = structlog.get_logger(__name__)
+
+VERSION_KEY = "kb:lexical:version:{tenant_id}"
+# Rows per registry INSERT / DELETE ... IN statement (bind-parameter limits)
+REGISTRY_BATCH_SIZE = 1000
+
+# Words, numbers and joined codes such as "AB-1200", "v2.5", "12/64GB", "o'zbek"
+_TOKEN_RE = re.compile(r"[^\W_]+(?:[\-./'ʻ’][^\W_]+)*")
+_SPLIT_RE = re.compile(r"[\-./'ʻ’]")
+
+
+def tokenize(text: str) -> list[str]:
+    """
+    Lowercased word tokens. Joined codes are kept whole and also emitted as
+    their parts and glued form ("ab-1200" -> "ab-1200", "ab", "1200", "ab1200"),
+    so "AB1200", "AB 1200" and "AB-1200" all meet in the index.
+    """
+    tokens = []
+    for match in _TOKEN_RE.finditer(text.lower()):
+        token = match.group()
+        tokens.append(token)
+        if len(token) > 1 and _SPLIT_RE.search(token):
+            parts = [p for p in _SPLIT_RE.split(token) if p]
+            tokens.extend(parts)
+            tokens.append("".join(parts))
+    return tokens
+
+
+class BM25Index:
+    """Okapi BM25 over a mutable set of chunks keyed by vector id."""
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75, common_term_ratio: float = 0.5):
+        self.k1 = k1
+        self.b = b
+        self.common_term_ratio = common_term_ratio
+        self._postings: dict[str, dict[int, int]] = defaultdict(dict)
+        self._doc_len: dict[int, int] = {}
+        self._doc_terms: dict[int, tuple[str, ...]] = {}
+        self._docs: dict[int, tuple[str, str, dict]] = {}  # slot -> (vector_id, text, metadata)
+        self._slots: dict[str, int] = {}
+        self._next_slot = 0
+        self._total_len = 0
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def add(self, vector_id: str, text: str, metadata: Optional[dict] = None) -> None:
+        if vector_id in self._slots:
+            self.remove(vector_id)
+        tf = Counter(tokenize(text))
+        slot = self._next_slot
+        self._next_slot += 1
+        for term, count in tf.items():
+            self._postings[term][slot] = count
+        length = sum(tf.values())
+        self._doc_len[slot] = length
+        self._doc_terms[slot] = tuple(tf)
+        self._docs[slot] = (vector_id, text, metadata or {})
+        self._slots[vector_id] = slot
+        self._total_len += length
+
+    def remove(self, vector_id: str) -> bool:
+        slot = self._slots.pop(vector_id, None)
+        if slot is None:
+            return False
+        for term in self._doc_terms.pop(slot):
+            postings = self._postings[term]
+            postings.pop(slot, None)
+            if not postings:
+                del self._postings[term]
+        self._total_len -= self._doc_len.pop(slot)
+        del self._docs[slot]
+        return True
+
+    def search(self, query: str, top_k: int = 10) -> list[dict]:
+        n_docs = len(self._docs)
+        if not n_docs:
+            return []
+        avg_len = self._total_len / n_docs or 1.0
+        k1, b = self.k1, self.b
+        doc_len = self._doc_len
+
+        terms = [(term, self._postings[term]) for term in set(tokenize(query)) if term in self._postings]
+        # Terms in most chunks (stop words, "sku" of "SKU-123") add ~0 to the ranking
+        # but dominate the cost; skip them when the query has anything rarer.
+        rare = [(term, postings) for term, postings in terms if len(postings) <= n_docs * self.common_term_ratio]
+        if rare:
+            terms = rare
+
+        scores: dict[int, float] = defaultdict(float)
+        for term, postings in terms:
+            df = len(postings)
+            idf = math.log(1.0 + (n_docs - df + 0.5) / (df + 0.5))
+            for slot, tf in postings.items():
+                norm = k1 * (1.0 - b + b * doc_len[slot] / avg_len)
+                scores[slot] += idf * tf * (k1 + 1.0) / (tf + norm)
+
+        best = heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+        results = []
+        for slot, score in best:
+            vector_id, text, metadata = self._docs[slot]
+            results.append({"id": vector_id, "score": score, "text": text, "metadata": metadata})
+        return results
+
+
+class _TenantIndex:
+    __slots__ = ("index", "version")
+
+    def __init__(self, index: BM25Index, version: int):
+        self.index = index
+        self.version = version
+
+
+class LexicalIndex:
+    """Process-wide registry of tenant BM25 indexes with DB persistence."""
+
+    def __init__(self, max_tenants: int = 500):
+        self.max_tenants = max_tenants
+        self._tenants: OrderedDict[str, _TenantIndex] = OrderedDict()
+        self._locks: dict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
+
+    # ── Cross-process version ──
+
+    async def _remote_version(self, tenant_id: str) -> int:
+        from app.memory.context import memory
+        if not memory._use_redis:
+            return 0
+        try:
+            value = await memory.redis.get(VERSION_KEY.format(tenant_id=tenant_id))
+            return int(value or 0)
+        except Exception as e:
+            logger.warning("lexical_version_read_failed", tenant=tenant_id, error=str(e))
+            return 0
+
+    async def _bump_version(self, tenant_id: str) -> Optional[int]:
+        from app.memory.context import memory
+        if not memory._use_redis:
+            return None
+        try:
+            return int(await memory.redis.incr(VERSION_KEY.format(tenant_id=tenant_id)))
+        except Exception as e:
+            logger.warning("lexical_version_bump_failed", tenant=tenant_id, error=str(e))
+            return None
+
+    def _apply_locally(self, tenant_id: str, new_version: Optional[int], mutate) -> None:
+        entry = self._tenants.get(tenant_id)
+        if entry is None:
+            return
+        if new_version is not None and new_version != entry.version + 1:
+            # Someone else changed the corpus in between; reload on next search
+            self._tenants.pop(tenant_id, None)
+            return
+        mutate(entry.index)
+        if new_version is not None:
+            entry.version = new_version
+
+    # ── Loading ──
+
+    async def _load(self, tenant_id: str, version: int) -> _TenantIndex:
+        from app.database import async_session_factory
+        from app.models import KnowledgeBaseChunk
+
+        index = BM25Index()
+        async with async_session_factory() as db:
+            result = await db.execute(
+                select(
+                    KnowledgeBaseChunk.vector_id,
+                    KnowledgeBaseChunk.content,
+                    KnowledgeBaseChunk.source,
+                    KnowledgeBaseChunk.chunk_index,
+                    KnowledgeBaseChunk.document_id,
+                    KnowledgeBaseChunk.created_at,
+                ).where(KnowledgeBaseChunk.tenant_id == uuid.UUID(str(tenant_id)))
+            )
+            for vector_id, content, source, chunk_index, document_id, created_at in result.all():
+                indexed_at = created_at.timestamp() if created_at else None
+                index.add(vector_id, content, _chunk_metadata(source, chunk_index, document_id, indexed_at))
+
+        entry = _TenantIndex(index, version)
+        self._tenants[tenant_id] = entry
+        while len(self._tenants) > self.max_tenants:
+            self._tenants.popitem(last=False)
+        logger.info("lexical_index_loaded", tenant=tenant_id, chunks=len(index), version=version)
+        return entry
+
+    async def _get(self, tenant_id: str) -> _TenantIndex:
+        version = await self._remote_version(tenant_id)
+        entry = self._tenants.get(tenant_id)
+        if entry is not None and entry.version == version:
+            self._tenants.move_to_end(tenant_id)
+            return entry
+        async with self._locks[tenant_id]:
+            entry = self._tenants.get(tenant_id)
+            if entry is not None and entry.version == version:
+                return entry
+            return await self._load(tenant_id, version)
+
+    # ── Public API ──
+
+    async def search(self, tenant_id: str, query: str, top_k: int = 10) -> list[dict]:
+        """BM25 matches as dicts with 'id', 'score', 'text' and 'metadata'."""
+        entry = await self._get(str(tenant_id))
+        return entry.index.search(query, top_k)
+
+    async def add_chunks(
+        self,
+        tenant_id: str,
+        chunks: list[dict],
+        document_id: Optional[str] = None,
+    ) -> None:
+        """
+        Persist and index chunks ({'vector_id', 'text', 'source', 'chunk_index',
+        optional 'content_hash'}).
+        `document_id` is only stored when it refers to a KnowledgeDocument row.
+        """
+        from app.database import async_session_factory
+        from app.models import KnowledgeBaseChunk
+
+        if not chunks:
+            return
+        tenant_id = str(tenant_id)
+        rows = [
+            {
+                "id": uuid.uuid4(),
+                "tenant_id": uuid.UUID(tenant_id),
+                "document_id": uuid.UUID(document_id) if document_id else None,
+                "content": c["text"],
+                "vector_id": c["vector_id"],
+                "source": c.get("source"),
+                "chunk_index": c.get("chunk_index", 0),
+                "content_hash": c.get("content_hash"),
+            }
+            for c in chunks
+        ]
+        async with async_session_factory() as db:
+            for start in range(0, len(rows), REGISTRY_BATCH_SIZE):
+                batch = rows[start:start + REGISTRY_BATCH_SIZE]
+                await db.execute(
+                    delete(KnowledgeBaseChunk).where(
+                        KnowledgeBaseChunk.tenant_id == uuid.UUID(tenant_id),
+                        KnowledgeBaseChunk.vector_id.in_([row["vector_id"] for row in batch]),
+                    )
+                )
+                await db.execute(insert(KnowledgeBaseChunk), batch)
+            await db.commit()
+
+        indexed_at = time.time()
+
+        def mutate(index: BM25Index) -> None:
+            for c in chunks:
+                metadata = _chunk_metadata(c.get("source"), c.get("chunk_index", 0), document_id, indexed_at)
+                index.add(c["vector_id"], c["text"], metadata)
+
+        self._apply_locally(tenant_id, await self._bump_version(tenant_id), mutate)
+
+    async def document_chunks(self, tenant_id: str, document_id: str) -> dict[str, str]:
+        """Registered chunks of a document as {content_hash: vector_id}."""
+        from app.database import async_session_factory
+        from app.models import KnowledgeBaseChunk
+
+        async with async_session_factory() as db:
+            result = await db.execute(
+                select(KnowledgeBaseChunk.content_hash, KnowledgeBaseChunk.vector_id).where(
+                    KnowledgeBaseChunk.tenant_id == uuid.UUID(str(tenant_id)),
+                    KnowledgeBaseChunk.vector_id.startswith(f"{document_id}_", autoescape=True),
+                    KnowledgeBaseChunk.content_hash.is_not(None),
+                )
+            )
+            return {chunk_hash: vector_id for chunk_hash, vector_id in result.all()}
+
+    async def remove_chunks(self, tenant_id: str, vector_ids: list[str]) -> None:
+        """Drop chunks by vector id from the table and the index."""
+        from app.database import async_session_factory
+        from app.models import KnowledgeBaseChunk
+
+        if not vector_ids:
+            return
+        tenant_id = str(tenant_id)
+        async with async_session_factory() as db:
+            for start in range(0, len(vector_ids), REGISTRY_BATCH_SIZE):
+                await db.execute(
+                    delete(KnowledgeBaseChunk).where(
+                        KnowledgeBaseChunk.tenant_id == uuid.UUID(tenant_id),
+                        KnowledgeBaseChunk.vector_id.in_(vector_ids[start:start + REGISTRY_BATCH_SIZE]),
+                    )
+                )
+            await db.commit()
+
+        def mutate(index: BM25Index) -> None:
+            for vector_id in vector_ids:
+                index.remove(vector_id)
+
+        self._apply_locally(tenant_id, await self._bump_version(tenant_id), mutate)
+
+    async def drop_tenant(self, tenant_id: str) -> None:
+        """Forget every chunk of a tenant (namespace wipe)."""
+        from app.database import async_session_factory
+        from app.models import KnowledgeBaseChunk
+
+        tenant_id = str(tenant_id)
+        async with async_session_factory() as db:
+            await db.execute(delete(KnowledgeBaseChunk).where(KnowledgeBaseChunk.tenant_id == uuid.UUID(tenant_id)))
+            await db.commit()
+        self._tenants.pop(tenant_id, None)
+        await self._bump_version(tenant_id)
+
+    def stats(self) -> dict:
+        return {
+            "tenants_loaded": len(self._tenants),
+            "chunks_loaded": sum(len(entry.index) for entry in self._tenants.values()),
+        }
+
+
+def _chunk_metadata(
+    source: Optional[str],
+    chunk_index: Optional[int],
+    document_id,
+    indexed_at: Optional[float] = None,
+) -> dict:
+    metadata = {"source": source or "unknown", "chunk_index": chunk_index or 0}
+    if document_id:
+        metadata["document_id"] = str(document_id)
+    if indexed_at:
+        metadata["indexed_at"] = int(indexed_at)
+    return metadata
+
+
+def is_uuid(value: Optional[str]) -> bool:
+    try:
+        uuid.UUID(str(value))
+        return True
+    except (TypeError, ValueError):
+        return False
+
+
+# Singleton instance
+lexical_index = LexicalIndex(max_tenants=settings.lexical_index_max_tenants)
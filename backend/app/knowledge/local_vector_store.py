@@ -0,0 +1,462 @@
+"""
+InstaTG Agent — Local Vector Store
+
+Self-hosted VectorStore backend for on-prem tenants (no Pinecone). Each
+tenant namespace lives in its own directory:
+
+    vectors.f32 | vectors.i8   memory-mapped matrix (capacity x dim), rows L2-normalised
+    scales.f32                 per-row dequantisation scale (int8 mode only)
+    meta.jsonl                 append-only log of puts/deletes (ids + metadata)
+    header.json                dim, dtype, capacity
+    hnsw.bin                   optional persisted graph index
+
+Search is an exact (chunked) matrix product for small namespaces. Once a
+namespace reaches LOCAL_VECTOR_HNSW_THRESHOLD live vectors, an HNSW graph
+(hnswlib) is built on a background thread — queries stay on exact search
+until it is ready — and then kept up to date incrementally. Without hnswlib
+installed the store stays on exact search.
+"""
+
+import asyncio
+import json
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+import structlog
+
+from app.config import settings
+from app.knowledge.vector_store import VectorStore
+
+logger = structlog.get_logger(__name__)
+
+try:
+    import hnswlib
+    has_hnswlib = True
+except ImportError:
+    hnswlib = None
+    has_hnswlib = False
+
+INITIAL_CAPACITY = 1024
+SEARCH_BLOCK_ROWS = 16384
+
+
+def _matches_filter(metadata: dict, flt: Optional[dict]) -> bool:
+    """Subset of Pinecone filter syntax: {key: value}, {key: {"$eq"|"$ne"|"$in"|"$nin": ...}}."""
+    if not flt:
+        return True
+    for key, cond in flt.items():
+        value = metadata.get(key)
+        if isinstance(cond, dict):
+            for op, expected in cond.items():
+                if op == "$eq" and value != expected:
+                    return False
+                if op == "$ne" and value == expected:
+                    return False
+                if op == "$in" and value not in expected:
+                    return False
+                if op == "$nin" and value in expected:
+                    return False
+        elif value != cond:
+            return False
+    return True
+
+
+class _Namespace:
+    """One tenant's vectors, ids and metadata backed by files in `path`."""
+
+    def __init__(self, path: Path, quantize: bool):
+        self.path = path
+        self.quantize = quantize
+        self.lock = threading.RLock()
+        self._reset()
+        self._load()
+
+    def _reset(self) -> None:
+        self.dim: Optional[int] = None
+        self.capacity = 0
+        self.size = 0  # high-water mark of used rows
+        self.vectors: Optional[np.memmap] = None
+        self.scales: Optional[np.memmap] = None
+        self.valid = np.zeros(0, dtype=bool)
+        self.ids: list[Optional[str]] = []
+        self.metadata: list[Optional[dict]] = []
+        self.slot_of: dict[str, int] = {}
+        self.free: list[int] = []
+        self.log_ops = 0
+        self.graph = None
+        self.graph_ops = -1  # log_ops at the time the graph file was saved
+        self.building = False
+        self.touched: set[int] = set()  # slots written or freed while the graph builds
+        self.generation = getattr(self, "generation", 0) + 1  # bumped by delete_all
+
+    # ── Files ──
+
+    @property
+    def _dtype(self):
+        return np.int8 if self.quantize else np.float32
+
+    def _vector_file(self) -> Path:
+        return self.path / ("vectors.i8" if self.quantize else "vectors.f32")
+
+    def _open_matrices(self, mode: str) -> None:
+        self.vectors = np.memmap(self._vector_file(), dtype=self._dtype, mode=mode, shape=(self.capacity, self.dim))
+        if self.quantize:
+            self.scales = np.memmap(self.path / "scales.f32", dtype=np.float32, mode=mode, shape=(self.capacity,))
+
+    def _write_header(self) -> None:
+        header = {"dim": self.dim, "quantize": self.quantize, "capacity": self.capacity,
+                  "size": self.size, "graph_ops": self.graph_ops}
+        tmp = self.path / "header.json.tmp"
+        tmp.write_text(json.dumps(header))
+        os.replace(tmp, self.path / "header.json")
+
+    def _load(self) -> None:
+        header_path = self.path / "header.json"
+        if not header_path.exists():
+            return
+        header = json.loads(header_path.read_text())
+        self.dim, self.capacity = header["dim"], header["capacity"]
+        self.quantize = header.get("quantize", self.quantize)
+        self.graph_ops = header.get("graph_ops", -1)
+        self._open_matrices("r+")
+        self.ids = [None] * self.capacity
+        self.metadata = [None] * self.capacity
+        self.valid = np.zeros(self.capacity, dtype=bool)
+
+        log_path = self.path / "meta.jsonl"
+        if log_path.exists():
+            with open(log_path, encoding="utf-8") as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    op = json.loads(line)
+                    self.log_ops += 1
+                    if op["op"] == "put":
+                        self._apply_put(op["id"], op["slot"], op["metadata"])
+                    else:
+                        self._apply_delete(op["id"])
+        self.size = max(header.get("size", 0), max(self.slot_of.values(), default=-1) + 1)
+        self.free = [s for s in range(self.size) if not self.valid[s]]
+
+        graph_path = self.path / "hnsw.bin"
+        if has_hnswlib and graph_path.exists() and self.graph_ops == self.log_ops:
+            self.graph = hnswlib.Index(space="ip", dim=self.dim)
+            self.graph.load_index(str(graph_path), max_elements=self.capacity)
+
+    def _init(self, dim: int) -> None:
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.dim, self.capacity = dim, INITIAL_CAPACITY
+        self._open_matrices("w+")
+        self.ids = [None] * self.capacity
+        self.metadata = [None] * self.capacity
+        self.valid = np.zeros(self.capacity, dtype=bool)
+        self._write_header()
+
+    def _grow(self, needed: int) -> None:
+        new_capacity = self.capacity
+        while new_capacity < needed:
+            new_capacity *= 2
+        if new_capacity == self.capacity:
+            return
+        old_vectors, old_scales = self.vectors, self.scales
+        tmp = self._vector_file().with_suffix(".grow")
+        grown = np.memmap(tmp, dtype=self._dtype, mode="w+", shape=(new_capacity, self.dim))
+        grown[:self.capacity] = old_vectors
+        grown.flush()
+        del grown, old_vectors
+        os.replace(tmp, self._vector_file())
+        if self.quantize:
+            tmp = self.path / "scales.grow"
+            grown = np.memmap(tmp, dtype=np.float32, mode="w+", shape=(new_capacity,))
+            grown[:self.capacity] = old_scales
+            grown.flush()
+            del grown, old_scales
+            os.replace(tmp, self.path / "scales.f32")
+
+        extra = new_capacity - self.capacity
+        self.ids.extend([None] * extra)
+        self.metadata.extend([None] * extra)
+        self.valid = np.concatenate([self.valid, np.zeros(extra, dtype=bool)])
+        self.capacity = new_capacity
+        self._open_matrices("r+")
+        if self.graph is not None:
+            self.graph.resize_index(new_capacity)
+        self._write_header()
+
+    # ── Mutations ──
+
+    def _apply_put(self, vector_id: str, slot: int, metadata: dict) -> None:
+        self.ids[slot] = vector_id
+        self.metadata[slot] = metadata
+        self.valid[slot] = True
+        self.slot_of[vector_id] = slot
+
+    def _apply_delete(self, vector_id: str) -> Optional[int]:
+        slot = self.slot_of.pop(vector_id, None)
+        if slot is not None:
+            self.ids[slot] = None
+            self.metadata[slot] = None
+            self.valid[slot] = False
+        return slot
+
+    def _append_log(self, ops: list[dict]) -> None:
+        with open(self.path / "meta.jsonl", "a", encoding="utf-8") as f:
+            for op in ops:
+                f.write(json.dumps(op, ensure_ascii=False) + "\n")
+        self.log_ops += len(ops)
+
+    def upsert(self, vectors: list[dict]) -> int:
+        with self.lock:
+            if self.dim is None:
+                self._init(len(vectors[0]["values"]))
+
+            # A repeated id keeps its last occurrence (one slot per id)
+            vectors = list({v["id"]: v for v in vectors}.values())
+            matrix = np.asarray([v["values"] for v in vectors], dtype=np.float32)
+            if matrix.shape[1] != self.dim:
+                raise ValueError(f"Vector dimension {matrix.shape[1]} does not match namespace dimension {self.dim}")
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            matrix /= np.where(norms == 0, 1, norms)
+
+            slots = []
+            new_rows = sum(1 for v in vectors if v["id"] not in self.slot_of) - len(self.free)
+            if new_rows > 0:
+                self._grow(self.size + new_rows)
+            for v in vectors:
+                slot = self.slot_of.get(v["id"])
+                if slot is None:
+                    if self.free:
+                        slot = self.free.pop()
+                    else:
+                        slot = self.size
+                        self.size += 1
+                slots.append(slot)
+
+            slots_arr = np.asarray(slots)
+            if self.quantize:
+                scale = np.abs(matrix).max(axis=1) / 127.0
+                scale[scale == 0] = 1.0
+                self.vectors[slots_arr] = np.round(matrix / scale[:, None]).astype(np.int8)
+                self.scales[slots_arr] = scale
+                self.scales.flush()
+            else:
+                self.vectors[slots_arr] = matrix
+            self.vectors.flush()
+
+            ops = []
+            for v, slot in zip(vectors, slots):
+                self._apply_put(v["id"], slot, v.get("metadata") or {})
+                ops.append({"op": "put", "id": v["id"], "slot": slot, "metadata": v.get("metadata") or {}})
+            self._append_log(ops)
+            self._write_header()
+
+            if self.building:
+                self.touched.update(slots)
+            if self.graph is not None:
+                for slot in slots:
+                    try:
+                        self.graph.unmark_deleted(slot)
+                    except RuntimeError:
+                        pass
+                self.graph.add_items(matrix, slots_arr)
+            self._maybe_compact()
+            return len(vectors)
+
+    def delete(self, ids: Optional[list[str]] = None, delete_all: bool = False) -> None:
+        with self.lock:
+            if delete_all:
+                self._reset()
+                for name in ("vectors.f32", "vectors.i8", "scales.f32", "meta.jsonl", "header.json", "hnsw.bin"):
+                    (self.path / name).unlink(missing_ok=True)
+                return
+
+            ops = []
+            for vector_id in ids or []:
+                slot = self._apply_delete(vector_id)
+                if slot is None:
+                    continue
+                self.free.append(slot)
+                ops.append({"op": "del", "id": vector_id})
+                if self.building:
+                    self.touched.add(slot)
+                if self.graph is not None:
+                    self.graph.mark_deleted(slot)
+            if ops:
+                self._append_log(ops)
+                self._maybe_compact()
+
+    def _maybe_compact(self) -> None:
+        """Rewrite the metadata log once it is mostly superseded entries."""
+        live = len(self.slot_of)
+        if self.log_ops <= max(1000, 4 * live):
+            return
+        tmp = self.path / "meta.jsonl.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            for vector_id, slot in self.slot_of.items():
+                f.write(json.dumps({"op": "put", "id": vector_id, "slot": slot, "metadata": self.metadata[slot]},
+                                   ensure_ascii=False) + "\n")
+        os.replace(tmp, self.path / "meta.jsonl")
+        self.log_ops = live
+        self.graph_ops = -1  # graph file no longer matches the log
+        self._write_header()
+
+    # ── Search ──
+
+    def _dense_rows(self, start: int, stop: int) -> np.ndarray:
+        block = self.vectors[start:stop]
+        if self.quantize:
+            return block.astype(np.float32) * self.scales[start:stop, None]
+        return block
+
+    def start_graph_build(self) -> None:
+        """Build the HNSW graph on a background thread (caller holds the lock)."""
+        if self.building or self.graph is not None:
+            return
+        self.building = True
+        self.touched = set()
+        threading.Thread(target=self._build_graph, name=f"hnsw-{self.path.name}", daemon=True).start()
+
+    def _build_graph(self) -> None:
+        try:
+            with self.lock:
+                live = np.flatnonzero(self.valid[:self.size])
+                vectors, scales, capacity = self.vectors, self.scales, self.capacity
+                generation = self.generation
+            # Rows are read without the lock; slots written or freed meanwhile are
+            # recorded in `touched` and redone below
+            graph = hnswlib.Index(space="ip", dim=self.dim)
+            graph.init_index(max_elements=capacity, ef_construction=200, M=settings.local_vector_hnsw_m)
+            for start in range(0, len(live), SEARCH_BLOCK_ROWS):
+                rows = live[start:start + SEARCH_BLOCK_ROWS]
+                dense = vectors[rows].astype(np.float32)
+                if self.quantize:
+                    dense *= scales[rows, None]
+                graph.add_items(dense, rows)
+
+            with self.lock:
+                if self.generation != generation:
+                    return  # namespace was wiped meanwhile
+                if self.capacity > capacity:
+                    graph.resize_index(self.capacity)
+                built = set(live.tolist())
+                for slot in sorted(self.touched):
+                    if self.valid[slot]:
+                        if slot in built:
+                            try:
+                                graph.unmark_deleted(slot)
+                            except RuntimeError:
+                                pass
+                        graph.add_items(self._dense_rows(slot, slot + 1), np.asarray([slot]))
+                    elif slot in built:
+                        graph.mark_deleted(slot)
+                self.graph = graph
+                self.building = False
+                self.touched = set()
+                logger.info("local_vector_graph_built", namespace=self.path.name, vectors=len(live))
+                self.persist_graph()
+        except Exception as e:
+            with self.lock:
+                self.building = False
+            logger.error("local_vector_graph_build_failed", namespace=self.path.name, error=str(e))
+
+    def persist_graph(self) -> None:
+        with self.lock:
+            if self.graph is not None:
+                self.graph.save_index(str(self.path / "hnsw.bin"))
+                self.graph_ops = self.log_ops
+                self._write_header()
+
+    def query(self, vector: list[float], top_k: int, flt: Optional[dict]) -> list[dict]:
+        with self.lock:
+            live = len(self.slot_of)
+            if not live:
+                return []
+            q = np.asarray(vector, dtype=np.float32)
+            q /= (np.linalg.norm(q) or 1.0)
+
+            use_graph = has_hnswlib and live >= settings.local_vector_hnsw_threshold
+            if use_graph and self.graph is None:
+                self.start_graph_build()
+            if use_graph and self.graph is not None:
+                k = min(live, top_k * 10 if flt else top_k)
+                self.graph.set_ef(max(settings.local_vector_hnsw_ef, k))
+                labels, distances = self.graph.knn_query(q, k=k)
+                candidates = zip(labels[0].tolist(), (1.0 - distances[0]).tolist())
+            else:
+                scores = np.empty(self.size, dtype=np.float32)
+                for start in range(0, self.size, SEARCH_BLOCK_ROWS):
+                    stop = min(self.size, start + SEARCH_BLOCK_ROWS)
+                    scores[start:stop] = self._dense_rows(start, stop) @ q
+                scores[~self.valid[:self.size]] = -np.inf
+                k = min(live, top_k if not flt else live)
+                top = np.argpartition(-scores, k - 1)[:k]
+                top = top[np.argsort(-scores[top])]
+                candidates = zip(top.tolist(), scores[top].tolist())
+
+            results = []
+            for slot, score in candidates:
+                if not self.valid[slot] or not _matches_filter(self.metadata[slot], flt):
+                    continue
+                results.append({"id": self.ids[slot], "score": float(score), "metadata": self.metadata[slot]})
+                if len(results) == top_k:
+                    break
+            return results
+
+
+class LocalVectorStore(VectorStore):
+    """VectorStore over per-tenant memory-mapped NumPy files on local disk."""
+
+    def __init__(self, root: str, quantize: bool = False, max_workers: int = 4):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.quantize = quantize
+        self._namespaces: dict[str, _Namespace] = {}
+        self._ns_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="local-vectors")
+
+    def _namespace(self, namespace: str) -> _Namespace:
+        with self._ns_lock:
+            ns = self._namespaces.get(namespace)
+            if ns is None:
+                safe = re.sub(r"[^A-Za-z0-9_.-]", "_", namespace)
+                ns = _Namespace(self.root / safe, self.quantize)
+                self._namespaces[namespace] = ns
+            return ns
+
+    async def _run(self, fn, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(fn, *args, **kwargs))
+
+    async def query(self, namespace, vector, top_k, filter=None):
+        return await self._run(lambda: self._namespace(namespace).query(vector, top_k, filter))
+
+    async def upsert(self, namespace, vectors):
+        if not vectors:
+            return 0
+        return await self._run(lambda: self._namespace(namespace).upsert(vectors))
+
+    async def delete(self, namespace, ids=None, delete_all=False):
+        await self._run(lambda: self._namespace(namespace).delete(ids, delete_all))
+
+    async def list_ids(self, namespace, prefix=None, page_size: int = 1000):
+        ns = self._namespace(namespace)
+        with ns.lock:
+            ids = [i for i in ns.slot_of if prefix is None or i.startswith(prefix)]
+        for start in range(0, len(ids), page_size):
+            yield ids[start:start + page_size]
+
+    async def fetch_metadata(self, namespace, ids):
+        ns = self._namespace(namespace)
+        with ns.lock:
+            return {i: dict(ns.metadata[ns.slot_of[i]] or {}) for i in ids if i in ns.slot_of}
+
+    async def close(self) -> None:
+        for ns in list(self._namespaces.values()):
+            ns.persist_graph()
+        self._executor.shutdown(wait=True)
@@ -3,13 +3,20 @@ InstaTG Agent — Pinecone RAG Search
 
 Vector search for tenant knowledge bases using Pinecone.
 Embeds queries with OpenAI text-embedding-3-small.
+Index calls go through the async VectorStore (see vector_store.py); a
+per-tenant BM25 index (lexical_index.py) is queried alongside and fused in,
+and the over-fetched candidates are rescored by reranker.py.
 """
 
+import asyncio
 import structlog
 from typing import Optional
 
 from pinecone import Pinecone
 from app.llms.provider import get_embedding
+from app.knowledge.vector_store import get_vector_store
+from app.knowledge.lexical_index import lexical_index, tokenize
+from app.knowledge.reranker import rerank
 
 from app.config import settings
 
@@ -31,65 +38,72 @@ def get_pinecone_index():
     return _pinecone_index
 
 
-async def get_embedding(text: str) -> list[float]:
-    """Generate embedding for text using OpenAI."""
-    client = openai.AsyncOpenAI(api_key=settings.openai_api_key)
-
-    response = await client.embeddings.create(
-        model=settings.embedding_model,
-        input=text,
-    )
-
-    return response.data[0].embedding
-
-
 async def rag_search(
     tenant_id: str,
     query: str,
     top_k: int = 5,
     score_threshold: float = 0.3,
+    token_budget: Optional[int] = None,
 ) -> list[dict]:
     """
     Search tenant knowledge base for relevant content.
-    
+
+    Vector and BM25 (lexical) searches run concurrently and are merged with
+    reciprocal rank fusion, so exact product names, SKUs and prices surface
+    even when their embeddings are not close to the query.
+
+    With reranking enabled, top_k × rerank_overfetch candidates are fetched
+    and the local reranker keeps the best (and least redundant) of them that
+    fit the prompt token budget — often fewer than top_k.
+
     Args:
         tenant_id: Business tenant identifier (used as Pinecone namespace)
         query: User question or message
         top_k: Number of results to return
-        score_threshold: Minimum similarity score
-    
+        score_threshold: Minimum similarity score for vector-only matches
+        token_budget: Prompt tokens the returned chunks may use
+            (default: settings.rag_context_token_budget)
+
     Returns:
         List of dicts with 'text', 'score', and 'metadata' keys
     """
     try:
-        # Generate query embedding
-        query_embedding = await get_embedding(query)
-
-        # Search Pinecone with tenant namespace
-        index = get_pinecone_index()
-        results = index.query(
-            vector=query_embedding,
-            top_k=top_k,
-            namespace=str(tenant_id),
-            include_metadata=True,
-        )
-
-        # Filter by score threshold and format results
-        matches = []
-        for match in results.get("matches", []):
-            if match["score"] >= score_threshold:
-                matches.append({
-                    "text": match["metadata"].get("text", ""),
-                    "score": match["score"],
-                    "source": match["metadata"].get("source", "unknown"),
-                    "chunk_index": match["metadata"].get("chunk_index", 0),
-                    "metadata": match["metadata"],
-                })
+        fetch_k = top_k * settings.rerank_overfetch if settings.rerank_enabled else top_k
+        if not settings.hybrid_search_enabled:
+            matches = await _vector_search(tenant_id, query, fetch_k, score_threshold)
+        else:
+            candidates = max(fetch_k, settings.hybrid_candidates)
+            vector_result, lexical_result = await asyncio.gather(
+                _vector_search(tenant_id, query, candidates, score_threshold),
+                lexical_index.search(tenant_id, query, top_k=candidates),
+                return_exceptions=True,
+            )
+            if isinstance(vector_result, BaseException) and isinstance(lexical_result, BaseException):
+                raise vector_result
+            if isinstance(vector_result, BaseException):
+                logger.warning("rag_vector_search_failed", error=str(vector_result), tenant=tenant_id)
+                vector_result = []
+            if isinstance(lexical_result, BaseException):
+                logger.warning("rag_lexical_search_failed", error=str(lexical_result), tenant=tenant_id)
+                lexical_result = []
+            matches = reciprocal_rank_fusion(
+                vector_result,
+                lexical_result,
+                query,
+                k=settings.hybrid_rrf_k,
+                min_coverage=settings.hybrid_lexical_min_coverage,
+            )[:fetch_k]
+
+        candidate_count = len(matches)
+        if settings.rerank_enabled:
+            budget = token_budget if token_budget is not None else settings.rag_context_token_budget
+            matches = rerank(query, matches, top_k=top_k, token_budget=budget)
 
         logger.info(
             "rag_search_completed",
             tenant=tenant_id,
             query_length=len(query),
+            candidates=candidate_count,
             results_count=len(matches),
             top_score=matches[0]["score"] if matches else 0,
         )
@@ -101,6 +115,87 @@ async def rag_search(
         return []
 
 
+async def _vector_search(tenant_id: str, query: str, top_k: int, score_threshold: float) -> list[dict]:
+    # Generate query embedding
+    query_embedding = await get_embedding(query)
+
+    # Search the vector store with tenant namespace (off the event loop)
+    results = await get_vector_store().query(
+        namespace=str(tenant_id),
+        vector=query_embedding,
+        top_k=top_k,
+    )
+
+    # Filter by score threshold and format results
+    matches = []
+    for match in results:
+        if match["score"] >= score_threshold:
+            matches.append({
+                "id": match["id"],
+                "text": match["metadata"].get("text", ""),
+                "score": match["score"],
+                "source": match["metadata"].get("source", "unknown"),
+                "chunk_index": match["metadata"].get("chunk_index", 0),
+                "metadata": match["metadata"],
+            })
+    return matches
+
+
+def query_coverage(query: str, text: str) -> float:
+    """Share of the query's words that occur in text (any tokenized form of a word counts)."""
+    words = [forms for forms in (set(tokenize(word)) for word in query.split()) if forms]
+    if not words:
+        return 0.0
+    text_terms = set(tokenize(text))
+    return sum(1 for forms in words if forms & text_terms) / len(words)
+
+
+def reciprocal_rank_fusion(
+    vector_matches: list[dict],
+    lexical_matches: list[dict],
+    query: str,
+    k: int = 60,
+    min_coverage: float = 0.6,
+) -> list[dict]:
+    """
+    Merge two rankings by sum of 1 / (k + rank). Vector matches keep their
+    cosine score. A lexical-only match has no similarity score, so it is only
+    admitted when it contains at least `min_coverage` of the query's words,
+    and its 'score' is that coverage. BM25 scores are relative to the corpus
+    and would let the best of a set of unrelated hits look like a perfect match.
+    """
+    fused: dict[str, dict] = {}
+    rrf: dict[str, float] = {}
+
+    for rank, match in enumerate(vector_matches, 1):
+        fused[match["id"]] = dict(match)
+        rrf[match["id"]] = 1.0 / (k + rank)
+
+    for rank, match in enumerate(lexical_matches, 1):
+        match_id = match["id"]
+        coverage = query_coverage(query, match["text"])
+        if match_id in fused:
+            rrf[match_id] += 1.0 / (k + rank)
+            fused[match_id]["lexical_score"] = coverage
+            continue
+        if coverage < min_coverage:
+            continue
+        rrf[match_id] = 1.0 / (k + rank)
+        metadata = match.get("metadata") or {}
+        fused[match_id] = {
+            "id": match_id,
+            "text": match["text"],
+            "score": coverage,
+            "lexical_score": coverage,
+            "source": metadata.get("source", "unknown"),
+            "chunk_index": metadata.get("chunk_index", 0),
+            "metadata": {**metadata, "text": match["text"]},
+        }
+
+    ordered = sorted(fused, key=lambda match_id: rrf[match_id], reverse=True)
+    return [{**fused[match_id], "rrf_score": rrf[match_id]} for match_id in ordered]
+
+
 async def upsert_vectors(
     tenant_id: str,
     vectors: list[dict],
@@ -116,24 +211,8 @@ async def upsert_vectors(
         Number of vectors upserted
     """
     try:
-        index = get_pinecone_index()
-
-        # Batch upsert (Pinecone recommends batches of 100)
-        batch_size = 100
-        total_upserted = 0
-
-        for i in range(0, len(vectors), batch_size):
-            batch = vectors[i:i + batch_size]
-            pinecone_vectors = [
-                {
-                    "id": v["id"],
-                    "values": v["values"],
-                    "metadata": v["metadata"],
-                }
-                for v in batch
-            ]
-            index.upsert(vectors=pinecone_vectors, namespace=str(tenant_id))
-            total_upserted += len(batch)
+        # Batches of 100 are upserted in parallel by the vector store
+        total_upserted = await get_vector_store().upsert(str(tenant_id), vectors)
 
         logger.info("vectors_upserted", tenant=tenant_id, count=total_upserted)
         return total_upserted
@@ -146,9 +225,22 @@ async def upsert_vectors(
 async def delete_tenant_vectors(tenant_id: str) -> None:
     """Delete all vectors for a tenant namespace."""
     try:
-        index = get_pinecone_index()
-        index.delete(delete_all=True, namespace=str(tenant_id))
+        await get_vector_store().delete(str(tenant_id), delete_all=True)
+        await lexical_index.drop_tenant(tenant_id)
         logger.info("tenant_vectors_deleted", tenant=tenant_id)
     except Exception as e:
         logger.error("vector_delete_error", error=str(e), tenant=tenant_id)
         raise
+
+
+async def delete_vectors(tenant_id: str, vector_ids: list[str]) -> None:
+    """Delete specific vectors from a tenant namespace."""
+    if not vector_ids:
+        return
+    try:
+        await get_vector_store().delete(str(tenant_id), ids=vector_ids)
+        await lexical_index.remove_chunks(tenant_id, vector_ids)
+        logger.info("vectors_deleted", tenant=tenant_id, count=len(vector_ids))
+    except Exception as e:
+        logger.error("vector_delete_error", error=str(e), tenant=tenant_id)
+        raise
@@ -0,0 +1,209 @@
+"""
+InstaTG Agent — Knowledge Vector Reconciliation
+
+Diffs each tenant's chunk registry (`knowledge_base_chunks.vector_id`)
+against the ids actually stored in its vector namespace and repairs drift:
+
+- Unregistered vectors written before the registry existed are adopted into
+  it: positional `{document_id}_{i}` chunks (i < chunk_count) of a live
+  document that has no registry rows yet, manual entries (`manual_{id}`)
+  that still exist, and legacy `ws_` website scrapes.
+- Every other unregistered vector is an orphan (deleted document, crashed
+  ingestion, positional chunks of a document already re-indexed by content
+  hash, drifted chunk counts) and is deleted in batches.
+- Registry rows whose vector is missing and that are older than the grace
+  period are dropped, so lexical search stops returning them.
+
+Ingestion registers chunks before upserting their vectors, so a vector
+listed here without a registry row is never an in-flight upload; ids are
+still re-checked against the registry right before each delete batch.
+Runs daily from Celery beat (celery_worker.reconcile_knowledge_vectors_task).
+"""
+
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+import structlog
+from sqlalchemy import select
+
+from app.config import settings
+
+logger = structlog.get_logger(__name__)
+
+
+async def _registered_ids(tenant_id: str, vector_ids: Optional[list[str]] = None) -> set[str]:
+    """Registered vector ids of a tenant (optionally only among `vector_ids`)."""
+    from app.database import background_session_factory
+    from app.models import KnowledgeBaseChunk
+    from app.knowledge.lexical_index import REGISTRY_BATCH_SIZE
+
+    query = select(KnowledgeBaseChunk.vector_id).where(KnowledgeBaseChunk.tenant_id == uuid.UUID(tenant_id))
+    async with background_session_factory() as db:
+        if vector_ids is None:
+            return {row[0] for row in (await db.execute(query)).all() if row[0]}
+        found: set[str] = set()
+        for start in range(0, len(vector_ids), REGISTRY_BATCH_SIZE):
+            batch = vector_ids[start:start + REGISTRY_BATCH_SIZE]
+            found.update(row[0] for row in (await db.execute(query.where(KnowledgeBaseChunk.vector_id.in_(batch)))).all())
+        return found
+
+
+async def _live_owners(tenant_id: str) -> tuple[dict[str, int], set[str]]:
+    """
+    Chunk counts of the tenant's knowledge documents that have no registry
+    rows yet (pre-registry uploads), and ids of its manual entries.
+    """
+    from app.database import background_session_factory
+    from app.models import KnowledgeBaseChunk, KnowledgeDocument, ManualKnowledge
+
+    tenant_uuid = uuid.UUID(tenant_id)
+    async with background_session_factory() as db:
+        documents = await db.execute(
+            select(KnowledgeDocument.id, KnowledgeDocument.chunk_count).where(KnowledgeDocument.tenant_id == tenant_uuid)
+        )
+        indexed = await db.execute(
+            select(KnowledgeBaseChunk.document_id)
+            .where(KnowledgeBaseChunk.tenant_id == tenant_uuid, KnowledgeBaseChunk.document_id.is_not(None))
+            .distinct()
+        )
+        manual = await db.execute(select(ManualKnowledge.id).where(ManualKnowledge.tenant_id == tenant_uuid))
+        indexed_ids = {str(row[0]) for row in indexed.all()}
+        unindexed = {str(doc_id): count or 0 for doc_id, count in documents.all() if str(doc_id) not in indexed_ids}
+        return unindexed, {str(row[0]) for row in manual.all()}
+
+
+def _legacy_position(vector_id: str, document_id: str) -> Optional[int]:
+    """i of a pre-registry positional id `{document_id}_{i}`, else None."""
+    suffix = vector_id[len(document_id) + 1:] if vector_id.startswith(f"{document_id}_") else ""
+    return int(suffix) if suffix.isdigit() else None
+
+
+async def reconcile_tenant(tenant_id: str, dry_run: bool = False) -> dict:
+    """Reconcile one tenant's registry and vector namespace; returns counts."""
+    from app.database import background_session_factory
+    from app.models import KnowledgeBaseChunk
+    from app.knowledge.lexical_index import lexical_index
+    from app.knowledge.uploader import content_hash
+    from app.knowledge.vector_store import get_vector_store
+
+    tenant_id = str(tenant_id)
+    store = get_vector_store()
+    batch_size = settings.kb_reconcile_batch_size
+    stats = {"vectors": 0, "registered": 0, "adopted": 0, "orphans_deleted": 0, "missing_dropped": 0}
+
+    registered = await _registered_ids(tenant_id)
+    stats["registered"] = len(registered)
+    legacy_documents, manual_entries = await _live_owners(tenant_id)
+    seen: set[str] = set()
+    candidates: list[str] = []
+
+    async def collect(ids: list[str]) -> None:
+        # Re-check against the registry: chunks may have been registered since the snapshot
+        now_registered = await _registered_ids(tenant_id, ids)
+        ids = [i for i in ids if i not in now_registered]
+        if not ids:
+            return
+        metadata = await store.fetch_metadata(tenant_id, ids)
+        adopt, orphans = [], []
+        for vector_id in ids:
+            meta = metadata.get(vector_id)
+            if meta is None:
+                continue  # already gone
+            owner = str(meta.get("document_id") or "")
+            position = _legacy_position(vector_id, owner) if owner in legacy_documents else None
+            if position is not None and position < legacy_documents[owner]:
+                adopt.append((vector_id, meta, owner))
+            elif vector_id.startswith("manual_") and vector_id[len("manual_"):] in manual_entries:
+                adopt.append((vector_id, meta, None))
+            elif owner.startswith("ws_"):
+                # Pre-job website scrapes were never linked to their document row
+                adopt.append((vector_id, meta, None))
+            else:
+                orphans.append(vector_id)
+
+        if dry_run:
+            stats["adopted"] += len(adopt)
+            stats["orphans_deleted"] += len(orphans)
+            return
+        for owner in {owner for _, _, owner in adopt}:
+            group = [(vector_id, meta) for vector_id, meta, o in adopt if o == owner]
+            await lexical_index.add_chunks(
+                tenant_id,
+                [
+                    {
+                        "vector_id": vector_id,
+                        "text": meta.get("text", ""),
+                        "source": meta.get("source"),
+                        "chunk_index": int(meta.get("chunk_index") or 0),
+                        "content_hash": content_hash(meta.get("text", "")),
+                    }
+                    for vector_id, meta in group
+                ],
+                document_id=owner,
+            )
+        stats["adopted"] += len(adopt)
+        if orphans:
+            await store.delete(tenant_id, ids=orphans)
+            stats["orphans_deleted"] += len(orphans)
+
+    async for page in store.list_ids(tenant_id):
+        stats["vectors"] += len(page)
+        seen.update(page)
+        candidates.extend(i for i in page if i not in registered)
+        if len(candidates) >= batch_size:
+            await collect(candidates)
+            candidates = []
+    if candidates:
+        await collect(candidates)
+
+    # Registry rows without a vector, past the window in which an upload may still be upserting
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=settings.kb_reconcile_grace_sec)
+    missing = sorted(registered - seen)
+    stale: list[str] = []
+    async with background_session_factory() as db:
+        for start in range(0, len(missing), batch_size):
+            result = await db.execute(
+                select(KnowledgeBaseChunk.vector_id, KnowledgeBaseChunk.created_at).where(
+                    KnowledgeBaseChunk.tenant_id == uuid.UUID(tenant_id),
+                    KnowledgeBaseChunk.vector_id.in_(missing[start:start + batch_size]),
+                )
+            )
+            for vector_id, created_at in result.all():
+                if created_at is not None and created_at.tzinfo is None:
+                    created_at = created_at.replace(tzinfo=timezone.utc)
+                if created_at is None or created_at < cutoff:
+                    stale.append(vector_id)
+    if stale and not dry_run:
+        for start in range(0, len(stale), batch_size):
+            await lexical_index.remove_chunks(tenant_id, stale[start:start + batch_size])
+    stats["missing_dropped"] = len(stale)
+
+    logger.info("kb_reconcile_completed", tenant=tenant_id, dry_run=dry_run, **stats)
+    return stats
+
+
+async def reconcile_all(dry_run: bool = False) -> dict:
+    """Reconcile every active tenant; one tenant failing doesn't stop the rest."""
+    from app.database import background_session_factory
+    from app.models import Tenant
+
+    async with background_session_factory() as db:
+        result = await db.execute(select(Tenant.id).where(Tenant.is_active == True))
+        tenant_ids = [str(row[0]) for row in result.all()]
+
+    totals = {"tenants": 0, "failed": 0, "adopted": 0, "orphans_deleted": 0, "missing_dropped": 0}
+    for tenant_id in tenant_ids:
+        try:
+            stats = await reconcile_tenant(tenant_id, dry_run=dry_run)
+        except NotImplementedError as e:
+            logger.warning("kb_reconcile_unsupported", error=str(e))
+            break
+        except Exception as e:
+            totals["failed"] += 1
+            logger.error("kb_reconcile_failed", tenant=tenant_id, error=str(e))
+            continue
+        totals["tenants"] += 1
+        for key in ("adopted", "orphans_deleted", "missing_dropped"):
+            totals[key] += stats[key]
+    return totals
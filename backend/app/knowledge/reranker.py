@@ -0,0 +1,127 @@
+"""
+InstaTG Agent — Retrieval Reranker
+
+Second retrieval stage: rag_search over-fetches candidates (top_k × N) and
+this module rescores them locally before anything reaches the prompt.
+
+Relevance = first-stage score (cosine / query-word coverage for BM25-only hits)
+          + lexical overlap with the query
+          + recency boost (exponential decay on indexed_at)
+          + boost for manual Q&A / objection entries.
+
+Selection is greedy MMR over term-vector cosine similarity, so five
+paraphrases of the same paragraph don't crowd out everything else; the
+selected chunks are then trimmed to a prompt token budget. All scoring is
+vectorised with NumPy — a few hundred microseconds for 20–40 candidates.
+"""
+
+import math
+import time
+from typing import Optional
+
+import numpy as np
+
+from app.config import settings
+from app.knowledge.lexical_index import tokenize
+
+# Rough chars-per-token for the mixed Uzbek / Russian / English KB content
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // CHARS_PER_TOKEN)
+
+
+def _term_matrix(term_sets: list[set[str]]) -> tuple[np.ndarray, dict[str, int]]:
+    vocab: dict[str, int] = {}
+    for terms in term_sets:
+        for term in terms:
+            vocab.setdefault(term, len(vocab))
+    matrix = np.zeros((len(term_sets), max(len(vocab), 1)), dtype=np.float32)
+    for row, terms in enumerate(term_sets):
+        if terms:
+            matrix[row, [vocab[term] for term in terms]] = 1.0
+    return matrix, vocab
+
+
+def _is_manual(candidate: dict) -> bool:
+    metadata = candidate.get("metadata") or {}
+    return bool(metadata.get("is_manual")) or str(candidate.get("id", "")).startswith("manual_")
+
+
+def rerank(
+    query: str,
+    candidates: list[dict],
+    top_k: int = 5,
+    token_budget: Optional[int] = None,
+    now: Optional[float] = None,
+) -> list[dict]:
+    """
+    Pick the best `top_k` candidates for the prompt.
+
+    Candidates are rag_search match dicts ('text', 'score', 'metadata', ...);
+    the returned dicts gain a 'rerank_score'. Chunks below
+    `rerank_min_relative_score` of the best one are dropped, and chunks that
+    no longer fit `token_budget` are skipped (the first is truncated instead).
+    """
+    if not candidates:
+        return []
+    now = now or time.time()
+
+    term_sets = [set(tokenize(c.get("text", ""))) for c in candidates]
+    matrix, vocab = _term_matrix(term_sets)
+
+    query_terms = {term for term in tokenize(query) if term in vocab}
+    query_vector = np.zeros(matrix.shape[1], dtype=np.float32)
+    if query_terms:
+        query_vector[[vocab[term] for term in query_terms]] = 1.0
+    overlap = matrix @ query_vector / max(len(set(tokenize(query))), 1)
+
+    base = np.array([float(c.get("score") or 0.0) for c in candidates], dtype=np.float32)
+    indexed_at = np.array(
+        [float((c.get("metadata") or {}).get("indexed_at") or 0) for c in candidates], dtype=np.float64
+    )
+    age_days = np.maximum(now - indexed_at, 0.0) / 86400.0
+    half_life = max(settings.rerank_recency_half_life_days, 1e-6)
+    recency = np.where(indexed_at > 0, np.exp(-math.log(2) * age_days / half_life), 0.0)
+    manual = np.array([_is_manual(c) for c in candidates], dtype=np.float32)
+
+    relevance = (
+        base
+        + settings.rerank_lexical_weight * overlap
+        + settings.rerank_recency_weight * recency
+        + settings.rerank_manual_boost * manual
+    ).astype(np.float32)
+
+    # Cosine similarity between binary term vectors, for the MMR redundancy penalty
+    norms = np.sqrt(matrix.sum(axis=1))
+    norms[norms == 0] = 1.0
+    unit = matrix / norms[:, None]
+    similarity = unit @ unit.T
+
+    lam = settings.rerank_mmr_lambda
+    remaining = np.ones(len(candidates), dtype=bool)
+    max_similarity = np.zeros(len(candidates), dtype=np.float32)
+    selected: list[int] = []
+    while len(selected) < top_k and remaining.any():
+        mmr = np.where(remaining, lam * relevance - (1 - lam) * max_similarity, -np.inf)
+        best = int(np.argmax(mmr))
+        if selected and relevance[best] < settings.rerank_min_relative_score * relevance[selected[0]]:
+            break
+        selected.append(best)
+        remaining[best] = False
+        max_similarity = np.maximum(max_similarity, similarity[best])
+
+    results: list[dict] = []
+    used = 0
+    for idx in selected:
+        candidate = {**candidates[idx], "rerank_score": float(relevance[idx])}
+        cost = estimate_tokens(candidate.get("text", ""))
+        if token_budget and used + cost > token_budget:
+            if results:
+                continue
+            candidate["text"] = candidate["text"][: token_budget * CHARS_PER_TOKEN]
+            cost = token_budget
+        results.append(candidate)
+        used += cost
+    return results
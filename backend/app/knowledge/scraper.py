@@ -1,7 +1,8 @@
 import httpx
 import structlog
-from bs4 import BeautifulSoup
-from typing import List, Dict
+from typing import List, Dict, Optional
+from app.config import settings
+from app.knowledge.crawler import SiteCrawler, html_to_text
 from app.knowledge.rag import get_pinecone_index
 from app.knowledge.uploader import ingest_document
 
@@ -13,7 +14,13 @@ class WebScraper:
     Optimized for parsing business pages, FAQs, and service descriptions.
     """
     
-    async def scrape_and_ingest(self, tenant_id: str, url: str) -> Dict[str, any]:
+    async def scrape_and_ingest(
+        self,
+        tenant_id: str,
+        url: str,
+        document_id: Optional[str] = None,
+        progress=None,
+    ) -> Dict[str, any]:
         logger.info("web_scrape_starting", tenant=tenant_id, url=url)
         
         try:
@@ -21,25 +28,15 @@ class WebScraper:
                 response = await client.get(url, follow_redirects=True)
                 response.raise_for_status()
                 
-                soup = BeautifulSoup(response.text, 'html.parser')
-                
-                # Remove script and style elements
-                for script_or_style in soup(["script", "style", "nav", "footer"]):
-                    script_or_style.decompose()
-
-                # Extract meaningful text
-                text_content = soup.get_text(separator='\n')
-                # Clean up whitespace
-                lines = (line.strip() for line in text_content.splitlines())
-                chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-                text = '\n'.join(chunk for chunk in chunks if chunk)
+                text, _ = html_to_text(response.text, str(response.url))
 
                 # Ingest as a virtual document
                 result = await ingest_document(
                     tenant_id=tenant_id,
                     file_data=text.encode('utf-8'),
                     filename=f"scraped_{url.replace('://', '_').replace('/', '_')}.txt",
-                    document_id=f"ws_{tenant_id}_{hash(url)}"
+                    document_id=document_id or f"ws_{tenant_id}_{hash(url)}",
+                    progress=progress,
                 )
                 
                 logger.info("web_scrape_completed", tenant=tenant_id, url=url, chunks=result.get("chunk_count"))
@@ -53,4 +50,37 @@ class WebScraper:
             logger.error("web_scrape_error", error=str(e), url=url)
             return {"status": "error", "message": str(e)}
 
+    async def crawl_and_ingest(
+        self,
+        tenant_id: str,
+        url: str,
+        document_id: str,
+        max_pages: Optional[int] = None,
+        progress=None,
+    ) -> Dict[str, any]:
+        """Crawl a whole site (sitemap + same-domain links) into one document."""
+        from app.knowledge.lexical_index import lexical_index
+
+        logger.info("web_crawl_starting", tenant=tenant_id, url=url)
+        crawler = SiteCrawler(
+            tenant_id,
+            url,
+            document_id,
+            max_pages=max_pages or settings.crawl_max_pages,
+            max_depth=settings.crawl_max_depth,
+            concurrency=settings.crawl_concurrency,
+            per_host_concurrency=settings.crawl_per_host_concurrency,
+            host_delay=settings.crawl_host_delay_sec,
+            batch_pages=settings.crawl_batch_pages,
+            progress=progress,
+        )
+        try:
+            stats = await crawler.run()
+        except Exception as e:
+            logger.error("web_crawl_error", error=str(e), url=url)
+            return {"status": "error", "message": str(e)}
+
+        chunks = await lexical_index.document_chunks(tenant_id, document_id)
+        return {"status": "success", "url": url, "chunks": len(chunks), **stats}
+
 scraper = WebScraper()
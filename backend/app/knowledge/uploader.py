@@ -5,60 +5,40 @@ Ingests documents (PDF, TXT, DOCX) into Pinecone vectors.
 Chunks text, generates embeddings, and stores per-tenant namespace.
 """
 
+import asyncio
+import hashlib
+import time
 import uuid
+from collections import deque
 import structlog
-from typing import Optional
+from typing import Awaitable, Callable, Iterator, Optional
 
 import PyPDF2
 import docx
 import io
 
 from app.config import settings
-from app.llms.provider import get_embedding
-from app.knowledge.rag import upsert_vectors
+from app.llms.provider import get_embeddings
+from app.knowledge.rag import upsert_vectors, delete_vectors
+from app.knowledge.lexical_index import lexical_index, is_uuid
+from app.knowledge.chunker import iter_chunks
 
 logger = structlog.get_logger(__name__)
 
-# Chunking parameters
-CHUNK_SIZE = 1000
-CHUNK_OVERLAP = 200
 
-
-def chunk_text(text: str, chunk_size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP) -> list[str]:
+def chunk_text(text: str, max_tokens: Optional[int] = None, overlap_tokens: Optional[int] = None) -> Iterator[str]:
     """
-    Split text into overlapping chunks for embedding.
-    
+    Split text into overlapping, sentence-aligned chunks for embedding.
+
     Args:
         text: Full document text
-        chunk_size: Maximum characters per chunk
-        overlap: Number of overlapping characters between chunks
-    
+        max_tokens: Target tokens per chunk (default: settings.chunk_max_tokens)
+        overlap_tokens: Tokens of whole sentences repeated between chunks
+
     Returns:
-        List of text chunks
+        Generator of text chunks (see chunker.py)
     """
-    if len(text) <= chunk_size:
-        return [text]
-
-    chunks = []
-    start = 0
-    while start < len(text):
-        end = start + chunk_size
-
-        # Try to break at sentence boundary
-        if end < len(text):
-            last_period = text.rfind(".", start, end)
-            last_newline = text.rfind("\n", start, end)
-            break_point = max(last_period, last_newline)
-            if break_point > start + chunk_size // 2:
-                end = break_point + 1
-
-        chunk = text[start:end].strip()
-        if chunk:
-            chunks.append(chunk)
-
-        start = end - overlap
-
-    return chunks
+    return iter_chunks(text, max_tokens=max_tokens, overlap_tokens=overlap_tokens)
 
 
 def extract_text_from_pdf(file_data: bytes) -> str:
@@ -129,74 +109,295 @@ def extract_text(file_data: bytes, filename: str) -> str:
     return extractor(file_data)
 
 
+async def extract_text_async(
+    file_data: bytes,
+    filename: str,
+    max_chars: Optional[int] = None,
+    on_page: Optional[Callable[[int], Awaitable[None]]] = None,
+) -> str:
+    """
+    Like extract_text, but PDF/DOCX parsing runs in the extraction process pool
+    so the event loop stays responsive. With max_chars, PDF extraction stops
+    once enough text has been streamed back; on_page receives the number of
+    pages parsed so far.
+    """
+    from app.knowledge.extraction_pool import extraction_pool, ExtractionTimeout
+
+    ext = filename.lower().rsplit(".", 1)[-1] if "." in filename else ""
+    try:
+        if ext == "pdf":
+            parts, length, pages = [], 0, 0
+            async for page_text in extraction_pool.pdf_pages(file_data):
+                pages += 1
+                if on_page:
+                    await on_page(pages)
+                if page_text:
+                    parts.append(page_text)
+                    length += len(page_text)
+                if max_chars and length >= max_chars:
+                    break
+            return "\n\n".join(parts)
+        if ext in ("docx", "doc"):
+            return await extraction_pool.docx_text(file_data)
+    except ExtractionTimeout as e:
+        logger.error("document_extraction_timeout", filename=filename, error=str(e))
+        raise
+    except ValueError:
+        raise
+    except Exception as e:
+        logger.error(f"{ext}_extraction_error", error=str(e))
+        raise ValueError(f"Failed to extract text from {ext.upper()}: {e}")
+
+    return extract_text(file_data, filename)
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+ProgressCallback = Callable[[str, dict], Awaitable[None]]
+
+
+async def _report(progress: Optional[ProgressCallback], stage: str, **counters) -> None:
+    if progress:
+        await progress(stage, counters)
+
+
 async def ingest_document(
     tenant_id: str,
     file_data: bytes,
     filename: str,
     document_id: Optional[str] = None,
+    legacy_chunk_count: int = 0,
+    progress: Optional[ProgressCallback] = None,
 ) -> dict:
     """
     Full ingestion pipeline: extract text → chunk → embed → store in Pinecone.
-    
+
     Args:
         tenant_id: Business tenant identifier
         file_data: Raw file bytes
         filename: Original filename (for format detection)
         document_id: Optional document ID for tracking
-    
+        legacy_chunk_count: See ingest_text
+        progress: Optional async callback(stage, counters) for job progress
+
+    Returns:
+        Dict with ingestion results (chunk_count, document_id)
+    """
+    logger.info("ingestion_started", tenant=tenant_id, filename=filename)
+    try:
+        await _report(progress, "extracting", pages_parsed=0)
+
+        async def on_page(pages: int) -> None:
+            await _report(progress, "extracting", pages_parsed=pages)
+
+        text = await extract_text_async(file_data, filename, on_page=on_page)
+    except Exception as e:
+        logger.error("ingestion_error", error=str(e), tenant=tenant_id, filename=filename)
+        raise
+
+    return await ingest_text(
+        tenant_id,
+        text,
+        filename,
+        document_id=document_id,
+        legacy_chunk_count=legacy_chunk_count,
+        progress=progress,
+    )
+
+
+async def ingest_text(
+    tenant_id: str,
+    text: str,
+    filename: str,
+    document_id: Optional[str] = None,
+    legacy_chunk_count: int = 0,
+    progress: Optional[ProgressCallback] = None,
+) -> dict:
+    """
+    Chunk → embed → upsert already-extracted text.
+
+    Re-ingesting an existing document is a diff: chunks are identified by
+    content hash, so only new or edited chunks are embedded and upserted and
+    only chunks that vanished are deleted.
+
+    Args:
+        legacy_chunk_count: Chunk count of a previous version indexed before
+            chunk hashes were recorded; its positional vectors are replaced
+
     Returns:
         Dict with ingestion results (chunk_count, document_id)
     """
     doc_id = document_id or str(uuid.uuid4())
+    if not text.strip():
+        logger.error("ingestion_error", error="No text content found in document", tenant=tenant_id, filename=filename)
+        raise ValueError("No text content found in document")
+
+    result = await ingest_pages(
+        tenant_id,
+        [{"text": text, "source": filename, "prefix": doc_id}],
+        document_id=doc_id,
+        diff=document_id is not None,
+        legacy_chunk_count=legacy_chunk_count,
+        progress=progress,
+    )
+    return {
+        "document_id": doc_id,
+        "filename": filename,
+        "text_length": len(text),
+        **result,
+    }
+
+
+async def ingest_pages(
+    tenant_id: str,
+    pages: list[dict],
+    document_id: str,
+    diff: bool = True,
+    legacy_chunk_count: int = 0,
+    progress: Optional[ProgressCallback] = None,
+) -> dict:
+    """
+    Ingest several texts ({'text', 'source', 'prefix'}) of one document in a
+    single embed/upsert batch. Each page is diffed independently against the
+    chunks registered under its vector-id prefix (a document, or one page of
+    a crawled site), so edits to one page never touch another's vectors.
+    """
+    group = settings.embedding_batch_size * settings.embedding_batch_concurrency
+    batch_size = max(1, settings.embedding_batch_size)
+    in_flight = max(1, settings.embedding_batch_concurrency)
+    embedding_tasks: deque[asyncio.Task] = deque()
+    embeddings: list[list[float]] = []
+
+    async def start_embedding(texts: list[str]) -> None:
+        if len(embedding_tasks) >= in_flight:
+            embeddings.extend(await embedding_tasks.popleft())
+        embedding_tasks.append(asyncio.create_task(get_embeddings(texts)))
 
     try:
-        # 1. Extract text
-        logger.info("ingestion_started", tenant=tenant_id, filename=filename)
-        text = extract_text(file_data, filename)
+        # 1. Chunk text (streamed) and diff against what is already indexed.
+        #    Each full batch of new chunks starts embedding while chunking continues;
+        #    at most EMBEDDING_BATCH_CONCURRENCY batches are in flight, so chunking
+        #    waits on the oldest one instead of queueing requests for the whole document.
+        planned = []  # (page, chunk count, {hash: (chunk index, text)}, existing {hash: vector_id})
+        new_chunks: list[tuple[dict, str, str, int]] = []  # (page, hash, text, index)
+        pending: list[str] = []
+        vanished: list[str] = []
+        for page in pages:
+            existing = await lexical_index.document_chunks(tenant_id, page["prefix"]) if diff else {}
+            unique: dict[str, tuple[int, str]] = {}  # hash -> (chunk index, text) of first occurrence
+            count = 0
+            for i, chunk in enumerate(chunk_text(page["text"]) if page["text"].strip() else ()):
+                count += 1
+                chunk_hash = content_hash(chunk)
+                if chunk_hash in unique:
+                    continue
+                unique[chunk_hash] = (i, chunk)
+                if chunk_hash not in existing:
+                    new_chunks.append((page, chunk_hash, chunk, i))
+                    pending.append(chunk)
+                    if len(pending) >= batch_size:
+                        await start_embedding(pending)
+                        pending = []
+            vanished.extend(vector_id for h, vector_id in existing.items() if h not in unique)
+            if not existing and legacy_chunk_count:
+                vanished.extend(f"{page['prefix']}_{i}" for i in range(legacy_chunk_count))
+            planned.append((page, count, unique, existing))
+        if pending:
+            await start_embedding(pending)
+
+        chunk_count = sum(count for _, count, _, _ in planned)
+        unique_count = sum(len(unique) for _, _, unique, _ in planned)
+        logger.info(
+            "text_chunked",
+            tenant=tenant_id,
+            pages=len(pages),
+            chunk_count=chunk_count,
+            new=len(new_chunks),
+            unchanged=unique_count - len(new_chunks),
+            vanished=len(vanished),
+        )
 
-        if not text.strip():
-            raise ValueError("No text content found in document")
+        await _report(progress, "chunking", chunks_total=chunk_count, chunks_new=len(new_chunks))
 
-        # 2. Chunk text
-        chunks = chunk_text(text)
-        logger.info("text_chunked", tenant=tenant_id, chunk_count=len(chunks))
+        # 2. Collect the remaining embeddings (batched, cached) for new chunks only, in order
+        while embedding_tasks:
+            embeddings.extend(await embedding_tasks.popleft())
+            await _report(progress, "embedding", chunks_embedded=len(embeddings))
 
-        # 3. Generate embeddings and prepare vectors
         vectors = []
-        for i, chunk in enumerate(chunks):
-            embedding = await get_embedding(chunk)
+        indexed_at = int(time.time())
+        totals = {id(page): count for page, count, _, _ in planned}
+        for (page, chunk_hash, chunk, i), embedding in zip(new_chunks, embeddings):
             vectors.append({
-                "id": f"{doc_id}_{i}",
+                "id": f"{page['prefix']}_{chunk_hash[:16]}",
                 "values": embedding,
                 "metadata": {
                     "text": chunk,
-                    "source": filename,
-                    "document_id": doc_id,
+                    "source": page["source"],
+                    "document_id": document_id,
                     "chunk_index": i,
-                    "total_chunks": len(chunks),
+                    "total_chunks": totals[id(page)],
                     "tenant_id": str(tenant_id),
+                    "indexed_at": indexed_at,
                 },
             })
 
-        # 4. Upsert to Pinecone
-        upserted = await upsert_vectors(tenant_id, vectors)
+        # 3. Register new chunks (hash, position) before their vectors exist, so every
+        #    vector in the index has a registry row (reconcile.py collects the rest)
+        registered = [
+            {
+                "vector_id": vector["id"],
+                "text": vector["metadata"]["text"],
+                "source": vector["metadata"]["source"],
+                "chunk_index": vector["metadata"]["chunk_index"],
+                "content_hash": chunk_hash,
+            }
+            for vector, (_, chunk_hash, _, _) in zip(vectors, new_chunks)
+        ]
+        await lexical_index.add_chunks(
+            tenant_id,
+            registered,
+            document_id=document_id if is_uuid(document_id) else None,
+        )
+
+        # 4. Upsert to Pinecone, then drop chunks that are gone
+        upserted = 0
+        try:
+            for start in range(0, len(vectors), group):
+                upserted += await upsert_vectors(tenant_id, vectors[start:start + group])
+                await _report(progress, "upserting", vectors_upserted=upserted)
+        except Exception:
+            await lexical_index.remove_chunks(tenant_id, [c["vector_id"] for c in registered])
+            raise
+        if vanished:
+            await delete_vectors(tenant_id, vanished)
 
         logger.info(
             "ingestion_completed",
             tenant=tenant_id,
-            filename=filename,
-            chunks=len(chunks),
+            sources=[page["source"] for page in pages][:5],
+            chunks=chunk_count,
             vectors_stored=upserted,
+            vectors_deleted=len(vanished),
         )
 
         return {
-            "document_id": doc_id,
-            "filename": filename,
-            "chunk_count": len(chunks),
-            "text_length": len(text),
+            "chunk_count": chunk_count,
+            "chunks_embedded": len(new_chunks),
+            "chunks_unchanged": unique_count - len(new_chunks),
+            "chunks_deleted": len(vanished),
             "status": "completed",
         }
 
+    except Exception as e:
+        for task in embedding_tasks:
+            task.cancel()
+        logger.error("ingestion_error", error=str(e), tenant=tenant_id, document_id=document_id)
+        raise
+
+
 async def ingest_manual_entry(
     tenant_id: str,
     text: str,
@@ -208,20 +409,52 @@ async def ingest_manual_entry(
     Used for Manual Q&A and Objections.
     """
     id_tag = entry_id or str(uuid.uuid4())
+    await ingest_manual_entries(tenant_id, [{"id": id_tag, "text": text, "source": source}])
+    return id_tag
+
+
+async def ingest_manual_entries(tenant_id: str, entries: list[dict]) -> int:
+    """
+    Index many manual entries ({'id', 'text', 'source'}) as `manual_{id}`
+    vectors: one batched embedding call, registry rows, parallel upserts.
+    """
+    if not entries:
+        return 0
     try:
-        embedding = await get_embedding(text)
-        vector = [{
-            "id": f"manual_{id_tag}",
-            "values": embedding,
-            "metadata": {
-                "text": text,
-                "source": source,
-                "tenant_id": str(tenant_id),
-                "is_manual": True
-            },
-        }]
-        await upsert_vectors(tenant_id, vector)
-        return id_tag
+        embeddings = await get_embeddings([e["text"] for e in entries])
+        indexed_at = int(time.time())
+        vectors = [
+            {
+                "id": f"manual_{entry['id']}",
+                "values": embedding,
+                "metadata": {
+                    "text": entry["text"],
+                    "source": entry["source"],
+                    "tenant_id": str(tenant_id),
+                    "is_manual": True,
+                    "indexed_at": indexed_at,
+                },
+            }
+            for entry, embedding in zip(entries, embeddings)
+        ]
+        await lexical_index.add_chunks(
+            tenant_id,
+            [
+                {
+                    "vector_id": vector["id"],
+                    "text": vector["metadata"]["text"],
+                    "source": vector["metadata"]["source"],
+                    "chunk_index": 0,
+                    "content_hash": content_hash(vector["metadata"]["text"]),
+                }
+                for vector in vectors
+            ],
+        )
+        try:
+            return await upsert_vectors(tenant_id, vectors)
+        except Exception:
+            await lexical_index.remove_chunks(tenant_id, [v["id"] for v in vectors])
+            raise
     except Exception as e:
-        logger.error("manual_ingestion_error", error=str(e), tenant=tenant_id)
+        logger.error("manual_ingestion_error", error=str(e), tenant=tenant_id, entries=len(entries))
         raise
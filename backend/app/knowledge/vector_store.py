@@ -0,0 +1,202 @@
+"""
+InstaTG Agent — Vector Store
+
+Async interface over the tenant vector index. The Pinecone client is
+synchronous, so every call runs on a dedicated, bounded thread pool instead
+of the event loop; upsert batches are sent in parallel.
+
+VECTOR_STORE_BACKEND=local switches to the on-disk NumPy store
+(local_vector_store.py) for self-hosted deployments.
+"""
+
+import asyncio
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, AsyncIterator, Optional
+
+import structlog
+
+from app.config import settings
+
+logger = structlog.get_logger(__name__)
+
+# Pinecone recommends batches of 100 vectors per upsert
+UPSERT_BATCH_SIZE = 100
+
+
+class VectorStore(ABC):
+    """Per-tenant (namespace) vector index."""
+
+    @abstractmethod
+    async def query(
+        self,
+        namespace: str,
+        vector: list[float],
+        top_k: int,
+        filter: Optional[dict] = None,
+    ) -> list[dict]:
+        """Return matches as dicts with 'id', 'score' and 'metadata'."""
+
+    @abstractmethod
+    async def upsert(self, namespace: str, vectors: list[dict]) -> int:
+        """Insert or replace vectors ({'id', 'values', 'metadata'}); returns count."""
+
+    @abstractmethod
+    async def delete(
+        self,
+        namespace: str,
+        ids: Optional[list[str]] = None,
+        delete_all: bool = False,
+    ) -> None:
+        """Delete vectors by id, or the whole namespace."""
+
+    def list_ids(self, namespace: str, prefix: Optional[str] = None) -> AsyncIterator[list[str]]:
+        """Yield pages of vector ids in a namespace (used by reconciliation)."""
+        raise NotImplementedError(f"{type(self).__name__} cannot list vector ids")
+
+    async def fetch_metadata(self, namespace: str, ids: list[str]) -> dict[str, dict]:
+        """Metadata of existing vectors, keyed by id."""
+        raise NotImplementedError(f"{type(self).__name__} cannot fetch vectors")
+
+    async def close(self) -> None:
+        pass
+
+
+def _match_to_dict(match: Any) -> dict:
+    if isinstance(match, dict):
+        return {"id": match.get("id"), "score": match.get("score", 0.0), "metadata": match.get("metadata") or {}}
+    return {"id": match.id, "score": match.score, "metadata": match.metadata or {}}
+
+
+class PineconeVectorStore(VectorStore):
+    """Pinecone index accessed through a bounded thread pool."""
+
+    def __init__(self, max_workers: int, upsert_concurrency: int):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="pinecone")
+        self._upsert_concurrency = upsert_concurrency
+        self._index = None
+        self._can_list: Optional[bool] = None  # learned from the first list request
+
+    def _get_index(self):
+        if self._index is None:
+            from app.knowledge.rag import get_pinecone_index
+            self._index = get_pinecone_index()
+        return self._index
+
+    async def _run(self, fn, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(fn, *args, **kwargs))
+
+    async def query(self, namespace, vector, top_k, filter=None):
+        index = await self._run(self._get_index)
+        kwargs = {"filter": filter} if filter else {}
+        results = await self._run(
+            index.query,
+            vector=vector,
+            top_k=top_k,
+            namespace=namespace,
+            include_metadata=True,
+            **kwargs,
+        )
+        matches = results.get("matches", []) if isinstance(results, dict) else (results.matches or [])
+        return [_match_to_dict(m) for m in matches]
+
+    async def upsert(self, namespace, vectors):
+        if not vectors:
+            return 0
+        index = await self._run(self._get_index)
+        semaphore = asyncio.Semaphore(self._upsert_concurrency)
+
+        async def _upsert_batch(batch: list[dict]) -> int:
+            async with semaphore:
+                await self._run(
+                    index.upsert,
+                    vectors=[{"id": v["id"], "values": v["values"], "metadata": v["metadata"]} for v in batch],
+                    namespace=namespace,
+                )
+                return len(batch)
+
+        batches = [vectors[i:i + UPSERT_BATCH_SIZE] for i in range(0, len(vectors), UPSERT_BATCH_SIZE)]
+        return sum(await asyncio.gather(*(_upsert_batch(b) for b in batches)))
+
+    async def delete(self, namespace, ids=None, delete_all=False):
+        index = await self._run(self._get_index)
+        if delete_all:
+            await self._run(index.delete, delete_all=True, namespace=namespace)
+            return
+        # Pinecone caps ids per delete request at 1000
+        for i in range(0, len(ids or []), 1000):
+            await self._run(index.delete, ids=ids[i:i + 1000], namespace=namespace)
+
+    async def list_ids(self, namespace, prefix=None):
+        # Serverless indexes only. Pod-based indexes reject the request with a
+        # 400; remember that so reconciliation stops after one try per process
+        if self._can_list is False:
+            raise NotImplementedError("Pinecone index does not support listing vector ids (pod-based)")
+        from pinecone.core.client.exceptions import PineconeApiException
+
+        index = await self._run(self._get_index)
+        token = None
+        while True:
+            kwargs = {"pagination_token": token} if token else {}
+            try:
+                page = await self._run(index.list_paginated, prefix=prefix, namespace=namespace, limit=100, **kwargs)
+            except PineconeApiException as e:
+                if self._can_list is None and e.status == 400:
+                    self._can_list = False
+                    raise NotImplementedError(
+                        f"Pinecone index does not support listing vector ids (pod-based): {e.reason}"
+                    ) from e
+                raise
+            self._can_list = True
+            ids = [v.id for v in (page.vectors or [])]
+            if ids:
+                yield ids
+            token = page.pagination.next if page.pagination else None
+            if not token:
+                return
+
+    async def fetch_metadata(self, namespace, ids):
+        index = await self._run(self._get_index)
+        found: dict[str, dict] = {}
+        for i in range(0, len(ids), 100):
+            response = await self._run(index.fetch, ids=ids[i:i + 100], namespace=namespace)
+            vectors = response.get("vectors", {}) if isinstance(response, dict) else response.vectors
+            for vector_id, vector in (vectors or {}).items():
+                metadata = vector.get("metadata") if isinstance(vector, dict) else vector.metadata
+                found[vector_id] = metadata or {}
+        return found
+
+    async def close(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+_vector_store: Optional[VectorStore] = None
+
+
+def get_vector_store() -> VectorStore:
+    """Process-wide vector store singleton."""
+    global _vector_store
+    if _vector_store is None and settings.vector_store_backend == "local":
+        from app.knowledge.local_vector_store import LocalVectorStore
+        _vector_store = LocalVectorStore(
+            root=settings.local_vector_store_dir,
+            quantize=settings.local_vector_quantize,
+            max_workers=settings.vector_store_threads,
+        )
+        logger.info("vector_store_initialized", backend="local", path=settings.local_vector_store_dir)
+    elif _vector_store is None:
+        _vector_store = PineconeVectorStore(
+            max_workers=settings.vector_store_threads,
+            upsert_concurrency=settings.vector_upsert_concurrency,
+        )
+        logger.info("vector_store_initialized", backend="pinecone", threads=settings.vector_store_threads)
+    return _vector_store
+
+
+async def close_vector_store() -> None:
+    global _vector_store
+    if _vector_store is not None:
+        await _vector_store.close()
+        _vector_store = None
@@ -0,0 +1,223 @@
+"""
+InstaTG Agent — Embedding Cache
+
+Content-addressed cache for embeddings, shared by knowledge ingestion and
+query paths. Keys are sha256(model + text), so re-uploaded documents and
+repeated customer questions skip the embedding API entirely.
+
+Lookup order: process-local LRU -> Redis (float32 bytes) -> provider.
+Identical in-flight requests are coalesced into a single provider call.
+"""
+
+import asyncio
+import hashlib
+from array import array
+from collections import OrderedDict
+from functools import partial
+from typing import Awaitable, Callable, Optional
+
+import structlog
+
+from app.config import settings
+
+logger = structlog.get_logger(__name__)
+
+KEY_PREFIX = "emb:v1:"
+
+
+def cache_key(text: str, model: str) -> str:
+    return hashlib.sha256(f"{model}\x00{text}".encode("utf-8")).hexdigest()
+
+
+def pack_vector(vector: list[float]) -> bytes:
+    return array("f", vector).tobytes()
+
+
+def unpack_vector(data: bytes) -> list[float]:
+    vec = array("f")
+    vec.frombytes(data)
+    return vec.tolist()
+
+
+class EmbeddingCache:
+    """Two-level (L1 in-process LRU, L2 Redis) embedding cache with hit/miss metrics."""
+
+    def __init__(self, max_local_entries: int = 4096):
+        self.max_local_entries = max_local_entries
+        self._local: OrderedDict[str, bytes] = OrderedDict()
+        self._inflight: dict[str, asyncio.Task] = {}
+        self._redis = None
+        self._redis_checked = False
+        self.metrics = {"l1_hits": 0, "l2_hits": 0, "misses": 0, "coalesced": 0, "redis_errors": 0}
+
+    # ── L2 (Redis, binary-safe connection) ──
+
+    def _get_redis(self):
+        if not self._redis_checked:
+            self._redis_checked = True
+            from app.memory.context import memory
+            if memory._use_redis:
+                from app.core.redis_client import get_redis
+                # Binary client: the memory client decodes responses to str
+                self._redis = get_redis(binary=True)
+        return self._redis
+
+    async def _l2_get(self, key: str) -> Optional[bytes]:
+        redis = self._get_redis()
+        if redis is None:
+            return None
+        try:
+            return await redis.get(KEY_PREFIX + key)
+        except Exception as e:
+            self.metrics["redis_errors"] += 1
+            logger.warning("embedding_cache_redis_error", op="get", error=str(e))
+            return None
+
+    async def _l2_set(self, key: str, data: bytes) -> None:
+        redis = self._get_redis()
+        if redis is None:
+            return
+        try:
+            await redis.set(KEY_PREFIX + key, data, ex=settings.embedding_cache_ttl_sec)
+        except Exception as e:
+            self.metrics["redis_errors"] += 1
+            logger.warning("embedding_cache_redis_error", op="set", error=str(e))
+
+    async def _l2_get_many(self, keys: list[str]) -> list[Optional[bytes]]:
+        redis = self._get_redis()
+        if redis is None:
+            return [None] * len(keys)
+        try:
+            from app.core.redis_client import is_cluster
+            # Content-addressed keys spread over every slot; the cluster client splits by node
+            mget = redis.mget_nonatomic if is_cluster(redis) else redis.mget
+            return await mget([KEY_PREFIX + key for key in keys])
+        except Exception as e:
+            self.metrics["redis_errors"] += 1
+            logger.warning("embedding_cache_redis_error", op="mget", error=str(e))
+            return [None] * len(keys)
+
+    async def _l2_set_many(self, items: dict[str, bytes]) -> None:
+        redis = self._get_redis()
+        if redis is None or not items:
+            return
+        try:
+            async with redis.pipeline(transaction=False) as pipe:
+                for key, data in items.items():
+                    pipe.set(KEY_PREFIX + key, data, ex=settings.embedding_cache_ttl_sec)
+                await pipe.execute()
+        except Exception as e:
+            self.metrics["redis_errors"] += 1
+            logger.warning("embedding_cache_redis_error", op="pipeline_set", error=str(e))
+
+    # ── L1 (process-local LRU) ──
+
+    def _l1_get(self, key: str) -> Optional[bytes]:
+        data = self._local.get(key)
+        if data is not None:
+            self._local.move_to_end(key)
+        return data
+
+    def _l1_set(self, key: str, data: bytes) -> None:
+        self._local[key] = data
+        self._local.move_to_end(key)
+        while len(self._local) > self.max_local_entries:
+            self._local.popitem(last=False)
+
+    # ── Public API ──
+
+    async def get_or_compute(
+        self,
+        text: str,
+        model: str,
+        compute: Callable[[str], Awaitable[list[float]]],
+    ) -> list[float]:
+        """Return the cached embedding for (model, text), computing and storing it on a miss."""
+        key = cache_key(text, model)
+
+        data = self._l1_get(key)
+        if data is not None:
+            self.metrics["l1_hits"] += 1
+            return unpack_vector(data)
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.metrics["coalesced"] += 1
+        else:
+            # The lookup runs in a task owned by the cache: a caller that is
+            # cancelled stops waiting, but the others coalesced on it still get the result
+            task = asyncio.create_task(self._lookup(key, text, compute))
+            self._inflight[key] = task
+            task.add_done_callback(partial(self._lookup_done, key))
+        return unpack_vector(await asyncio.shield(task))
+
+    async def _lookup(self, key: str, text: str, compute: Callable[[str], Awaitable[list[float]]]) -> bytes:
+        data = await self._l2_get(key)
+        if data is not None:
+            self.metrics["l2_hits"] += 1
+        else:
+            self.metrics["misses"] += 1
+            data = pack_vector(await compute(text))
+            await self._l2_set(key, data)
+        self._l1_set(key, data)
+        return data
+
+    def _lookup_done(self, key: str, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Every caller may have been cancelled; don't warn about an unretrieved exception
+        if not task.cancelled():
+            task.exception()
+
+    async def get_or_compute_many(
+        self,
+        texts: list[str],
+        model: str,
+        compute_many: Callable[[list[str]], Awaitable[list[list[float]]]],
+    ) -> list[list[float]]:
+        """Batch variant: one Redis MGET for L1 misses, one provider call for the rest."""
+        keys = [cache_key(text, model) for text in texts]
+        found: dict[str, bytes] = {}
+        pending: dict[str, str] = {}  # key -> text, unique, in first-seen order
+
+        for key, text in zip(keys, texts):
+            if key in found or key in pending:
+                continue
+            data = self._l1_get(key)
+            if data is not None:
+                self.metrics["l1_hits"] += 1
+                found[key] = data
+            else:
+                pending[key] = text
+
+        if pending:
+            for key, data in zip(list(pending), await self._l2_get_many(list(pending))):
+                if data is not None:
+                    self.metrics["l2_hits"] += 1
+                    found[key] = data
+                    self._l1_set(key, data)
+                    del pending[key]
+
+        if pending:
+            self.metrics["misses"] += len(pending)
+            vectors = await compute_many(list(pending.values()))
+            computed = {key: pack_vector(vec) for key, vec in zip(pending, vectors)}
+            await self._l2_set_many(computed)
+            for key, data in computed.items():
+                self._l1_set(key, data)
+            found.update(computed)
+
+        return [unpack_vector(found[key]) for key in keys]
+
+    def stats(self) -> dict:
+        lookups = sum(self.metrics[k] for k in ("l1_hits", "l2_hits", "misses", "coalesced"))
+        hits = lookups - self.metrics["misses"]
+        return {
+            **self.metrics,
+            "local_entries": len(self._local),
+            "hit_rate": round(hits / lookups, 3) if lookups else None,
+        }
+
+
+# Singleton instance
+embedding_cache = EmbeddingCache(max_local_entries=settings.embedding_cache_local_size)
@@ -1,12 +1,14 @@
 """
 Simple LLM provider wrapper.
-Provides `get_embedding` and `generate_text` helpers with a pluggable provider selector.
+Provides `get_embedding`/`get_embeddings` and `generate_text` helpers with a pluggable provider selector.
 Currently supports OpenAI (default). Placeholders for OpenRouter/HuggingFace are present.
 """
+import asyncio
 import structlog
 from typing import List, Optional
 
 import openai
+from tenacity import retry, stop_after_attempt, wait_exponential
 
 from app.config import settings
 
@@ -14,24 +16,71 @@ logger = structlog.get_logger(__name__)
 
 
 async def get_embedding(text: str) -> List[float]:
-    """Return embedding vector for `text` using configured provider."""
-    provider = (settings.llm_provider or "openai").lower()
+    """Return embedding vector for `text`, served from the embedding cache when possible."""
+    if not settings.embedding_cache_enabled:
+        return await _embed(text)
 
-    if provider == "openai":
-        client = openai.AsyncOpenAI(api_key=settings.openai_api_key)
-        response = await client.embeddings.create(model=settings.embedding_model, input=text)
-        return response.data[0].embedding
+    from app.llms.embedding_cache import embedding_cache
+    return await embedding_cache.get_or_compute(text, settings.embedding_model, _embed)
+
+
+async def get_embeddings(texts: List[str]) -> List[List[float]]:
+    """
+    Return embeddings for many texts (same order), using the cache and
+    provider-sized batched requests for the misses.
+    """
+    if not texts:
+        return []
+    if not settings.embedding_cache_enabled:
+        return await _embed_many(texts)
+
+    from app.llms.embedding_cache import embedding_cache
+    return await embedding_cache.get_or_compute_many(texts, settings.embedding_model, _embed_many)
+
+
+def _embedding_client() -> openai.AsyncOpenAI:
+    """OpenAI-compatible client for embeddings under the configured provider."""
+    provider = (settings.llm_provider or "openai").lower()
 
     # Google/Groq typically don't share the same embedding endpoint via OpenAI SDK
     # We'll default to OpenAI if key is present, otherwise error
-    if settings.openai_api_key:
-        client = openai.AsyncOpenAI(api_key=settings.openai_api_key)
-        response = await client.embeddings.create(model=settings.embedding_model, input=text)
-        return response.data[0].embedding
+    if provider == "openai" or settings.openai_api_key:
+        return openai.AsyncOpenAI(api_key=settings.openai_api_key)
 
     raise RuntimeError(f"Embedding provider '{provider}' not implemented or no OpenAI key for embeddings.")
 
 
+async def _embed(text: str) -> List[float]:
+    """Return embedding vector for `text` using configured provider."""
+    return (await _embed_many([text]))[0]
+
+
+async def _embed_many(texts: List[str]) -> List[List[float]]:
+    """Embed texts in batches of up to EMBEDDING_BATCH_SIZE, a few batches in flight at once."""
+    client = _embedding_client()
+    batch_size = max(1, settings.embedding_batch_size)
+    batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+    semaphore = asyncio.Semaphore(max(1, settings.embedding_batch_concurrency))
+
+    async def _run(batch: List[str]) -> List[List[float]]:
+        async with semaphore:
+            return await _embed_batch(client, batch)
+
+    results = await asyncio.gather(*(_run(batch) for batch in batches))
+    return [vector for batch in results for vector in batch]
+
+
+@retry(stop=stop_after_attempt(4), wait=wait_exponential(multiplier=0.5, min=0.5, max=8), reraise=True)
+async def _embed_batch(client: openai.AsyncOpenAI, batch: List[str]) -> List[List[float]]:
+    """One embeddings request; retried with backoff on failure."""
+    try:
+        response = await client.embeddings.create(model=settings.embedding_model, input=batch)
+    except Exception as e:
+        logger.warning("embedding_batch_failed", size=len(batch), error=str(e))
+        raise
+    return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+
 async def generate_text(prompt: str, model: Optional[str] = None, max_tokens: int = 512) -> str:
     """Generate text from `prompt` using configured provider."""
     provider = (settings.llm_provider or "openai").lower()
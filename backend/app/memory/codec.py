@@ -0,0 +1,110 @@
+"""
+InstaTG Agent — Conversation Message Codec
+
+Compact binary encoding for the messages kept in conversation memory.
+
+Each message is packed as a positional array instead of a JSON object:
+
+    [role, type, timestamp_us, content]            (+ [metadata] if present)
+
+- role and type are interned to small ints (unknown values are kept as strings)
+- the ISO timestamp becomes integer microseconds since the epoch
+- a leading version byte names the serializer (orjson or msgpack), so the
+  format can change without flushing Redis
+
+Entries written before this codec (plain `json.dumps` objects) start with
+'{' and are still decoded.
+"""
+
+import json
+from datetime import datetime, timedelta
+from typing import Union
+
+import orjson
+
+try:
+    import msgpack
+    has_msgpack = True
+except ImportError:
+    msgpack = None
+    has_msgpack = False
+
+FORMAT_ORJSON = 1
+FORMAT_MSGPACK = 2
+FORMATS = {"orjson": FORMAT_ORJSON, "msgpack": FORMAT_MSGPACK}
+
+# Append-only: positions are persisted in Redis
+ROLES = ("user", "assistant", "system")
+TYPES = ("text", "voice", "image", "video", "document", "sticker", "comment", "comment_reply", "other")
+_ROLE_CODES = {name: code for code, name in enumerate(ROLES)}
+_TYPE_CODES = {name: code for code, name in enumerate(TYPES)}
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def _pack_timestamp(value: str):
+    try:
+        moment = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return value
+    if moment.tzinfo is not None:
+        return value  # only naive UTC (datetime.utcnow) round-trips exactly
+    delta = moment - _EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1_000_000 + delta.microseconds
+
+
+def _unpack_timestamp(value) -> str:
+    if isinstance(value, int):
+        return (_EPOCH + timedelta(microseconds=value)).isoformat()
+    return value
+
+
+def encode_message(message: dict, codec: str = "orjson") -> bytes:
+    """Encode a memory message dict ('role', 'content', 'type', 'timestamp'[, 'metadata'])."""
+    fmt = FORMATS.get(codec, FORMAT_ORJSON)
+    if fmt == FORMAT_MSGPACK and not has_msgpack:
+        fmt = FORMAT_ORJSON
+    role = message.get("role", "user")
+    message_type = message.get("type", "text")
+    packed = [
+        _ROLE_CODES.get(role, role),
+        _TYPE_CODES.get(message_type, message_type),
+        _pack_timestamp(message.get("timestamp")),
+        message.get("content", ""),
+    ]
+    if message.get("metadata"):
+        packed.append(message["metadata"])
+    if fmt == FORMAT_MSGPACK:
+        return bytes((FORMAT_MSGPACK,)) + msgpack.packb(packed, use_bin_type=True)
+    return bytes((FORMAT_ORJSON,)) + orjson.dumps(packed, option=orjson.OPT_NON_STR_KEYS)
+
+
+def decode_message(raw: Union[bytes, str]) -> dict:
+    """Decode an encoded message, or a legacy JSON object entry. Raises ValueError if unreadable."""
+    if isinstance(raw, str):
+        raw = raw.encode("utf-8")
+    if not raw:
+        raise ValueError("empty message entry")
+    version = raw[0]
+    if version == ord("{"):
+        return json.loads(raw)
+    if version == FORMAT_ORJSON:
+        packed = orjson.loads(raw[1:])
+    elif version == FORMAT_MSGPACK:
+        if not has_msgpack:
+            raise ValueError("msgpack-encoded message but msgpack is not installed")
+        packed = msgpack.unpackb(raw[1:], raw=False)
+    else:
+        raise ValueError(f"unknown message format version {version}")
+
+    role, message_type, timestamp, content = packed[:4]
+    message = {
+        "role": ROLES[role] if isinstance(role, int) else role,
+        "content": content,
+        "type": TYPES[message_type] if isinstance(message_type, int) else message_type,
+        "timestamp": _unpack_timestamp(timestamp),
+    }
+    if len(packed) > 4:
+        message["metadata"] = packed[4]
+    return message
+
@@ -3,19 +3,242 @@ InstaTG Agent — Conversation Memory
 
 Maintains per-contact conversation context.
 Uses Redis when available, falls back to in-memory dict for demo mode.
+
+Messages are stored in the compact versioned encoding of app.memory.codec
+(Redis lists are read through a separate binary-safe connection). The
+in-memory fallback is LRU-bounded and expires keys like Redis would, so a
+long-running worker without Redis doesn't keep every contact forever.
+
+With Redis, each process also keeps an L1 cache of hot contexts (messages +
+handoff flag). A contact's state is read with one Lua script (one round-trip)
+on an L1 miss and written through with one script per turn; every write
+bumps a per-contact version counter and publishes it on an invalidation
+channel, and other processes drop their older copies when they see it.
+
+All keys of one contact share a cluster hash tag, `memory:{tenant:contact}:*`,
+so the scripts work unchanged on Redis Cluster. Contacts still stored under
+the old `tenant:{id}:contact:{id}:*` keys are moved over by a one-time
+background sweep (and on their first read while it runs); once it finishes,
+a marker key turns the legacy check off for every process.
 """
 
-import json
+import asyncio
+import time
 import structlog
+from collections import OrderedDict
 from datetime import datetime
-from typing import Optional
-from collections import defaultdict
+from typing import Any, Optional
 
 from app.config import settings
+from app.core.redis_client import close_redis, create_pubsub_client, get_redis, hash_tag
+from app.memory.codec import decode_message, encode_message
 
 logger = structlog.get_logger(__name__)
 
 MAX_CONTEXT_MESSAGES = 50
+HANDOFF_TTL_SEC = 86400
+INVALIDATION_CHANNEL = "memory:context:invalidate"
+# Set once every pre-hash-tag contact has been migrated; later processes skip the legacy fallback
+LEGACY_DONE_KEY = "memory:legacy_migration_done"
+
+# KEYS = messages, handoff flag, version;  ARGV = limit
+# Returns {version, handoff flag, messages}
+_READ_LUA = """
+local messages = redis.call('LRANGE', KEYS[1], -tonumber(ARGV[1]), -1)
+local handoff = redis.call('GET', KEYS[2]) or ''
+local version = redis.call('GET', KEYS[3]) or '0'
+return {version, handoff, messages}
+"""
+
+# KEYS = messages, version;  ARGV = max messages, ttl, channel, contact key, encoded messages...
+# Returns the new version
+_APPEND_LUA = """
+for i = 5, #ARGV do
+    redis.call('RPUSH', KEYS[1], ARGV[i])
+end
+redis.call('LTRIM', KEYS[1], -tonumber(ARGV[1]), -1)
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+local version = redis.call('INCR', KEYS[2])
+redis.call('EXPIRE', KEYS[2], ARGV[2])
+redis.call('PUBLISH', ARGV[3], ARGV[4] .. '|' .. version)
+return version
+"""
+
+# KEYS = messages, version;  ARGV = max messages, ttl, channel, contact key, legacy entries (oldest first)...
+# Prepends, so anything already written under the new key stays newest
+_MIGRATE_LUA = """
+for i = #ARGV, 5, -1 do
+    redis.call('LPUSH', KEYS[1], ARGV[i])
+end
+redis.call('LTRIM', KEYS[1], -tonumber(ARGV[1]), -1)
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+local version = redis.call('INCR', KEYS[2])
+redis.call('EXPIRE', KEYS[2], ARGV[2])
+redis.call('PUBLISH', ARGV[3], ARGV[4] .. '|' .. version)
+return version
+"""
+
+# KEYS = legacy messages;  ARGV = limit.  Read-and-delete, so only one process migrates a contact
+_TAKE_LUA = """
+local messages = redis.call('LRANGE', KEYS[1], -tonumber(ARGV[1]), -1)
+redis.call('DEL', KEYS[1])
+return messages
+"""
+
+# KEYS = handoff flag (or messages, for a clear), version;  ARGV = mode ('set'|'del'), ttl, channel, contact key
+_FLAG_LUA = """
+if ARGV[1] == 'set' then
+    redis.call('SET', KEYS[1], '1', 'EX', ARGV[2])
+else
+    redis.call('DEL', KEYS[1])
+end
+local version = redis.call('INCR', KEYS[2])
+redis.call('EXPIRE', KEYS[2], 604800)
+redis.call('PUBLISH', ARGV[3], ARGV[4] .. '|' .. version)
+return version
+"""
+
+
+class LocalStore:
+    """Process-local key/value store: LRU-bounded, TTL-expiring, with size metrics."""
+
+    def __init__(self, max_keys: int, ttl_sec: int):
+        self.max_keys = max_keys
+        self.ttl_sec = ttl_sec
+        self._data: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self.metrics = {"evictions": 0, "expirations": 0}
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        entry = self._data.get(key)
+        if entry is None:
+            return default
+        if entry[0] <= time.monotonic():
+            del self._data[key]
+            self.metrics["expirations"] += 1
+            return default
+        self._data.move_to_end(key)
+        return entry[1]
+
+    def set(self, key: str, value: Any, ttl_sec: Optional[int] = None) -> None:
+        self._data[key] = (time.monotonic() + (ttl_sec or self.ttl_sec), value)
+        self._data.move_to_end(key)
+        self._evict()
+
+    def append(self, key: str, item: Any, max_items: int) -> list:
+        """Append to a list value, keeping the last `max_items`; refreshes the TTL."""
+        items = self.get(key) or []
+        items.append(item)
+        if len(items) > max_items:
+            del items[:-max_items]
+        self.set(key, items)
+        return items
+
+    def pop(self, key: str) -> None:
+        self._data.pop(key, None)
+
+    def _evict(self) -> None:
+        now = time.monotonic()
+        # Least recently used first; expired keys there go without counting as evictions
+        while self._data:
+            key, (expires_at, _) = next(iter(self._data.items()))
+            if expires_at <= now:
+                self.metrics["expirations"] += 1
+            elif len(self._data) > self.max_keys:
+                self.metrics["evictions"] += 1
+            else:
+                break
+            del self._data[key]
+
+    def stats(self) -> dict:
+        values = [value for _, value in self._data.values()]
+        lists = [value for value in values if isinstance(value, list)]
+        return {
+            **self.metrics,
+            "keys": len(self._data),
+            "max_keys": self.max_keys,
+            "messages": sum(len(items) for items in lists),
+            "bytes": sum(len(item) for items in lists for item in items if isinstance(item, bytes)),
+        }
+
+
+class ContextCache:
+    """
+    L1 cache of contact state: key -> (version, handoff, last messages).
+
+    Entries never outlive `ttl_sec`, and an invalidation for a version newer
+    than the cached one drops the entry but leaves a tombstone, so a read
+    that raced the write can't put the older state back.
+    """
+
+    def __init__(self, max_contacts: int, ttl_sec: float):
+        self.max_contacts = max_contacts
+        self.ttl_sec = ttl_sec
+        self.enabled = False  # only while the invalidation listener is subscribed
+        # key -> [expires_at, version, handoff, messages or None (tombstone)]
+        self._entries: OrderedDict[str, list] = OrderedDict()
+        self.metrics = {"l1_hits": 0, "l1_misses": 0, "invalidations": 0}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[tuple[bool, list[dict]]]:
+        entry = self._entries.get(key) if self.enabled else None
+        if entry is None or entry[3] is None or entry[0] <= time.monotonic():
+            self.metrics["l1_misses"] += 1
+            return None
+        self._entries.move_to_end(key)
+        self.metrics["l1_hits"] += 1
+        return entry[2], entry[3]
+
+    def put(self, key: str, version: int, handoff: bool, messages: list[dict]) -> None:
+        if not self.enabled:
+            return
+        current = self._entries.get(key)
+        if current is not None and current[1] > version:
+            return
+        self._entries[key] = [time.monotonic() + self.ttl_sec, version, handoff, messages]
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_contacts:
+            self._entries.popitem(last=False)
+
+    def update(self, key: str, version: int, handoff: Optional[bool] = None, append: Optional[list[dict]] = None) -> None:
+        """Write-through after our own write: apply it if we held the preceding version, else drop."""
+        entry = self._entries.get(key)
+        if entry is None or entry[3] is None:
+            return
+        if entry[1] != version - 1:
+            self.invalidate(key, version)
+            return
+        if handoff is not None:
+            entry[2] = handoff
+        if append:
+            entry[3] = (entry[3] + append)[-MAX_CONTEXT_MESSAGES:]
+        entry[1] = version
+
+    def invalidate(self, key: str, version: int) -> None:
+        entry = self._entries.get(key)
+        if entry is not None and entry[1] >= version:
+            return  # our own write, already applied
+        self.metrics["invalidations"] += 1
+        self._entries[key] = [time.monotonic() + self.ttl_sec, version, False, None]
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_contacts:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.metrics["l1_hits"] + self.metrics["l1_misses"]
+        return {
+            **self.metrics,
+            "enabled": self.enabled,
+            "contacts": sum(1 for entry in self._entries.values() if entry[3] is not None),
+            "hit_rate": round(self.metrics["l1_hits"] / lookups, 3) if lookups else None,
+        }
 
 
 class ConversationMemory:
@@ -23,30 +246,64 @@ class ConversationMemory:
 
     def __init__(self):
         self._redis = None
+        self._binary = None
         self._use_redis = False
-        self._local_store: dict[str, list] = defaultdict(list)
+        self._local_store = LocalStore(settings.memory_local_max_keys, settings.memory_context_ttl_sec)
+        self._l1 = ContextCache(settings.memory_l1_max_contacts, settings.memory_l1_ttl_sec)
+        self._listener: Optional[asyncio.Task] = None
+        self._read_script = None
+        self._append_script = None
+        self._flag_script = None
+        self._migrate_script = None
+        self._take_script = None
+        self._legacy_pending = False
+        self._legacy_task: Optional[asyncio.Task] = None
+        self.metrics = {"decode_errors": 0, "round_trips": 0, "legacy_migrated": 0}
 
     async def connect(self) -> None:
         """Try to connect to Redis. Fall back gracefully if unavailable."""
         try:
-            import redis.asyncio as aioredis
-            self._redis = aioredis.from_url(
-                settings.redis_url,
-                encoding="utf-8",
-                decode_responses=True,
-            )
+            self._redis = get_redis()
             await self._redis.ping()
+            # Separate client for the binary message lists: the shared one decodes to str
+            self._binary = get_redis(binary=True)
+            self._read_script = self._binary.register_script(_READ_LUA)
+            self._append_script = self._binary.register_script(_APPEND_LUA)
+            self._flag_script = self._binary.register_script(_FLAG_LUA)
+            self._migrate_script = self._binary.register_script(_MIGRATE_LUA)
+            self._take_script = self._binary.register_script(_TAKE_LUA)
             self._use_redis = True
+            if settings.memory_legacy_key_fallback and not await self._redis.exists(LEGACY_DONE_KEY):
+                self._legacy_pending = True
+                self._legacy_task = asyncio.create_task(self._sweep_legacy())
+            if settings.memory_l1_enabled:
+                self._listener = asyncio.create_task(self._listen_invalidations())
             logger.info("redis_connected", url=settings.redis_url)
         except Exception as e:
             self._use_redis = False
             self._redis = None
+            self._binary = None
+            await close_redis()
             logger.warning("redis_unavailable_using_memory", reason=str(e))
 
     async def close(self) -> None:
         """Close Redis connection if active."""
+        if self._legacy_task:
+            self._legacy_task.cancel()
+            try:
+                await self._legacy_task
+            except asyncio.CancelledError:
+                pass
+            self._legacy_task = None
+        if self._listener:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
         if self._redis and self._use_redis:
-            await self._redis.close()
+            await close_redis()
             logger.info("redis_disconnected")
 
     @property
@@ -54,42 +311,154 @@ class ConversationMemory:
         return self._redis
 
     def _key(self, tenant_id: str, contact_id: str) -> str:
-        return f"tenant:{tenant_id}:contact:{contact_id}:messages"
+        return f"memory:{hash_tag(tenant_id, contact_id)}:messages"
 
-    async def add_message(
+    def _handoff_key(self, tenant_id: str, contact_id: str) -> str:
+        return f"memory:{hash_tag(tenant_id, contact_id)}:human_handoff"
+
+    def _version_key(self, tenant_id: str, contact_id: str) -> str:
+        return f"memory:{hash_tag(tenant_id, contact_id)}:version"
+
+    def _legacy_keys(self, tenant_id: str, contact_id: str) -> tuple[str, str]:
+        prefix = f"tenant:{tenant_id}:contact:{contact_id}"
+        return f"{prefix}:messages", f"{prefix}:human_handoff"
+
+    @staticmethod
+    def _parse_legacy_key(key: str) -> Optional[tuple[str, str]]:
+        """(tenant_id, contact_id) of a `tenant:{t}:contact:{c}:messages|human_handoff` key."""
+        if not key.startswith("tenant:"):
+            return None
+        tenant_id, sep, rest = key[len("tenant:"):].partition(":contact:")
+        contact_id, _, suffix = rest.rpartition(":")
+        if not sep or not contact_id or suffix not in ("messages", "human_handoff"):
+            return None
+        return tenant_id, contact_id
+
+    def _decode_all(self, raw_messages: list) -> list[dict]:
+        messages = []
+        for raw in raw_messages:
+            try:
+                messages.append(decode_message(raw))
+            except ValueError as e:
+                self.metrics["decode_errors"] += 1
+                logger.warning("memory_message_decode_error", error=str(e))
+        return messages
+
+    # ── L1 coherence ──
+
+    async def _listen_invalidations(self) -> None:
+        """Drop L1 entries other processes have written; L1 is off while unsubscribed."""
+        client = create_pubsub_client()
+        try:
+            while True:
+                pubsub = client.pubsub()
+                try:
+                    await pubsub.subscribe(INVALIDATION_CHANNEL)
+                    # Anything cached before the subscription may have missed an invalidation
+                    self._l1.clear()
+                    self._l1.enabled = True
+                    async for message in pubsub.listen():
+                        if message.get("type") != "message":
+                            continue
+                        key, _, version = message["data"].rpartition("|")
+                        self._l1.invalidate(key, int(version))
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    self._l1.enabled = False
+                    self._l1.clear()
+                    logger.warning("memory_invalidation_listener_error", error=str(e))
+                    await asyncio.sleep(1.0)
+                finally:
+                    try:
+                        await pubsub.close()
+                    except Exception:
+                        pass
+        finally:
+            self._l1.enabled = False
+            await client.close()
+
+    async def _migrate_legacy(self, tenant_id: str, contact_id: str) -> bool:
+        """Move a contact's pre-hash-tag keys to the new ones; True if anything moved."""
+        legacy_messages, legacy_handoff = self._legacy_keys(tenant_id, contact_id)
+        key = self._key(tenant_id, contact_id)
+        # Legacy keys sit in different slots: read-and-delete each on its own
+        raw_messages = await self._take_script(keys=[legacy_messages], args=[MAX_CONTEXT_MESSAGES])
+        handoff = await self._binary.getdel(legacy_handoff)
+        self.metrics["round_trips"] += 2
+        if raw_messages:
+            await self._migrate_script(
+                keys=[key, self._version_key(tenant_id, contact_id)],
+                args=[MAX_CONTEXT_MESSAGES, settings.memory_context_ttl_sec, INVALIDATION_CHANNEL, key, *raw_messages],
+            )
+        if handoff == b"1":
+            await self._flag_script(
+                keys=[self._handoff_key(tenant_id, contact_id), self._version_key(tenant_id, contact_id)],
+                args=["set", HANDOFF_TTL_SEC, INVALIDATION_CHANNEL, key],
+            )
+        if raw_messages or handoff:
+            self.metrics["legacy_migrated"] += 1
+            return True
+        return False
+
+    async def _sweep_legacy(self) -> None:
+        """
+        Migrate every remaining pre-hash-tag contact in the background, then
+        set LEGACY_DONE_KEY. Until then a read that finds no current keys
+        checks the legacy ones (two extra round trips); afterwards, in this
+        and every later process, it doesn't.
+        """
+        seen: set[tuple[str, str]] = set()
+        try:
+            async for raw_key in self._binary.scan_iter(match="tenant:*:contact:*", count=1000):
+                contact = self._parse_legacy_key(raw_key.decode("utf-8", "replace"))
+                if contact is None or contact in seen:
+                    continue
+                seen.add(contact)
+                await self._migrate_legacy(*contact)
+            await self._redis.set(LEGACY_DONE_KEY, "1")
+            self._legacy_pending = False
+            logger.info("memory_legacy_migration_completed", contacts=len(seen))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # The per-read fallback stays on; the next process start retries the sweep
+            logger.warning("memory_legacy_migration_failed", contacts=len(seen), error=str(e))
+
+    # ── Reads ──
+
+    async def get_state(
         self,
         tenant_id: str,
         contact_id: str,
-        role: str,
-        content: str,
-        message_type: str = "text",
-        metadata: Optional[dict] = None,
-    ) -> None:
-        """Add a message to the conversation context."""
+        limit: int = MAX_CONTEXT_MESSAGES,
+    ) -> tuple[list[dict], bool]:
+        """Conversation context and human-handoff flag — from L1, or one Redis round-trip."""
         key = self._key(tenant_id, contact_id)
-        message = {
-            "role": role,
-            "content": content,
-            "type": message_type,
-            "timestamp": datetime.utcnow().isoformat(),
-        }
-        if metadata:
-            message["metadata"] = metadata
 
         if self._use_redis:
+            cached = self._l1.get(key)
+            if cached is not None:
+                handoff, messages = cached
+                return messages[-limit:], handoff
             try:
-                pipe = self._redis.pipeline()
-                pipe.rpush(key, json.dumps(message))
-                pipe.ltrim(key, -MAX_CONTEXT_MESSAGES, -1)
-                pipe.expire(key, 86400 * 7)
-                await pipe.execute()
+                keys = [key, self._handoff_key(tenant_id, contact_id), self._version_key(tenant_id, contact_id)]
+                self.metrics["round_trips"] += 1
+                version, handoff, raw_messages = await self._read_script(keys=keys, args=[MAX_CONTEXT_MESSAGES])
+                # Version 0: never written under the current keys
+                if int(version) == 0 and self._legacy_pending:
+                    if await self._migrate_legacy(tenant_id, contact_id):
+                        self.metrics["round_trips"] += 1
+                        version, handoff, raw_messages = await self._read_script(keys=keys, args=[MAX_CONTEXT_MESSAGES])
+                messages = self._decode_all(raw_messages)
+                handoff = handoff == b"1"
+                self._l1.put(key, int(version), handoff, messages)
+                return messages[-limit:], handoff
             except Exception as e:
-                logger.error("redis_add_message_error", error=str(e))
-                self._local_store[key].append(message)
-                self._local_store[key] = self._local_store[key][-MAX_CONTEXT_MESSAGES:]
-        else:
-            self._local_store[key].append(message)
-            self._local_store[key] = self._local_store[key][-MAX_CONTEXT_MESSAGES:]
+                logger.error("redis_get_context_error", error=str(e))
+
+        messages = self._decode_all(self._local_store.get(key, [])[-limit:])
+        return messages, self._local_store.get(self._handoff_key(tenant_id, contact_id)) == "1"
 
     async def get_context(
         self,
@@ -98,70 +467,128 @@ class ConversationMemory:
         limit: int = MAX_CONTEXT_MESSAGES,
     ) -> list[dict]:
         """Retrieve conversation context for a contact."""
+        messages, _ = await self.get_state(tenant_id, contact_id, limit)
+        return messages
+
+    async def is_human_handoff(self, tenant_id: str, contact_id: str) -> bool:
+        """Check if conversation is flagged for human handoff."""
+        _, handoff = await self.get_state(tenant_id, contact_id)
+        return handoff
+
+    async def get_last_message_time(self, tenant_id: str, contact_id: str) -> Optional[datetime]:
+        """Get timestamp of the last message in conversation."""
+        try:
+            messages = await self.get_context(tenant_id, contact_id, limit=1)
+            if messages:
+                return datetime.fromisoformat(messages[-1]["timestamp"])
+        except Exception:
+            pass
+        return None
+
+    # ── Writes ──
+
+    async def add_messages(self, tenant_id: str, contact_id: str, messages: list[dict]) -> None:
+        """
+        Append several messages (dicts with 'role', 'content' and optional
+        'type', 'metadata') in one write; they are copied to the database
+        in the background (app.memory.persister).
+        """
+        from app.memory.persister import message_persister
+
         key = self._key(tenant_id, contact_id)
+        full = []
+        for m in messages:
+            message = {
+                "role": m["role"],
+                "content": m["content"],
+                "type": m.get("type") or "text",
+                "timestamp": datetime.utcnow().isoformat(),
+            }
+            if m.get("metadata"):
+                message["metadata"] = m["metadata"]
+            full.append(message)
+        encoded = [encode_message(message, settings.memory_codec) for message in full]
+        message_persister.enqueue(tenant_id, contact_id, full)
 
         if self._use_redis:
             try:
-                raw_messages = await self._redis.lrange(key, -limit, -1)
-                return [json.loads(msg) for msg in raw_messages]
+                self.metrics["round_trips"] += 1
+                version = await self._append_script(
+                    keys=[key, self._version_key(tenant_id, contact_id)],
+                    args=[MAX_CONTEXT_MESSAGES, settings.memory_context_ttl_sec, INVALIDATION_CHANNEL, key, *encoded],
+                )
+                self._l1.update(key, int(version), append=full)
+                return
             except Exception as e:
-                logger.error("redis_get_context_error", error=str(e))
-                return self._local_store.get(key, [])[-limit:]
-        else:
-            return self._local_store.get(key, [])[-limit:]
+                logger.error("redis_add_message_error", error=str(e))
+        for item in encoded:
+            self._local_store.append(key, item, MAX_CONTEXT_MESSAGES)
 
-    async def clear_context(self, tenant_id: str, contact_id: str) -> None:
-        """Clear all messages for a conversation."""
+    async def add_message(
+        self,
+        tenant_id: str,
+        contact_id: str,
+        role: str,
+        content: str,
+        message_type: str = "text",
+        metadata: Optional[dict] = None,
+    ) -> None:
+        """Add a message to the conversation context."""
+        await self.add_messages(
+            tenant_id, contact_id, [{"role": role, "content": content, "type": message_type, "metadata": metadata}]
+        )
+
+    async def _write_flag(self, tenant_id: str, contact_id: str, target_key: str, mode: str, ttl_sec: int) -> bool:
         key = self._key(tenant_id, contact_id)
-        if self._use_redis:
+        try:
+            self.metrics["round_trips"] += 1
+            version = await self._flag_script(
+                keys=[target_key, self._version_key(tenant_id, contact_id)],
+                args=[mode, ttl_sec, INVALIDATION_CHANNEL, key],
+            )
+        except Exception as e:
+            logger.error("redis_memory_flag_error", error=str(e))
+            return False
+        if target_key == key:
+            self._l1.invalidate(key, int(version))
+        else:
+            self._l1.update(key, int(version), handoff=mode == "set")
+        if mode == "del" and self._legacy_pending:
+            # Don't let a later first read migrate what was just cleared
+            legacy = self._legacy_keys(tenant_id, contact_id)
             try:
-                await self._redis.delete(key)
+                await self._binary.delete(legacy[0] if target_key == key else legacy[1])
             except Exception:
                 pass
-        self._local_store.pop(key, None)
+        return True
 
-    async def get_last_message_time(self, tenant_id: str, contact_id: str) -> Optional[datetime]:
-        """Get timestamp of the last message in conversation."""
+    async def clear_context(self, tenant_id: str, contact_id: str) -> None:
+        """Clear all messages for a conversation."""
         key = self._key(tenant_id, contact_id)
-        try:
-            if self._use_redis:
-                last_raw = await self._redis.lindex(key, -1)
-                if last_raw:
-                    return datetime.fromisoformat(json.loads(last_raw)["timestamp"])
-            else:
-                msgs = self._local_store.get(key, [])
-                if msgs:
-                    return datetime.fromisoformat(msgs[-1]["timestamp"])
-        except Exception:
-            pass
-        return None
+        if self._use_redis:
+            await self._write_flag(tenant_id, contact_id, key, "del", 0)
+        self._local_store.pop(key)
 
     async def set_human_handoff(self, tenant_id: str, contact_id: str, active: bool = True) -> None:
         """Flag a conversation for human handoff."""
-        flag_key = f"tenant:{tenant_id}:contact:{contact_id}:human_handoff"
+        flag_key = self._handoff_key(tenant_id, contact_id)
         if self._use_redis:
-            try:
-                if active:
-                    await self._redis.set(flag_key, "1", ex=86400)
-                else:
-                    await self._redis.delete(flag_key)
-            except Exception:
-                self._local_store[flag_key] = ["1"] if active else []
+            if await self._write_flag(tenant_id, contact_id, flag_key, "set" if active else "del", HANDOFF_TTL_SEC):
+                return
+        if active:
+            self._local_store.set(flag_key, "1", ttl_sec=HANDOFF_TTL_SEC)
         else:
-            self._local_store[flag_key] = ["1"] if active else []
+            self._local_store.pop(flag_key)
 
-    async def is_human_handoff(self, tenant_id: str, contact_id: str) -> bool:
-        """Check if conversation is flagged for human handoff."""
-        flag_key = f"tenant:{tenant_id}:contact:{contact_id}:human_handoff"
-        if self._use_redis:
-            try:
-                result = await self._redis.get(flag_key)
-                return result == "1"
-            except Exception:
-                pass
-        return bool(self._local_store.get(flag_key, []))
+    def stats(self) -> dict:
+        return {
+            "backend": "redis" if self._use_redis else "local",
+            "codec": settings.memory_codec,
+            **self.metrics,
+            "l1": self._l1.stats(),
+            "local": self._local_store.stats(),
+        }
 
 
 # Singleton instance
 memory = ConversationMemory()
-
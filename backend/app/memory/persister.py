@@ -0,0 +1,269 @@
+"""
+InstaTG Agent — Conversation Memory Persister
+
+Write-behind copy of conversation memory into `conversations` / `messages`.
+
+ConversationMemory.add_messages hands every message to this buffer and
+returns; a background task flushes the buffer every
+`memory_persist_interval_sec` (or as soon as `memory_persist_batch_size`
+messages are waiting) with one bulk INSERT into `messages`, and each
+conversation touched by the flush is created or has its `last_message_at`
+updated once. Nothing is written to the database on the reply path.
+
+- The channel comes from the memory contact id prefix (`ig_`, `fb_`,
+  `ig_comment_`, `fb_comment_`; bare numeric ids are Telegram). Contacts
+  without a channel (sandbox/simulator sessions) are not persisted.
+- Handlers that store their own messages through MessageStorageService
+  (Telegram bot webhook, Instagram text DMs, WhatsApp) are decorated with
+  `stores_own_messages`; memory messages added while one runs are not
+  persisted again. Matching on content after the fact cannot work there:
+  the handler stores the assistant reply only after the outbound send,
+  which may be after this buffer has already flushed it.
+- A failed flush is retried with backoff; the buffer is bounded and drops
+  the oldest messages when the database stays unavailable (Redis still holds
+  the recent window of every conversation).
+"""
+
+import asyncio
+import contextvars
+import functools
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timezone
+from typing import Optional
+
+import structlog
+from sqlalchemy import insert, select, update
+
+from app.config import settings
+
+logger = structlog.get_logger(__name__)
+
+MAX_RETRY_DELAY_SEC = 60.0
+
+# True while a handler that persists through MessageStorageService is running
+_handler_stores_messages: contextvars.ContextVar[bool] = contextvars.ContextVar(
+    "handler_stores_messages", default=False
+)
+
+
+def stores_own_messages(handler):
+    """Mark a channel handler that stores its messages itself; memory writes inside it are not persisted."""
+
+    @functools.wraps(handler)
+    async def wrapper(*args, **kwargs):
+        token = _handler_stores_messages.set(True)
+        try:
+            return await handler(*args, **kwargs)
+        finally:
+            _handler_stores_messages.reset(token)
+
+    return wrapper
+
+
+def resolve_channel(contact_id: str) -> Optional[tuple[str, str]]:
+    """(ChannelType value, channel contact id) for a memory contact id, or None."""
+    from app.models import ChannelType
+
+    for prefix, channel in (
+        ("ig_comment_", ChannelType.INSTAGRAM_COMMENT),
+        ("fb_comment_", ChannelType.FACEBOOK_COMMENT),
+        ("ig_", ChannelType.INSTAGRAM),
+        ("fb_", ChannelType.FACEBOOK),
+    ):
+        if contact_id.startswith(prefix):
+            return channel.value, contact_id[len(prefix):]
+    if contact_id.lstrip("-").isdigit():
+        return ChannelType.TELEGRAM.value, contact_id
+    return None
+
+
+def _parse_timestamp(value: Optional[str]) -> datetime:
+    try:
+        moment = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return datetime.now(timezone.utc)
+    return moment if moment.tzinfo else moment.replace(tzinfo=timezone.utc)
+
+
+class MessagePersister:
+    """Bounded write-behind buffer of memory messages, flushed in batches."""
+
+    def __init__(self, batch_size: int = 200, interval_sec: float = 1.0, max_buffer: int = 20000):
+        self.batch_size = batch_size
+        self.interval_sec = interval_sec
+        self.max_buffer = max_buffer
+        # (tenant_id, contact_id, message dict)
+        self._buffer: deque[tuple[str, str, dict]] = deque()
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._retry_delay = 0.0
+        self.metrics = {"persisted": 0, "handler_stored": 0, "skipped": 0, "dropped": 0, "flushes": 0, "flush_errors": 0}
+
+    def enqueue(self, tenant_id: str, contact_id: str, messages: list[dict]) -> None:
+        if not settings.memory_persist_enabled:
+            return
+        if _handler_stores_messages.get():
+            self.metrics["handler_stored"] += len(messages)
+            return
+        if resolve_channel(str(contact_id)) is None:
+            self.metrics["skipped"] += len(messages)
+            return
+        for message in messages:
+            self._buffer.append((str(tenant_id), str(contact_id), message))
+        overflow = len(self._buffer) - self.max_buffer
+        if overflow > 0:
+            for _ in range(overflow):
+                self._buffer.popleft()
+            self.metrics["dropped"] += overflow
+            logger.warning("memory_persist_buffer_full", dropped=overflow)
+        self._ensure_running()
+        if len(self._buffer) >= self.batch_size and self._wakeup is not None:
+            self._wakeup.set()
+
+    def _ensure_running(self) -> None:
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return  # flushed by the next caller that has a loop
+        if self._task is None or self._task.done() or self._task.get_loop() is not loop:
+            self._wakeup = asyncio.Event()
+            self._task = loop.create_task(self._run())
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.interval_sec + self._retry_delay)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            while self._buffer:
+                if not await self.flush():
+                    break
+                if len(self._buffer) < self.batch_size:
+                    break
+
+    async def flush(self) -> bool:
+        """Write up to one batch; returns False (and keeps the batch) if the database write failed."""
+        if not self._buffer:
+            return True
+        batch = [self._buffer.popleft() for _ in range(min(self.batch_size, len(self._buffer)))]
+        try:
+            await self._write(batch)
+        except asyncio.CancelledError:
+            self._buffer.extendleft(reversed(batch))
+            raise
+        except Exception as e:
+            self._buffer.extendleft(reversed(batch))
+            self.metrics["flush_errors"] += 1
+            self._retry_delay = min(MAX_RETRY_DELAY_SEC, max(1.0, self._retry_delay * 2))
+            logger.error("memory_persist_flush_failed", messages=len(batch), error=str(e), retry_in=self._retry_delay)
+            return False
+        self._retry_delay = 0.0
+        self.metrics["flushes"] += 1
+        return True
+
+    async def _write(self, batch: list[tuple[str, str, dict]]) -> None:
+        from app.database import background_session_factory
+        from app.models import ChannelType, Conversation, Message, MessageRole, MessageType
+
+        started = time.perf_counter()
+        # Conversation key -> newest message time in this batch
+        conversations: dict[tuple[uuid.UUID, str, str], datetime] = {}
+        rows: list[tuple[tuple[uuid.UUID, str, str], dict]] = []
+        for tenant_id, contact_id, message in batch:
+            channel = resolve_channel(contact_id)
+            try:
+                tenant_uuid = uuid.UUID(tenant_id)
+                role = MessageRole(message.get("role"))
+            except ValueError:
+                self.metrics["skipped"] += 1
+                continue
+            try:
+                message_type = MessageType(message.get("type") or "text")
+            except ValueError:
+                message_type = MessageType.OTHER
+            key = (tenant_uuid, channel[0], channel[1])
+            created_at = _parse_timestamp(message.get("timestamp"))
+            conversations[key] = max(conversations.get(key, created_at), created_at)
+            rows.append((key, {
+                "role": role,
+                "message_type": message_type,
+                "content": message.get("content") or "",
+                "metadata_": message.get("metadata"),
+                "created_at": created_at,
+            }))
+        if not rows:
+            return
+
+        async with background_session_factory() as db:
+            # Upsert each conversation once
+            existing = await db.execute(
+                select(Conversation.id, Conversation.tenant_id, Conversation.channel, Conversation.contact_id).where(
+                    Conversation.tenant_id.in_(list({key[0] for key in conversations})),
+                    Conversation.contact_id.in_(list({key[2] for key in conversations})),
+                )
+            )
+            ids: dict[tuple[uuid.UUID, str, str], uuid.UUID] = {}
+            for conversation_id, tenant_uuid, channel, contact in existing.all():
+                ids.setdefault((tenant_uuid, ChannelType(channel).value, contact), conversation_id)
+
+            new = [key for key in conversations if key not in ids]
+            if new:
+                for key in new:
+                    ids[key] = uuid.uuid4()
+                await db.execute(insert(Conversation), [
+                    {
+                        "id": ids[key],
+                        "tenant_id": key[0],
+                        "channel": ChannelType(key[1]),
+                        "contact_id": key[2],
+                        "contact_name": "New Customer",
+                        "last_message_at": conversations[key],
+                    }
+                    for key in new
+                ])
+            touched = [key for key in conversations if key not in new]
+            if touched:
+                await db.execute(
+                    update(Conversation),
+                    [{"id": ids[key], "last_message_at": conversations[key]} for key in touched],
+                )
+
+            values = [{"id": uuid.uuid4(), "conversation_id": ids[key], **row} for key, row in rows]
+            await db.execute(insert(Message), values)
+            await db.commit()
+
+        self.metrics["persisted"] += len(values)
+        logger.debug(
+            "memory_persist_flushed",
+            messages=len(values),
+            conversations=len(conversations),
+            ms=round((time.perf_counter() - started) * 1000, 1),
+        )
+
+    async def close(self) -> None:
+        """Stop the background task and flush what is buffered."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, RuntimeError):
+                pass
+            self._task = None
+        while self._buffer:
+            if not await self.flush():
+                logger.error("memory_persist_unflushed_on_close", messages=len(self._buffer))
+                break
+
+    def stats(self) -> dict:
+        return {**self.metrics, "buffered": len(self._buffer)}
+
+
+# Singleton instance
+message_persister = MessagePersister(
+    batch_size=settings.memory_persist_batch_size,
+    interval_sec=settings.memory_persist_interval_sec,
+    max_buffer=settings.memory_persist_max_buffer,
+)
@@ -16,6 +16,7 @@ from sqlalchemy import (
     DateTime,
     Float,
     ForeignKey,
+    Index,
     Integer,
     String,
     Text,
@@ -25,7 +26,7 @@ from sqlalchemy import (
     CHAR,
 )
 from sqlalchemy.orm import relationship
-from sqlalchemy.sql import func
+from sqlalchemy.sql import func, text
 
 from app.database import Base
 
@@ -190,7 +191,7 @@ class InstagramAccount(Base):
 
     id = Column(UUID(), primary_key=True, default=uuid.uuid4)
     tenant_id = Column(UUID(), ForeignKey("tenants.id", ondelete="CASCADE"), nullable=False)
-    instagram_user_id = Column(String(100), nullable=False)
+    instagram_user_id = Column(String(100), nullable=False, index=True)
     page_id = Column(String(100), nullable=False)
     access_token = Column(Text, nullable=False)
     username = Column(String(255), nullable=True)
@@ -282,6 +283,12 @@ class Conversation(Base):
     analysis = relationship("ConversationAnalysis", back_populates="conversation", uselist=False, cascade="all, delete-orphan")
     voice_analyses = relationship("VoiceAnalysis", back_populates="conversation", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        Index("ix_conversations_tenant_contact_channel", "tenant_id", "contact_id", "channel"),
+        Index("ix_conversations_tenant_created_at", "tenant_id", "created_at"),
+        Index("ix_conversations_tenant_last_message_at", "tenant_id", "last_message_at"),
+    )
+
 
 class Message(Base):
     """Individual message in a conversation."""
@@ -298,6 +305,10 @@ class Message(Base):
 
     conversation = relationship("Conversation", back_populates="messages")
 
+    __table_args__ = (
+        Index("ix_messages_conversation_created_at", "conversation_id", "created_at"),
+    )
+
 
 class ConversationAnalysis(Base):
     """AI-generated analysis of a completed conversation."""
@@ -307,7 +318,7 @@ class ConversationAnalysis(Base):
     conversation_id = Column(UUID(), ForeignKey("conversations.id", ondelete="CASCADE"), nullable=False, unique=True)
     sentiment = Column(Enum(SentimentType), nullable=True)
     lead_score = Column(Integer, nullable=True)
-    sales_outcome = Column(Enum(SalesOutcome), nullable=True)
+    sales_outcome = Column(Enum(SalesOutcome), nullable=True, index=True)
     key_topics = Column(JSON, nullable=True)
     objections_raised = Column(JSON, nullable=True)
     objection_handling = Column(JSON, nullable=True)
@@ -380,6 +391,34 @@ class KnowledgeDocument(Base):
     )
 
 
+class KnowledgeIngestionJob(Base):
+    """Background extract → chunk → embed → upsert job for a knowledge document."""
+    __tablename__ = "knowledge_ingestion_jobs"
+
+    id = Column(UUID(), primary_key=True, default=uuid.uuid4)
+    tenant_id = Column(UUID(), ForeignKey("tenants.id", ondelete="CASCADE"), nullable=False, index=True)
+    document_id = Column(UUID(), ForeignKey("knowledge_documents.id", ondelete="CASCADE"), nullable=True)
+    kind = Column(String(20), nullable=False)  # upload, scrape
+    source = Column(String(1000), nullable=False)  # filename or URL
+    status = Column(String(20), default="queued", index=True)  # queued, running, completed, failed
+    stage = Column(String(30), default="queued")  # queued, extracting, chunking, embedding, upserting, done
+    progress = Column(JSON, nullable=True)  # {pages_parsed, chunks_total, chunks_embedded, vectors_upserted}
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    __table_args__ = (
+        # At most one queued/running job per document (re-uploads diff the same chunk registry)
+        Index(
+            "uq_knowledge_ingestion_jobs_active_document",
+            "document_id",
+            unique=True,
+            postgresql_where=text("status IN ('queued', 'running')"),
+            sqlite_where=text("status IN ('queued', 'running')"),
+        ),
+    )
+
+
 class CRMLead(Base):
     """Record of a lead pushed to AmoCRM."""
     __tablename__ = "crm_leads"
@@ -418,6 +457,10 @@ class DailyReport(Base):
 
     tenant = relationship("Tenant", back_populates="daily_reports")
 
+    __table_args__ = (
+        Index("ix_daily_reports_tenant_report_date", "tenant_id", "report_date"),
+    )
+
 
 class ManualKnowledge(Base):
     """Manually entered Q&A or raw text knowledge."""
@@ -601,6 +644,10 @@ class AILog(Base):
     prompt_snapshot = Column(Text, nullable=True)
     completion = Column(Text, nullable=True)
     token_usage = Column(Integer, default=0)
+    # Routing classifier training signal
+    user_message = Column(Text, nullable=True)
+    complexity = Column(String(20), nullable=True)
+    intent = Column(String(50), nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     tenant = relationship("Tenant", back_populates="ai_logs")
@@ -613,6 +660,9 @@ class KnowledgeBaseChunk(Base):
     document_id = Column(UUID(), ForeignKey("knowledge_documents.id", ondelete="CASCADE"), nullable=True)
     content = Column(Text, nullable=False)
     vector_id = Column(String(255), nullable=True)
+    source = Column(String(500), nullable=True)
+    chunk_index = Column(Integer, default=0)
+    content_hash = Column(String(64), nullable=True)  # sha256 of content, for diff re-indexing
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     tenant = relationship("Tenant", back_populates="knowledge_base_chunks")
@@ -645,6 +695,9 @@ class Lead(Base):
 
     id = Column(UUID(), primary_key=True, default=uuid.uuid4)
     tenant_id = Column(UUID(), ForeignKey("tenants.id", ondelete="CASCADE"), nullable=False, index=True)
+    name = Column(String(255), nullable=True)
+    phone = Column(String(100), nullable=True)  # channel contact id for Telegram / WhatsApp leads
+    source = Column(String(100), nullable=True)
     contact_info = Column(JSON, nullable=True)
     status = Column(String(50), default="New", index=True)
     pipeline_stage_id = Column(UUID(), ForeignKey("pipeline_stages.id", ondelete="SET NULL"), nullable=True)
@@ -658,6 +711,10 @@ class Lead(Base):
     sales_interactions = relationship("SalesInteraction", back_populates="lead", cascade="all, delete-orphan")
     transactions = relationship("Transaction", back_populates="lead", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        Index("ix_leads_tenant_phone", "tenant_id", "phone"),
+    )
+
 class SalesInteraction(Base):
     __tablename__ = "sales_interactions"
 
@@ -55,6 +55,13 @@ async def execute_flow(flow_data: Dict[str, Any], tenant_id: str, user_id: str,
     if not flow_data or "nodes" not in flow_data or "edges" not in flow_data:
         return
 
+    # LLM calls made by this flow queue behind live replies in the scheduler
+    from app.services.llm_scheduler import llm_work
+    with llm_work(tenant_id=tenant_id, priority="automation"):
+        await _execute_flow_nodes(flow_data, tenant_id, user_id, message_text, send_message_func)
+
+
+async def _execute_flow_nodes(flow_data: Dict[str, Any], tenant_id: str, user_id: str, message_text: str, send_message_func):
     nodes = flow_data["nodes"]
     edges = flow_data["edges"]
     node_map = {n["id"]: n for n in nodes}
@@ -115,11 +122,18 @@ async def execute_flow(flow_data: Dict[str, Any], tenant_id: str, user_id: str,
             
             elif node_type == "extractData":
                 keys = node_data.get("keys", "phone, name")
-                from app.agents.claude_agent import agent
-                # AI-powered extraction
-                extracted = await agent.extract_json(message_text, keys)
+                from app.services.extraction_rules import parse_keys, extract_with_rules
+                # Local rules first (phones, emails, amounts, dates, names)
+                key_list = parse_keys(keys)
+                extracted = extract_with_rules(message_text, key_list)
+                missing = [k for k in key_list if k not in extracted]
+                if missing:
+                    # AI-powered extraction only for what the rules couldn't fill
+                    from app.agents.claude_agent import agent
+                    ai_extracted = await agent.extract_json(message_text, ", ".join(missing))
+                    extracted.update({k: v for k, v in ai_extracted.items() if k not in extracted})
                 context["extracted"].update(extracted)
-                logger.info("data_extracted", data=extracted)
+                logger.info("data_extracted", data=extracted, llm_keys=missing)
 
             elif node_type == "aiStep":
                 prompt = node_data.get("prompt", "")
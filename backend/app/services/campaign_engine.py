@@ -3,7 +3,7 @@ import asyncio
 from typing import List, Dict, Any
 from uuid import UUID
 from datetime import datetime
-from app.database import async_session_factory
+from app.database import background_session_factory
 from app.models import Lead, Campaign, VoiceAgent, ChatAgent
 from sqlalchemy import select, update
 
@@ -41,7 +41,7 @@ class CampaignEngine:
         except ImportError:
             logger.error("celery_not_found_falling_back_to_local")
             # Fallback to local processing if Celery is not available (demo mode)
-            async with async_session_factory() as db:
+            async with background_session_factory() as db:
                 result = await db.execute(select(Campaign).where(Campaign.id == campaign_id))
                 campaign = result.scalar_one_or_none()
                 if campaign:
@@ -51,7 +51,7 @@ class CampaignEngine:
     
     async def stop_campaign(self, campaign_id: str):
         """Cancel a running campaign task."""
-        async with async_session_factory() as db:
+        async with background_session_factory() as db:
             result = await db.execute(select(Campaign).where(Campaign.id == campaign_id))
             campaign = result.scalar_one_or_none()
             if campaign:
@@ -87,7 +87,7 @@ class CampaignEngine:
             
             variants_data = json.loads(response.content[0].text)
             
-            async with async_session_factory() as db:
+            async with background_session_factory() as db:
                 await db.execute(
                     update(Campaign)
                     .where(Campaign.id == campaign_id)
@@ -0,0 +1,437 @@
+"""
+Lightweight complexity / intent classifier for LLM routing.
+
+Hashed character n-gram features + multinomial logistic regression in NumPy.
+Language-agnostic, so Uzbek and Russian traffic is routed on what the message
+looks like rather than on English keywords. Prediction is a sparse row
+gather + softmax and runs well under 1 ms on CPU.
+
+Training data comes from logged AILog traffic (user_message, intent, reply),
+optionally merged with a hand-reviewed JSONL file.
+
+CLI:
+    python -m app.services.complexity_classifier train --out models/router_classifier.npz
+    python -m app.services.complexity_classifier evaluate --model models/router_classifier.npz --labels reviewed.jsonl
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import time
+import zlib
+from dataclasses import dataclass
+from typing import Iterable, Optional
+
+import numpy as np
+import structlog
+
+logger = structlog.get_logger(__name__)
+
+COMPLEXITY_LABELS = ("LOW", "MEDIUM", "HIGH")
+INTENT_LABELS = ("purchase", "inquiry", "complaint", "support", "general", "payment_verification")
+
+DEFAULT_N_FEATURES = 2 ** 18
+NGRAM_RANGE = (2, 4)
+
+
+@dataclass
+class Prediction:
+    """Classifier output for a single message."""
+    complexity: str
+    complexity_confidence: float
+    intent: str
+    intent_confidence: float
+
+
+def featurize(text: str, n_features: int = DEFAULT_N_FEATURES) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Hash a message into sparse (indices, values) features.
+
+    Character n-grams are taken per word with boundary markers, which keeps
+    Uzbek/Russian morphology (suffixes, cases) visible to the model. A few
+    length/shape features go into reserved buckets at the end of the space.
+    """
+    lowered = text.lower()
+    counts: dict[int, float] = {}
+    lo, hi = NGRAM_RANGE
+    hashed_space = n_features - 8
+
+    for word in lowered.split():
+        padded = f" {word} "
+        for n in range(lo, hi + 1):
+            for i in range(len(padded) - n + 1):
+                h = zlib.crc32(padded[i:i + n].encode("utf-8")) % hashed_space
+                counts[h] = counts.get(h, 0.0) + 1.0
+
+    # Reserved shape features
+    words = len(lowered.split())
+    shape = {
+        hashed_space + 0: math.log1p(len(text)) / 6.0,
+        hashed_space + 1: math.log1p(words) / 4.0,
+        hashed_space + 2: float(text.count("?")),
+        hashed_space + 3: float(any(c.isdigit() for c in text)),
+        hashed_space + 4: float(text.count("\n") > 0),
+        hashed_space + 5: 1.0,  # bias-like constant, helps with empty messages
+    }
+
+    if counts:
+        idx = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+        val = np.fromiter(counts.values(), dtype=np.float32, count=len(counts))
+        # Sublinear TF + L2 normalisation of the n-gram part
+        val = 1.0 + np.log(val)
+        val /= np.linalg.norm(val)
+    else:
+        idx = np.empty(0, dtype=np.int64)
+        val = np.empty(0, dtype=np.float32)
+
+    idx = np.concatenate([idx, np.fromiter(shape.keys(), dtype=np.int64, count=len(shape))])
+    val = np.concatenate([val, np.fromiter(shape.values(), dtype=np.float32, count=len(shape))])
+    return idx, val
+
+
+def _softmax(z: np.ndarray) -> np.ndarray:
+    z = z - z.max(axis=-1, keepdims=True)
+    e = np.exp(z)
+    return e / e.sum(axis=-1, keepdims=True)
+
+
+class _LogisticHead:
+    """Multinomial logistic regression over hashed sparse features."""
+
+    def __init__(self, labels: tuple, n_features: int):
+        self.labels = tuple(labels)
+        self.W = np.zeros((n_features, len(labels)), dtype=np.float32)
+        self.b = np.zeros(len(labels), dtype=np.float32)
+
+    def logits(self, idx: np.ndarray, val: np.ndarray) -> np.ndarray:
+        return val @ self.W[idx] + self.b
+
+    def predict(self, idx: np.ndarray, val: np.ndarray) -> tuple[str, float]:
+        p = _softmax(self.logits(idx, val))
+        k = int(p.argmax())
+        return self.labels[k], float(p[k])
+
+    def fit(
+        self,
+        X: list[tuple[np.ndarray, np.ndarray]],
+        y: np.ndarray,
+        epochs: int = 10,
+        lr: float = 0.5,
+        l2: float = 1e-6,
+        batch_size: int = 256,
+        seed: int = 0,
+    ) -> None:
+        """Mini-batch SGD with class-balanced weights and Adagrad step sizes."""
+        rng = np.random.default_rng(seed)
+        n_classes = len(self.labels)
+        counts = np.bincount(y, minlength=n_classes).astype(np.float32)
+        class_w = np.where(counts > 0, len(y) / (n_classes * np.maximum(counts, 1)), 0.0).astype(np.float32)
+
+        g2_W = np.full_like(self.W, 1e-8)
+        g2_b = np.full_like(self.b, 1e-8)
+        order = np.arange(len(X))
+
+        for _ in range(epochs):
+            rng.shuffle(order)
+            for start in range(0, len(order), batch_size):
+                batch = order[start:start + batch_size]
+                # Flatten the batch into COO form: (row in batch, feature, value)
+                idx = np.concatenate([X[i][0] for i in batch])
+                val = np.concatenate([X[i][1] for i in batch])
+                rows = np.repeat(np.arange(len(batch)), [len(X[i][0]) for i in batch])
+
+                Z = np.zeros((len(batch), n_classes), dtype=np.float32)
+                np.add.at(Z, rows, val[:, None] * self.W[idx])
+                P = _softmax(Z + self.b)
+                P[np.arange(len(batch)), y[batch]] -= 1.0
+                P *= class_w[y[batch]][:, None]
+
+                uniq, inverse = np.unique(idx, return_inverse=True)
+                G = np.zeros((len(uniq), n_classes), dtype=np.float32)
+                np.add.at(G, inverse, val[:, None] * P[rows])
+                G = G / len(batch) + l2 * self.W[uniq]
+                g2_W[uniq] += G * G
+                self.W[uniq] -= lr * G / np.sqrt(g2_W[uniq])
+
+                grad_b = P.mean(axis=0)
+                g2_b += grad_b * grad_b
+                self.b -= lr * grad_b / np.sqrt(g2_b)
+
+
+class RoutingClassifier:
+    """Predicts routing complexity (LOW/MEDIUM/HIGH) and sales intent."""
+
+    def __init__(self, n_features: int = DEFAULT_N_FEATURES):
+        self.n_features = n_features
+        self.complexity = _LogisticHead(COMPLEXITY_LABELS, n_features)
+        self.intent = _LogisticHead(INTENT_LABELS, n_features)
+
+    def predict(self, text: str) -> Prediction:
+        idx, val = featurize(text, self.n_features)
+        complexity, c_conf = self.complexity.predict(idx, val)
+        intent, i_conf = self.intent.predict(idx, val)
+        return Prediction(complexity, c_conf, intent, i_conf)
+
+    def fit(self, samples: list[dict], epochs: int = 10, seed: int = 0) -> None:
+        """Fit both heads on dicts with 'text', 'complexity' and optional 'intent'."""
+        X = [featurize(s["text"], self.n_features) for s in samples]
+        y_c = np.array([COMPLEXITY_LABELS.index(s["complexity"]) for s in samples], dtype=np.int64)
+        self.complexity.fit(X, y_c, epochs=epochs, seed=seed)
+
+        with_intent = [i for i, s in enumerate(samples) if s.get("intent") in INTENT_LABELS]
+        if with_intent:
+            y_i = np.array([INTENT_LABELS.index(samples[i]["intent"]) for i in with_intent], dtype=np.int64)
+            self.intent.fit([X[i] for i in with_intent], y_i, epochs=epochs, seed=seed)
+
+    def save(self, path: str) -> None:
+        # Only non-zero rows are stored; hashed weight matrices are very sparse.
+        rows = np.flatnonzero(np.abs(self.complexity.W).sum(1) + np.abs(self.intent.W).sum(1))
+        np.savez_compressed(
+            path,
+            n_features=np.array(self.n_features),
+            rows=rows,
+            Wc=self.complexity.W[rows], bc=self.complexity.b,
+            Wi=self.intent.W[rows], bi=self.intent.b,
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "RoutingClassifier":
+        data = np.load(path)
+        model = cls(int(data["n_features"]))
+        rows = data["rows"]
+        model.complexity.W[rows] = data["Wc"]
+        model.complexity.b[:] = data["bc"]
+        model.intent.W[rows] = data["Wi"]
+        model.intent.b[:] = data["bi"]
+        return model
+
+
+# ─── Runtime access ──────────────────────────────────────────────────
+
+_classifier: Optional[RoutingClassifier] = None
+_load_attempted = False
+
+
+def get_classifier() -> Optional[RoutingClassifier]:
+    """Load the configured model once per process; None if not configured or unreadable."""
+    global _classifier, _load_attempted
+    if not _load_attempted:
+        _load_attempted = True
+        from app.config import settings
+        if settings.routing_classifier_path:
+            try:
+                _classifier = RoutingClassifier.load(settings.routing_classifier_path)
+                logger.info("routing_classifier_loaded", path=settings.routing_classifier_path)
+            except Exception as e:
+                logger.warning("routing_classifier_load_failed", path=settings.routing_classifier_path, error=str(e))
+    return _classifier
+
+
+# ─── Training data ───────────────────────────────────────────────────
+
+def derive_complexity_label(completion: str) -> str:
+    """
+    Weak label for logged traffic: how much answer the message actually needed.
+    Short acknowledgements and greetings are LOW, explanations are HIGH.
+    Hand-reviewed labels (--labels) take precedence over this.
+    """
+    words = len((completion or "").split())
+    if words <= 30:
+        return "LOW"
+    if words <= 90:
+        return "MEDIUM"
+    return "HIGH"
+
+
+async def load_ai_log_samples(since_days: int = 90, tenant_id: Optional[str] = None, limit: int = 200_000) -> list[dict]:
+    """Pull labelled samples from the AILog table."""
+    from datetime import datetime, timedelta
+    from sqlalchemy import select
+
+    from app.database import background_session_factory
+    from app.models import AILog
+
+    stmt = (
+        select(AILog.user_message, AILog.intent, AILog.completion)
+        .where(AILog.user_message.isnot(None))
+        .where(AILog.created_at >= datetime.utcnow() - timedelta(days=since_days))
+        .order_by(AILog.created_at.desc())
+        .limit(limit)
+    )
+    if tenant_id:
+        stmt = stmt.where(AILog.tenant_id == tenant_id)
+
+    async with background_session_factory() as db:
+        rows = (await db.execute(stmt)).all()
+
+    return [
+        {"text": msg, "complexity": derive_complexity_label(completion), "intent": intent}
+        for msg, intent, completion in rows
+        if msg and msg.strip()
+    ]
+
+
+def load_jsonl(path: str) -> list[dict]:
+    samples = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            row = json.loads(line)
+            if row.get("text") and row.get("complexity") in COMPLEXITY_LABELS:
+                samples.append(row)
+    return samples
+
+
+# ─── Evaluation ──────────────────────────────────────────────────────
+
+def _head_report(y_true: list[str], y_pred: list[str], labels: Iterable[str]) -> dict:
+    labels = list(labels)
+    matrix = {t: {p: 0 for p in labels} for t in labels}
+    for t, p in zip(y_true, y_pred):
+        matrix[t][p] += 1
+
+    per_class = {}
+    f1s = []
+    for label in labels:
+        tp = matrix[label][label]
+        fp = sum(matrix[t][label] for t in labels if t != label)
+        fn = sum(matrix[label][p] for p in labels if p != label)
+        precision = tp / (tp + fp) if tp + fp else 0.0
+        recall = tp / (tp + fn) if tp + fn else 0.0
+        f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+        support = tp + fn
+        per_class[label] = {"precision": round(precision, 3), "recall": round(recall, 3),
+                            "f1": round(f1, 3), "support": support}
+        if support:
+            f1s.append(f1)
+
+    correct = sum(1 for t, p in zip(y_true, y_pred) if t == p)
+    return {
+        "accuracy": round(correct / len(y_true), 4) if y_true else 0.0,
+        "macro_f1": round(sum(f1s) / len(f1s), 4) if f1s else 0.0,
+        "per_class": per_class,
+        "confusion": matrix,
+    }
+
+
+def evaluate(model: RoutingClassifier, samples: list[dict]) -> dict:
+    """Accuracy, per-class P/R/F1, confusion matrices, latency and routing shift."""
+    from app.services.llm_router import heuristic_complexity
+
+    latencies = []
+    c_true, c_pred, i_true, i_pred = [], [], [], []
+    heuristic = []
+    for s in samples:
+        start = time.perf_counter()
+        pred = model.predict(s["text"])
+        latencies.append(time.perf_counter() - start)
+        c_true.append(s["complexity"])
+        c_pred.append(pred.complexity)
+        heuristic.append(heuristic_complexity(s["text"]))
+        if s.get("intent") in INTENT_LABELS:
+            i_true.append(s["intent"])
+            i_pred.append(pred.intent)
+
+    latencies.sort()
+
+    def pct(p):
+        return round(latencies[min(len(latencies) - 1, int(p / 100 * len(latencies)))] * 1e6, 1) if latencies else 0.0
+
+    def share(values):
+        return {label: round(values.count(label) / len(values), 3) if values else 0.0 for label in COMPLEXITY_LABELS}
+
+    return {
+        "samples": len(samples),
+        "complexity": _head_report(c_true, c_pred, COMPLEXITY_LABELS),
+        "complexity_heuristic_baseline": _head_report(c_true, heuristic, COMPLEXITY_LABELS),
+        "intent": _head_report(i_true, i_pred, INTENT_LABELS) if i_true else None,
+        "latency_us": {"p50": pct(50), "p99": pct(99), "max": pct(100)},
+        "routing_share": {"classifier": share(c_pred), "heuristic": share(heuristic)},
+    }
+
+
+def print_report(report: dict) -> None:
+    print(f"\nSamples: {report['samples']}")
+    for head in ("complexity", "complexity_heuristic_baseline", "intent"):
+        r = report.get(head)
+        if not r:
+            continue
+        print(f"\n[{head}] accuracy={r['accuracy']} macro_f1={r['macro_f1']}")
+        for label, m in r["per_class"].items():
+            print(f"  {label:<22} P={m['precision']:<6} R={m['recall']:<6} F1={m['f1']:<6} n={m['support']}")
+    lat = report["latency_us"]
+    print(f"\nPrediction latency: p50={lat['p50']}µs p99={lat['p99']}µs max={lat['max']}µs")
+    print(f"Routing share (classifier): {report['routing_share']['classifier']}")
+    print(f"Routing share (heuristic):  {report['routing_share']['heuristic']}\n")
+
+
+# ─── CLI ─────────────────────────────────────────────────────────────
+
+def _split(samples: list[dict], holdout: float, seed: int) -> tuple[list[dict], list[dict]]:
+    rng = np.random.default_rng(seed)
+    order = rng.permutation(len(samples))
+    cut = int(len(samples) * (1 - holdout))
+    return [samples[i] for i in order[:cut]], [samples[i] for i in order[cut:]]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Train/evaluate the LLM routing classifier")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    train_p = sub.add_parser("train")
+    train_p.add_argument("--out", required=True, help="Output .npz path")
+    train_p.add_argument("--labels", help="Hand-reviewed JSONL (text, complexity, intent); overrides AILog labels")
+    train_p.add_argument("--no-ai-log", action="store_true", help="Train only on --labels")
+    train_p.add_argument("--since-days", type=int, default=90)
+    train_p.add_argument("--tenant", default=None)
+    train_p.add_argument("--epochs", type=int, default=10)
+    train_p.add_argument("--holdout", type=float, default=0.2)
+    train_p.add_argument("--n-features", type=int, default=DEFAULT_N_FEATURES)
+    train_p.add_argument("--seed", type=int, default=0)
+    train_p.add_argument("--report", help="Write evaluation report JSON here")
+
+    eval_p = sub.add_parser("evaluate")
+    eval_p.add_argument("--model", required=True)
+    eval_p.add_argument("--labels", help="Evaluate on this JSONL instead of recent AILog traffic")
+    eval_p.add_argument("--since-days", type=int, default=14)
+    eval_p.add_argument("--report", help="Write evaluation report JSON here")
+
+    args = parser.parse_args()
+
+    if args.command == "train":
+        samples: dict[str, dict] = {}
+        if not args.no_ai_log:
+            for s in asyncio.run(load_ai_log_samples(args.since_days, args.tenant)):
+                samples[s["text"]] = s
+        if args.labels:
+            for s in load_jsonl(args.labels):
+                samples[s["text"]] = s
+        data = list(samples.values())
+        if len(data) < 10:
+            raise SystemExit(f"Not enough training samples ({len(data)})")
+
+        train, test = _split(data, args.holdout, args.seed)
+        model = RoutingClassifier(args.n_features)
+        started = time.perf_counter()
+        model.fit(train, epochs=args.epochs, seed=args.seed)
+        print(f"Trained on {len(train)} samples in {time.perf_counter() - started:.1f}s")
+        model.save(args.out)
+        print(f"Model written to {args.out}")
+
+        report = evaluate(model, test or train)
+    else:
+        model = RoutingClassifier.load(args.model)
+        data = load_jsonl(args.labels) if args.labels else asyncio.run(load_ai_log_samples(args.since_days))
+        report = evaluate(model, data)
+
+    print_report(report)
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+"""
+InstaTG Agent — Rule-Based Data Extraction
+Fast local path for automation `extractData` nodes. Phone numbers (UZ/RU),
+emails, amounts, dates and self-introduced names ("ismim ...", "меня зовут
+...", "my name is ..."; never a bare capitalised word) are pulled out with
+precompiled regexes in microseconds; only keys these rules cannot fill are
+sent to the LLM (see automation_engine).
+"""
+
+import re
+from datetime import date, timedelta
+from typing import Callable, Optional
+
+# ─── Key aliases (flow builders use EN/UZ/RU names) ─────────────────
+
+KEY_ALIASES = {
+    "phone": {"phone", "phone_number", "phonenumber", "tel", "telephone", "mobile", "telefon", "raqam", "nomer", "телефон", "номер"},
+    "email": {"email", "e-mail", "mail", "pochta", "почта"},
+    "name": {"name", "full_name", "fullname", "first_name", "ism", "ismi", "имя"},
+    "amount": {"amount", "price", "budget", "sum", "summa", "narx", "byudjet", "сумма", "цена", "бюджет"},
+    "date": {"date", "sana", "day", "дата"},
+}
+_ALIAS_TO_KIND = {alias: kind for kind, aliases in KEY_ALIASES.items() for alias in aliases}
+
+# ─── Phones ─────────────────────────────────────────────────────────
+
+_PHONE_CANDIDATE_RE = re.compile(r"(?<![\w+])\+?\d[\d\s\-().]{7,18}\d(?!\d)")
+# Uzbek mobile / landline operator codes
+_UZ_CODES = {"20", "33", "50", "55", "61", "62", "65", "66", "67", "69", "70", "71", "72", "73", "74",
+             "75", "76", "77", "78", "79", "88", "90", "91", "93", "94", "95", "97", "98", "99"}
+
+
+def _normalize_phone(raw: str) -> Optional[str]:
+    digits = re.sub(r"\D", "", raw)
+    if len(digits) == 12 and digits.startswith("998"):
+        return "+" + digits
+    if len(digits) == 9 and digits[:2] in _UZ_CODES:
+        return "+998" + digits
+    if len(digits) == 11 and digits[0] in "78" and digits[1] in "3489":
+        return "+7" + digits[1:]
+    if len(digits) == 10 and digits[0] == "9":
+        return "+7" + digits
+    return None
+
+
+def extract_phone(text: str) -> Optional[str]:
+    for match in _PHONE_CANDIDATE_RE.finditer(text):
+        phone = _normalize_phone(match.group())
+        if phone:
+            return phone
+    return None
+
+
+# ─── Emails ─────────────────────────────────────────────────────────
+
+_EMAIL_RE = re.compile(r"[A-Za-z0-9._%+\-]+@[A-Za-z0-9.\-]+\.[A-Za-z]{2,}")
+
+
+def extract_email(text: str) -> Optional[str]:
+    match = _EMAIL_RE.search(text)
+    return match.group().lower() if match else None
+
+
+# ─── Amounts ────────────────────────────────────────────────────────
+
+_CURRENCIES = [
+    ("UZS", r"so['ʻ‘’`]?m|сум|sum|uzs"),
+    ("USD", r"\$|usd|dollar\w*|доллар\w*"),
+    ("RUB", r"₽|руб\w*|rub"),
+    ("EUR", r"€|eur|euro\w*|евро"),
+]
+_MULTIPLIERS = {"k": 1_000, "ming": 1_000, "тыс": 1_000, "mln": 1_000_000, "million": 1_000_000, "млн": 1_000_000}
+_MULT_RE = r"(?:mln|million|млн|ming|тыс\.?|k)"
+_CUR_RE = "|".join(f"(?P<{code}>{pattern})" for code, pattern in _CURRENCIES)
+_NUMBER_RE = r"\d{1,3}(?:[ .,\u00a0]\d{3})+(?:[.,]\d+)?|\d+(?:[.,]\d+)?"
+_AMOUNT_RE = re.compile(
+    rf"(?:(?P<pre>\$|€|₽)\s*)?(?P<num>{_NUMBER_RE})\s*(?P<mult>{_MULT_RE})?\s*(?:{_CUR_RE})?(?!\w)",
+    re.IGNORECASE,
+)
+
+
+def _parse_number(raw: str) -> float:
+    raw = raw.replace("\u00a0", "").replace(" ", "")
+    if re.fullmatch(r"\d{1,3}(?:[.,]\d{3})+", raw):
+        return float(re.sub(r"\D", "", raw))  # "1.500.000" / "1,500"
+    return float(raw.replace(",", "."))
+
+
+def extract_amount(text: str) -> Optional[dict]:
+    """Returns {"value": number, "currency": code|None} for the first money-like amount."""
+    for match in _AMOUNT_RE.finditer(text):
+        currency = next((code for code, _ in _CURRENCIES if match.group(code)), None)
+        pre = match.group("pre")
+        if pre:
+            currency = {"$": "USD", "€": "EUR", "₽": "RUB"}[pre]
+        mult = match.group("mult")
+        # Bare numbers are not amounts (could be a phone, a date, a quantity)
+        if not currency and not mult:
+            continue
+        value = _parse_number(match.group("num"))
+        if mult:
+            value *= _MULTIPLIERS[mult.lower().rstrip(".")]
+        return {"value": int(value) if value == int(value) else value, "currency": currency}
+    return None
+
+
+# ─── Dates ──────────────────────────────────────────────────────────
+
+_MONTHS = {
+    1: ("jan", "yanvar", "январ", "января"), 2: ("feb", "fevral", "феврал"), 3: ("mar", "mart", "март"),
+    4: ("apr", "aprel", "апрел"), 5: ("may", "май", "мая"), 6: ("jun", "iyun", "июн"),
+    7: ("jul", "iyul", "июл"), 8: ("aug", "avgust", "август"), 9: ("sep", "sentabr", "сентябр"),
+    10: ("oct", "oktabr", "октябр"), 11: ("nov", "noyabr", "ноябр"), 12: ("dec", "dekabr", "декабр"),
+}
+_MONTH_STEMS = sorted(((stem, m) for m, stems in _MONTHS.items() for stem in stems), key=lambda x: -len(x[0]))
+_MONTH_RE = "|".join(re.escape(stem) for stem, _ in _MONTH_STEMS)
+_ISO_DATE_RE = re.compile(r"\b(\d{4})-(\d{1,2})-(\d{1,2})\b")
+_DMY_RE = re.compile(r"\b(\d{1,2})[./](\d{2})(?:[./](\d{2,4}))?\b")
+_DAY_MONTH_RE = re.compile(rf"\b(\d{{1,2}})(?:-?(?:chi|go|e|th|st|nd|rd))?\s+({_MONTH_RE})\w*", re.IGNORECASE)
+_MONTH_DAY_RE = re.compile(rf"\b({_MONTH_RE})\w*\s+(\d{{1,2}})\b", re.IGNORECASE)
+_RELATIVE_DAYS = [
+    (re.compile(r"\b(?:indinga|послезавтра|day after tomorrow)\b", re.IGNORECASE), 2),
+    (re.compile(r"\b(?:ertaga|завтра|tomorrow)\b", re.IGNORECASE), 1),
+    (re.compile(r"\b(?:bugun|сегодня|today)\b", re.IGNORECASE), 0),
+]
+
+
+def _month_from_stem(word: str) -> int:
+    word = word.lower()
+    return next(m for stem, m in _MONTH_STEMS if word.startswith(stem))
+
+
+def _safe_date(year: int, month: int, day: int) -> Optional[date]:
+    try:
+        return date(year, month, day)
+    except ValueError:
+        return None
+
+
+def extract_date(text: str, today: Optional[date] = None) -> Optional[str]:
+    """ISO date (YYYY-MM-DD) for explicit or relative (today/tomorrow) dates."""
+    today = today or date.today()
+
+    match = _ISO_DATE_RE.search(text)
+    if match:
+        d = _safe_date(int(match.group(1)), int(match.group(2)), int(match.group(3)))
+        if d:
+            return d.isoformat()
+
+    for match in _DMY_RE.finditer(text):
+        day, month, year = int(match.group(1)), int(match.group(2)), match.group(3)
+        year = today.year if year is None else int(year) + (2000 if len(year) == 2 else 0)
+        d = _safe_date(year, month, day)
+        if d:
+            return d.isoformat()
+
+    match = _DAY_MONTH_RE.search(text)
+    if match:
+        d = _safe_date(today.year, _month_from_stem(match.group(2)), int(match.group(1)))
+        if d:
+            return d.isoformat()
+    match = _MONTH_DAY_RE.search(text)
+    if match:
+        d = _safe_date(today.year, _month_from_stem(match.group(1)), int(match.group(2)))
+        if d:
+            return d.isoformat()
+
+    for pattern, offset in _RELATIVE_DAYS:
+        if pattern.search(text):
+            return (today + timedelta(days=offset)).isoformat()
+    return None
+
+
+# ─── Names ──────────────────────────────────────────────────────────
+
+_NAME_WORD = r"[A-ZА-ЯЁ][a-zа-яёʻ‘'’\-]+"
+_ANY_CASE_WORD = r"[A-Za-zА-Яа-яЁё][a-zа-яёʻ‘'’\-]+"
+# Explicit introductions: the next word is a name even if typed in lowercase
+_INTRO_STRONG_RE = re.compile(
+    rf"(?i:my name is|mening ismim|ismim|меня зовут|моё имя|мое имя)\s+"
+    rf"(?P<name>{_ANY_CASE_WORD}(?:\s+{_NAME_WORD})?)"
+)
+# Weaker introductions ("I'm ...", "это ...") only count for capitalised words that end
+# the clause ("I'm Aziz", "Это Ольга, ..."), not "I'm Interested in ..." / "Это Очень дорого"
+_INTRO_WEAK_RE = re.compile(
+    rf"(?i:\bi am|\bi'm|\bthis is|\bэто|\bя\s*[-—])\s+(?P<name>{_NAME_WORD}(?:\s+{_NAME_WORD})?)"
+    r"(?=\s*(?:[,.!?;)]|$))"
+)
+_NAME_SUFFIX_RE = re.compile(rf"(?:(?i:\bmen)\s+|^)(?P<name>{_ANY_CASE_WORD}(?:\s+{_NAME_WORD})?)\s+bo['ʻ‘’]?laman\b")
+_NOT_NAMES = {
+    "salom", "assalomu", "alaykum", "rahmat", "ha", "yo'q", "xayr", "hello", "hi", "hey", "thanks", "yes", "no",
+    "ok", "okay", "привет", "здравствуйте", "спасибо", "да", "нет", "добрый", "день", "вечер", "hammasi", "yaxshi",
+    # Words that end a weak cue without being a name ("I'm Fine.", "Это Дорого!")
+    "fine", "good", "ready", "sure", "sorry", "interested", "here", "back", "busy", "done",
+    "хорошо", "дорого", "отлично", "понятно", "нормально",
+    # Places that follow weak cues ("это Ташкент")
+    "toshkent", "tashkent", "ташкент", "samarqand", "samarkand", "самарканд", "buxoro", "bukhara", "бухара",
+    "andijon", "андижан", "namangan", "наманган", "farg'ona", "fergana", "фергана", "nukus", "нукус",
+    "qarshi", "карши", "termiz", "термез", "moskva", "moscow", "москва",
+}
+
+
+def extract_name(text: str) -> Optional[str]:
+    for pattern in (_INTRO_STRONG_RE, _INTRO_WEAK_RE, _NAME_SUFFIX_RE):
+        match = pattern.search(text)
+        if match:
+            words = [w for w in match.group("name").split() if w.lower() not in _NOT_NAMES]
+            if words:
+                return " ".join(w[:1].upper() + w[1:] for w in words)
+    # No introduction cue: a bare capitalised reply may be a city, product or
+    # brand as easily as a name, so it is left to the LLM
+    return None
+
+
+# ─── Engine ─────────────────────────────────────────────────────────
+
+_EXTRACTORS: dict[str, Callable[[str], object]] = {
+    "phone": extract_phone,
+    "email": extract_email,
+    "name": extract_name,
+    "amount": lambda text: (extract_amount(text) or {}).get("value"),
+    "date": extract_date,
+}
+
+
+def parse_keys(keys: str) -> list[str]:
+    """'phone, name' -> ['phone', 'name'] (order preserved, duplicates dropped)."""
+    seen = []
+    for key in re.split(r"[,;\n]", keys or ""):
+        key = key.strip()
+        if key and key not in seen:
+            seen.append(key)
+    return seen
+
+
+def extract_with_rules(text: str, keys: list[str]) -> dict:
+    """
+    Extract the requested keys with local rules.
+    Returns only keys that were found; the caller decides what to do with the rest.
+    """
+    found = {}
+    amount = None
+    for key in keys:
+        normalized = key.lower().replace(" ", "_")
+        if normalized == "currency":
+            amount = amount or extract_amount(text)
+            if amount and amount["currency"]:
+                found[key] = amount["currency"]
+            continue
+        kind = _ALIAS_TO_KIND.get(normalized)
+        if kind is None:
+            continue
+        value = _EXTRACTORS[kind](text)
+        if value is not None:
+            found[key] = value
+    return found
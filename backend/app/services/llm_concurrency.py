@@ -0,0 +1,303 @@
+"""
+Adaptive (AIMD) concurrency limiter per LLM provider.
+
+Each provider gets an allowed number of in-flight requests. The limit grows
+additively (about +1 per limit's worth of healthy responses) and is cut
+multiplicatively on 429/5xx/timeouts or when latency climbs well above its
+baseline. Requests beyond the limit wait in a FIFO queue until a slot frees
+up or their deadline passes, in which case `ProviderOverloaded` is raised
+and the router moves on to the next provider.
+
+With Redis available, the limit and the in-flight leases are shared across
+all API and Celery workers; otherwise each process limits itself.
+"""
+
+import asyncio
+import time
+import uuid
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Optional
+
+import structlog
+
+from app.config import settings
+
+logger = structlog.get_logger(__name__)
+
+# Decreases within this window are treated as one congestion event.
+DECREASE_COOLDOWN_SEC = 2.0
+# Leases not released within this time (crashed worker) stop counting.
+LEASE_TTL_SEC = 180.0
+MIN_LATENCY_SAMPLES = 20
+
+
+class ProviderOverloaded(RuntimeError):
+    """Raised when no concurrency slot became free before the deadline."""
+
+
+# KEYS[1] = limit key, KEYS[2] = leases zset
+# ARGV = now, lease_id, lease_ttl, initial_limit
+_ACQUIRE_LUA = """
+local limit = tonumber(redis.call('GET', KEYS[1]) or ARGV[4])
+redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', ARGV[1])
+if redis.call('ZCARD', KEYS[2]) < math.floor(limit) then
+    redis.call('ZADD', KEYS[2], tonumber(ARGV[1]) + tonumber(ARGV[3]), ARGV[2])
+    redis.call('EXPIRE', KEYS[2], math.ceil(tonumber(ARGV[3])) * 2)
+    return 1
+end
+return 0
+"""
+
+# KEYS[1] = limit key, KEYS[2] = last-decrease key
+# ARGV = mode ('inc'|'dec'), now, initial, min, max, decrease_factor, cooldown
+_ADJUST_LUA = """
+local limit = tonumber(redis.call('GET', KEYS[1]) or ARGV[3])
+local min_l, max_l = tonumber(ARGV[4]), tonumber(ARGV[5])
+if ARGV[1] == 'inc' then
+    limit = math.min(max_l, limit + 1 / math.max(limit, 1))
+else
+    local last = tonumber(redis.call('GET', KEYS[2]) or '0')
+    if tonumber(ARGV[2]) - last < tonumber(ARGV[7]) then
+        return tostring(limit)
+    end
+    limit = math.max(min_l, limit * tonumber(ARGV[6]))
+    redis.call('SET', KEYS[2], ARGV[2], 'EX', 3600)
+end
+redis.call('SET', KEYS[1], tostring(limit), 'EX', 86400)
+return tostring(limit)
+"""
+
+
+class AdaptiveConcurrencyLimiter:
+    """AIMD concurrency governor for a single provider."""
+
+    def __init__(
+        self,
+        provider: str,
+        initial_limit: int,
+        min_limit: int,
+        max_limit: int,
+        decrease_factor: float = 0.5,
+        latency_tolerance: float = 2.0,
+    ):
+        self.provider = provider
+        self.initial_limit = float(initial_limit)
+        self.min_limit = float(min_limit)
+        self.max_limit = float(max_limit)
+        self.decrease_factor = decrease_factor
+        self.latency_tolerance = latency_tolerance
+
+        # Local view (authoritative when Redis is unavailable)
+        self.limit = float(initial_limit)
+        self.in_flight = 0
+        self._last_decrease = 0.0
+        self._waiters: deque[asyncio.Future] = deque()
+
+        # Latency tracking: slow baseline vs. fast recent EWMA
+        self._latency_baseline: Optional[float] = None
+        self._latency_recent: Optional[float] = None
+        self._latency_samples = 0
+
+        # One hash tag per provider: the scripts touch these keys together
+        self._limit_key = f"llm:aimd:{{{provider}}}:limit"
+        self._leases_key = f"llm:aimd:{{{provider}}}:leases"
+        self._decrease_key = f"llm:aimd:{{{provider}}}:last_decrease"
+        self._acquire_script = None
+        self._adjust_script = None
+
+    # ── Redis helpers ──
+
+    def _redis(self):
+        from app.memory.context import memory
+        return memory.redis if memory._use_redis else None
+
+    def _scripts(self, redis):
+        if self._acquire_script is None:
+            self._acquire_script = redis.register_script(_ACQUIRE_LUA)
+            self._adjust_script = redis.register_script(_ADJUST_LUA)
+        return self._acquire_script, self._adjust_script
+
+    async def _try_acquire(self, lease_id: str) -> bool:
+        redis = self._redis()
+        if redis is not None:
+            try:
+                acquire, _ = self._scripts(redis)
+                ok = await acquire(
+                    keys=[self._limit_key, self._leases_key],
+                    args=[time.time(), lease_id, LEASE_TTL_SEC, self.initial_limit],
+                )
+                if ok:
+                    self.in_flight += 1
+                return bool(ok)
+            except Exception as e:
+                logger.warning("llm_limiter_redis_error", provider=self.provider, error=str(e))
+
+        if self.in_flight < int(self.limit):
+            self.in_flight += 1
+            return True
+        return False
+
+    async def _release_lease(self, lease_id: str) -> None:
+        self.in_flight = max(0, self.in_flight - 1)
+        redis = self._redis()
+        if redis is not None:
+            try:
+                await redis.zrem(self._leases_key, lease_id)
+            except Exception as e:
+                logger.warning("llm_limiter_redis_error", provider=self.provider, error=str(e))
+        # Hand the freed slot to the oldest local waiter
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                break
+
+    async def _adjust(self, mode: str) -> None:
+        now = time.time()
+        redis = self._redis()
+        if redis is not None:
+            try:
+                _, adjust = self._scripts(redis)
+                new_limit = await adjust(
+                    keys=[self._limit_key, self._decrease_key],
+                    args=[mode, now, self.initial_limit, self.min_limit, self.max_limit,
+                          self.decrease_factor, DECREASE_COOLDOWN_SEC],
+                )
+                previous, self.limit = self.limit, float(new_limit)
+                if mode == "dec" and self.limit < previous:
+                    logger.warning("llm_concurrency_limit_decreased", provider=self.provider, limit=round(self.limit, 2))
+                return
+            except Exception as e:
+                logger.warning("llm_limiter_redis_error", provider=self.provider, error=str(e))
+
+        if mode == "inc":
+            self.limit = min(self.max_limit, self.limit + 1.0 / max(self.limit, 1.0))
+        elif now - self._last_decrease >= DECREASE_COOLDOWN_SEC:
+            self._last_decrease = now
+            self.limit = max(self.min_limit, self.limit * self.decrease_factor)
+            logger.warning("llm_concurrency_limit_decreased", provider=self.provider, limit=round(self.limit, 2))
+
+    # ── Public API ──
+
+    async def acquire(self, timeout: float) -> str:
+        """Wait for a slot (FIFO) until `timeout` seconds elapse; returns a lease id."""
+        lease_id = uuid.uuid4().hex
+        deadline = time.monotonic() + timeout
+        poll = 0.02
+
+        # Queue behind earlier local waiters so the order stays FIFO.
+        if not self._waiters and await self._try_acquire(lease_id):
+            return lease_id
+
+        loop = asyncio.get_running_loop()
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                logger.warning("llm_queue_deadline_exceeded", provider=self.provider, waited=timeout,
+                               limit=round(self.limit, 2), waiting=len(self._waiters))
+                raise ProviderOverloaded(f"{self.provider}: no concurrency slot within {timeout:.1f}s")
+
+            waiter = loop.create_future()
+            self._waiters.append(waiter)
+            try:
+                # Woken by a local release, or re-check periodically for remote ones.
+                await asyncio.wait_for(asyncio.shield(waiter), timeout=min(poll, remaining))
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                if not waiter.done():
+                    waiter.cancel()
+                try:
+                    self._waiters.remove(waiter)
+                except ValueError:
+                    pass
+
+            if await self._try_acquire(lease_id):
+                return lease_id
+            poll = min(poll * 2, 0.25)
+
+    async def release(self, lease_id: str, latency: float, outcome: str) -> None:
+        """
+        Release a slot and feed the outcome into AIMD.
+        outcome: 'ok' | 'overload' (429/5xx/timeout) | 'error' (neutral, e.g. bad request)
+        """
+        await self._release_lease(lease_id)
+
+        if outcome == "overload":
+            await self._adjust("dec")
+            return
+        if outcome != "ok":
+            return
+
+        self._latency_samples += 1
+        if self._latency_baseline is None:
+            self._latency_baseline = self._latency_recent = latency
+        else:
+            self._latency_baseline += 0.02 * (latency - self._latency_baseline)
+            self._latency_recent += 0.3 * (latency - self._latency_recent)
+
+        if (
+            self._latency_samples >= MIN_LATENCY_SAMPLES
+            and self._latency_recent > self._latency_baseline * self.latency_tolerance
+        ):
+            await self._adjust("dec")
+        else:
+            await self._adjust("inc")
+
+    @asynccontextmanager
+    async def slot(self, timeout: Optional[float] = None):
+        """Hold a concurrency slot for the duration of one provider call."""
+        lease_id = await self.acquire(settings.llm_queue_timeout_sec if timeout is None else timeout)
+        start = time.monotonic()
+        outcome = "ok"
+        try:
+            yield
+        except BaseException as e:
+            outcome = "overload" if is_overload_error(e) else "error"
+            raise
+        finally:
+            await self.release(lease_id, time.monotonic() - start, outcome)
+
+    def snapshot(self) -> dict:
+        return {
+            "limit": round(self.limit, 2),
+            "in_flight": self.in_flight,
+            "waiting": len(self._waiters),
+            "latency_baseline_sec": round(self._latency_baseline, 3) if self._latency_baseline else None,
+            "latency_recent_sec": round(self._latency_recent, 3) if self._latency_recent else None,
+        }
+
+
+def is_overload_error(exc: BaseException) -> bool:
+    """True for provider back-pressure: 429, 5xx, timeouts and connection drops."""
+    if isinstance(exc, (asyncio.TimeoutError, ProviderOverloaded)):
+        return True
+    status = getattr(exc, "status_code", None)
+    if status is not None:
+        return status == 429 or status >= 500
+    name = type(exc).__name__
+    return name in ("RateLimitError", "APITimeoutError", "APIConnectionError", "InternalServerError")
+
+
+_limiters: dict[str, AdaptiveConcurrencyLimiter] = {}
+
+
+def get_limiter(provider: str) -> AdaptiveConcurrencyLimiter:
+    """Per-process singleton limiter for a provider."""
+    limiter = _limiters.get(provider)
+    if limiter is None:
+        limiter = AdaptiveConcurrencyLimiter(
+            provider=provider,
+            initial_limit=settings.llm_aimd_initial_limit,
+            min_limit=settings.llm_aimd_min_limit,
+            max_limit=settings.llm_aimd_provider_max.get(provider, settings.llm_aimd_max_limit),
+            decrease_factor=settings.llm_aimd_decrease_factor,
+            latency_tolerance=settings.llm_aimd_latency_tolerance,
+        )
+        _limiters[provider] = limiter
+    return limiter
+
+
+def limiter_snapshot() -> dict:
+    return {name: limiter.snapshot() for name, limiter in _limiters.items()}
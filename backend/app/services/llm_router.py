@@ -11,6 +11,8 @@ import openai
 import anthropic
 
 from app.config import settings
+from app.services.llm_concurrency import get_limiter, ProviderOverloaded
+from app.services.llm_scheduler import llm_scheduler
 
 logger = structlog.get_logger(__name__)
 
@@ -129,10 +131,18 @@ async def try_orbit_claude(messages: List[Dict[str, str]], max_tokens: int, temp
         raise
 
 
-def determine_complexity(message: str) -> str:
+# Concurrency limiter keys (one AIMD limiter per provider)
+PROVIDER_KEYS = {
+    try_groq: "groq",
+    try_openrouter: "openrouter",
+    try_orbit_claude: "orbit",
+}
+
+
+def heuristic_complexity(message: str) -> str:
     """
     Evaluate message complexity using simple heuristics.
-    Used to route to the most cost-effective and capable provider.
+    Fallback when no routing classifier is configured or it is unsure.
     """
     lower_msg = message.lower()
     
@@ -153,14 +163,38 @@ def determine_complexity(message: str) -> str:
         return "HIGH"
 
 
+def determine_complexity(message: str) -> str:
+    """
+    Evaluate message complexity for routing.
+    Uses the trained routing classifier when available (language-agnostic),
+    falling back to the keyword/length heuristic on low confidence.
+    """
+    from app.services.complexity_classifier import get_classifier
+
+    classifier = get_classifier()
+    if classifier is not None:
+        try:
+            prediction = classifier.predict(message)
+            if prediction.complexity_confidence >= settings.routing_classifier_min_confidence:
+                return prediction.complexity
+        except Exception as e:
+            logger.warning("routing_classifier_failed", error=str(e))
+
+    return heuristic_complexity(message)
+
+
 async def generate_response(
     message: str,
-    conversation_history: list,
-    mode: str = "chat"
+    conversation_history: Optional[list] = None,
+    mode: str = "chat",
+    tenant_id: Optional[str] = None,
+    priority: Optional[str] = None,
 ) -> dict:
     """
     Unified multi-provider LLM routing endpoint.
     Expects conversation_history as a list of dicts: [{"role": "...", "content": "..."}]
+    tenant_id/priority feed the fair scheduler; when omitted they come from
+    the surrounding `llm_work(...)` context (default: interactive).
     """
     messages = []
     if conversation_history:
@@ -190,9 +224,20 @@ async def generate_response(
         # Target: Orbit -> fallback: OpenRouter (safe fallback)
         routing_sequence = [try_orbit_claude, try_openrouter]
         
+    async with llm_scheduler.slot(tenant_id, priority):
+        return await _run_routing_sequence(routing_sequence, messages, max_tokens, temperature, complexity)
+
+
+async def _run_routing_sequence(routing_sequence, messages, max_tokens: int, temperature: float, complexity: str) -> dict:
+    """Try providers in order until one succeeds."""
     for provider_func in routing_sequence:
         try:
-            result = await provider_func(messages, max_tokens, temperature)
+            if settings.llm_aimd_enabled:
+                # Adaptive per-provider concurrency; waits (bounded) for a free slot
+                async with get_limiter(PROVIDER_KEYS[provider_func]).slot():
+                    result = await provider_func(messages, max_tokens, temperature)
+            else:
+                result = await provider_func(messages, max_tokens, temperature)
             logger.info(
                 "llm_generation_success", 
                 provider=result["provider"],
@@ -200,7 +245,10 @@ async def generate_response(
                 tokens=result["tokens_used"],
                 latency=result["latency_sec"]
             )
-            return dict(result)
+            return dict(result, complexity=complexity)
+        except ProviderOverloaded:
+            logger.info("llm_fallback_triggered", failed_provider=provider_func.__name__, reason="queue_deadline")
+            continue
         except Exception:
             logger.info("llm_fallback_triggered", failed_provider=provider_func.__name__)
             continue
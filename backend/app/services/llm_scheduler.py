@@ -0,0 +1,275 @@
+"""
+InstaTG Agent — Weighted Fair LLM Scheduler
+Sits in front of llm_router so one tenant's campaign or comment storm cannot
+starve everyone else's live DMs.
+
+Work is split into strict priority classes (interactive > automation >
+analysis). Inside a class, tenants are served by start-time fair queueing
+weighted per tenant, and no tenant may hold more than its configured share
+of the concurrent LLM slots. Queue depth and wait times are published to
+Redis (and logs) for dashboards.
+"""
+
+import asyncio
+import math
+import os
+import socket
+import time
+from collections import defaultdict, deque
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Optional
+
+import structlog
+
+from app.config import settings
+
+logger = structlog.get_logger(__name__)
+
+PRIORITY_CLASSES = ("interactive", "automation", "analysis")
+DEFAULT_TENANT = "_system"
+
+_current_tenant: ContextVar[Optional[str]] = ContextVar("llm_tenant", default=None)
+_current_priority: ContextVar[str] = ContextVar("llm_priority", default="interactive")
+
+
+class LLMQueueTimeout(RuntimeError):
+    """Raised when LLM work waited in the scheduler longer than its class allows."""
+
+
+@contextmanager
+def llm_work(tenant_id: Optional[str] = None, priority: Optional[str] = None):
+    """
+    Tag LLM calls made inside this block with a tenant and/or priority class.
+    Nested blocks override only what they set.
+    """
+    tokens = []
+    if tenant_id is not None:
+        tokens.append((_current_tenant, _current_tenant.set(str(tenant_id))))
+    if priority is not None:
+        if priority not in PRIORITY_CLASSES:
+            raise ValueError(f"Unknown LLM priority class: {priority}")
+        tokens.append((_current_priority, _current_priority.set(priority)))
+    try:
+        yield
+    finally:
+        for var, token in reversed(tokens):
+            var.reset(token)
+
+
+def current_llm_work() -> tuple[str, str]:
+    return _current_tenant.get() or DEFAULT_TENANT, _current_priority.get()
+
+
+@dataclass
+class _Ticket:
+    tenant: str
+    priority: str
+    tag: float
+    enqueued_at: float
+    future: asyncio.Future = field(repr=False)
+
+
+class FairLLMScheduler:
+    """Strict-priority classes, weighted fair queueing across tenants within each."""
+
+    def __init__(self):
+        self._queues: dict[str, dict[str, deque[_Ticket]]] = {p: {} for p in PRIORITY_CLASSES}
+        self._virtual_time = {p: 0.0 for p in PRIORITY_CLASSES}
+        self._last_finish: dict[str, dict[str, float]] = {p: {} for p in PRIORITY_CLASSES}
+        self._running = 0
+        self._running_by_tenant: dict[str, int] = defaultdict(int)
+
+        # Metrics
+        self._wait_ewma_ms = {p: 0.0 for p in PRIORITY_CLASSES}
+        self._served = {p: 0 for p in PRIORITY_CLASSES}
+        self._timeouts = {p: 0 for p in PRIORITY_CLASSES}
+        self._last_publish = 0.0
+        self._instance = f"{socket.gethostname()}:{os.getpid()}"
+
+    # ── Policy ──
+
+    @property
+    def capacity(self) -> int:
+        return max(1, settings.llm_scheduler_max_concurrency)
+
+    def tenant_cap(self, tenant: str) -> int:
+        share = settings.llm_tenant_shares.get(tenant, settings.llm_tenant_default_share)
+        return max(1, math.ceil(self.capacity * share))
+
+    def tenant_weight(self, tenant: str) -> float:
+        return max(0.01, settings.llm_tenant_weights.get(tenant, 1.0))
+
+    # ── Queueing ──
+
+    def _enqueue(self, tenant: str, priority: str) -> _Ticket:
+        vt = self._virtual_time[priority]
+        finishes = self._last_finish[priority]
+        start = max(vt, finishes.get(tenant, 0.0))
+        finishes[tenant] = start + 1.0 / self.tenant_weight(tenant)
+
+        ticket = _Ticket(
+            tenant=tenant,
+            priority=priority,
+            tag=start,
+            enqueued_at=time.monotonic(),
+            future=asyncio.get_running_loop().create_future(),
+        )
+        self._queues[priority].setdefault(tenant, deque()).append(ticket)
+        return ticket
+
+    def _remove(self, ticket: _Ticket) -> None:
+        queue = self._queues[ticket.priority].get(ticket.tenant)
+        if queue is None:
+            return
+        try:
+            queue.remove(ticket)
+        except ValueError:
+            pass
+        if not queue:
+            del self._queues[ticket.priority][ticket.tenant]
+
+    def _next_eligible(self) -> Optional[_Ticket]:
+        for priority in PRIORITY_CLASSES:
+            best = None
+            for tenant, queue in self._queues[priority].items():
+                if self._running_by_tenant[tenant] >= self.tenant_cap(tenant):
+                    continue
+                if best is None or queue[0].tag < best.tag:
+                    best = queue[0]
+            if best is not None:
+                return best
+        return None
+
+    def _dispatch(self) -> None:
+        while self._running < self.capacity:
+            ticket = self._next_eligible()
+            if ticket is None:
+                break
+            self._remove(ticket)
+            self._virtual_time[ticket.priority] = ticket.tag
+            self._running += 1
+            self._running_by_tenant[ticket.tenant] += 1
+
+            waited_ms = (time.monotonic() - ticket.enqueued_at) * 1000
+            self._wait_ewma_ms[ticket.priority] += 0.1 * (waited_ms - self._wait_ewma_ms[ticket.priority])
+            self._served[ticket.priority] += 1
+            ticket.future.set_result(None)
+
+        # Forget finish tags of tenants that have fallen behind virtual time
+        for priority in PRIORITY_CLASSES:
+            vt = self._virtual_time[priority]
+            stale = [t for t, f in self._last_finish[priority].items()
+                     if f <= vt and t not in self._queues[priority]]
+            for tenant in stale:
+                del self._last_finish[priority][tenant]
+
+    def _release(self, tenant: str) -> None:
+        self._running = max(0, self._running - 1)
+        self._running_by_tenant[tenant] -= 1
+        if self._running_by_tenant[tenant] <= 0:
+            del self._running_by_tenant[tenant]
+        self._dispatch()
+
+    async def acquire(self, tenant: str, priority: str, timeout: Optional[float] = None) -> None:
+        if priority not in PRIORITY_CLASSES:
+            raise ValueError(f"Unknown LLM priority class: {priority}")
+        if timeout is None:
+            timeout = settings.llm_scheduler_timeouts.get(priority, 60.0)
+
+        ticket = self._enqueue(tenant, priority)
+        self._dispatch()
+        self._maybe_publish()
+        if ticket.future.done():
+            return
+
+        try:
+            await asyncio.wait_for(asyncio.shield(ticket.future), timeout=timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if ticket.future.done():
+                # Slot was granted in the same tick we gave up on it
+                self._release(tenant)
+            else:
+                ticket.future.cancel()
+                self._remove(ticket)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            self._timeouts[priority] += 1
+            logger.warning("llm_scheduler_timeout", tenant=tenant, priority=priority, waited=timeout)
+            raise LLMQueueTimeout(f"LLM {priority} work for tenant {tenant} queued longer than {timeout:.0f}s")
+
+    @asynccontextmanager
+    async def slot(self, tenant_id: Optional[str] = None, priority: Optional[str] = None):
+        """Hold one scheduled LLM slot. Defaults come from `llm_work` context."""
+        ctx_tenant, ctx_priority = current_llm_work()
+        tenant = str(tenant_id) if tenant_id else ctx_tenant
+        priority = priority or ctx_priority
+        if not settings.llm_scheduler_enabled:
+            yield
+            return
+
+        await self.acquire(tenant, priority)
+        try:
+            yield
+        finally:
+            self._release(tenant)
+
+    # ── Metrics ──
+
+    def metrics(self) -> dict:
+        queued_by_tenant: dict[str, int] = defaultdict(int)
+        for queues in self._queues.values():
+            for tenant, queue in queues.items():
+                queued_by_tenant[tenant] += len(queue)
+        top = sorted(queued_by_tenant.items(), key=lambda kv: kv[1], reverse=True)[:10]
+
+        return {
+            "capacity": self.capacity,
+            "running": self._running,
+            "queued": {p: sum(len(q) for q in self._queues[p].values()) for p in PRIORITY_CLASSES},
+            "queued_by_tenant": dict(top),
+            "running_by_tenant": dict(self._running_by_tenant),
+            "wait_ms_ewma": {p: round(v, 1) for p, v in self._wait_ewma_ms.items()},
+            "served": dict(self._served),
+            "timeouts": dict(self._timeouts),
+        }
+
+    def _maybe_publish(self) -> None:
+        now = time.monotonic()
+        if now - self._last_publish < settings.llm_scheduler_metrics_interval_sec:
+            return
+        self._last_publish = now
+        asyncio.create_task(self._publish(self.metrics()))
+
+    async def _publish(self, snapshot: dict) -> None:
+        if any(snapshot["queued"].values()):
+            logger.info("llm_scheduler_queue_depth", running=snapshot["running"], **snapshot["queued"])
+        try:
+            import json
+            from app.memory.context import memory
+            if memory._use_redis:
+                key = f"llm:scheduler:metrics:{self._instance}"
+                await memory.redis.set(key, json.dumps(snapshot), ex=max(30, int(settings.llm_scheduler_metrics_interval_sec * 6)))
+        except Exception as e:
+            logger.debug("llm_scheduler_publish_failed", error=str(e))
+
+
+async def collect_cluster_metrics() -> list[dict]:
+    """Latest scheduler snapshots from every API/worker process (via Redis)."""
+    import json
+    from app.memory.context import memory
+
+    if not memory._use_redis:
+        return [dict(llm_scheduler.metrics(), instance=llm_scheduler._instance)]
+
+    snapshots = []
+    async for key in memory.redis.scan_iter(match="llm:scheduler:metrics:*", count=100):
+        raw = await memory.redis.get(key)
+        if raw:
+            snapshots.append(dict(json.loads(raw), instance=key[len("llm:scheduler:metrics:"):]))
+    return snapshots
+
+
+# Singleton instance
+llm_scheduler = FairLLMScheduler()
@@ -0,0 +1,144 @@
+"""
+Chunking Benchmark — streaming token chunker vs. the legacy character chunker
+
+Generates a large mixed Uzbek / Russian / English document (price lists,
+FAQ paragraphs, long prose) and reports for each chunker:
+
+- throughput (MB/s) and total time
+- time to first chunk (what the ingestion pipeline waits before embedding)
+- chunk count and tokens per chunk (mean / p5 / p95 / stdev) — the spread
+  is the variance in embedding cost per request
+- peak Python memory while chunking and discarding chunks, as a pipelined
+  consumer would (tracemalloc)
+
+Run from backend/:
+    DATABASE_URL=sqlite+aiosqlite:///./bench.db python -m benchmarks.chunking --mb 20
+"""
+
+import argparse
+import random
+import statistics
+import time
+import tracemalloc
+from typing import Callable, Iterable
+
+from app.knowledge.chunker import count_tokens, has_tiktoken, iter_chunks
+
+SENTENCES = [
+    "Bizning do'kon 2015-yildan beri Toshkentda ishlaydi.",
+    "Yetkazib berish Toshkent bo'ylab 1-2 kun, viloyatlarga 3-5 kun.",
+    "Kafolat muddati 12 oy, rasmiy servis markazida.",
+    "Доставка по Ташкенту бесплатная при заказе от 500 000 сум.",
+    "Оплата наличными, картой Uzcard/Humo или через Click и Payme.",
+    "Возврат товара возможен в течение 14 дней при сохранении упаковки.",
+    "All devices are original and come with an official warranty.",
+    "Orders placed before 3 pm ship the same day.",
+    "Installment plans are available for 3, 6 and 12 months.",
+]
+PRICE_LINES = ["- iPhone 15 Pro 256GB: 14 500 000 so'm", "- Samsung Galaxy S24 Ultra: 13 900 000 so'm",
+               "- AirPods Pro 2: 2 850 000 so'm", "- Xiaomi Redmi Note 13: 3 100 000 so'm"]
+
+
+def make_document(megabytes: float, seed: int = 7) -> str:
+    rng = random.Random(seed)
+    parts, size = [], 0
+    target = int(megabytes * 1024 * 1024)
+    while size < target:
+        kind = rng.random()
+        if kind < 0.3:
+            block = "Narxlar / Цены:\n" + "\n".join(rng.choices(PRICE_LINES, k=rng.randint(3, 12)))
+        elif kind < 0.9:
+            block = " ".join(rng.choices(SENTENCES, k=rng.randint(2, 10)))
+        else:
+            # Long run-on prose with no sentence breaks
+            block = " ".join(rng.choice(SENTENCES).rstrip(".") for _ in range(rng.randint(20, 60)))
+        parts.append(block)
+        size += len(block.encode("utf-8")) + 2
+    return "\n\n".join(parts)
+
+
+def legacy_chunk_text(text: str, chunk_size: int = 1000, overlap: int = 200) -> list[str]:
+    """The character-window chunker this replaced, for comparison."""
+    if len(text) <= chunk_size:
+        return [text]
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = start + chunk_size
+        if end < len(text):
+            last_period = text.rfind(".", start, end)
+            last_newline = text.rfind("\n", start, end)
+            break_point = max(last_period, last_newline)
+            if break_point > start + chunk_size // 2:
+                end = break_point + 1
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append(chunk)
+        start = end - overlap
+    return chunks
+
+
+def measure(name: str, chunker: Callable[[str], Iterable[str]], text: str) -> dict:
+    started = time.perf_counter()
+    first_chunk_ms = None
+    chunks = []
+    for chunk in chunker(text):
+        if first_chunk_ms is None:
+            first_chunk_ms = (time.perf_counter() - started) * 1000
+        chunks.append(chunk)
+    elapsed = time.perf_counter() - started
+
+    # Separate pass: tracemalloc slows allocation-heavy code too much to time it
+    tracemalloc.start()
+    for _ in chunker(text):
+        pass
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    tokens = sorted(count_tokens(chunk) for chunk in chunks)
+    megabytes = len(text.encode("utf-8")) / (1024 * 1024)
+    return {
+        "chunker": name,
+        "seconds": elapsed,
+        "mb_per_s": megabytes / elapsed,
+        "first_chunk_ms": first_chunk_ms or 0.0,
+        "chunks": len(chunks),
+        "tokens_mean": statistics.mean(tokens),
+        "tokens_p5": tokens[int(len(tokens) * 0.05)],
+        "tokens_p95": tokens[int(len(tokens) * 0.95)],
+        "tokens_stdev": statistics.pstdev(tokens),
+        "peak_mb": peak / (1024 * 1024),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Knowledge chunker throughput benchmark")
+    parser.add_argument("--mb", type=float, default=10.0, help="Document size in MB")
+    parser.add_argument("--max-tokens", type=int, default=256)
+    parser.add_argument("--overlap-tokens", type=int, default=48)
+    args = parser.parse_args()
+
+    text = make_document(args.mb)
+    print(f"document: {args.mb:.1f} MB, token counter: {'tiktoken' if has_tiktoken else 'character estimate'}")
+
+    results = [
+        measure("legacy (1000 chars)", legacy_chunk_text, text),
+        measure(
+            f"streaming ({args.max_tokens} tokens)",
+            lambda t: iter_chunks(t, max_tokens=args.max_tokens, overlap_tokens=args.overlap_tokens),
+            text,
+        ),
+    ]
+
+    header = f"{'chunker':<26}{'MB/s':>8}{'first ms':>10}{'chunks':>9}{'tok mean':>10}{'p5':>6}{'p95':>6}{'stdev':>8}{'peak MB':>9}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(
+            f"{r['chunker']:<26}{r['mb_per_s']:>8.1f}{r['first_chunk_ms']:>10.2f}{r['chunks']:>9}"
+            f"{r['tokens_mean']:>10.1f}{r['tokens_p5']:>6}{r['tokens_p95']:>6}{r['tokens_stdev']:>8.1f}{r['peak_mb']:>9.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Conversation Memory Codec Benchmark — versioned orjson/msgpack vs. json.dumps
+
+Builds realistic conversation messages (mixed Uzbek / Russian / English,
+some with metadata) and reports for each encoding:
+
+- encode and decode cost per message (µs), and the time to decode a full
+  50-message context as get_context does
+- bytes per message
+- with --redis-url: Redis MEMORY USAGE of a full 50-message context list
+
+Run from backend/:
+    DATABASE_URL=sqlite+aiosqlite:///./bench.db python -m benchmarks.memory_codec
+    DATABASE_URL=... python -m benchmarks.memory_codec --redis-url redis://localhost:6379/15
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+from typing import Callable
+
+from app.memory.codec import decode_message, encode_message, has_msgpack
+from app.memory.context import MAX_CONTEXT_MESSAGES
+
+TEXTS = [
+    "Salom! iPhone 15 Pro narxi qancha?",
+    "Здравствуйте, доставка в Самарканд есть?",
+    "Assalomu alaykum, 256GB versiyasi bormi?",
+    "Narxi 14 500 000 so'm, Toshkent bo'ylab yetkazib berish bepul. Buyurtma berasizmi?",
+    "Да, доставка в Самарканд 2-3 дня, оплата при получении через Click или Payme.",
+    "Thanks, can I pay in installments for 6 months?",
+]
+
+
+def make_messages(count: int, seed: int = 11) -> list[dict]:
+    rng = random.Random(seed)
+    start = datetime(2026, 10, 1, 9, 0, 0)
+    messages = []
+    for i in range(count):
+        message = {
+            "role": "user" if i % 2 == 0 else "assistant",
+            "content": rng.choice(TEXTS),
+            "type": rng.choice(["text", "text", "text", "voice", "image"]),
+            "timestamp": (start + timedelta(seconds=i * 37, microseconds=rng.randint(0, 999999))).isoformat(),
+        }
+        if rng.random() < 0.2:
+            message["metadata"] = {"intent": "price_inquiry", "lead_score": round(rng.random(), 2)}
+        messages.append(message)
+    return messages
+
+
+def _per_message_us(fn: Callable, items: list, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for item in items:
+            fn(item)
+        timings.append((time.perf_counter() - started) / len(items))
+    return statistics.median(timings) * 1e6
+
+
+def measure(name: str, encode: Callable[[dict], bytes], decode: Callable[[bytes], dict], messages: list[dict], repeat: int) -> dict:
+    encoded = [encode(m) for m in messages]
+    context = encoded[-MAX_CONTEXT_MESSAGES:]
+    context_timings = []
+    for _ in range(repeat * 10):
+        started = time.perf_counter()
+        [decode(raw) for raw in context]
+        context_timings.append(time.perf_counter() - started)
+    return {
+        "codec": name,
+        "encode_us": _per_message_us(encode, messages, repeat),
+        "decode_us": _per_message_us(decode, encoded, repeat),
+        "context_decode_us": statistics.median(context_timings) * 1e6,
+        "bytes_per_message": statistics.mean(len(raw) for raw in encoded),
+        "context": context,
+    }
+
+
+async def redis_usage(redis_url: str, results: list[dict]) -> None:
+    import redis.asyncio as aioredis
+
+    client = aioredis.from_url(redis_url, decode_responses=False)
+    try:
+        for r in results:
+            key = f"bench:memory_codec:{r['codec']}"
+            await client.delete(key)
+            await client.rpush(key, *r["context"])
+            r["redis_bytes"] = await client.memory_usage(key)
+            await client.delete(key)
+    finally:
+        await client.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Conversation memory codec benchmark")
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--redis-url", default=None, help="Also measure Redis MEMORY USAGE of a 50-message list")
+    args = parser.parse_args()
+
+    messages = make_messages(args.messages)
+    codecs = [
+        ("json (legacy)", lambda m: json.dumps(m).encode("utf-8"), json.loads),
+        ("orjson v1", lambda m: encode_message(m, "orjson"), decode_message),
+    ]
+    if has_msgpack:
+        codecs.append(("msgpack v2", lambda m: encode_message(m, "msgpack"), decode_message))
+    else:
+        print("msgpack not installed — skipping msgpack v2")
+
+    results = [measure(name, enc, dec, messages, args.repeat) for name, enc, dec in codecs]
+    if args.redis_url:
+        asyncio.run(redis_usage(args.redis_url, results))
+
+    header = f"{'codec':<16}{'encode µs':>11}{'decode µs':>11}{'ctx(50) µs':>12}{'bytes/msg':>11}{'redis bytes':>13}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        redis_bytes = str(r["redis_bytes"]) if "redis_bytes" in r else "-"
+        print(
+            f"{r['codec']:<16}{r['encode_us']:>11.2f}{r['decode_us']:>11.2f}{r['context_decode_us']:>12.1f}"
+            f"{r['bytes_per_message']:>11.1f}{redis_bytes:>13}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -54,6 +54,10 @@ celery_app.conf.beat_schedule = {
         "task": "celery_worker.check_follow_up_campaigns_task",
         "schedule": crontab(minute="*/15"),  # Every 15 minutes
     },
+    "reconcile-knowledge-vectors": {
+        "task": "celery_worker.reconcile_knowledge_vectors_task",
+        "schedule": crontab(hour=settings.kb_reconcile_hour, minute=30),
+    },
 }
 
 
@@ -213,6 +217,11 @@ def execute_campaign_batch_task(self, tenant_id: str, campaign_id: str):
     logger = structlog.get_logger(__name__)
 
     async def _process():
+        from app.services.llm_scheduler import llm_work
+        with llm_work(tenant_id=tenant_id, priority="automation"):
+            return await _process_batch()
+
+    async def _process_batch():
         async with async_session_factory() as db:
             # 1. Fetch Campaign
             result = await db.execute(select(Campaign).where(Campaign.id == campaign_id))
@@ -269,6 +278,16 @@ def execute_campaign_batch_task(self, tenant_id: str, campaign_id: str):
         self.retry(exc=exc, countdown=60)
 
 
+@celery_app.task(name="celery_worker.reconcile_knowledge_vectors_task", soft_time_limit=3600, time_limit=3900)
+def reconcile_knowledge_vectors_task(tenant_id: str = None, dry_run: bool = False):
+    """Garbage-collect orphan vectors and stale chunk registry rows."""
+    from app.knowledge.reconcile import reconcile_all, reconcile_tenant
+
+    if tenant_id:
+        return run_async(reconcile_tenant(tenant_id, dry_run=dry_run))
+    return run_async(reconcile_all(dry_run=dry_run))
+
+
 @celery_app.task(name="celery_worker.sync_crm_lead_task")
 def sync_crm_lead_task(
     tenant_id: str,
@@ -0,0 +1,276 @@
+"""
+Index Advisor — EXPLAIN the queries the app actually emits
+
+Drives the real FastAPI app in-process (webhook traffic from the load test
+harness, with LLM, RAG and outbound provider calls stubbed, plus the
+dashboard, conversation list, report and lead routes), records every
+distinct SELECT / UPDATE / DELETE the ORM sends to the database together
+with its first set of parameters, then EXPLAINs each one and flags
+sequential scans on tables with at least --min-rows rows.
+
+- PostgreSQL: EXPLAIN (FORMAT JSON); table size from pg_class.reltuples
+  (count(*) if the table was never analyzed). The Seq Scan filter is
+  printed, which is usually the missing index.
+- SQLite: EXPLAIN QUERY PLAN; a "SCAN <table>" step without an index is
+  treated as a sequential scan.
+
+Run from backend/ against a database with production-like volume:
+    python index_advisor.py --tenants 5 --messages 2000 --min-rows 10000
+    python index_advisor.py --run-tag prod-shape --messages 0 --output advisor.json --fail-on-findings
+"""
+
+import argparse
+import asyncio
+import contextvars
+import json
+import re
+import sys
+import uuid
+from collections import defaultdict
+
+import httpx
+
+from load_test import SyntheticTenant, cleanup_tenants, drive, install_stubs, seed_tenants
+
+READ_ROUTES = [
+    ("/api/dashboard/stats", {"days": 30}),
+    ("/api/dashboard/conversion-graph", {"days": 30}),
+    ("/api/dashboard/channel-breakdown", {}),
+    ("/api/conversations", {"days": 30}),
+    ("/api/conversations", {"days": 30, "channel": "instagram", "outcome": "won"}),
+    ("/api/reports", {"days": 30}),
+    ("/api/leads", {}),
+]
+
+EXPLAINABLE = re.compile(r"^\s*(SELECT|UPDATE|DELETE|WITH)\b", re.IGNORECASE)
+
+_current_source: contextvars.ContextVar[str] = contextvars.ContextVar("advisor_source", default="webhooks")
+
+
+# ─── Query capture ───────────────────────────────────────────────────
+
+class QueryLog:
+    """Distinct statements seen on the engine, with first parameters and call counts."""
+
+    def __init__(self):
+        self.statements: dict[str, dict] = {}
+
+    def record(self, statement: str, parameters, executemany: bool) -> None:
+        if executemany or not EXPLAINABLE.match(statement):
+            return
+        entry = self.statements.get(statement)
+        if entry is None:
+            entry = self.statements[statement] = {"parameters": parameters, "calls": 0, "sources": set()}
+        entry["calls"] += 1
+        entry["sources"].add(_current_source.get())
+
+    def install(self, sync_engine):
+        from sqlalchemy import event
+
+        def _record(conn, cursor, statement, parameters, context, executemany):
+            self.record(statement, parameters, executemany)
+
+        event.listen(sync_engine, "before_cursor_execute", _record)
+        return lambda: event.remove(sync_engine, "before_cursor_execute", _record)
+
+
+# ─── EXPLAIN ─────────────────────────────────────────────────────────
+
+def _walk_pg_plan(node: dict):
+    yield node
+    for child in node.get("Plans", ()):
+        yield from _walk_pg_plan(child)
+
+
+async def _table_rows(conn, dialect: str, table: str, cache: dict) -> int:
+    from sqlalchemy import text
+
+    if table not in cache:
+        rows = -1
+        if dialect == "postgresql":
+            res = await conn.execute(text("SELECT reltuples::bigint FROM pg_class WHERE relname = :name"), {"name": table})
+            rows = res.scalar() or -1
+        if rows < 0:
+            res = await conn.execute(text(f'SELECT count(*) FROM "{table}"'))
+            rows = res.scalar() or 0
+        cache[table] = int(rows)
+    return cache[table]
+
+
+async def explain_postgres(conn, statement: str, parameters) -> list[dict]:
+    res = await conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {statement}", parameters)
+    plan = res.scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    scans = []
+    for node in _walk_pg_plan(plan[0]["Plan"]):
+        if node.get("Node Type") == "Seq Scan":
+            scans.append({"table": node.get("Relation Name"), "filter": node.get("Filter")})
+    return scans
+
+
+async def explain_sqlite(conn, statement: str, parameters) -> list[dict]:
+    res = await conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)
+    scans = []
+    for row in res.fetchall():
+        detail = row[-1]
+        match = re.match(r"SCAN (?:TABLE )?(\w+)", detail)
+        if match and "USING" not in detail:
+            scans.append({"table": match.group(1), "filter": None})
+    return scans
+
+
+async def analyze(log: QueryLog, min_rows: int) -> dict:
+    """EXPLAIN every captured statement and collect sequential scans on large tables."""
+    from app.database import engine
+
+    dialect = engine.dialect.name
+    explain = explain_postgres if dialect == "postgresql" else explain_sqlite
+    sizes: dict[str, int] = {}
+    findings = []
+    errors = []
+
+    async with engine.connect() as conn:
+        for statement, entry in log.statements.items():
+            try:
+                scans = await explain(conn, statement, entry["parameters"])
+                for scan in scans:
+                    if not scan["table"]:
+                        continue
+                    rows = await _table_rows(conn, dialect, scan["table"], sizes)
+                    if rows >= min_rows:
+                        findings.append({
+                            **scan,
+                            "rows": rows,
+                            "calls": entry["calls"],
+                            "sources": sorted(entry["sources"]),
+                            "statement": " ".join(statement.split()),
+                        })
+            except Exception as e:
+                errors.append({"statement": " ".join(statement.split()), "error": str(e)})
+                await conn.rollback()
+
+    findings.sort(key=lambda f: (f["rows"] * f["calls"]), reverse=True)
+    return {
+        "dialect": dialect,
+        "statements": len(log.statements),
+        "min_rows": min_rows,
+        "findings": findings,
+        "explain_errors": errors,
+    }
+
+
+# ─── Driver ──────────────────────────────────────────────────────────
+
+async def call_read_routes(client: httpx.AsyncClient, tenants: list[SyntheticTenant]) -> dict[str, int]:
+    """GET the dashboard/list routes as each synthetic tenant; returns status codes per path."""
+    from app.api.routes.auth import create_access_token
+
+    statuses: dict[str, int] = {}
+    for t in tenants:
+        token = create_access_token({"sub": str(t.id), "email": t.email})
+        headers = {"Authorization": f"Bearer {token}"}
+        for path, params in READ_ROUTES:
+            source = _current_source.set(path)
+            try:
+                res = await client.get(path, params=params, headers=headers)
+            finally:
+                _current_source.reset(source)
+            statuses[path] = res.status_code
+    return statuses
+
+
+def print_report(report: dict) -> None:
+    print(f"\n{'═' * 72}")
+    print(f" Index advisor — {report['statements']} distinct statements ({report['dialect']}), "
+          f"seq scans on tables ≥ {report['min_rows']} rows")
+    print(f"{'═' * 72}")
+    failing = {path: code for path, code in report.get("routes", {}).items() if code != 200}
+    for path, code in failing.items():
+        print(f" ! {path} returned HTTP {code}")
+
+    if not report["findings"]:
+        print(" No sequential scans on large tables.")
+    by_table: dict[str, list[dict]] = defaultdict(list)
+    for finding in report["findings"]:
+        by_table[finding["table"]].append(finding)
+    for table, findings in by_table.items():
+        print(f"\n {table} ({findings[0]['rows']} rows)")
+        for f in findings:
+            print(f"   {f['calls']:>6}×  from {', '.join(f['sources'])}")
+            if f["filter"]:
+                print(f"           filter: {f['filter']}")
+            print(f"           {f['statement'][:160]}")
+
+    for e in report["explain_errors"]:
+        print(f"\n ! EXPLAIN failed: {e['error']}\n   {e['statement'][:160]}")
+    print()
+
+
+async def run(args) -> int:
+    run_tag = args.run_tag or uuid.uuid4().hex[:8]
+    tenants = [SyntheticTenant(i, run_tag) for i in range(args.tenants)]
+
+    install_stubs(0.0, 0.0, 0.0)
+    from main import app
+    from app.database import engine
+    from app.memory.context import memory
+    from app.memory.persister import message_persister
+
+    # ASGITransport does not run the lifespan, so connect Redis explicitly.
+    await memory.connect()
+    await seed_tenants(tenants)
+
+    log = QueryLog()
+    remove_listener = log.install(engine.sync_engine)
+    # A failing route is reported (HTTP 500), not raised, so the rest still run
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://advisor", timeout=60) as client:
+            if args.messages:
+                traffic = argparse.Namespace(
+                    mode="asgi", tenants=args.tenants, contacts=args.contacts, messages=args.messages,
+                    concurrency=args.concurrency, rate=None, mix=None, seed=args.seed,
+                    llm_latency_ms=0.0, rag_latency_ms=0.0, send_latency_ms=0.0,
+                )
+                await drive(traffic, client, tenants)
+                await message_persister.close()
+            routes = await call_read_routes(client, tenants)
+    finally:
+        # Keep the advisor's own EXPLAIN / count(*) queries out of the log
+        remove_listener()
+
+    report = await analyze(log, args.min_rows)
+    report["routes"] = routes
+
+    if args.cleanup:
+        await cleanup_tenants(tenants)
+    await memory.close()
+
+    print_report(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f" Report written to {args.output}")
+
+    return 1 if args.fail_on_findings and report["findings"] else 0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Flag sequential scans in the queries the app emits")
+    parser.add_argument("--tenants", type=int, default=2)
+    parser.add_argument("--contacts", type=int, default=20, help="Contacts per tenant")
+    parser.add_argument("--messages", type=int, default=200, help="Webhook messages to drive first (0 to skip)")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--run-tag", default=None, help="Reuse synthetic tenants from a previous run")
+    parser.add_argument("--min-rows", type=int, default=1000, help="Only flag scans of tables at least this large")
+    parser.add_argument("--cleanup", action="store_true", help="Delete synthetic tenants afterwards")
+    parser.add_argument("--output", default=None, help="Write JSON report to this path")
+    parser.add_argument("--fail-on-findings", action="store_true", help="Exit non-zero if any scan is flagged")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(run(args)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,705 @@
+"""
+Load Test Harness — Multi-tenant messaging pipeline
+
+Synthesizes Telegram Bot, Meta (Instagram/Facebook DMs + comments) and
+WhatsApp webhook traffic for N tenants × M contacts and drives the real
+FastAPI app with LLM, RAG and outbound provider calls stubbed.
+
+The report covers throughput, end-to-end latency per channel, a per-stage
+latency breakdown, DB queries per message, event-loop lag (asgi mode) and
+error rates.
+
+Run (in-process ASGI, the default):
+    python load_test.py run --tenants 10 --contacts 50 --messages 2000
+
+Run over HTTP against a stubbed server:
+    python load_test.py serve --port 8001
+    python load_test.py run --mode http --base-url http://127.0.0.1:8001
+
+Use --max-p99-ms / --max-error-rate / --baseline to fail a release build
+on regressions (non-zero exit code).
+"""
+
+import argparse
+import asyncio
+import contextvars
+import functools
+import hashlib
+import hmac
+import json
+import random
+import statistics
+import sys
+import time
+import uuid
+from collections import defaultdict
+from typing import Optional
+
+import httpx
+
+from app.config import settings
+
+
+# ─── Synthetic traffic ───────────────────────────────────────────────
+
+CHANNELS = ["telegram", "instagram", "facebook", "instagram_comment", "facebook_comment", "whatsapp"]
+
+DEFAULT_MIX = {
+    "telegram": 0.35,
+    "instagram": 0.2,
+    "facebook": 0.15,
+    "instagram_comment": 0.1,
+    "facebook_comment": 0.1,
+    "whatsapp": 0.1,
+}
+
+SAMPLE_MESSAGES = [
+    "Assalomu alaykum",
+    "Narxi qancha?",
+    "Bu mahsulot bormi? Yetkazib berish bormi Toshkentga?",
+    "Mening ismim Aziz, telefonim +998 90 123 45 67",
+    "Здравствуйте, сколько стоит доставка?",
+    "Есть ли скидка на iPhone 15 Pro 256?",
+    "Меня зовут Ольга, перезвоните пожалуйста на +7 916 123-45-67",
+    "Hi, how much is the premium plan?",
+    "Can you explain the difference between the basic and pro packages?",
+    "Katalogni yuboring iltimos",
+    "Qachon ochiq bo'lasizlar? Manzilingiz qayerda?",
+    "Спасибо, беру!",
+]
+
+LLM_REPLY = (
+    "Rahmat! Narxlar va yetkazib berish haqida ma'lumot beraman.\n"
+    "```json\n"
+    '{"sentiment": "positive", "intent": "inquiry", "lead_score": 6, "human_handoff": false, '
+    '"sale_detected": false, "unhandled_question": false, "confidence": 0.9}\n'
+    "```"
+)
+
+STUBBED_HOSTS = ("api.telegram.org", "graph.facebook.com")
+
+
+class SyntheticTenant:
+    """Identifiers for one synthetic tenant and its connected channels."""
+
+    def __init__(self, index: int, run_tag: str):
+        self.id = uuid.uuid5(uuid.NAMESPACE_URL, f"loadtest:{run_tag}:{index}")
+        self.name = f"LoadTest Tenant {index}"
+        self.email = f"loadtest+{run_tag}-{index}@example.com"
+        # Stable across processes so the HTTP driver and stubbed server agree.
+        suffix = int(hashlib.sha1(run_tag.encode()).hexdigest(), 16) % 10**6
+        self.page_id = f"9{index:05d}{suffix:06d}"
+        self.ig_user_id = f"17{index:05d}{suffix:06d}"
+        self.bot_token = f"{index}:LOADTEST"
+
+
+def _mid() -> str:
+    return f"m_{uuid.uuid4().hex}"
+
+
+def build_event(channel: str, tenant: SyntheticTenant, contact: int, text: str) -> tuple[str, dict]:
+    """Return (path, JSON body) for a realistic webhook delivery."""
+    now_ms = int(time.time() * 1000)
+    sender = f"{contact + 1000000}"
+
+    if channel == "telegram":
+        body = {
+            "update_id": random.randint(1, 2**31),
+            "message": {
+                "message_id": random.randint(1, 2**31),
+                "from": {"id": int(sender), "is_bot": False, "first_name": "User", "last_name": str(contact)},
+                "chat": {"id": int(sender), "type": "private"},
+                "date": now_ms // 1000,
+                "text": text,
+            },
+        }
+        return f"/api/webhooks/telegram/bot/{tenant.id}", body
+
+    if channel in ("instagram", "facebook"):
+        recipient = tenant.ig_user_id if channel == "instagram" else tenant.page_id
+        body = {
+            "object": "instagram" if channel == "instagram" else "page",
+            "entry": [{
+                "id": recipient,
+                "time": now_ms,
+                "messaging": [{
+                    "sender": {"id": sender},
+                    "recipient": {"id": recipient},
+                    "timestamp": now_ms,
+                    "message": {"mid": _mid(), "text": text},
+                }],
+            }],
+        }
+        return "/api/webhooks/meta", body
+
+    if channel == "instagram_comment":
+        body = {
+            "object": "instagram",
+            "entry": [{
+                "id": tenant.ig_user_id,
+                "time": now_ms,
+                "changes": [{
+                    "field": "comments",
+                    "value": {
+                        "id": f"c_{uuid.uuid4().hex[:16]}",
+                        "text": text,
+                        "from": {"id": sender, "username": f"user{contact}"},
+                        "media": {"id": "media_1"},
+                    },
+                }],
+            }],
+        }
+        return "/api/webhooks/meta", body
+
+    if channel == "facebook_comment":
+        body = {
+            "object": "page",
+            "entry": [{
+                "id": tenant.page_id,
+                "time": now_ms,
+                "changes": [{
+                    "field": "feed",
+                    "value": {
+                        "item": "comment",
+                        "verb": "add",
+                        "comment_id": f"{tenant.page_id}_{uuid.uuid4().hex[:12]}",
+                        "message": text,
+                        "from": {"id": sender, "name": f"User {contact}"},
+                        "post_id": f"{tenant.page_id}_1",
+                    },
+                }],
+            }],
+        }
+        return "/api/webhooks/meta", body
+
+    # whatsapp
+    body = {
+        "object": "whatsapp_business_account",
+        "entry": [{
+            "id": str(tenant.id),
+            "changes": [{
+                "field": "messages",
+                "value": {
+                    "messaging_product": "whatsapp",
+                    "metadata": {"phone_number_id": tenant.page_id},
+                    "messages": [{
+                        "from": f"99890{contact:07d}",
+                        "id": f"wamid.{uuid.uuid4().hex}",
+                        "timestamp": str(now_ms // 1000),
+                        "type": "text",
+                        "text": {"body": text},
+                    }],
+                },
+            }],
+        }],
+    }
+    return "/api/webhooks/whatsapp", body
+
+
+def _meta_headers(raw_body: bytes) -> dict:
+    headers = {"Content-Type": "application/json"}
+    if settings.meta_app_secret:
+        secret = settings.meta_app_secret.strip().strip('"').strip("'").strip()
+        digest = hmac.new(secret.encode(), raw_body, hashlib.sha256).hexdigest()
+        headers["X-Hub-Signature-256"] = f"sha256={digest}"
+    return headers
+
+
+# ─── Instrumentation ─────────────────────────────────────────────────
+
+# Per-message counters, set by the driver before each delivery. Context vars
+# follow the request through the in-process ASGI call and any tasks it spawns.
+_current_message: contextvars.ContextVar[Optional[dict]] = contextvars.ContextVar(
+    "loadtest_current_message", default=None
+)
+
+
+class StageStats:
+    """Latency samples and error counts per pipeline stage."""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self) -> None:
+        self.samples: dict[str, list[float]] = defaultdict(list)
+        self.errors: dict[str, int] = defaultdict(int)
+        self.total_queries = 0
+
+    def record(self, stage: str, seconds: float, failed: bool = False) -> None:
+        self.samples[stage].append(seconds)
+        if failed:
+            self.errors[stage] += 1
+
+    def as_dict(self) -> dict:
+        return {
+            "stages": {name: _summarize(values) | {"errors": self.errors.get(name, 0)}
+                       for name, values in sorted(self.samples.items())},
+            "total_queries": self.total_queries,
+        }
+
+
+stage_stats = StageStats()
+
+
+def _timed(stage: str, func):
+    """Wrap an async callable so every call is recorded under `stage`."""
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        failed = False
+        try:
+            return await func(*args, **kwargs)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            stage_stats.record(stage, time.perf_counter() - start, failed)
+
+    wrapper.__loadtest_wrapped__ = True
+    return wrapper
+
+
+def _patch(obj, attr: str, stage: str) -> None:
+    original = getattr(obj, attr)
+    if getattr(original, "__loadtest_wrapped__", False):
+        return
+    setattr(obj, attr, _timed(stage, original))
+
+
+def install_stubs(llm_latency_ms: float, rag_latency_ms: float, send_latency_ms: float) -> None:
+    """
+    Replace external providers with latency-simulating stubs and wrap the
+    pipeline stages with timers. Must run before the first request.
+    """
+    from sqlalchemy import event
+
+    import app.services.llm_router as llm_router
+    import app.agents.claude_agent as claude_agent
+    import app.services.automation_engine as automation_engine
+    from app.database import engine
+    from app.services.message_storage import storage
+    import app.api.routes.notifications as notifications
+
+    async def fake_generate_response(message: str, conversation_history: list = None, mode: str = "chat", **kwargs) -> dict:
+        await asyncio.sleep(random.expovariate(1000.0 / llm_latency_ms) if llm_latency_ms else 0)
+        return {
+            "provider": "LoadTestStub",
+            "model": "stub",
+            "response": LLM_REPLY,
+            "tokens_used": 120,
+            "latency_sec": 0.0,
+        }
+
+    async def fake_rag_search(tenant_id: str, query: str, top_k: int = 5, **kwargs) -> list[dict]:
+        await asyncio.sleep(rag_latency_ms / 1000.0)
+        return [{
+            "text": "Premium tarif narxi 250 000 so'm. Toshkent bo'ylab yetkazib berish bepul.",
+            "score": 0.82,
+            "source": "loadtest.txt",
+            "chunk_index": 0,
+            "metadata": {},
+        }]
+
+    llm_router.generate_response = _timed("llm", fake_generate_response)
+    claude_agent.rag_search = _timed("rag", fake_rag_search)
+
+    _patch(claude_agent.agent, "generate_response", "agent_generate")
+    _patch(storage, "get_or_create_conversation", "conversation_upsert")
+    _patch(storage, "store_message", "message_store")
+    _patch(automation_engine, "process_automation_flow", "automation_check")
+    _patch(notifications, "create_and_dispatch_notification", "notification")
+
+    # Outbound provider calls (Telegram sendMessage, Graph API, WhatsApp Cloud API)
+    original_post = httpx.AsyncClient.post
+
+    async def stubbed_post(self, url, *args, **kwargs):
+        if any(host in str(url) for host in STUBBED_HOSTS):
+            start = time.perf_counter()
+            await asyncio.sleep(send_latency_ms / 1000.0)
+            stage_stats.record("reply_send", time.perf_counter() - start)
+            return httpx.Response(200, json={"ok": True, "id": _mid()}, request=httpx.Request("POST", url))
+        return await original_post(self, url, *args, **kwargs)
+
+    httpx.AsyncClient.post = stubbed_post
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def _count_query(conn, cursor, statement, parameters, context, executemany):
+        stage_stats.total_queries += 1
+        counters = _current_message.get()
+        if counters is not None:
+            counters["queries"] += 1
+
+
+async def seed_tenants(tenants: list[SyntheticTenant]) -> None:
+    """Insert synthetic tenants and channel accounts, then register them in memory."""
+    from sqlalchemy import select
+
+    from app.database import async_session_factory, init_db
+    from app.models import FacebookAccount, InstagramAccount, Tenant
+    from app.channels.facebook import register_facebook_account
+    from app.channels.instagram import register_instagram_account
+    from app.channels.telegram import register_telegram_account
+
+    await init_db()
+
+    async with async_session_factory() as db:
+        for t in tenants:
+            existing = await db.execute(select(Tenant.id).where(Tenant.id == t.id))
+            if existing.scalar_one_or_none() is None:
+                db.add(Tenant(id=t.id, name=t.name, owner_email=t.email))
+                db.add(FacebookAccount(tenant_id=t.id, page_id=t.page_id, access_token="loadtest", page_name=t.name))
+                db.add(InstagramAccount(
+                    tenant_id=t.id, instagram_user_id=t.ig_user_id, page_id=t.page_id, access_token="loadtest",
+                ))
+        await db.commit()
+
+    for t in tenants:
+        register_facebook_account(page_id=t.page_id, tenant_id=str(t.id), access_token="loadtest", page_name=t.name)
+        register_instagram_account(
+            instagram_user_id=t.ig_user_id, tenant_id=str(t.id), access_token="loadtest",
+            page_id=t.page_id, display_name=t.name,
+        )
+        register_telegram_account(tenant_id=str(t.id), access_token=t.bot_token, bot_username=f"loadtest_{t.page_id}_bot")
+
+
+async def cleanup_tenants(tenants: list[SyntheticTenant]) -> None:
+    """Remove synthetic tenants (channel accounts and conversations cascade)."""
+    from sqlalchemy import delete
+
+    from app.database import async_session_factory
+    from app.models import Tenant
+
+    async with async_session_factory() as db:
+        await db.execute(delete(Tenant).where(Tenant.id.in_([t.id for t in tenants])))
+        await db.commit()
+
+
+# ─── Driver ──────────────────────────────────────────────────────────
+
+def _percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = max(0, min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1)))))
+    return ordered[k]
+
+
+def _summarize(values: list[float]) -> dict:
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "mean_ms": round(statistics.fmean(values) * 1000, 2),
+        "p50_ms": round(_percentile(values, 50) * 1000, 2),
+        "p90_ms": round(_percentile(values, 90) * 1000, 2),
+        "p99_ms": round(_percentile(values, 99) * 1000, 2),
+        "max_ms": round(max(values) * 1000, 2),
+    }
+
+
+def _parse_mix(raw: Optional[str]) -> dict:
+    if not raw:
+        return dict(DEFAULT_MIX)
+    mix = {}
+    for part in raw.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in CHANNELS:
+            raise SystemExit(f"Unknown channel in --mix: {name!r}. Choose from {', '.join(CHANNELS)}")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+async def drive(args, client: httpx.AsyncClient, tenants: list[SyntheticTenant]) -> dict:
+    """Send `args.messages` webhook deliveries with bounded concurrency."""
+    mix = _parse_mix(args.mix)
+    names, weights = list(mix), list(mix.values())
+    rng = random.Random(args.seed)
+
+    latencies: dict[str, list[float]] = defaultdict(list)
+    queries: list[int] = []
+    errors: dict[str, int] = defaultdict(int)
+    error_samples: dict[str, str] = {}
+    sent: dict[str, int] = defaultdict(int)
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def deliver(channel: str, tenant: SyntheticTenant, contact: int, text: str) -> None:
+        path, body = build_event(channel, tenant, contact, text)
+        raw = json.dumps(body).encode()
+        headers = _meta_headers(raw) if path == "/api/webhooks/meta" else {"Content-Type": "application/json"}
+        counters = {"queries": 0}
+        token = _current_message.set(counters)
+        start = time.perf_counter()
+        try:
+            async with semaphore:
+                start = time.perf_counter()
+                res = await client.post(path, content=raw, headers=headers)
+            failed = res.status_code != 200
+            reason = f"HTTP {res.status_code}"
+            if not failed:
+                try:
+                    payload = res.json()
+                except ValueError:
+                    payload = {}
+                if isinstance(payload, dict) and payload.get("status") == "error":
+                    failed, reason = True, str(payload.get("message", "error"))[:200]
+        except Exception as e:
+            failed, reason = True, f"{type(e).__name__}: {e}"[:200]
+        finally:
+            _current_message.reset(token)
+
+        latencies[channel].append(time.perf_counter() - start)
+        queries.append(counters["queries"])
+        sent[channel] += 1
+        if failed:
+            errors[channel] += 1
+            error_samples.setdefault(channel, reason)
+
+    plan = []
+    for _ in range(args.messages):
+        plan.append((
+            rng.choices(names, weights)[0],
+            rng.choice(tenants),
+            rng.randrange(args.contacts),
+            rng.choice(SAMPLE_MESSAGES),
+        ))
+
+    # In asgi mode the app shares this loop, so lag here is the app's loop lag
+    from app.core.loop_monitor import LoopLagMonitor
+    lag_monitor = LoopLagMonitor(interval=0.01, window=100_000, warn_threshold_ms=float("inf"))
+    lag_monitor.start()
+
+    started = time.perf_counter()
+    if args.rate:
+        tasks = []
+        interval = 1.0 / args.rate
+        for i, item in enumerate(plan):
+            delay = started + i * interval - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(deliver(*item)))
+        await asyncio.gather(*tasks)
+    else:
+        await asyncio.gather(*(deliver(*item) for item in plan))
+    elapsed = time.perf_counter() - started
+    await lag_monitor.stop()
+
+    all_latencies = [v for values in latencies.values() for v in values]
+    total_errors = sum(errors.values())
+    return {
+        "config": {
+            "mode": args.mode,
+            "tenants": args.tenants,
+            "contacts": args.contacts,
+            "messages": args.messages,
+            "concurrency": args.concurrency,
+            "rate": args.rate,
+            "mix": mix,
+            "llm_latency_ms": args.llm_latency_ms,
+        },
+        "duration_sec": round(elapsed, 3),
+        "throughput_msgs_per_sec": round(len(plan) / elapsed, 2) if elapsed else 0.0,
+        "latency": {"all": _summarize(all_latencies)} | {ch: _summarize(v) for ch, v in sorted(latencies.items())},
+        "db_queries_per_message": {
+            "mean": round(statistics.fmean(queries), 2) if queries else 0.0,
+            "p99": _percentile([float(q) for q in queries], 99),
+            "max": max(queries) if queries else 0,
+        },
+        "event_loop_lag": lag_monitor.stats() if args.mode == "asgi" else None,
+        "errors": {
+            "rate": round(total_errors / len(plan), 4) if plan else 0.0,
+            "by_channel": {ch: {"errors": errors.get(ch, 0), "sent": sent[ch],
+                                "rate": round(errors.get(ch, 0) / sent[ch], 4) if sent[ch] else 0.0,
+                                "sample": error_samples.get(ch)}
+                           for ch in sorted(sent)},
+        },
+    }
+
+
+def print_report(report: dict) -> None:
+    print(f"\n{'═' * 72}")
+    print(f" Load test — {report['config']['messages']} messages, "
+          f"{report['config']['tenants']} tenants × {report['config']['contacts']} contacts")
+    print(f"{'═' * 72}")
+    print(f" Throughput:        {report['throughput_msgs_per_sec']} msg/s over {report['duration_sec']} s")
+    print(f" Error rate:        {report['errors']['rate'] * 100:.2f}%")
+    q = report["db_queries_per_message"]
+    print(f" DB queries / msg:  mean {q['mean']}  p99 {q['p99']}  max {q['max']}")
+    lag = report.get("event_loop_lag")
+    if lag and lag.get("samples"):
+        print(f" Event-loop lag:    p50 {lag['p50_ms']} ms  p99 {lag['p99_ms']} ms  max {lag['max_ms']} ms")
+
+    print(f"\n {'channel':<20}{'count':>8}{'p50 ms':>10}{'p99 ms':>10}{'errors':>10}")
+    for channel, summary in report["latency"].items():
+        if channel == "all":
+            errs = sum(c["errors"] for c in report["errors"]["by_channel"].values())
+        else:
+            errs = report["errors"]["by_channel"].get(channel, {}).get("errors", 0)
+        print(f" {channel:<20}{summary.get('count', 0):>8}{summary.get('p50_ms', 0):>10}"
+              f"{summary.get('p99_ms', 0):>10}{errs:>10}")
+
+    stages = report.get("stages", {}).get("stages", {})
+    if stages:
+        print(f"\n {'stage':<22}{'calls':>8}{'mean ms':>10}{'p50 ms':>10}{'p99 ms':>10}{'errors':>10}")
+        for stage, summary in stages.items():
+            print(f" {stage:<22}{summary.get('count', 0):>8}{summary.get('mean_ms', 0):>10}"
+                  f"{summary.get('p50_ms', 0):>10}{summary.get('p99_ms', 0):>10}{summary.get('errors', 0):>10}")
+
+    for channel, info in report["errors"]["by_channel"].items():
+        if info["sample"]:
+            print(f"\n ! {channel}: {info['sample']}")
+    print()
+
+
+def check_regressions(report: dict, args) -> list[str]:
+    """Return a list of threshold/baseline violations."""
+    problems = []
+    p99 = report["latency"]["all"].get("p99_ms", 0)
+    if args.max_p99_ms is not None and p99 > args.max_p99_ms:
+        problems.append(f"p99 latency {p99} ms exceeds limit {args.max_p99_ms} ms")
+    if args.max_error_rate is not None and report["errors"]["rate"] > args.max_error_rate:
+        problems.append(f"error rate {report['errors']['rate']} exceeds limit {args.max_error_rate}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        tolerance = 1 + args.tolerance
+        base_tp = baseline.get("throughput_msgs_per_sec", 0)
+        if base_tp and report["throughput_msgs_per_sec"] * tolerance < base_tp:
+            problems.append(f"throughput {report['throughput_msgs_per_sec']} msg/s regressed from {base_tp}")
+        base_p99 = baseline.get("latency", {}).get("all", {}).get("p99_ms", 0)
+        if base_p99 and p99 > base_p99 * tolerance:
+            problems.append(f"p99 latency {p99} ms regressed from {base_p99} ms")
+        base_q = baseline.get("db_queries_per_message", {}).get("mean", 0)
+        cur_q = report["db_queries_per_message"]["mean"]
+        if base_q and cur_q > base_q * tolerance:
+            problems.append(f"DB queries per message {cur_q} regressed from {base_q}")
+    return problems
+
+
+async def run(args) -> int:
+    run_tag = args.run_tag or uuid.uuid4().hex[:8]
+    tenants = [SyntheticTenant(i, run_tag) for i in range(args.tenants)]
+
+    if args.mode == "asgi":
+        install_stubs(args.llm_latency_ms, args.rag_latency_ms, args.send_latency_ms)
+        from main import app
+        from app.memory.context import memory
+        # ASGITransport does not run the lifespan, so connect Redis explicitly.
+        await memory.connect()
+        await seed_tenants(tenants)
+        transport = httpx.ASGITransport(app=app)
+        base_url = "http://loadtest"
+    else:
+        transport = None
+        base_url = args.base_url
+        # The stubbed server seeds tenants itself so in-memory registries match.
+        async with httpx.AsyncClient(base_url=base_url, timeout=30) as c:
+            res = await c.post("/__loadtest/seed", json={"tenants": args.tenants, "run_tag": run_tag})
+            res.raise_for_status()
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(transport=transport, base_url=base_url, timeout=60, limits=limits) as client:
+        # Warm-up: first requests pay for imports, connection pools, etc.
+        if args.warmup:
+            warm = argparse.Namespace(**{**vars(args), "messages": args.warmup, "rate": None})
+            await drive(warm, client, tenants)
+            stage_stats.reset()
+
+        report = await drive(args, client, tenants)
+
+        if args.mode == "asgi":
+            report["stages"] = stage_stats.as_dict()
+        else:
+            res = await client.get("/__loadtest/stats")
+            if res.status_code == 200:
+                report["stages"] = res.json()
+
+    if args.cleanup:
+        if args.mode == "asgi":
+            await cleanup_tenants(tenants)
+        else:
+            async with httpx.AsyncClient(base_url=base_url, timeout=30) as c:
+                await c.post("/__loadtest/cleanup", json={"tenants": args.tenants, "run_tag": run_tag})
+
+    print_report(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f" Report written to {args.output}")
+
+    problems = check_regressions(report, args)
+    for p in problems:
+        print(f" ✗ {p}")
+    return 1 if problems else 0
+
+
+def serve(args) -> None:
+    """Run the real app over HTTP with providers stubbed and stats routes mounted."""
+    import uvicorn
+    from fastapi import Body
+
+    install_stubs(args.llm_latency_ms, args.rag_latency_ms, args.send_latency_ms)
+    from main import app
+
+    @app.post("/__loadtest/seed", include_in_schema=False)
+    async def _seed(payload: dict = Body(...)):
+        await seed_tenants([SyntheticTenant(i, payload["run_tag"]) for i in range(int(payload["tenants"]))])
+        stage_stats.reset()
+        return {"status": "ok"}
+
+    @app.post("/__loadtest/cleanup", include_in_schema=False)
+    async def _cleanup(payload: dict = Body(...)):
+        await cleanup_tenants([SyntheticTenant(i, payload["run_tag"]) for i in range(int(payload["tenants"]))])
+        return {"status": "ok"}
+
+    @app.get("/__loadtest/stats", include_in_schema=False)
+    async def _stats():
+        return stage_stats.as_dict()
+
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Multi-tenant messaging pipeline load test")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    def add_stub_args(p):
+        p.add_argument("--llm-latency-ms", type=float, default=400.0, help="Mean simulated LLM latency")
+        p.add_argument("--rag-latency-ms", type=float, default=60.0, help="Simulated embedding + vector search latency")
+        p.add_argument("--send-latency-ms", type=float, default=80.0, help="Simulated outbound provider latency")
+
+    run_p = sub.add_parser("run", help="Generate traffic and print a report")
+    run_p.add_argument("--mode", choices=["asgi", "http"], default="asgi")
+    run_p.add_argument("--base-url", default="http://127.0.0.1:8001")
+    run_p.add_argument("--tenants", type=int, default=5)
+    run_p.add_argument("--contacts", type=int, default=20, help="Contacts per tenant")
+    run_p.add_argument("--messages", type=int, default=500)
+    run_p.add_argument("--concurrency", type=int, default=50)
+    run_p.add_argument("--rate", type=float, default=None, help="Open-loop arrival rate (msg/s); default closed-loop")
+    run_p.add_argument("--mix", default=None, help="Channel weights, e.g. telegram=0.5,instagram=0.3,whatsapp=0.2")
+    run_p.add_argument("--warmup", type=int, default=20)
+    run_p.add_argument("--seed", type=int, default=42)
+    run_p.add_argument("--run-tag", default=None, help="Reuse synthetic tenants from a previous run")
+    run_p.add_argument("--cleanup", action="store_true", help="Delete synthetic tenants afterwards")
+    run_p.add_argument("--output", default=None, help="Write JSON report to this path")
+    run_p.add_argument("--baseline", default=None, help="JSON report from a previous release to compare against")
+    run_p.add_argument("--tolerance", type=float, default=0.15, help="Allowed regression vs baseline (fraction)")
+    run_p.add_argument("--max-p99-ms", type=float, default=None)
+    run_p.add_argument("--max-error-rate", type=float, default=None)
+    add_stub_args(run_p)
+
+    serve_p = sub.add_parser("serve", help="Run the app over HTTP with providers stubbed")
+    serve_p.add_argument("--host", default="127.0.0.1")
+    serve_p.add_argument("--port", type=int, default=8001)
+    add_stub_args(serve_p)
+
+    args = parser.parse_args()
+    if args.command == "serve":
+        serve(args)
+    else:
+        sys.exit(asyncio.run(run(args)))
+
+
+if __name__ == "__main__":
+    main()
@@ -104,6 +104,17 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         logger.warning("facebook_registration_failed", error=str(e))
 
+    # 6. Event-loop lag monitor (surfaced on /health)
+    from app.core.loop_monitor import loop_monitor
+    loop_monitor.start()
+
+    # 7. Resume knowledge ingestion jobs interrupted by the last shutdown
+    from app.knowledge.ingestion_jobs import ingestion_jobs
+    try:
+        await ingestion_jobs.resume_pending()
+    except Exception as e:
+        logger.warning("ingestion_jobs_resume_failed", error=str(e))
+
     logger.info("application_ready", app_name=settings.app_name)
 
     yield
@@ -116,6 +127,23 @@ async def lifespan(app: FastAPI):
     for tenant_id in list(active_clients.keys()):
         await stop_telegram_client(tenant_id)
 
+    await loop_monitor.stop()
+
+    # Hand running ingestion jobs back to the queue
+    await ingestion_jobs.close()
+
+    # Shut down vector store thread pool
+    from app.knowledge.vector_store import close_vector_store
+    await close_vector_store()
+
+    # Stop document extraction workers
+    from app.knowledge.extraction_pool import extraction_pool
+    await extraction_pool.close()
+
+    # Flush buffered conversation messages to the database
+    from app.memory.persister import message_persister
+    await message_persister.close()
+
     # Close Redis
     await memory.close()
 
@@ -384,9 +412,36 @@ async def health():
     except Exception:
         health_status["celery"] = "error"
 
+    # LLM provider concurrency limits (this process's view)
+    from app.services.llm_concurrency import limiter_snapshot
+    health_status["llm_limits"] = limiter_snapshot()
+    from app.services.llm_scheduler import llm_scheduler
+    health_status["llm_scheduler"] = llm_scheduler.metrics()
+    from app.llms.embedding_cache import embedding_cache
+    health_status["embedding_cache"] = embedding_cache.stats()
+    health_status["conversation_memory"] = memory.stats()
+    from app.core.redis_client import pool_stats
+    health_status["redis_pools"] = pool_stats()
+    from app.database import pool_stats as db_pool_stats
+    health_status["db_pools"] = db_pool_stats()
+    from app.memory.persister import message_persister
+    health_status["message_persister"] = message_persister.stats()
+    from app.core.loop_monitor import loop_monitor
+    health_status["event_loop_lag"] = loop_monitor.stats()
+    from app.knowledge.extraction_pool import extraction_pool
+    health_status["document_extraction"] = extraction_pool.stats()
+
     return health_status
 
 
+@app.get("/health/llm")
+async def llm_health():
+    """LLM scheduler queue depth across all API/worker processes."""
+    from app.services.llm_scheduler import collect_cluster_metrics
+    from app.services.llm_concurrency import limiter_snapshot
+    return {"schedulers": await collect_cluster_metrics(), "limits": limiter_snapshot()}
+
+
 @app.get("/health/db")
 async def db_health(db: AsyncSession = Depends(get_db)):
     await db.execute(text("SELECT 1"))
@@ -0,0 +1,144 @@
+import io
+import uuid
+
+import pytest
+import pytest_asyncio
+from openpyxl import Workbook
+from sqlalchemy import func, select
+
+from app.database import Base, async_session_factory, engine
+from app.knowledge import uploader
+from app.knowledge.bulk_import import ImportFormatError, import_manual_knowledge
+from app.models import ManualKnowledge
+
+
+@pytest_asyncio.fixture
+async def tables():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield
+
+
+@pytest.fixture
+def fake_index(monkeypatch):
+    calls = {"embed_calls": 0, "upserted": []}
+
+    async def fake_embeddings(texts):
+        calls["embed_calls"] += 1
+        if any("FAIL" in t for t in texts):
+            raise RuntimeError("embedding provider down")
+        return [[0.0] * 4 for _ in texts]
+
+    async def fake_upsert(tenant_id, vectors):
+        calls["upserted"].extend(v["id"] for v in vectors)
+        return len(vectors)
+
+    monkeypatch.setattr(uploader, "get_embeddings", fake_embeddings)
+    monkeypatch.setattr(uploader, "upsert_vectors", fake_upsert)
+    return calls
+
+
+async def _count(tenant_id: str) -> int:
+    async with async_session_factory() as db:
+        return await db.scalar(
+            select(func.count()).select_from(ManualKnowledge).where(ManualKnowledge.tenant_id == uuid.UUID(tenant_id))
+        )
+
+
+@pytest.mark.asyncio
+async def test_csv_import_batches_and_reports_bad_rows(tables, fake_index, monkeypatch):
+    monkeypatch.setattr(uploader.settings, "kb_import_batch_size", 50)
+    lines = ["Savol;Javob"] + [f"Narxi {i}?;{i * 1000} so'm" for i in range(120)]
+    lines[10] = ";missing question"
+    lines.append("Narxi 5?;5000 so'm")  # duplicate
+    tenant_id = str(uuid.uuid4())
+
+    summary = await import_manual_knowledge(tenant_id, io.BytesIO("\n".join(lines).encode()), "qa.csv")
+
+    assert summary["imported"] == 119 and summary["skipped"] == 1
+    assert summary["errors"] == [{"row": 11, "error": "question and answer are required"}]
+    assert fake_index["embed_calls"] == 3  # one per batch, not one per row
+    assert await _count(tenant_id) == 119
+    assert len(fake_index["upserted"]) == 119 and all(i.startswith("manual_") for i in fake_index["upserted"])
+
+
+@pytest.mark.asyncio
+async def test_xlsx_objections_failed_batch_rolls_back_only_itself(tables, fake_index, monkeypatch):
+    monkeypatch.setattr(uploader.settings, "kb_import_batch_size", 10)
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.append(["Objection", "Rebuttal"])
+    for i in range(30):
+        sheet.append([f"Qimmat {i}", "FAIL" if i == 15 else f"Sifat kafolati {i}"])
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    buffer.seek(0)
+    tenant_id = str(uuid.uuid4())
+
+    summary = await import_manual_knowledge(tenant_id, buffer, "objections.xlsx", kind="objection")
+
+    assert summary["imported"] == 20 and summary["failed"] == 10
+    assert {e["row"] for e in summary["errors"]} == set(range(12, 22))
+    async with async_session_factory() as db:
+        questions = (await db.execute(select(ManualKnowledge.question).where(
+            ManualKnowledge.tenant_id == uuid.UUID(tenant_id)))).scalars().all()
+    assert len(questions) == 20 and all(q.startswith("OBJECTION:") for q in questions)
+
+
+@pytest.mark.asyncio
+async def test_missing_columns_rejected(tables, fake_index):
+    with pytest.raises(ImportFormatError):
+        await import_manual_knowledge(str(uuid.uuid4()), io.BytesIO(b"name,phone\nA,1\n"), "qa.csv")
+
+
+@pytest.mark.asyncio
+async def test_reimport_skips_existing_pairs(tables, fake_index):
+    tenant_id = str(uuid.uuid4())
+    data = "Savol;Javob\nNarxi?;1000 so'm\nYetkazish?;Bepul\n".encode()
+
+    await import_manual_knowledge(tenant_id, io.BytesIO(data), "qa.csv")
+    summary = await import_manual_knowledge(tenant_id, io.BytesIO(data), "qa.csv")
+
+    assert summary["imported"] == 0 and summary["skipped"] == 2
+    assert await _count(tenant_id) == 2
+    assert len(fake_index["upserted"]) == 2
+
+
+@pytest.mark.asyncio
+async def test_failed_insert_reports_rows_and_continues(tables, fake_index, monkeypatch):
+    from app.knowledge import bulk_import
+
+    monkeypatch.setattr(uploader.settings, "kb_import_batch_size", 2)
+    real_factory = async_session_factory
+    inserts = {"n": 0}
+
+    class _FailingFirstInsert:
+        def __init__(self):
+            self._cm = real_factory()
+
+        async def __aenter__(self):
+            db = await self._cm.__aenter__()
+            real_execute = db.execute
+
+            async def execute(statement, *args, **kwargs):
+                if getattr(statement, "is_insert", False):
+                    inserts["n"] += 1
+                    if inserts["n"] == 1:
+                        raise RuntimeError("database unavailable")
+                return await real_execute(statement, *args, **kwargs)
+
+            db.execute = execute
+            return db
+
+        async def __aexit__(self, *exc):
+            return await self._cm.__aexit__(*exc)
+
+    monkeypatch.setattr("app.database.async_session_factory", _FailingFirstInsert)
+    tenant_id = str(uuid.uuid4())
+    data = "Savol;Javob\nA?;1\nB?;2\nC?;3\n".encode()
+
+    summary = await bulk_import.import_manual_knowledge(tenant_id, io.BytesIO(data), "qa.csv")
+
+    assert summary["imported"] == 1 and summary["failed"] == 2
+    assert [e["row"] for e in summary["errors"]] == [2, 3]
+    assert await _count(tenant_id) == 1
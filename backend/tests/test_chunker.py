@@ -0,0 +1,56 @@
+import itertools
+import types
+
+from app.knowledge.chunker import count_tokens, iter_chunks, iter_sentences
+
+TEXT = (
+    "Assalomu alaykum! Bizning do'kon 2015-yildan beri ishlaydi. Yetkazib berish bepul.\n"
+    "Narxlar:\n- iPhone 15: 12 000 000 so'm\n- Samsung S24: 10 500 000 so'm\n\n"
+    "Здравствуйте. Доставка по Ташкенту 1-2 дня. Hello there. We ship worldwide in 5 days.\n\n"
+)
+
+
+def test_sentences_and_lines_are_segmented_across_languages():
+    sentences = [s for s, _ in iter_sentences(TEXT)]
+    assert sentences[:3] == ["Assalomu alaykum!", "Bizning do'kon 2015-yildan beri ishlaydi.", "Yetkazib berish bepul."]
+    assert "- iPhone 15: 12 000 000 so'm" in sentences
+    assert "Доставка по Ташкенту 1-2 дня." in sentences
+
+
+def test_chunks_respect_token_budget_and_keep_sentences_whole():
+    chunks = list(iter_chunks(TEXT * 40, max_tokens=80, overlap_tokens=20))
+    sentences = {s for s, _ in iter_sentences(TEXT)}
+
+    assert len(chunks) > 10
+    assert all(count_tokens(chunk) <= 80 + 2 for chunk in chunks)  # + join separators
+    for chunk in chunks:
+        assert all(s in sentences for s, _ in iter_sentences(chunk))
+    # Consecutive chunks share a sentence of overlap
+    first_sentence, _ = next(iter_sentences(chunks[1]))
+    assert first_sentence in chunks[0]
+
+
+def test_chunks_stream_from_lazy_pages():
+    pulled = []
+
+    def pages():
+        for i in itertools.count():
+            pulled.append(i)
+            yield f"Page {i} text. " * 30
+
+    chunks = iter_chunks(pages(), max_tokens=50, overlap_tokens=0)
+    assert isinstance(chunks, types.GeneratorType)
+    first = next(chunks)
+    assert first.startswith("Page 0") and pulled == [0]
+
+    # A sentence longer than the budget is split on words
+    long = next(iter_chunks("word " * 500, max_tokens=100))
+    assert count_tokens(long) <= 100
+
+
+def test_text_without_spaces_is_sliced_to_the_budget():
+    blob = "aGVsbG8gd29ybGQ" * 2000  # base64-like, no whitespace
+    chunks = list(iter_chunks(f"Attachment: {blob} end.", max_tokens=200))
+    assert len(chunks) > 1
+    assert all(count_tokens(chunk) <= 200 for chunk in chunks)
+    assert "".join(chunk for chunk in chunks if chunk not in ("Attachment:", "end.")) == blob
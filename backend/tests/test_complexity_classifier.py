@@ -0,0 +1,60 @@
+import statistics
+import time
+
+from app.services.complexity_classifier import RoutingClassifier, featurize
+
+
+SAMPLES = [
+    {"text": "Salom", "complexity": "LOW", "intent": "general"},
+    {"text": "Assalomu alaykum", "complexity": "LOW", "intent": "general"},
+    {"text": "Привет", "complexity": "LOW", "intent": "general"},
+    {"text": "Rahmat", "complexity": "LOW", "intent": "general"},
+    {"text": "Narxi qancha?", "complexity": "MEDIUM", "intent": "inquiry"},
+    {"text": "Сколько стоит доставка?", "complexity": "MEDIUM", "intent": "inquiry"},
+    {"text": "Bu mahsulot narxi qancha bo'ladi?", "complexity": "MEDIUM", "intent": "inquiry"},
+    {"text": "Цена на iPhone 15 Pro?", "complexity": "MEDIUM", "intent": "inquiry"},
+    {"text": "Nima uchun bu tarif qimmatroq, farqini batafsil tushuntirib bering, qaysi biri menga mos?",
+     "complexity": "HIGH", "intent": "inquiry"},
+    {"text": "Объясните подробно, чем отличается базовый пакет от премиум и что выгоднее для магазина?",
+     "complexity": "HIGH", "intent": "inquiry"},
+    {"text": "Sotib olmoqchiman, qanday to'lasam bo'ladi?", "complexity": "MEDIUM", "intent": "purchase"},
+    {"text": "Хочу купить, как оплатить?", "complexity": "MEDIUM", "intent": "purchase"},
+]
+
+
+def test_featurize_is_deterministic_and_sparse():
+    idx_a, val_a = featurize("Narxi qancha?", 4096)
+    idx_b, val_b = featurize("Narxi qancha?", 4096)
+    assert (idx_a == idx_b).all()
+    assert (val_a == val_b).all()
+    assert idx_a.max() < 4096
+
+
+def test_classifier_learns_training_set_and_round_trips(tmp_path):
+    model = RoutingClassifier(n_features=2 ** 14)
+    model.fit(SAMPLES * 10, epochs=15)
+
+    for s in SAMPLES:
+        assert model.predict(s["text"]).complexity == s["complexity"]
+
+    path = tmp_path / "model.npz"
+    model.save(str(path))
+    loaded = RoutingClassifier.load(str(path))
+    for s in SAMPLES:
+        assert loaded.predict(s["text"]) == model.predict(s["text"])
+
+
+def test_prediction_latency_median_is_loose_bounded():
+    # The sub-millisecond target is tracked by the CLI's evaluate report
+    # (latency p50/p99); here only a median with a wide margin, so a loaded
+    # CI box cannot fail it on a few slow calls.
+    model = RoutingClassifier(n_features=2 ** 14)
+    model.fit(SAMPLES, epochs=2)
+    text = "Здравствуйте, сколько стоит доставка в Самарканд и есть ли скидка на второй товар?"
+    model.predict(text)
+    timings = []
+    for _ in range(500):
+        start = time.perf_counter()
+        model.predict(text)
+        timings.append(time.perf_counter() - start)
+    assert statistics.median(timings) < 0.01
@@ -0,0 +1,151 @@
+import json
+
+import pytest
+
+from app.memory import codec
+from app.memory.context import LEGACY_DONE_KEY, ContextCache, ConversationMemory, LocalStore
+
+
+def test_codec_round_trips_and_reads_legacy_json():
+    message = {
+        "role": "assistant",
+        "content": "Narxi 14 500 000 so'm — доставка бесплатная",
+        "type": "voice",
+        "timestamp": "2026-10-19T08:15:42.123456",
+        "metadata": {"intent": "price", "score": 0.9},
+    }
+    encoded = codec.encode_message(message)
+    assert encoded[0] == codec.FORMAT_ORJSON
+    assert len(encoded) < len(json.dumps(message).encode())
+    assert codec.decode_message(encoded) == message
+
+    odd = {"role": "operator", "content": "hi", "type": "carousel", "timestamp": "2026-10-19T08:15:42"}
+    assert codec.decode_message(codec.encode_message(odd)) == odd
+
+    legacy = json.dumps({"role": "user", "content": "salom", "type": "text", "timestamp": "2026-01-01T00:00:00"})
+    assert codec.decode_message(legacy)["content"] == "salom"
+    with pytest.raises(ValueError):
+        codec.decode_message(b"\x7fgarbage")
+
+
+def test_local_store_is_lru_bounded_and_expires(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr("app.memory.context.time.monotonic", lambda: clock[0])
+    store = LocalStore(max_keys=2, ttl_sec=60)
+
+    store.set("a", 1)
+    store.set("b", 2)
+    assert store.get("a") == 1  # 'a' is now most recently used
+    store.set("c", 3)
+    assert store.get("b") is None and store.get("a") == 1
+    assert store.metrics["evictions"] == 1
+
+    clock[0] += 61
+    assert store.get("a") is None
+    store.set("d", 4)
+    assert len(store) == 1 and store.metrics["expirations"] >= 1
+
+
+def test_contact_keys_share_a_cluster_slot(monkeypatch):
+    from redis.crc import key_slot
+
+    from app.core import redis_client
+
+    memory = ConversationMemory()
+    keys = [memory._key("t1", "ig_42"), memory._handoff_key("t1", "ig_42"), memory._version_key("t1", "ig_42")]
+    assert len({key_slot(key.encode()) for key in keys}) == 1
+
+    monkeypatch.setattr(redis_client.settings, "redis_max_connections", 7)
+    client = redis_client.create_redis()
+    assert client.connection_pool.max_connections == 7
+
+
+def test_l1_cache_write_through_and_invalidation(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr("app.memory.context.time.monotonic", lambda: clock[0])
+    cache = ContextCache(max_contacts=10, ttl_sec=30)
+    cache.enabled = True
+    hello = {"role": "user", "content": "salom"}
+
+    cache.put("k", 3, False, [hello])
+    assert cache.get("k") == (False, [hello])
+
+    # Our own write (version 3 -> 4) is applied in place; its echo on the channel is ignored
+    reply = {"role": "assistant", "content": "Assalomu alaykum!"}
+    cache.update("k", 4, append=[reply])
+    cache.invalidate("k", 4)
+    assert cache.get("k") == (False, [hello, reply])
+
+    # Another process wrote version 5: drop, and don't let a racing read put version 4 back
+    cache.invalidate("k", 5)
+    assert cache.get("k") is None
+    cache.put("k", 4, False, [hello, reply])
+    assert cache.get("k") is None
+    cache.put("k", 5, True, [hello])
+    assert cache.get("k") == (True, [hello])
+
+    # A write we didn't see the predecessor of can't be applied in place
+    cache.update("k", 7, handoff=False)
+    assert cache.get("k") is None
+
+    cache.put("k", 7, False, [hello])
+    clock[0] += 31
+    assert cache.get("k") is None
+
+
+@pytest.mark.asyncio
+async def test_memory_without_redis_keeps_last_messages():
+    memory = ConversationMemory()
+    for i in range(60):
+        await memory.add_message("t1", "c1", "user" if i % 2 else "assistant", f"message {i}")
+
+    context = await memory.get_context("t1", "c1")
+    assert len(context) == 50 and context[-1]["content"] == "message 59"
+    assert [m["content"] for m in await memory.get_context("t1", "c1", limit=2)] == ["message 58", "message 59"]
+    assert await memory.get_last_message_time("t1", "c1") is not None
+    stats = memory.stats()["local"]
+    assert stats["messages"] == 50 and stats["bytes"] > 0
+
+    await memory.set_human_handoff("t1", "c1")
+    messages, handoff = await memory.get_state("t1", "c1", limit=1)
+    assert handoff and messages[0]["content"] == "message 59"
+    await memory.set_human_handoff("t1", "c1", active=False)
+    assert not await memory.is_human_handoff("t1", "c1")
+
+
+def test_legacy_key_parsing():
+    parse = ConversationMemory._parse_legacy_key
+    assert parse("tenant:t1:contact:ig_comment_42:messages") == ("t1", "ig_comment_42")
+    assert parse("tenant:t1:contact:777:human_handoff") == ("t1", "777")
+    assert parse("tenant:t1:contact:777:profile") is None
+    assert parse("memory:{t1:777}:messages") is None
+
+
+@pytest.mark.asyncio
+async def test_legacy_sweep_migrates_once_then_turns_the_fallback_off():
+    class FakeRedis:
+        def __init__(self):
+            self.values = {}
+
+        async def scan_iter(self, match=None, count=None):
+            for key in (b"tenant:t1:contact:ig_1:messages", b"tenant:t1:contact:ig_1:human_handoff",
+                        b"tenant:t2:contact:77:messages"):
+                yield key
+
+        async def set(self, key, value):
+            self.values[key] = value
+
+    memory = ConversationMemory()
+    memory._binary = memory._redis = FakeRedis()
+    migrated = []
+
+    async def migrate(tenant_id, contact_id):
+        migrated.append((tenant_id, contact_id))
+        return True
+
+    memory._migrate_legacy = migrate
+    memory._legacy_pending = True
+    await memory._sweep_legacy()
+    assert migrated == [("t1", "ig_1"), ("t2", "77")]
+    assert memory._legacy_pending is False
+    assert memory._redis.values == {LEGACY_DONE_KEY: "1"}
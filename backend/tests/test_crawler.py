@@ -0,0 +1,155 @@
+import functools
+import os
+import threading
+import uuid
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import pytest_asyncio
+
+from app.database import Base, engine
+from app.knowledge import rag, uploader
+from app.knowledge.crawler import SiteCrawler
+
+
+class _QuietHandler(SimpleHTTPRequestHandler):
+    failing: set = set()  # paths that answer 500
+
+    def do_GET(self):
+        if self.path in self.failing:
+            self.send_error(500)
+            return
+        super().do_GET()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def site(tmp_path):
+    """Local static site; SimpleHTTPRequestHandler answers If-Modified-Since with 304."""
+    pages = {
+        "index.html": '<a href="/about.html">About</a> <a href="about.html#team">Team</a> '
+                      '<a href="/private.html">Private</a> <a href="https://elsewhere.example/">Out</a>'
+                      "<p>Welcome to the shop.</p>",
+        "about.html": '<p>We sell tea since 1999.</p><a href="/">Home</a>',
+        "copy.html": '<p>We sell tea since 1999.</p><a href="/">Home</a>',
+        "private.html": "<p>Staff only.</p>",
+        "prices.html": "<p>Green tea costs 20000 so'm.</p>",
+    }
+    for name, body in pages.items():
+        (tmp_path / name).write_text(f"<html><body>{body}</body></html>")
+    (tmp_path / "robots.txt").write_text("User-agent: *\nDisallow: /private.html\n")
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(_QuietHandler, directory=str(tmp_path)))
+    base = f"http://127.0.0.1:{server.server_port}"
+    (tmp_path / "sitemap.xml").write_text(
+        f"<urlset><url><loc>{base}/prices.html</loc></url><url><loc>{base}/copy.html</loc></url></urlset>"
+    )
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield tmp_path, base
+    server.shutdown()
+    server.server_close()
+
+
+@pytest_asyncio.fixture
+async def tables():
+    import app.models  # noqa: F401  (register models)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield
+
+
+@pytest.mark.asyncio
+async def test_crawl_then_conditional_recrawl(site, tables, monkeypatch):
+    root, base = site
+    embedded, deleted = [], []
+
+    async def fake_embeddings(texts):
+        embedded.extend(texts)
+        return [[0.0] * 4 for _ in texts]
+
+    async def fake_upsert(tenant_id, vectors):
+        return len(vectors)
+
+    async def fake_delete(tenant_id, vector_ids):
+        deleted.extend(vector_ids)
+        await uploader.lexical_index.remove_chunks(tenant_id, vector_ids)
+
+    monkeypatch.setattr(uploader, "get_embeddings", fake_embeddings)
+    monkeypatch.setattr(uploader, "upsert_vectors", fake_upsert)
+    monkeypatch.setattr(uploader, "delete_vectors", fake_delete)
+    monkeypatch.setattr(rag, "delete_vectors", fake_delete)
+
+    tenant_id, doc_id = str(uuid.uuid4()), str(uuid.uuid4())
+
+    def crawler():
+        # One fetcher keeps the order deterministic: sitemap URLs (copy.html) before about.html
+        return SiteCrawler(tenant_id, f"{base}/", doc_id, concurrency=1, host_delay=0, batch_pages=2)
+
+    # Links + sitemap are followed, robots.txt and other hosts are respected, duplicates indexed once
+    first = await crawler().run()
+    assert first["pages_ingested"] == 3
+    assert first["pages_duplicate"] == 1
+    assert not any("Staff only" in text for text in embedded)
+    sources = {hit["metadata"]["source"] for hit in await uploader.lexical_index.search(tenant_id, "tea", 10)}
+    assert f"{base}/prices.html" in sources
+
+    # Nothing changed: every page answers 304 and nothing is embedded
+    embedded.clear()
+    second = await crawler().run()
+    assert second["pages_unchanged"] == 3 and second["pages_duplicate"] == 1
+    assert second["pages_ingested"] == 0 and embedded == []
+
+    # One page edited, one page gone; about.html carried the same text as copy.html and now
+    # has to be indexed under its own URL
+    prices = root / "prices.html"
+    prices.write_text("<html><body><p>Green tea costs 25000 so'm.</p></body></html>")
+    os.utime(prices, (os.path.getmtime(prices) + 5,) * 2)
+    (root / "copy.html").unlink()
+    third = await crawler().run()
+    assert third["pages_ingested"] == 2 and third["pages_duplicate"] == 0
+    assert "Green tea costs 25000 so'm." in embedded
+    assert third["pages_removed"] == 1 and deleted
+    hits = await uploader.lexical_index.search(tenant_id, "tea since 1999", 10)
+    assert {hit["metadata"]["source"] for hit in hits} == {f"{base}/about.html"}
+
+    # A failed fetch hides links, so known pages are not swept as "no longer linked"
+    deleted.clear()
+    monkeypatch.setattr(_QuietHandler, "failing", {"/"})
+    fourth = await crawler().run()
+    assert fourth["pages_failed"] == 1
+    assert fourth["pages_removed"] == 0 and deleted == []
+    assert await uploader.lexical_index.search(tenant_id, "tea since 1999", 10)
+
+    # about.html now serves prices.html's text: it is a duplicate, and its previously
+    # indexed chunks must go rather than keep serving the old text
+    monkeypatch.setattr(_QuietHandler, "failing", set())
+    about = root / "about.html"
+    about.write_text("<html><body><p>Green tea costs 25000 so'm.</p></body></html>")
+    os.utime(about, (os.path.getmtime(about) + 10,) * 2)
+    fifth = await crawler().run()
+    assert fifth["pages_duplicate"] == 1 and fifth["pages_removed"] == 1
+    hits = await uploader.lexical_index.search(tenant_id, "tea since 1999", 10)
+    assert {hit["metadata"]["source"] for hit in hits} == {f"{base}/prices.html"}
+    assert not any("1999" in hit["text"] for hit in hits)
+
+@pytest.mark.asyncio
+async def test_failed_ingestion_with_full_page_queue_does_not_hang(site, tables, monkeypatch):
+    import asyncio
+
+    root, base = site
+    (root / "hub.html").write_text(
+        "<html><body>" + "".join(f'<a href="/p{i}.html">{i}</a>' for i in range(30)) + "</body></html>"
+    )
+    for i in range(30):
+        (root / f"p{i}.html").write_text(f"<html><body><p>Product {i} page.</p></body></html>")
+
+    async def failing_ingest(*args, **kwargs):
+        raise RuntimeError("embedding provider down")
+
+    monkeypatch.setattr(uploader, "ingest_pages", failing_ingest)
+    crawler = SiteCrawler(str(uuid.uuid4()), f"{base}/hub.html", str(uuid.uuid4()), host_delay=0, batch_pages=10)
+    with pytest.raises(RuntimeError, match="provider down"):
+        await asyncio.wait_for(crawler.run(), timeout=10)
@@ -0,0 +1,54 @@
+import pytest
+from sqlalchemy import exc, text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+import app.database as database
+from app.config import settings
+from app.core.db_pool import TimedQueuePool
+
+
+@pytest.mark.asyncio
+async def test_checkout_latency_and_timeouts_are_recorded(tmp_path):
+    engine = create_async_engine(
+        f"sqlite+aiosqlite:///{tmp_path / 'pool.db'}",
+        poolclass=TimedQueuePool,
+        pool_size=1,
+        max_overflow=0,
+        pool_timeout=0.2,
+    )
+    try:
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+            with pytest.raises(exc.TimeoutError):
+                async with engine.connect():
+                    pass
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+
+        stats = engine.pool.stats()
+        assert stats["checkouts"] == 2
+        assert stats["timeouts"] == 1
+        assert stats["size"] == 1 and stats["checked_out"] == 0
+        assert stats["p99_ms"] >= stats["p50_ms"] >= 0
+
+        # dispose() recreates the pool; the history carries over
+        await engine.dispose()
+        assert engine.pool.stats()["checkouts"] == 2
+    finally:
+        await engine.dispose()
+
+
+def test_pgbouncer_mode_disables_prepared_statement_cache(monkeypatch):
+    monkeypatch.setattr(database, "DATABASE_URL", "postgresql+asyncpg://u:p@pgbouncer:6432/app")
+    monkeypatch.setattr(settings, "db_pgbouncer", True)
+    options = database._engine_options("api", 7, 3)
+    assert options["poolclass"] is TimedQueuePool
+    assert (options["pool_size"], options["max_overflow"]) == (7, 3)
+    assert options["connect_args"]["statement_cache_size"] == 0
+    assert options["connect_args"]["prepared_statement_cache_size"] == 0
+    name_func = options["connect_args"]["prepared_statement_name_func"]
+    assert name_func() != name_func()
+
+    monkeypatch.setattr(settings, "db_pgbouncer", False)
+    options = database._engine_options("api", 7, 3)
+    assert options["connect_args"] == {"prepared_statement_cache_size": settings.db_statement_cache_size}
@@ -0,0 +1,86 @@
+import asyncio
+
+import pytest
+
+from app.llms.embedding_cache import EmbeddingCache, pack_vector, unpack_vector
+
+
+def test_vectors_round_trip_as_float32_bytes():
+    data = pack_vector([0.5, -1.25, 3.0])
+    assert len(data) == 12
+    assert unpack_vector(data) == [0.5, -1.25, 3.0]
+
+
+@pytest.mark.asyncio
+async def test_hits_misses_and_coalescing():
+    cache = EmbeddingCache(max_local_entries=2)
+    cache._redis_checked = True  # L1 only
+    calls = []
+
+    async def embed(text):
+        calls.append(text)
+        await asyncio.sleep(0.01)
+        return [float(len(text))]
+
+    results = await asyncio.gather(*(cache.get_or_compute("hello", "m", embed) for _ in range(5)))
+    assert results == [[5.0]] * 5
+    assert calls == ["hello"]
+
+    await cache.get_or_compute("hello", "m", embed)
+    await cache.get_or_compute("hello", "other-model", embed)
+    assert calls == ["hello", "hello"]
+    assert cache.metrics["misses"] == 2
+    assert cache.metrics["l1_hits"] == 1
+    assert cache.metrics["coalesced"] == 4
+
+
+@pytest.mark.asyncio
+async def test_cancelling_the_leader_does_not_cancel_coalesced_callers():
+    cache = EmbeddingCache()
+    cache._redis_checked = True
+    calls = []
+
+    async def embed(text):
+        calls.append(text)
+        await asyncio.sleep(0.02)
+        return [1.0]
+
+    leader = asyncio.create_task(cache.get_or_compute("price?", "m", embed))
+    await asyncio.sleep(0)
+    follower = asyncio.create_task(cache.get_or_compute("price?", "m", embed))
+    await asyncio.sleep(0)
+    leader.cancel()
+
+    assert await follower == [1.0]
+    with pytest.raises(asyncio.CancelledError):
+        await leader
+    assert calls == ["price?"] and not cache._inflight
+    assert await cache.get_or_compute("price?", "m", embed) == [1.0]
+    assert cache.metrics["l1_hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_batched_embeddings_keep_order_and_retry(monkeypatch):
+    from types import SimpleNamespace
+    from app.config import settings
+    from app.llms import provider
+
+    requests = []
+
+    class FakeEmbeddings:
+        async def create(self, model, input):
+            requests.append(list(input))
+            if len(requests) == 1:
+                raise RuntimeError("transient")
+            # Provider may return items out of order; `index` is authoritative
+            data = [SimpleNamespace(index=i, embedding=[float(len(t))]) for i, t in enumerate(input)]
+            return SimpleNamespace(data=list(reversed(data)))
+
+    monkeypatch.setattr(provider, "_embedding_client", lambda: SimpleNamespace(embeddings=FakeEmbeddings()))
+    monkeypatch.setattr(provider._embed_batch.retry, "sleep", lambda _: asyncio.sleep(0))
+    monkeypatch.setattr(settings, "embedding_batch_size", 2)
+    monkeypatch.setattr(settings, "embedding_cache_enabled", False)
+
+    texts = ["a", "bb", "ccc", "dddd", "eeeee"]
+    assert await provider.get_embeddings(texts) == [[1.0], [2.0], [3.0], [4.0], [5.0]]
+    assert sorted(map(len, requests)) == [1, 2, 2, 2]
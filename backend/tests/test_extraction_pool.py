@@ -0,0 +1,72 @@
+import time
+
+import pytest
+
+from app.knowledge.extraction_pool import ExtractionPool, ExtractionTimeout
+
+
+def make_pdf(pages: list[str]) -> bytes:
+    """Minimal PDF with one line of Helvetica text per page."""
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for text in pages:
+        stream = f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>"
+        )
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>"
+
+    out = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{body}\nendobj\n".encode()
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    out += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF".encode()
+    return out
+
+
+def _sleep(seconds: float) -> None:
+    time.sleep(seconds)
+
+
+@pytest.mark.asyncio
+async def test_pdf_pages_stream_in_document_order():
+    pool = ExtractionPool(max_workers=2, pages_per_job=3)
+    try:
+        pages = [text async for text in pool.pdf_pages(make_pdf([f"Page {i}" for i in range(10)]))]
+        assert [p.strip() for p in pages] == [f"Page {i}" for i in range(10)]
+
+        # Stopping early cancels the remaining batches
+        async for text in pool.pdf_pages(make_pdf([f"Page {i}" for i in range(30)])):
+            assert text.strip() == "Page 0"
+            break
+    finally:
+        await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_stuck_job_times_out_and_pool_recovers():
+    pool = ExtractionPool(max_workers=1, job_timeout=1.0)
+    try:
+        with pytest.raises(ExtractionTimeout):
+            await pool.run(_sleep, 30)
+        assert pool.metrics["restarts"] == 1
+
+        pages = [text async for text in pool.pdf_pages(make_pdf(["after restart"]))]
+        assert pages[0].strip() == "after restart"
+    finally:
+        await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_malformed_pdf_raises_value_error():
+    from app.knowledge.uploader import extract_text_async
+
+    with pytest.raises(ValueError):
+        await extract_text_async(b"%PDF-1.4 not really a pdf", "broken.pdf")
@@ -0,0 +1,54 @@
+import time
+from datetime import date
+
+from app.services.extraction_rules import extract_date, extract_with_rules, parse_keys
+
+
+def test_lead_capture_message():
+    text = "Assalomu alaykum, mening ismim Aziz Karimov, raqamim +998 90 123-45-67, aziz@Example.uz"
+    assert extract_with_rules(text, parse_keys("name, phone, email")) == {
+        "name": "Aziz Karimov",
+        "phone": "+998901234567",
+        "email": "aziz@example.uz",
+    }
+
+
+def test_russian_phone_amount_and_unknown_keys():
+    text = "Меня зовут Ольга, звоните 8 (912) 345-67-89, бюджет 2,5 млн сум"
+    found = extract_with_rules(text, parse_keys("телефон, name, budget, currency, city"))
+    assert found == {"телефон": "+79123456789", "name": "Ольга", "budget": 2500000, "currency": "UZS"}
+
+
+def test_dates_and_greetings():
+    today = date(2025, 3, 10)
+    assert extract_date("ertaga kelaman", today=today) == "2025-03-11"
+    assert extract_date("15 марта удобно", today=today) == "2025-03-15"
+    assert extract_date("30.04.2025 ga", today=today) == "2025-04-30"
+    assert extract_with_rules("Salom", ["name"]) == {}
+
+
+def test_names_need_an_introduction_cue():
+    assert extract_with_rules("Toshkent", ["name"]) == {}
+    assert extract_with_rules("Aziz Karimov", ["name"]) == {}
+    assert extract_with_rules("Это Ташкент", ["name"]) == {}
+    assert extract_with_rules("ismim aziz", ["name"]) == {"name": "Aziz"}
+    assert extract_with_rules("My name is Dilnoza", ["name"]) == {"name": "Dilnoza"}
+    assert extract_with_rules("I'm Interested in the iPhone", ["name"]) == {}
+    assert extract_with_rules("I am Ready to order", ["name"]) == {}
+    assert extract_with_rules("Это Очень дорого", ["name"]) == {}
+    assert extract_with_rules("Hi, I'm Aziz, how much is it?", ["name"]) == {"name": "Aziz"}
+    assert extract_with_rules("Это Ольга", ["name"]) == {"name": "Ольга"}
+
+
+def test_plural_currency_names():
+    assert extract_with_rules("budget is 500 dollars", ["amount", "currency"]) == {"amount": 500, "currency": "USD"}
+    assert extract_with_rules("20 euros", ["currency"]) == {"currency": "EUR"}
+
+
+def test_extraction_is_fast():
+    keys = parse_keys("phone, name, email, amount, date")
+    text = "Men Dilshod bo'laman, 97 765 43 21, narxi 300$ bo'lsa ertaga olaman"
+    start = time.perf_counter()
+    for _ in range(1000):
+        extract_with_rules(text, keys)
+    assert (time.perf_counter() - start) / 1000 < 0.001
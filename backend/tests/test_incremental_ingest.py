@@ -0,0 +1,96 @@
+import uuid
+
+import pytest
+import pytest_asyncio
+
+from app.database import Base, engine
+from app.knowledge import uploader
+
+
+@pytest_asyncio.fixture
+async def tables():
+    import app.models  # noqa: F401  (register models)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield
+
+
+@pytest.mark.asyncio
+async def test_reupload_only_embeds_changed_chunks(tables, monkeypatch):
+    embedded, upserted, deleted = [], [], []
+
+    async def fake_embeddings(texts):
+        embedded.extend(texts)
+        return [[0.0] * 4 for _ in texts]
+
+    async def fake_upsert(tenant_id, vectors):
+        upserted.extend(v["id"] for v in vectors)
+        return len(vectors)
+
+    async def fake_delete(tenant_id, vector_ids):
+        deleted.extend(vector_ids)
+        await uploader.lexical_index.remove_chunks(tenant_id, vector_ids)
+
+    monkeypatch.setattr(uploader, "get_embeddings", fake_embeddings)
+    monkeypatch.setattr(uploader, "upsert_vectors", fake_upsert)
+    monkeypatch.setattr(uploader, "delete_vectors", fake_delete)
+    monkeypatch.setattr(uploader, "chunk_text", lambda text: [p for p in text.split("\n\n") if p])
+
+    tenant_id, doc_id = str(uuid.uuid4()), str(uuid.uuid4())
+    sections = [f"Section {i}: item {i} costs {i * 1000} so'm." for i in range(20)]
+
+    first = await uploader.ingest_document(tenant_id, "\n\n".join(sections).encode(), "prices.txt", document_id=doc_id)
+    assert first["chunks_embedded"] == 20 and len(upserted) == 20
+
+    embedded.clear()
+    upserted.clear()
+    edited = sections[:5] + ["Section 5: item 5 costs 5500 so'm."] + sections[6:19]
+    second = await uploader.ingest_document(tenant_id, "\n\n".join(edited).encode(), "prices.txt", document_id=doc_id)
+
+    assert second["chunks_embedded"] == 1 and embedded == [edited[5]]
+    assert second["chunks_unchanged"] == 18
+    assert second["chunks_deleted"] == 2 and len(deleted) == 2
+
+    registered = await uploader.lexical_index.document_chunks(tenant_id, doc_id)
+    assert len(registered) == 19
+    assert set(deleted).isdisjoint(registered.values())
+
+    embedded.clear()
+    third = await uploader.ingest_document(tenant_id, "\n\n".join(edited).encode(), "prices.txt", document_id=doc_id)
+    assert third["chunks_embedded"] == 0 and embedded == []
+
+
+@pytest.mark.asyncio
+async def test_embedding_batches_in_flight_are_bounded(tables, monkeypatch):
+    import asyncio
+
+    from app.config import settings
+
+    monkeypatch.setattr(settings, "embedding_batch_size", 2)
+    monkeypatch.setattr(settings, "embedding_batch_concurrency", 3)
+    active, peak, calls = 0, 0, []
+
+    async def fake_embeddings(texts):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        calls.append(list(texts))
+        await asyncio.sleep(0.01)
+        active -= 1
+        return [[float(len(text))] for text in texts]
+
+    async def fake_upsert(tenant_id, vectors):
+        return len(vectors)
+
+    monkeypatch.setattr(uploader, "get_embeddings", fake_embeddings)
+    monkeypatch.setattr(uploader, "upsert_vectors", fake_upsert)
+    monkeypatch.setattr(uploader, "chunk_text", lambda text: [p for p in text.split("\n\n") if p])
+
+    sections = [f"Section {i}" + "!" * i for i in range(25)]
+    result = await uploader.ingest_document(
+        str(uuid.uuid4()), "\n\n".join(sections).encode(), "big.txt", document_id=str(uuid.uuid4()),
+    )
+
+    assert result["chunks_embedded"] == 25
+    assert len(calls) == 13 and peak <= 3
+    assert [text for batch in calls for text in batch] == sections
@@ -0,0 +1,156 @@
+import asyncio
+import uuid
+
+import pytest
+import pytest_asyncio
+
+from app.config import settings
+from app.database import Base, async_session_factory, engine
+from app.knowledge import uploader
+from app.knowledge.ingestion_jobs import IngestionJobManager, JobConflictError
+from app.models import KnowledgeDocument, KnowledgeIngestionJob
+
+
+@pytest_asyncio.fixture
+async def tables():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield
+
+
+@pytest.fixture
+def fake_index(monkeypatch):
+    monkeypatch.setattr(settings, "knowledge_job_claim_retry_sec", 0.01)
+    calls = {"embedded": 0, "running": 0, "max_running": 0}
+
+    async def fake_embeddings(texts):
+        calls["running"] += 1
+        calls["max_running"] = max(calls["max_running"], calls["running"])
+        await asyncio.sleep(0.05)
+        calls["running"] -= 1
+        calls["embedded"] += len(texts)
+        return [[0.0] * 4 for _ in texts]
+
+    async def fake_upsert(tenant_id, vectors):
+        return len(vectors)
+
+    monkeypatch.setattr(uploader, "get_embeddings", fake_embeddings)
+    monkeypatch.setattr(uploader, "upsert_vectors", fake_upsert)
+    return calls
+
+
+async def _new_document(tenant_id: str, filename: str) -> str:
+    async with async_session_factory() as db:
+        doc = KnowledgeDocument(tenant_id=uuid.UUID(tenant_id), filename=filename, file_type="txt", status="processing")
+        db.add(doc)
+        await db.commit()
+        return str(doc.id)
+
+
+async def _wait(manager: IngestionJobManager) -> None:
+    while manager._tasks:
+        await asyncio.gather(*manager._tasks.values(), return_exceptions=True)
+
+
+@pytest.mark.asyncio
+async def test_upload_job_streams_progress_and_completes(tables, fake_index, tmp_path):
+    from app.api.routes.notifications import get_tenant_connections
+
+    tenant_id = str(uuid.uuid4())
+    events: asyncio.Queue = asyncio.Queue()
+    get_tenant_connections(tenant_id).append(events)
+
+    manager = IngestionJobManager(per_tenant=1, staging_dir=str(tmp_path))
+    doc_ids = [await _new_document(tenant_id, f"faq{i}.txt") for i in range(2)]
+    text = "\n\n".join(f"Question {i}? Answer {i}." * 20 for i in range(30)).encode()
+    job_ids = [await manager.submit_upload(tenant_id, doc_id, f"faq{i}.txt", text) for i, doc_id in enumerate(doc_ids)]
+    await _wait(manager)
+
+    # Per-tenant cap of one: the two jobs never embedded at the same time
+    assert fake_index["max_running"] == 1
+
+    for job_id, doc_id in zip(job_ids, doc_ids):
+        job = await manager.get(tenant_id, job_id)
+        assert job["status"] == "completed" and job["stage"] == "done"
+        assert job["progress"]["chunks_embedded"] == job["progress"]["chunks_new"] > 0
+        async with async_session_factory() as db:
+            assert (await db.get(KnowledgeDocument, uuid.UUID(doc_id))).status == "completed"
+    assert list(tmp_path.iterdir()) == []
+
+    stages = []
+    while not events.empty():
+        event = events.get_nowait()
+        if event.get("event_type") == "ingestion_progress":
+            stages.append((event["status"], event["stage"]))
+    assert ("running", "embedding") in stages and ("completed", "done") in stages
+
+
+@pytest.mark.asyncio
+async def test_interrupted_job_resumes_after_extraction(tables, fake_index, tmp_path, monkeypatch):
+    tenant_id = str(uuid.uuid4())
+    doc_id = await _new_document(tenant_id, "prices.pdf")
+    manager = IngestionJobManager(staging_dir=str(tmp_path))
+
+    # A job that was queued with its text already extracted before a restart
+    job_id = str(uuid.uuid4())
+    async with async_session_factory() as db:
+        db.add(KnowledgeIngestionJob(
+            id=uuid.UUID(job_id), tenant_id=uuid.UUID(tenant_id), document_id=uuid.UUID(doc_id),
+            kind="upload", source="prices.pdf", status="queued", stage="embedding", progress={"pages_parsed": 12},
+        ))
+        await db.commit()
+    (tmp_path / f"{job_id}.txt").write_text("Model A34 costs 3 100 000 so'm.")
+
+    async def no_extraction(*args, **kwargs):
+        raise AssertionError("extraction should be skipped on resume")
+    monkeypatch.setattr(uploader, "extract_text_async", no_extraction)
+
+    assert await manager.resume_pending() >= 1
+    await _wait(manager)
+    job = await manager.get(tenant_id, job_id)
+    assert job["status"] == "completed"
+    assert job["progress"]["pages_parsed"] == 12
+
+
+@pytest.mark.asyncio
+async def test_tenant_cap_holds_across_processes(tables, fake_index, tmp_path):
+    tenant_id = str(uuid.uuid4())
+    # Two managers stand in for two API processes sharing the database
+    managers = [IngestionJobManager(per_tenant=1, staging_dir=str(tmp_path)) for _ in range(2)]
+    text = "\n\n".join(f"Delivery {i} takes {i} days." * 20 for i in range(10)).encode()
+    job_ids = []
+    for i, manager in enumerate(managers):
+        doc_id = await _new_document(tenant_id, f"delivery{i}.txt")
+        job_ids.append(await manager.submit_upload(tenant_id, doc_id, f"delivery{i}.txt", text))
+    for manager in managers:
+        await _wait(manager)
+
+    assert fake_index["max_running"] == 1
+    for manager, job_id in zip(managers, job_ids):
+        job = await manager.get(tenant_id, job_id)
+    assert job["status"] == "completed", job["error"]
+
+
+@pytest.mark.asyncio
+async def test_one_active_job_per_document(tables, fake_index, tmp_path, monkeypatch):
+    async def fake_delete(tenant_id, vector_ids):
+        await uploader.lexical_index.remove_chunks(tenant_id, vector_ids)
+
+    monkeypatch.setattr(uploader, "delete_vectors", fake_delete)
+    tenant_id = str(uuid.uuid4())
+    doc_id = await _new_document(tenant_id, "faq.txt")
+    manager = IngestionJobManager(staging_dir=str(tmp_path))
+
+    results = await asyncio.gather(
+        *(manager.submit_upload(tenant_id, doc_id, "faq.txt", b"Delivery is free.") for _ in range(2)),
+        return_exceptions=True,
+    )
+    assert sum(isinstance(r, JobConflictError) for r in results) == 1
+    await _wait(manager)
+    assert list(tmp_path.iterdir()) == []
+
+    # Once the first job is done the document can be re-ingested
+    job_id = await manager.submit_upload(tenant_id, doc_id, "faq.txt", b"Delivery is free in Tashkent.")
+    await _wait(manager)
+    job = await manager.get(tenant_id, job_id)
+    assert job["status"] == "completed", job["error"]
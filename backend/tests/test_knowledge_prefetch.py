@@ -0,0 +1,30 @@
+import asyncio
+
+import pytest
+
+from app.agents.claude_agent import ClaudeAgent
+
+
+@pytest.mark.asyncio
+async def test_discard_with_task_leaves_newer_prefetch(monkeypatch):
+    agent = ClaudeAgent()
+    started = asyncio.Event()
+
+    async def slow_context(tenant_id, query):
+        started.set()
+        await asyncio.sleep(10)
+        return query
+
+    monkeypatch.setattr(agent, "_get_knowledge_context", slow_context)
+
+    first = agent.prefetch_knowledge("t1", "c1", "Narxi qancha?")
+    second = agent.prefetch_knowledge("t1", "c1", "Yetkazish bormi?")
+    await started.wait()
+
+    # The first message's handler finishing must not drop the second's retrieval
+    agent.discard_prefetch("t1", "c1", first)
+    assert not second.cancelled() and ("t1", "c1") in agent._prefetches
+
+    agent.discard_prefetch("t1", "c1", second)
+    await asyncio.sleep(0)
+    assert second.cancelled() and not agent._prefetches
@@ -0,0 +1,77 @@
+import random
+import time
+
+import pytest
+
+from app.knowledge.lexical_index import BM25Index, tokenize
+from app.knowledge.rag import reciprocal_rank_fusion
+
+
+def test_tokenizer_keeps_codes_and_their_parts():
+    tokens = tokenize("Model XR-200 costs 1.5 mln so'm")
+    assert "xr-200" in tokens
+    assert "xr200" in tokens and "200" in tokens
+    assert "so'm" in tokens
+
+
+def test_exact_sku_ranks_first_and_updates_incrementally():
+    index = BM25Index()
+    index.add("a", "Smartphone Galaxy A54, 8/128GB, black. Price 4 200 000 so'm")
+    index.add("b", "Smartphone Galaxy A34, 6/128GB, silver. Price 3 100 000 so'm")
+    index.add("c", "Delivery across Tashkent takes one day")
+
+    assert index.search("narxi A34 qancha?")[0]["id"] == "b"
+    assert index.search("XR200") == []
+
+    index.add("d", "Router XR-200 dual band")
+    assert index.search("xr200")[0]["id"] == "d"
+
+    index.remove("b")
+    assert all(r["id"] != "b" for r in index.search("A34"))
+    assert len(index) == 3
+
+
+def test_fusion_promotes_lexical_hit_missed_by_vectors():
+    vector = [
+        {"id": "v1", "text": "phones", "score": 0.62, "metadata": {}},
+        {"id": "v2", "text": "accessories", "score": 0.55, "metadata": {}},
+        {"id": "v3", "text": "warranty", "score": 0.41, "metadata": {}},
+    ]
+    lexical = [
+        {"id": "sku", "text": "A34 price", "score": 7.1, "metadata": {"source": "prices.pdf"}},
+        {"id": "v2", "text": "accessories", "score": 2.0, "metadata": {}},
+    ]
+    fused = reciprocal_rank_fusion(vector, lexical, "A34 price accessories", k=60)
+    ids = [m["id"] for m in fused]
+    assert ids[0] == "v2"
+    assert ids.index("sku") < ids.index("v3")
+    sku = next(m for m in fused if m["id"] == "sku")
+    assert sku["source"] == "prices.pdf" and sku["score"] == pytest.approx(2 / 3)
+
+
+def test_fusion_drops_weak_lexical_only_hits():
+    vector = [{"id": "v1", "text": "phones", "score": 0.62, "metadata": {}}]
+    # The best BM25 hit for a sign-off shares one word with the query
+    lexical = [{"id": "greeting", "text": "Rahmat, buyurtmangiz qabul qilindi", "score": 3.4, "metadata": {}}]
+    fused = reciprocal_rank_fusion(vector, lexical, "Rahmat, xayr", k=60, min_coverage=0.6)
+    assert [m["id"] for m in fused] == ["v1"]
+
+    fused = reciprocal_rank_fusion([], [{"id": "sku", "text": "Narx AB-1200: 500 000", "score": 1.2, "metadata": {}}],
+                                   "ab1200 narx", k=60, min_coverage=0.6)
+    assert fused[0]["score"] == 1.0
+
+
+def test_search_latency_for_typical_tenant_corpus():
+    rng = random.Random(0)
+    vocab = [f"word{i}" for i in range(3000)]
+    index = BM25Index()
+    for i in range(5000):
+        words = rng.choices(vocab, k=120) + [f"SKU-{i:05d}"]
+        index.add(str(i), " ".join(words))
+
+    queries = [" ".join(rng.choices(vocab, k=6)) + f" sku-{rng.randrange(5000):05d}" for _ in range(50)]
+    start = time.perf_counter()
+    for query in queries:
+        index.search(query, top_k=20)
+    per_query_ms = (time.perf_counter() - start) * 1000 / len(queries)
+    assert per_query_ms < 5
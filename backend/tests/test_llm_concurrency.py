@@ -0,0 +1,35 @@
+import asyncio
+
+import pytest
+
+from app.services.llm_concurrency import AdaptiveConcurrencyLimiter, ProviderOverloaded
+
+
+@pytest.mark.asyncio
+async def test_limit_grows_additively_and_halves_on_overload():
+    limiter = AdaptiveConcurrencyLimiter("test", initial_limit=4, min_limit=1, max_limit=16)
+
+    for _ in range(8):
+        lease = await limiter.acquire(timeout=1)
+        await limiter.release(lease, latency=0.1, outcome="ok")
+    assert 5.5 < limiter.limit < 6.5
+
+    lease = await limiter.acquire(timeout=1)
+    await limiter.release(lease, latency=0.1, outcome="overload")
+    assert 2.5 < limiter.limit < 3.5
+
+
+@pytest.mark.asyncio
+async def test_excess_work_waits_then_times_out():
+    limiter = AdaptiveConcurrencyLimiter("test", initial_limit=1, min_limit=1, max_limit=1)
+    held = await limiter.acquire(timeout=1)
+
+    with pytest.raises(ProviderOverloaded):
+        await limiter.acquire(timeout=0.05)
+
+    waiter = asyncio.create_task(limiter.acquire(timeout=1))
+    await asyncio.sleep(0.01)
+    await limiter.release(held, latency=0.1, outcome="ok")
+    lease = await asyncio.wait_for(waiter, timeout=0.5)
+    assert limiter.in_flight == 1
+    await limiter.release(lease, latency=0.1, outcome="ok")
@@ -0,0 +1,34 @@
+import asyncio
+
+import pytest
+
+from app.config import settings
+from app.services.llm_scheduler import FairLLMScheduler
+
+
+@pytest.mark.asyncio
+async def test_interactive_and_small_tenant_not_starved(monkeypatch):
+    monkeypatch.setattr(settings, "llm_scheduler_max_concurrency", 1)
+    monkeypatch.setattr(settings, "llm_tenant_default_share", 1.0)
+    scheduler = FairLLMScheduler()
+    order = []
+
+    async def job(tenant, priority):
+        await scheduler.acquire(tenant, priority)
+        order.append((tenant, priority))
+        await asyncio.sleep(0)
+        scheduler._release(tenant)
+
+    await scheduler.acquire("blocker", "interactive")
+    tasks = [asyncio.create_task(job("campaign", "automation")) for _ in range(5)]
+    tasks += [asyncio.create_task(job("big", "interactive")) for _ in range(4)]
+    tasks.append(asyncio.create_task(job("small", "interactive")))
+    await asyncio.sleep(0)
+    assert scheduler.metrics()["queued"] == {"interactive": 5, "automation": 5, "analysis": 0}
+
+    scheduler._release("blocker")
+    await asyncio.gather(*tasks)
+
+    # All interactive work runs before automation; "small" is not stuck behind all of "big"
+    assert [p for _, p in order[:5]] == ["interactive"] * 5
+    assert order.index(("small", "interactive")) <= 1
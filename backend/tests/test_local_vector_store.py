@@ -0,0 +1,86 @@
+import numpy as np
+import pytest
+
+from app.knowledge.local_vector_store import LocalVectorStore
+
+
+def _vectors(n, dim=32, seed=0):
+    rng = np.random.default_rng(seed)
+    return [
+        {"id": f"doc_{i}", "values": rng.normal(size=dim).tolist(), "metadata": {"text": f"chunk {i}", "document_id": f"d{i % 3}"}}
+        for i in range(n)
+    ]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("quantize", [False, True])
+async def test_upsert_query_delete_and_reload(tmp_path, quantize):
+    store = LocalVectorStore(str(tmp_path), quantize=quantize, max_workers=2)
+    vectors = _vectors(1500)  # forces the memmap to grow past its initial capacity
+    assert await store.upsert("tenant-a", vectors) == 1500
+
+    top = await store.query("tenant-a", vectors[42]["values"], top_k=3)
+    assert top[0]["id"] == "doc_42"
+    assert top[0]["score"] == pytest.approx(1.0, abs=0.02)
+
+    filtered = await store.query("tenant-a", vectors[42]["values"], top_k=5, filter={"document_id": {"$eq": "d1"}})
+    assert filtered and all(m["metadata"]["document_id"] == "d1" for m in filtered)
+
+    await store.delete("tenant-a", ids=["doc_42"])
+    assert (await store.query("tenant-a", vectors[42]["values"], top_k=1))[0]["id"] != "doc_42"
+    assert await store.query("tenant-b", vectors[0]["values"], top_k=1) == []
+    await store.close()
+
+    reopened = LocalVectorStore(str(tmp_path), quantize=quantize)
+    top = await reopened.query("tenant-a", vectors[7]["values"], top_k=1)
+    assert top[0]["id"] == "doc_7"
+    assert top[0]["metadata"]["text"] == "chunk 7"
+    assert (await reopened.query("tenant-a", vectors[42]["values"], top_k=1))[0]["id"] != "doc_42"
+
+    await reopened.delete("tenant-a", delete_all=True)
+    assert await reopened.query("tenant-a", vectors[7]["values"], top_k=1) == []
+    await reopened.close()
+
+
+@pytest.mark.asyncio
+async def test_repeated_id_in_one_batch_keeps_a_single_row(tmp_path):
+    store = LocalVectorStore(str(tmp_path))
+    first, second = _vectors(2)
+    assert await store.upsert("t", [first, {**second, "id": first["id"]}]) == 1
+
+    top = await store.query("t", first["values"], top_k=2)
+    assert [hit["id"] for hit in top] == ["doc_0"]
+    assert top[0]["score"] < 0.9  # the row holds the last occurrence's values
+    await store.close()
+
+
+@pytest.mark.asyncio
+async def test_hnsw_graph_builds_in_the_background(tmp_path, monkeypatch):
+    import asyncio
+    import time
+
+    from app.config import settings
+
+    pytest.importorskip("hnswlib")
+    monkeypatch.setattr(settings, "local_vector_hnsw_threshold", 500)
+    store = LocalVectorStore(str(tmp_path))
+    vectors = _vectors(800)
+    await store.upsert("t", vectors)
+    ns = store._namespace("t")
+
+    # First query past the threshold answers from exact search and starts the build
+    assert (await store.query("t", vectors[3]["values"], top_k=1))[0]["id"] == "doc_3"
+    # Writes that land while the graph builds are replayed into it
+    late = {**_vectors(1, seed=9)[0], "id": "late"}
+    await store.delete("t", ids=["doc_5"])
+    await store.upsert("t", [late])
+    deadline = time.monotonic() + 10
+    while ns.graph is None and time.monotonic() < deadline:
+        await asyncio.sleep(0.01)
+    assert ns.graph is not None and not ns.building
+    assert (tmp_path / "t" / "hnsw.bin").exists()
+
+    assert (await store.query("t", late["values"], top_k=1))[0]["id"] == "late"
+    assert (await store.query("t", vectors[5]["values"], top_k=1))[0]["id"] != "doc_5"
+    assert (await store.query("t", vectors[700]["values"], top_k=1))[0]["id"] == "doc_700"
+    await store.close()
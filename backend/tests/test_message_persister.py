@@ -0,0 +1,81 @@
+import uuid
+from datetime import datetime
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import select
+
+from app.database import Base, async_session_factory, engine
+from app.memory.persister import MessagePersister, resolve_channel, stores_own_messages
+from app.models import ChannelType, Conversation, Message, MessageRole
+
+
+@pytest_asyncio.fixture
+async def tables():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield
+
+
+def test_channel_from_contact_prefix():
+    assert resolve_channel("ig_comment_42") == ("instagram_comment", "42")
+    assert resolve_channel("ig_42") == ("instagram", "42")
+    assert resolve_channel("fb_42") == ("facebook", "42")
+    assert resolve_channel("123456789") == ("telegram", "123456789")
+    assert resolve_channel("studio_sandbox_session") is None
+
+
+def _turn(user: str, reply: str, ts: str = None) -> list[dict]:
+    ts = ts or datetime.utcnow().isoformat()
+    return [
+        {"role": "user", "content": user, "type": "text", "timestamp": ts},
+        {"role": "assistant", "content": reply, "type": "text", "timestamp": ts},
+    ]
+
+
+@pytest.mark.asyncio
+async def test_flush_batches_messages_and_upserts_conversations(tables):
+    tenant_id = str(uuid.uuid4())
+    persister = MessagePersister(batch_size=100)
+
+    @stores_own_messages
+    async def bot_webhook():
+        # The Telegram bot webhook stores this turn itself through MessageStorageService
+        persister.enqueue(tenant_id, "777", _turn("Narxi qancha?", "14 500 000 so'm"))
+
+    await bot_webhook()
+    persister.enqueue(tenant_id, "ig_555", _turn("Salom", "Assalomu alaykum!"))
+    persister.enqueue(tenant_id, "ig_555", _turn("Bormi?", "Ha, bor"))
+    persister.enqueue(tenant_id, "sim_user_123", _turn("test", "test"))
+    assert persister.stats()["buffered"] == 4
+
+    assert await persister.flush()
+    assert persister.stats() == {
+        "persisted": 4, "handler_stored": 2, "skipped": 2, "dropped": 0, "flushes": 1, "flush_errors": 0, "buffered": 0,
+    }
+
+    async with async_session_factory() as db:
+        conversations = (await db.execute(
+            select(Conversation).where(Conversation.tenant_id == uuid.UUID(tenant_id))
+        )).scalars().all()
+        assert [(c.channel, c.contact_id) for c in conversations] == [(ChannelType.INSTAGRAM, "555")]
+        messages = (await db.execute(
+            select(Message.role, Message.content).where(Message.conversation_id == conversations[0].id)
+        )).all()
+        assert sorted(messages) == [
+            (MessageRole.ASSISTANT, "Assalomu alaykum!"), (MessageRole.ASSISTANT, "Ha, bor"),
+            (MessageRole.USER, "Bormi?"), (MessageRole.USER, "Salom"),
+        ]
+
+
+@pytest.mark.asyncio
+async def test_failed_flush_keeps_batch(tables, monkeypatch):
+    persister = MessagePersister(batch_size=10)
+    persister.enqueue("not-a-uuid-but-kept", "ig_1", _turn("a", "b"))
+
+    async def broken(batch):
+        raise RuntimeError("database unavailable")
+
+    monkeypatch.setattr(persister, "_write", broken)
+    assert not await persister.flush()
+    assert persister.stats()["buffered"] == 2 and persister.metrics["flush_errors"] == 1
@@ -0,0 +1,117 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import update
+
+from app.database import Base, async_session_factory, engine
+from app.knowledge import reconcile, uploader, vector_store
+from app.knowledge.lexical_index import lexical_index
+from app.knowledge.local_vector_store import LocalVectorStore
+from app.models import KnowledgeBaseChunk, KnowledgeDocument
+
+
+@pytest_asyncio.fixture
+async def tables():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield
+
+
+@pytest_asyncio.fixture
+async def local_store(tmp_path, monkeypatch):
+    store = LocalVectorStore(str(tmp_path / "vectors"))
+    monkeypatch.setattr(vector_store, "_vector_store", store)
+    yield store
+    await store.close()
+
+
+def _vector(vector_id, **metadata):
+    return {"id": vector_id, "values": [1.0, 0.0, 0.0, 0.0], "metadata": {"text": f"text of {vector_id}", **metadata}}
+
+
+@pytest.mark.asyncio
+async def test_reconcile_adopts_legacy_collects_orphans_and_drops_missing(tables, local_store, monkeypatch):
+    async def fake_embeddings(texts):
+        return [[1.0, 0.0, 0.0, 0.0] for _ in texts]
+
+    monkeypatch.setattr(uploader, "get_embeddings", fake_embeddings)
+    monkeypatch.setattr(uploader, "chunk_text", lambda text: [p for p in text.split("\n\n") if p])
+
+    tenant_id = str(uuid.uuid4())
+    async with async_session_factory() as db:
+        doc = KnowledgeDocument(tenant_id=uuid.UUID(tenant_id), filename="faq.txt", file_type="txt", status="completed")
+        db.add(doc)
+        await db.commit()
+        doc_id = str(doc.id)
+
+    result = await uploader.ingest_text(tenant_id, "Delivery is free.\n\nWarranty is 12 months.", "faq.txt", doc_id)
+    assert result["chunks_embedded"] == 2
+
+    # A document uploaded before the registry: two positional chunks, plus one left over
+    # from an older, longer version of it
+    async with async_session_factory() as db:
+        legacy = KnowledgeDocument(
+            tenant_id=uuid.UUID(tenant_id), filename="old.txt", file_type="txt", status="completed", chunk_count=2,
+        )
+        db.add(legacy)
+        await db.commit()
+        legacy_id = str(legacy.id)
+    await local_store.upsert(tenant_id, [_vector(f"{legacy_id}_{i}", document_id=legacy_id) for i in range(3)])
+
+    # Drift: a stale positional vector of the hash-indexed document, orphans of a deleted
+    # document, a registry row without a vector
+    await local_store.upsert(tenant_id, [_vector(f"{doc_id}_0", document_id=doc_id, source="faq.txt")])
+    orphans = [_vector(f"{uuid.uuid4()}_{i}", document_id=str(uuid.uuid4())) for i in range(7)]
+    await local_store.upsert(tenant_id, orphans)
+    await lexical_index.add_chunks(
+        tenant_id, [{"vector_id": "lost_1", "text": "lost chunk", "source": "x", "chunk_index": 0}], document_id=doc_id
+    )
+    async with async_session_factory() as db:
+        await db.execute(
+            update(KnowledgeBaseChunk)
+            .where(KnowledgeBaseChunk.vector_id == "lost_1")
+            .values(created_at=datetime.now(timezone.utc) - timedelta(days=1))
+        )
+        await db.commit()
+
+    monkeypatch.setattr(reconcile.settings, "kb_reconcile_batch_size", 3)
+    dry = await reconcile.reconcile_tenant(tenant_id, dry_run=True)
+    assert (dry["adopted"], dry["orphans_deleted"], dry["missing_dropped"]) == (2, 9, 1)
+
+    stats = await reconcile.reconcile_tenant(tenant_id)
+    assert (stats["adopted"], stats["orphans_deleted"], stats["missing_dropped"]) == (2, 9, 1)
+
+    remaining = {i async for page in local_store.list_ids(tenant_id) for i in page}
+    registered = set((await lexical_index.document_chunks(tenant_id, doc_id)).values())
+    assert len(registered) == 2 and f"{doc_id}_0" not in remaining
+    assert remaining == registered | {f"{legacy_id}_0", f"{legacy_id}_1"}
+    assert set((await lexical_index.document_chunks(tenant_id, legacy_id)).values()) == {f"{legacy_id}_0", f"{legacy_id}_1"}
+
+    # Converged: a second pass changes nothing
+    again = await reconcile.reconcile_tenant(tenant_id)
+    assert (again["adopted"], again["orphans_deleted"], again["missing_dropped"]) == (0, 0, 0)
+
+
+@pytest.mark.asyncio
+async def test_pod_based_pinecone_listing_is_detected_once():
+    from pinecone.core.client.exceptions import PineconeApiException
+
+    class PodIndex:
+        calls = 0
+
+        def list_paginated(self, **kwargs):
+            PodIndex.calls += 1
+            raise PineconeApiException(status=400, reason="Bad Request")
+
+    store = vector_store.PineconeVectorStore(max_workers=1, upsert_concurrency=1)
+    store._index = PodIndex()
+    try:
+        for tenant_id in ("t1", "t2"):
+            with pytest.raises(NotImplementedError):
+                async for _ in store.list_ids(tenant_id):
+                    pass
+        assert PodIndex.calls == 1
+    finally:
+        await store.close()
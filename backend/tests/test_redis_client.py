@@ -0,0 +1,63 @@
+import asyncio
+import time
+
+import pytest
+from redis.asyncio.connection import Connection
+from redis.exceptions import ConnectionError
+
+from app.core.redis_client import WaitingConnectionPool, hash_tag
+
+
+class _FakeConnection(Connection):
+    """Connects instantly; connecting to port 1 fails."""
+
+    async def connect(self):
+        if self.port == 1:
+            raise ConnectionError("refused")
+
+    async def can_read_destructive(self):
+        return False
+
+    async def disconnect(self, nowait: bool = False):
+        pass
+
+
+def _pool(max_connections: int, timeout: float, port: int = 6379) -> WaitingConnectionPool:
+    return WaitingConnectionPool(
+        connection_class=_FakeConnection, max_connections=max_connections, timeout=timeout, port=port,
+    )
+
+
+def test_hash_tag():
+    assert hash_tag("t1", "c9") == "{t1:c9}"
+
+
+@pytest.mark.asyncio
+async def test_burst_past_the_cap_waits_instead_of_failing():
+    pool = _pool(max_connections=2, timeout=1.0)
+
+    async def command():
+        connection = await pool.get_connection("GET")
+        await asyncio.sleep(0.01)
+        await pool.release(connection)
+
+    await asyncio.gather(*(command() for _ in range(10)))
+    assert pool.waits > 0 and pool.wait_timeouts == 0
+    assert len(pool._in_use_connections) == 0 and len(pool._available_connections) == 2
+
+
+@pytest.mark.asyncio
+async def test_saturated_pool_times_out_and_failed_connect_does_not_stall():
+    pool = _pool(max_connections=1, timeout=0.05)
+    held = await pool.get_connection("GET")
+    with pytest.raises(ConnectionError, match="No connection available"):
+        await pool.get_connection("GET")
+    assert pool.wait_timeouts == 1
+    await pool.release(held)
+
+    down = _pool(max_connections=1, timeout=5.0, port=1)
+    started = time.perf_counter()
+    for _ in range(3):
+        with pytest.raises(ConnectionError, match="refused"):
+            await down.get_connection("GET")
+    assert time.perf_counter() - started < 1.0
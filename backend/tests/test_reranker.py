@@ -0,0 +1,60 @@
+import time
+
+import pytest
+
+from app.knowledge import rag
+from app.knowledge.reranker import estimate_tokens, rerank
+
+
+def _match(match_id, text, score, **metadata):
+    return {"id": match_id, "text": text, "score": score, "metadata": metadata}
+
+
+def test_mmr_skips_near_duplicates_and_prefers_manual_entries():
+    candidates = [
+        _match("a", "Delivery in Tashkent takes 1-2 days and costs 20000 so'm.", 0.82),
+        _match("b", "Delivery in Tashkent takes 1-2 days and costs 20000 so'm!", 0.81),
+        _match("c", "Regions: delivery takes 3-5 days via BTS courier.", 0.74),
+        _match("manual_1", "Q: How long is delivery? A: 1-2 days in Tashkent, 3-5 days in regions.", 0.72, is_manual=True),
+        _match("d", "Our store opened in 2015 on Amir Temur street.", 0.40),
+    ]
+    results = rerank("how long does delivery take", candidates, top_k=3)
+    ids = [r["id"] for r in results]
+
+    assert "manual_1" in ids
+    assert not {"a", "b"} <= set(ids)
+    assert "d" not in ids
+
+
+def test_recency_breaks_ties_and_budget_trims_prompt():
+    now = time.time()
+    old = _match("old", "Price list: iPhone 15 costs 12 000 000 so'm.", 0.8, indexed_at=now - 400 * 86400)
+    new = _match("new", "Price list: iPhone 15 costs 11 500 000 so'm now.", 0.8, indexed_at=now - 86400)
+    assert rerank("iphone 15 price", [old, new], top_k=1, now=now)[0]["id"] == "new"
+
+    long_chunks = [_match(str(i), f"topic {i} " + "word " * 200, 0.9 - i * 0.01) for i in range(5)]
+    results = rerank("topic", long_chunks, top_k=5, token_budget=600)
+    assert sum(estimate_tokens(r["text"]) for r in results) <= 600
+    assert len(results) < 5
+
+
+@pytest.mark.asyncio
+async def test_rag_search_overfetches_then_reranks(monkeypatch):
+    requested = {}
+
+    async def fake_vector_search(tenant_id, query, top_k, score_threshold):
+        requested["vector"] = top_k
+        return [_match(f"v{i}", f"chunk {i} about warranty terms {i}", 0.9 - i * 0.01) for i in range(top_k)]
+
+    async def fake_lexical_search(tenant_id, query, top_k=10):
+        requested["lexical"] = top_k
+        return []
+
+    monkeypatch.setattr(rag, "_vector_search", fake_vector_search)
+    monkeypatch.setattr(rag.lexical_index, "search", fake_lexical_search)
+    monkeypatch.setattr(rag.settings, "hybrid_candidates", 5)
+
+    results = await rag.rag_search("tenant", "warranty terms", top_k=5)
+    assert requested == {"vector": 20, "lexical": 20}
+    assert 0 < len(results) <= 5
+    assert all("rerank_score" in r for r in results)
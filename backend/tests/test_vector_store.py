@@ -0,0 +1,50 @@
+import asyncio
+import time
+
+import pytest
+
+from app.knowledge.vector_store import PineconeVectorStore
+
+
+class BlockingIndex:
+    """Stand-in for the synchronous Pinecone index."""
+
+    def __init__(self):
+        self.batches = []
+
+    def upsert(self, vectors, namespace):
+        time.sleep(0.05)
+        self.batches.append(len(vectors))
+
+    def query(self, vector, top_k, namespace, include_metadata):
+        time.sleep(0.05)
+        return {"matches": [{"id": "a", "score": 0.9, "metadata": {"text": "hi"}}]}
+
+
+@pytest.mark.asyncio
+async def test_upserts_run_in_parallel_off_the_event_loop():
+    store = PineconeVectorStore(max_workers=4, upsert_concurrency=4)
+    store._index = BlockingIndex()
+    vectors = [{"id": str(i), "values": [0.0], "metadata": {}} for i in range(400)]
+
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.005)
+            ticks += 1
+
+    ticker_task = asyncio.create_task(ticker())
+    start = time.perf_counter()
+    assert await store.upsert("tenant", vectors) == 400
+    elapsed = time.perf_counter() - start
+    ticker_task.cancel()
+
+    assert sorted(store._index.batches) == [100, 100, 100, 100]
+    assert elapsed < 0.15  # four 50ms batches overlapped
+    assert ticks >= 5  # the loop kept running meanwhile
+
+    matches = await store.query("tenant", [0.0], top_k=1)
+    assert matches == [{"id": "a", "score": 0.9, "metadata": {"text": "hi"}}]
+    await store.close()